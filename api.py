@@ -1,17 +1,34 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from trade_manager import TradingBot
+import metrics
 
 app = FastAPI()
 
-# Initialize the Trading Bot
-trading_bot = TradingBot()
+# Trading Bot is created on first use so /health workers start without exchange clients
+_trading_bot = None
+
+def get_trading_bot():
+    global _trading_bot
+    if _trading_bot is None:
+        _trading_bot = TradingBot()
+        # Shared product catalog: orders are quantized and validated in memory
+        _trading_bot.client.catalog.start(_trading_bot.client.client)
+        # No trading loop feeds the gate here: re-read balances in the background
+        _trading_bot.client.risk_gate.start(_trading_bot.client)
+    return _trading_bot
 
 # Health Check
 @app.get("/health")
 def health_check():
     return {"status": "Trading bot is running"}
 
+# Prometheus metrics (API call counters/latency, tick stage timings)
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return metrics.render_prometheus()
+
 # Schema for trade requests
 class TradeRequest(BaseModel):
     symbol: str   # e.g. "BTC-USD"
@@ -22,14 +39,22 @@ class TradeRequest(BaseModel):
 @app.post("/trade")
 def place_trade(trade: TradeRequest):
     try:
-        result = trading_bot.execute_trade(
+        result = get_trading_bot().execute_trade(
             symbol=trade.symbol,
             side=trade.side,
             quantity=trade.quantity
         )
-        return {"message": "Trade executed", "details": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if isinstance(result, dict) and result.get("rejected"):
+        # Blocked by the pre-trade risk gate before reaching the exchange
+        raise HTTPException(status_code=403, detail=result["error"])
+    return {"message": "Trade executed", "details": result}
+
+# Pre-trade check latency vs. budget
+@app.get("/risk/latency")
+def risk_latency():
+    return get_trading_bot().client.risk_gate.latency_stats()
 
 # Get open orders
 @app.get("/trades")
@@ -38,7 +63,7 @@ def get_open_trades(symbol: str = None):
     Optional: pass ?symbol=BTC-USD to filter by product ID.
     """
     try:
-        trades = trading_bot.get_active_trades(symbol=symbol)
+        trades = get_trading_bot().get_active_trades(symbol=symbol)
         return {"open_trades": trades}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,254 @@
+# app/broadcaster.py
+import asyncio
+import json
+import logging
+import threading
+
+from broker import EVENTS_CHANNEL, get_broker
+
+logger = logging.getLogger(__name__)
+
+# What to do when a subscriber's send queue is full
+CONFLATE = "conflate"  # drop the oldest queued message, keep the newest
+DROP = "drop"          # disconnect the slow client
+
+
+class Subscription:
+    """
+    One connected socket. Holds a bounded queue of already-serialized
+    messages that the socket's sender task drains.
+    """
+
+    def __init__(self, user_id, topics, max_queue=100, policy=CONFLATE):
+        self.user_id = user_id
+        self.topics = tuple(topics)
+        self.policy = policy
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.closed = False
+        self.dropped = 0
+
+    def offer(self, message):
+        """
+        Enqueue without blocking. Returns False if the subscriber should be
+        disconnected because it cannot keep up.
+        """
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+        self.dropped += 1
+        if self.policy == DROP:
+            return False
+        # Conflate: the newest state matters more than the backlog
+        self.queue.get_nowait()
+        self.queue.put_nowait(message)
+        return True
+
+    def close(self):
+        """Wake the sender task so it exits; pending messages are discarded."""
+        if self.closed:
+            return
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self):
+        """Next serialized message, or None once the subscription is closed."""
+        return await self.queue.get()
+
+
+class Broadcaster:
+    """
+    Publish/subscribe fan-out for trade and signal events.
+
+    Events are serialized once per publish and the same string is queued to
+    every matching subscription, so the cost of a publish is one json.dumps
+    plus one non-blocking enqueue per recipient. Slow sockets never hold up
+    the publisher: their queue is conflated or they are disconnected.
+    """
+
+    def __init__(self, max_queue=100, policy=CONFLATE):
+        self.max_queue = max_queue
+        self.policy = policy
+        # topic -> user_id -> set of subscriptions
+        self._subscribers = {}
+        self._loop = None
+
+    def subscribe(self, user_id, topics=("trades", "signals")):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        sub = Subscription(user_id, topics, max_queue=self.max_queue, policy=self.policy)
+        for topic in sub.topics:
+            self._subscribers.setdefault(topic, {}).setdefault(user_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        sub.close()
+        for topic in sub.topics:
+            by_user = self._subscribers.get(topic)
+            if not by_user:
+                continue
+            subs = by_user.get(sub.user_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del by_user[sub.user_id]
+            if not by_user:
+                del self._subscribers[topic]
+
+    def publish(self, topic, event, user_id=None):
+        """
+        Fan an event out to subscribers of `topic`. With `user_id`, only that
+        user's sockets receive it; otherwise every subscriber of the topic does.
+        Must be called from the event loop thread (see publish_threadsafe).
+        Returns the number of subscriptions the message was queued to.
+        """
+        by_user = self._subscribers.get(topic)
+        if not by_user:
+            return 0
+        if user_id is None:
+            targets = [s for subs in by_user.values() for s in subs]
+        else:
+            targets = list(by_user.get(user_id, ()))
+        if not targets:
+            return 0
+
+        message = json.dumps(event)
+        delivered = 0
+        for sub in targets:
+            if sub.offer(message):
+                delivered += 1
+            else:
+                logger.warning(f"Dropping slow websocket subscriber for user {sub.user_id}")
+                self.unsubscribe(sub)
+        return delivered
+
+    def publish_threadsafe(self, topic, event, user_id=None):
+        """
+        Publish from a non-async thread (e.g. BrokerRelay). A no-op until a
+        socket has subscribed in this process, or once its loop has closed.
+        Trading processes serve no sockets; they use BrokerPublisher.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self.publish, topic, event, user_id)
+        except RuntimeError:
+            # Loop closed between the check and the call (shutdown)
+            pass
+
+    def subscriber_count(self, topic=None):
+        topics = [topic] if topic else list(self._subscribers)
+        return sum(
+            len(subs)
+            for t in topics
+            for subs in self._subscribers.get(t, {}).values()
+        )
+
+
+class BrokerPublisher:
+    """
+    Broadcaster stand-in for processes that serve no websockets (the
+    trading loop, the multi-tenant runtime): events go to the broker's
+    EVENTS_CHANNEL and every API process's BrokerRelay fans them out.
+    Publishing never raises into the trading thread.
+    """
+
+    def __init__(self, broker=None):
+        self._broker = broker
+
+    @property
+    def broker(self):
+        # Resolved on first publish so importing this module never connects
+        if self._broker is None:
+            self._broker = get_broker()
+        return self._broker
+
+    def publish_threadsafe(self, topic, event, user_id=None):
+        try:
+            self.broker.broadcast(EVENTS_CHANNEL, {"topic": topic, "user_id": user_id, "event": event})
+        except Exception as e:
+            logger.warning(f"Could not publish {topic} event: {e}")
+
+
+class BrokerRelay:
+    """
+    Background thread in the API process: events published on the broker's
+    EVENTS_CHANNEL by other processes are handed to `broadcaster`.
+    """
+
+    def __init__(self, broadcaster, broker=None, poll=1.0):
+        self.broadcaster = broadcaster
+        self._broker = broker
+        self.poll = poll
+        self._listener = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        broker = self._broker or get_broker()
+        # Subscribed before returning, so nothing published afterwards is missed
+        self._listener = broker.listen(EVENTS_CHANNEL)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="broker-relay", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll + 1)
+            self._thread = None
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def _run(self):
+        listener = self._listener
+        while not self._stop.is_set():
+            try:
+                message = listener.get(timeout=self.poll)
+            except Exception as e:
+                logger.warning(f"Broker relay read failed: {e}")
+                self._stop.wait(self.poll)
+                continue
+            if message is not None:
+                self.broadcaster.publish_threadsafe(message["topic"], message["event"], message.get("user_id"))
+
+
+async def pump(sub, send, disconnected):
+    """
+    Send a subscription's messages with `send` until the subscription is
+    closed or the `disconnected` coroutine returns (the client went away),
+    whichever comes first; the other side is cancelled. Without the
+    watcher a socket that disconnects while no events arrive would wait in
+    sub.get() forever and its subscription would never be removed.
+    """
+    async def sender():
+        while True:
+            message = await sub.get()
+            if message is None:
+                # Closed by the broadcaster (slow consumer) or on shutdown
+                return
+            await send(message)
+
+    tasks = {asyncio.ensure_future(sender()), asyncio.ensure_future(disconnected)}
+    try:
+        done, _pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()   # re-raise a failed send
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+broadcaster = Broadcaster()
+# What trading processes publish through
+publisher = BrokerPublisher()
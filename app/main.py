@@ -1,11 +1,31 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, WebSocket
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from typing import List, Dict
 import jwt
 
+from user_store import get_user_store
+from app.tasks import run_trader
+from app.websockets import websocket_endpoint
+from app.broadcaster import BrokerRelay, broadcaster
+from config import PERFORMANCE_CHART_POINTS
+from performance import get_performance_store, chart_points
+from trade_ledger import get_trade_ledger
+
 app = FastAPI()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Orders and fills published by the trading processes, fanned out to /ws
+relay = BrokerRelay(broadcaster)
+
+
+@app.on_event("startup")
+def start_relay():
+    relay.start()
+
+
+@app.on_event("shutdown")
+def stop_relay():
+    relay.stop()
 
 class ExchangeConfig(BaseModel):
     exchange_name: str
@@ -19,7 +39,6 @@ class User(BaseModel):
     exchanges: List[ExchangeConfig] = []
     settings: Dict = {}
 
-users = {}  # In-memory store for demo; use database in production
 
 @app.post("/add_exchange")
 async def add_exchange(config: ExchangeConfig, token: str = Depends(oauth2_scheme)):
@@ -27,12 +46,86 @@ async def add_exchange(config: ExchangeConfig, token: str = Depends(oauth2_schem
     limits = {1: 1, 2: 2, 3: 5}
     if len(user.exchanges) >= limits.get(user.tier, 0):
         raise HTTPException(status_code=403, detail="Exchange limit reached")
-    user.exchanges.append(config)
+    get_user_store().add_exchange(user.wallet_public_key, config.dict())
     return {"message": "Exchange added"}
 
 def get_current_user(token: str):
     try:
         payload = jwt.decode(token, "secret", algorithms=["HS256"])
-        return users.get(payload.get("sub"))
     except:
-        raise HTTPException(status_code=401, detail="Invalid token")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid token")
+    # Shared with the Telegram bot and other API workers
+    record = get_user_store().get_by_wallet(payload.get("sub"))
+    if record is None:
+        raise HTTPException(status_code=401, detail="Unknown user")
+    return User(
+        wallet_public_key=record["wallet"],
+        token_balance=record["token_balance"],
+        tier=record["tier"],
+        exchanges=[ExchangeConfig(**e) for e in record["exchanges"]],
+        settings=record["settings"]
+    )
+
+@app.post("/start_trader")
+async def start_trader(settings: dict, user: User = Depends(get_current_user)):
+    # Start Celery task (see Step 4)
+    task = run_trader.delay(user.dict(), settings)
+    return {"task_id": task.id}
+
+@app.websocket("/ws")
+async def trades_websocket(websocket: WebSocket, token: str):
+    # Browsers cannot set headers on a websocket: the JWT comes as ?token=
+    try:
+        user = get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket_endpoint(websocket, user)
+
+@app.get("/trading_history")
+def get_trading_history(product_id: str = None, start: float = None, end: float = None,
+                        limit: int = 500, after_id: int = None, user: User = Depends(get_current_user)):
+    # Indexed range scan of the trade ledger; page with after_id = last fill id
+    ledger = get_trade_ledger()
+    limit = max(1, min(limit, 5000))
+    return {
+        "history": ledger.fills(user.wallet_public_key, product_id, start, end, limit, after_id),
+        "daily": ledger.daily(user.wallet_public_key, product_id=product_id),
+    }
+
+
+def _own_wallet(wallet: str, user: User):
+    if wallet != user.wallet_public_key:
+        raise HTTPException(status_code=403, detail="Not your wallet")
+
+
+def _conditional(request: Request, response: Response, etag: str, build):
+    """304 if the client already has `etag`, else build() with the ETag set."""
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return build()
+
+
+# Plain `def`: reading the ledger is blocking I/O, so these run in the threadpool
+@app.get("/performance/{wallet}")
+def get_performance(wallet: str, request: Request, response: Response,
+                    points: int = PERFORMANCE_CHART_POINTS, user: User = Depends(get_current_user)):
+    # Downsampled equity curve (chart.js line data), precomputed per fill/mark
+    _own_wallet(wallet, user)
+    store = get_performance_store()
+    store.sync(wallet)
+    points = chart_points(points)
+    return _conditional(request, response, store.etag(wallet, "performance", points),
+                        lambda: store.chart(wallet, points))
+
+
+@app.get("/trade-summary/{wallet}")
+def get_trade_summary(wallet: str, request: Request, response: Response,
+                      user: User = Depends(get_current_user)):
+    _own_wallet(wallet, user)
+    store = get_performance_store()
+    store.sync(wallet)
+    return _conditional(request, response, store.etag(wallet, "summary"),
+                        lambda: store.summary(wallet))
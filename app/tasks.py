@@ -1,10 +1,13 @@
 # app/tasks.py
 from celery import Celery
-from ai_trader.trader import start_trader
+from trader import start_trader
+from user import User
+from config import BROKER_URL
 
-celery_app = Celery('trader', broker='redis://localhost:6379/0')
+celery_app = Celery('trader', broker=BROKER_URL)
 
 @celery_app.task
 def run_trader(user_data, settings):
+    # Validates the tier and registers the user with the shared trader runtime
     user = User(**user_data)
-    start_trader(user, settings)
\ No newline at end of file
+    start_trader(user, settings)
@@ -1,9 +1,26 @@
 # app/websockets.py
-from fastapi import WebSocket
-import json
+from fastapi import WebSocket, WebSocketDisconnect
 
-async def websocket_endpoint(websocket: WebSocket, user: User):
+from app.broadcaster import broadcaster, pump
+
+
+async def _disconnected(websocket: WebSocket):
+    """Return once the client disconnects; clients send nothing we act on."""
+    try:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    except WebSocketDisconnect:
+        pass
+
+
+async def websocket_endpoint(websocket: WebSocket, user):
+    """Stream `user`'s (an app.main.User) trade and signal events until either side closes."""
     await websocket.accept()
-    while True:
-        trade = await get_new_trade(user)  # Hypothetical function
-        await websocket.send_text(json.dumps(trade))
\ No newline at end of file
+    # Trade/signal events are pushed by the broadcaster; no per-client polling
+    sub = broadcaster.subscribe(user.wallet_public_key, topics=("trades", "signals"))
+    try:
+        await pump(sub, websocket.send_text, _disconnected(websocket))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.unsubscribe(sub)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from config import BARS_PER_YEAR
+from rl_env import MultiAssetTradingEnv
+from resampler import BASE_FEATURES
+
+def summarize_equity(equity, bars_per_year=BARS_PER_YEAR):
+    """Return, drawdown and Sharpe stats for an equity curve."""
+    equity = np.asarray(equity, dtype=np.float64)
+    returns = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.zeros(0)
+    peak = np.maximum.accumulate(equity)
+    std = returns.std() if len(returns) else 0.0
+    return {
+        "initial_net_worth": float(equity[0]),
+        "final_net_worth": float(equity[-1]),
+        "total_return": float(equity[-1] / equity[0] - 1),
+        "max_drawdown": float(np.max(1 - equity / peak)),
+        "sharpe": float(returns.mean() / std * np.sqrt(bars_per_year)) if std > 0 else 0.0,
+        "n_steps": int(len(returns)),
+    }
+
+def run_backtest(model, df, product_ids, initial_balance=10000, features=BASE_FEATURES):
+    """
+    Replay a trained policy over historical data through MultiAssetTradingEnv,
+    so fees and risk rules match training. Returns summary stats plus the
+    equity curve.
+    """
+    env = MultiAssetTradingEnv(df, product_ids, initial_balance=initial_balance, features=features)
+    obs = env.reset()
+    equity = [float(initial_balance)]
+    done = False
+    while not done:
+        action, _states = model.predict(obs, deterministic=True)
+        obs, _reward, done, info = env.step(action)
+        equity.append(info["net_worth"])
+
+    stats = summarize_equity(equity)
+    stats["equity_curve"] = equity
+    return stats
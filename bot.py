@@ -1,27 +1,29 @@
 import logging
+from datetime import datetime, timezone
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, CallbackContext
 
 # Import configuration (ensure your .env now defines SOLANA_RPC_URL and SPARK_MINT_ADDRESS)
 from config import BOT_TOKEN, ADMIN_CHAT_ID, SOLANA_RPC_URL, SPARK_MINT_ADDRESS
 from trade_manager import CoinbaseClient
-from solana.rpc.api import Client as SolanaClient
-from solana.publickey import PublicKey
+from user_store import get_user_store
+from trade_ledger import get_trade_ledger
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # ------------------------------------------------------------------------------
-# Global storage for user configurations (for demo only – in production use a DB)
+# Shared user configuration store (SQLite, shared with the API workers), opened
+# on first use via get_user_store().
 # Each user (keyed by Telegram user id) stores:
 #   - "wallet": the user's Solana wallet address
-#   - "api_key" and "api_secret": exchange API credentials
-user_configs = {}
+#   - "api_key" and "api_secret": exchange API credentials (encrypted at rest)
 
 # ------------------------------------------------------------------------------
 # SparkTokenClient using Solana
 class SparkTokenClient:
     def __init__(self, rpc_url, mint_address):
+        from solana.rpc.api import Client as SolanaClient
         self.client = SolanaClient(rpc_url)
         self.mint_address = mint_address
 
@@ -30,6 +32,7 @@ class SparkTokenClient:
         Query the wallet's token balance for the given mint (Spark token).
         Returns the total balance as a float.
         """
+        from solana.publickey import PublicKey
         try:
             owner = PublicKey(wallet_address)
             mint = PublicKey(self.mint_address)
@@ -55,23 +58,40 @@ class SparkTokenClient:
         balance = self.get_balance(wallet_address)
         return balance >= minimum
 
-# Instantiate the trading client and Spark token client
-coinbase_client = CoinbaseClient()
-spark_token_client = SparkTokenClient(SOLANA_RPC_URL, SPARK_MINT_ADDRESS)
+# Trading client and Spark token client, created on first use so importing
+# this module does not open connections.
+_coinbase_client = None
+_spark_token_client = None
 MINIMUM_SPARK_BALANCE = 1_000_000
 
+def get_coinbase_client():
+    global _coinbase_client
+    if _coinbase_client is None:
+        _coinbase_client = CoinbaseClient()
+        # Shared with the trading loop when both run in one process
+        _coinbase_client.catalog.start(_coinbase_client.client)
+        # Net worth and positions for the gate's position and drawdown checks
+        _coinbase_client.risk_gate.start(_coinbase_client)
+    return _coinbase_client
+
+def get_spark_token_client():
+    global _spark_token_client
+    if _spark_token_client is None:
+        _spark_token_client = SparkTokenClient(SOLANA_RPC_URL, SPARK_MINT_ADDRESS)
+    return _spark_token_client
+
 # ------------------------------------------------------------------------------
 # Helper: Check if user has set a wallet and has sufficient Spark tokens.
 def check_user_spark_balance(update: Update, context: CallbackContext) -> bool:
     user_id = update.effective_user.id
-    config = user_configs.get(user_id, {})
+    config = get_user_store().get_by_telegram_id(user_id) or {}
     wallet = config.get("wallet")
     if not wallet:
         update.message.reply_text(
             "You haven't set your wallet address yet. Use /setwallet <your_wallet_address> to set it."
         )
         return False
-    if not spark_token_client.is_balance_sufficient(wallet, MINIMUM_SPARK_BALANCE):
+    if not get_spark_token_client().is_balance_sufficient(wallet, MINIMUM_SPARK_BALANCE):
         update.message.reply_text(
             "Your Spark token balance is below the required 1,000,000 tokens. "
             "AI trading is paused until you top up your balance."
@@ -113,14 +133,22 @@ def help_command(update: Update, context: CallbackContext):
 
 def status_command(update: Update, context: CallbackContext):
     user_id = update.effective_user.id
-    config = user_configs.get(user_id, {})
+    config = get_user_store().get_by_telegram_id(user_id) or {}
     wallet = config.get("wallet")
-    if wallet and not spark_token_client.is_balance_sufficient(wallet, MINIMUM_SPARK_BALANCE):
+    if wallet and not get_spark_token_client().is_balance_sufficient(wallet, MINIMUM_SPARK_BALANCE):
         update.message.reply_text(
             "Warning: Your Spark token balance is below the required 1,000,000 tokens. AI trading is paused."
         )
         return
-    update.message.reply_text("AI Performance: +15% this month (placeholder)")
+    if not wallet:
+        update.message.reply_text("No wallet linked yet. Use /setwallet <address> first.")
+        return
+    month_start = datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    totals = get_trade_ledger().totals(wallet, since=month_start.timestamp())
+    update.message.reply_text(
+        f"AI Performance this month: realized PnL ${totals['realized_pnl']:+.2f} "
+        f"over {totals['trades']} trades (volume ${totals['volume']:.2f}, fees ${totals['fees']:.2f})"
+    )
 
 def buy_command(update: Update, context: CallbackContext):
     if not check_user_spark_balance(update, context):
@@ -132,7 +160,7 @@ def buy_command(update: Update, context: CallbackContext):
             return
         product_id = args[0]
         funds = float(args[1])
-        result = coinbase_client.place_market_order(product_id, "buy", funds=funds)
+        result = get_coinbase_client().place_market_order(product_id, "buy", funds=funds)
         update.message.reply_text(str(result))
     except Exception as e:
         update.message.reply_text(f"Error: {e}")
@@ -147,13 +175,13 @@ def sell_command(update: Update, context: CallbackContext):
             return
         product_id = args[0]
         size = float(args[1])
-        result = coinbase_client.place_market_order(product_id, "sell", size=size)
+        result = get_coinbase_client().place_market_order(product_id, "sell", size=size)
         update.message.reply_text(str(result))
     except Exception as e:
         update.message.reply_text(f"Error: {e}")
 
 def balance_command(update: Update, context: CallbackContext):
-    balances = coinbase_client.get_account_balances()
+    balances = get_coinbase_client().get_account_balances()
     if isinstance(balances, list) and balances and "error" in balances[0]:
         update.message.reply_text(f"Error retrieving balances: {balances[0]['error']}")
         return
@@ -175,13 +203,18 @@ def setwallet_command(update: Update, context: CallbackContext):
         update.message.reply_text("Usage: /setwallet <your_wallet_address>")
         return
     wallet_address = args[0]
+    from solana.publickey import PublicKey
     try:
         # Validate that the address is a valid Solana public key.
         PublicKey(wallet_address)
     except Exception as e:
         update.message.reply_text(f"Invalid wallet address: {e}")
         return
-    user_configs.setdefault(user_id, {})["wallet"] = wallet_address
+    try:
+        get_user_store().update_telegram_user(user_id, wallet=wallet_address)
+    except ValueError as e:
+        update.message.reply_text(str(e))
+        return
     update.message.reply_text(f"Wallet address set to: {wallet_address}")
 
 def setapikey_command(update: Update, context: CallbackContext):
@@ -193,16 +226,15 @@ def setapikey_command(update: Update, context: CallbackContext):
         return
     api_key = args[0]
     api_secret = args[1]
-    user_configs.setdefault(user_id, {})["api_key"] = api_key
-    user_configs[user_id]["api_secret"] = api_secret
+    get_user_store().update_telegram_user(user_id, api_key=api_key, api_secret=api_secret)
     update.message.reply_text("Exchange API credentials set successfully.")
 
 def config_command(update: Update, context: CallbackContext):
     """Display the current configuration for the user."""
     user_id = update.effective_user.id
-    config = user_configs.get(user_id, {})
-    wallet = config.get("wallet", "Not set")
-    api_key = config.get("api_key", "Not set")
+    config = get_user_store().get_by_telegram_id(user_id) or {}
+    wallet = config.get("wallet") or "Not set"
+    api_key = config.get("api_key") or "Not set"
     message = f"Your Configuration:\nWallet Address: {wallet}\nExchange API Key: {api_key}\n"
     update.message.reply_text(message)
 
@@ -213,7 +245,7 @@ def menu_callback(update: Update, context: CallbackContext):
     data = query.data
     query.answer()
     if data == "menu_balance":
-        balances = coinbase_client.get_account_balances()
+        balances = get_coinbase_client().get_account_balances()
         if isinstance(balances, list) and balances and "error" in balances[0]:
             query.edit_message_text(f"Error retrieving balances: {balances[0]['error']}")
             return
@@ -0,0 +1,142 @@
+import json
+import queue
+import threading
+
+from config import BROKER_URL
+
+# Channel the API/Celery side uses to hand users to the trader runtime
+RUNTIME_CHANNEL = "trader:runtime"
+# Pub/sub channel the trading processes publish order/fill events on; every
+# API process relays them to its websockets (see app.broadcaster.BrokerRelay)
+EVENTS_CHANNEL = "trader:events"
+
+
+class _QueueListener:
+    """One InMemoryBroker.listen() subscription."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue()
+
+    def get(self, timeout=None):
+        """Next message, or None if none arrives within `timeout` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self.broker._lock:
+            listeners = self.broker._listeners.get(self.channel, [])
+            if self in listeners:
+                listeners.remove(self)
+
+
+class InMemoryBroker:
+    """
+    Process-local stand-in for Redis. Used by tests and single-process
+    deployments (BROKER_URL=memory://).
+
+    publish/drain is a work queue (each message is drained once);
+    broadcast/listen is pub/sub (every listener gets every message sent
+    after it subscribed).
+    """
+
+    def __init__(self):
+        self._channels = {}
+        self._listeners = {}
+        self._lock = threading.Lock()
+
+    def _channel(self, channel):
+        with self._lock:
+            if channel not in self._channels:
+                self._channels[channel] = queue.Queue()
+            return self._channels[channel]
+
+    def publish(self, channel, message):
+        self._channel(channel).put(message)
+
+    def drain(self, channel, max_items=None):
+        """Return all pending messages on a channel without blocking."""
+        q = self._channel(channel)
+        messages = []
+        while max_items is None or len(messages) < max_items:
+            try:
+                messages.append(q.get_nowait())
+            except queue.Empty:
+                break
+        return messages
+
+    def broadcast(self, channel, message):
+        """Deliver to every current listener of `channel` (pub/sub, not queued)."""
+        with self._lock:
+            listeners = list(self._listeners.get(channel, ()))
+        for listener in listeners:
+            listener.queue.put(message)
+
+    def listen(self, channel):
+        listener = _QueueListener(self, channel)
+        with self._lock:
+            self._listeners.setdefault(channel, []).append(listener)
+        return listener
+
+
+class _RedisListener:
+    """One RedisBroker.listen() subscription (a Redis PubSub connection)."""
+
+    def __init__(self, client, channel):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(channel)
+
+    def get(self, timeout=None):
+        message = self.pubsub.get_message(timeout=timeout or 0.0)
+        if message is None or message.get("type") != "message":
+            return None
+        return json.loads(message["data"])
+
+    def close(self):
+        self.pubsub.close()
+
+
+class RedisBroker:
+    """Same interface as InMemoryBroker, backed by Redis lists and Redis pub/sub."""
+
+    def __init__(self, url):
+        # Only needed when a Redis URL is configured
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self.client.rpush(channel, json.dumps(message))
+
+    def drain(self, channel, max_items=None):
+        count = max_items or 1000
+        pipe = self.client.pipeline()
+        pipe.lrange(channel, 0, count - 1)
+        pipe.ltrim(channel, count, -1)
+        raw, _ = pipe.execute()
+        return [json.loads(item) for item in raw]
+
+    def broadcast(self, channel, message):
+        self.client.publish(channel, json.dumps(message))
+
+    def listen(self, channel):
+        return _RedisListener(self.client, channel)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the process-wide broker selected by BROKER_URL."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if BROKER_URL.startswith("memory://"):
+                    _broker = InMemoryBroker()
+                else:
+                    _broker = RedisBroker(BROKER_URL)
+    return _broker
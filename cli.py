@@ -0,0 +1,449 @@
+"""
+Command-line entry points. Each subcommand imports only what it needs, so
+e.g. `python cli.py api` never loads torch and `python cli.py fetch` never
+loads Telegram.
+
+    python cli.py fetch --days 365 --out data/dataset
+    python cli.py train --data data/dataset
+    python cli.py backtest --data data/dataset
+    python cli.py trade
+    python cli.py runtime --house
+    python cli.py house deposit <wallet> 1000
+    python cli.py bot
+    python cli.py api --port 8000
+    python cli.py replay data/ticks.log
+    python cli.py stress --data data/dataset --scenario all --paths 10000
+    python cli.py models register models/ppo_trader_v2 --stage shadow
+    python cli.py profile-imports --max-ms 1500
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+DEFAULT_PRODUCTS = ["BTC-USD", "TRUMP-USD", "ETH-USD", "SOL-USD"]
+PROFILED_MODULES = ["api", "app.main", "main", "bot", "data_manager", "trade_manager",
+                    "ml_engine", "sentiment_manager", "x_scraper"]
+
+
+def _resolutions(args):
+    if args.resolutions is not None:
+        return args.resolutions
+    from config import CANDLE_RESOLUTIONS
+    return CANDLE_RESOLUTIONS
+
+
+def _features(args):
+    from resampler import feature_names
+    return feature_names(_resolutions(args))
+
+
+def _load_dataset(args):
+    import pandas as pd
+    if args.data:
+        if os.path.isdir(args.data):
+            # Memory-mapped columnar dataset written by `fetch`
+            from dataset_store import ColumnarDataset
+            return ColumnarDataset.open(args.data)
+        return pd.read_csv(args.data, parse_dates=["time"])
+    from data_manager import DataManager
+    dm = DataManager(product_ids=args.products, resolutions=_resolutions(args))
+    end = pd.Timestamp.utcnow()
+    return dm.build_multiasset_dataset(end - pd.Timedelta(days=args.days), end)
+
+
+def cmd_fetch(args):
+    if not args.out.endswith(".csv"):
+        # Chunked fetch straight into a memory-mapped columnar dataset
+        import pandas as pd
+        from data_manager import DataManager
+        dm = DataManager(product_ids=args.products, granularity=args.granularity,
+                         resolutions=_resolutions(args))
+        end = pd.Timestamp.utcnow()
+        dataset = dm.build_columnar_dataset(end - pd.Timedelta(days=args.days), end, args.out)
+        if dataset is None or not len(dataset):
+            print("No historical data found.")
+            return 1
+        print(f"{args.out} now holds {len(dataset)} rows")
+        return 0
+
+    df = _load_dataset(args)
+    if df is None or df.empty:
+        print("No historical data found.")
+        return 1
+    directory = os.path.dirname(args.out)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    df.to_csv(args.out, index=False)
+    print(f"Wrote {len(df)} rows to {args.out}")
+    return 0
+
+
+def cmd_train(args):
+    from config import RL_ALGO
+    from ml_engine import MLEngine
+    df = _load_dataset(args)
+    if df is None or len(df) == 0:
+        print("No historical data found.")
+        return 1
+    engine = MLEngine(df, args.products, args.model, algo=RL_ALGO, features=_features(args),
+                      episode_length=args.episode_length, recency_halflife=args.recency_halflife)
+    engine.train_model(timesteps=args.timesteps)
+    print(f"Saved model to {args.model}")
+    return 0
+
+
+def cmd_backtest(args):
+    from config import RL_ALGO
+    from ml_engine import MLEngine
+    from backtester import run_backtest
+    df = _load_dataset(args)
+    if df is None or len(df) == 0:
+        print("No historical data found.")
+        return 1
+    model = MLEngine(df, args.products, args.model, algo=RL_ALGO).load_model()
+    stats = run_backtest(model, df, args.products, initial_balance=args.balance,
+                         features=_features(args))
+    stats.pop("equity_curve")
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+def cmd_trade(args):
+    from config import METRICS_PORT
+    from sentiment_manager import SentimentManager
+    import metrics
+    from data_manager import DataManager
+    from model_registry import ModelRegistry
+    from main import ai_trading_loop, load_live_model, wrap_live_model
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+    registry = ModelRegistry()
+    features = DataManager(product_ids=args.products).feature_names()
+    try:
+        model, model_path = load_live_model(args.products, features, registry, args.model)
+    except FileNotFoundError as e:
+        print(f"{e}; train one with `python cli.py train` or register one with `python cli.py models`")
+        return 1
+    model = wrap_live_model(model, args.products, registry, model_path)
+    ai_trading_loop(model, args.products, SentimentManager())
+    return 0
+
+
+def cmd_runtime(args):
+    from config import RL_ALGO, METRICS_PORT, ORDER_BOOK_ENABLED, HOUSE_ACCOUNT_ENABLED
+    from ml_engine import MLEngine
+    from data_manager import DataManager
+    from trade_manager import CoinbaseClient
+    from product_catalog import get_product_catalog
+    from trade_ledger import get_trade_ledger
+    from trader_runtime import HouseAccounts, MultiTenantRuntime, default_client_factory
+    import metrics
+    if METRICS_PORT:
+        metrics.start_http_server(METRICS_PORT)
+    data_manager = DataManager(product_ids=args.products)
+    model = MLEngine(None, args.products, args.model, algo=RL_ALGO,
+                     features=data_manager.feature_names()).load_model()
+    order_books = None
+    if ORDER_BOOK_ENABLED:
+        from order_book import OrderBooks
+        try:
+            order_books = OrderBooks(args.products).start()
+        except Exception as e:
+            print(f"Order book feed unavailable, market making disabled: {e}")
+    house_client = CoinbaseClient()
+    catalog = get_product_catalog().start(house_client.client)
+    ledger = get_trade_ledger()
+    if args.house or HOUSE_ACCOUNT_ENABLED:
+        # Tenants are ledger-backed sub-accounts; netted orders go out from the house account
+        client_factory = HouseAccounts(ledger)
+    else:
+        # House REST client only reads the product list; tenants trade with their own keys
+        client_factory, house_client = default_client_factory, None
+    runtime = MultiTenantRuntime(model, args.products, data_manager, client_factory=client_factory,
+                                 order_books=order_books, house_client=house_client, ledger=ledger,
+                                 catalog=catalog)
+    mode = "house account" if house_client is not None else "per-user accounts"
+    print(f"Trader runtime serving {len(args.products)} products ({mode}); waiting for registrations")
+    runtime.run_forever()
+    return 0
+
+
+def cmd_house(args):
+    if args.action == "status":
+        from trade_manager import CoinbaseClient
+        from trade_ledger import get_trade_ledger
+        house = CoinbaseClient().get_account_balances()
+        if isinstance(house, dict) or (house and "error" in house[0]):
+            print(f"Could not read house balances: {house}")
+            return 1
+        held = {b["currency"]: float(b["balance"]) for b in house}
+        allocated = get_trade_ledger().balance_totals()
+        short = False
+        for currency in sorted(set(held) | set(allocated)):
+            free = held.get(currency, 0.0) - allocated.get(currency, 0.0)
+            short |= free < -1e-9
+            print(f"{currency:6s} house {held.get(currency, 0.0):16.8f}  sub-accounts "
+                  f"{allocated.get(currency, 0.0):16.8f}  unallocated {free:16.8f}")
+        return 1 if short else 0
+    if not args.wallet or not args.amount or args.amount <= 0:
+        print(f"{args.action} needs a wallet and a positive amount")
+        return 1
+    from trader import fund_house_account
+    amount = args.amount if args.action == "deposit" else -args.amount
+    fund_house_account(args.wallet, amount, args.currency)
+    print(f"Sent {args.action} of {args.amount} {args.currency} for {args.wallet}; "
+          f"the runtime applies it only if the house account covers it")
+    return 0
+
+
+def cmd_bot(args):
+    from bot import main_bot
+    main_bot()
+    return 0
+
+
+def cmd_api(args):
+    import uvicorn
+    uvicorn.run(args.app, host=args.host, port=args.port)
+    return 0
+
+
+def cmd_replay(args):
+    from tick_recorder import replay
+    model = None
+    if args.model:
+        from config import RL_ALGO
+        from ml_engine import MLEngine
+        model = MLEngine(None, [], args.model, algo=RL_ALGO).load_model()
+    report = replay(args.log, model=model)
+    print(f"{report['ticks']} ticks in {report['seconds']:.2f}s "
+          f"({report['seconds_per_tick'] * 1000:.2f} ms/tick), "
+          f"{len(report['mismatches'])} mismatching")
+    for mismatch in report["mismatches"][:args.show]:
+        print(json.dumps(mismatch))
+    return 1 if report["mismatches"] else 0
+
+
+def cmd_stress(args):
+    import numpy as np
+    import pandas as pd
+    from stress_test import SCENARIOS, log_returns, run_stress
+    df = _load_dataset(args)
+    if df is None or len(df) == 0:
+        print("No historical data found.")
+        return 1
+    closes = np.column_stack([
+        df[f"{pid}_close"].to_numpy() if isinstance(df, pd.DataFrame) else df.column(f"{pid}_close")
+        for pid in args.products
+    ])
+    returns = log_returns(closes)
+    scenarios = SCENARIOS if args.scenario == "all" else [args.scenario]
+    report = {}
+    for scenario in scenarios:
+        report[scenario] = run_stress(
+            returns, scenario, n_paths=args.paths, n_bars=args.bars, weights=args.weights,
+            max_position=args.max_position, max_drawdown=args.max_drawdown,
+            workers=args.workers, seed=args.seed, block=args.block
+        )
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def cmd_models(args):
+    from model_registry import ModelRegistry
+    registry = ModelRegistry()
+    if args.action == "register":
+        if not args.path:
+            print("register needs a saved model path")
+            return 1
+        entry = registry.register(args.path, name=args.name, stage=args.stage or "candidate")
+        print(f"Registered {entry['name']} v{entry['version']} ({entry['stage']})")
+    elif args.action == "stage":
+        if args.version is None or args.stage is None:
+            print("stage needs --version and --stage")
+            return 1
+        entry = registry.set_stage(args.name, args.version, args.stage)
+        print(f"{entry['name']} v{entry['version']} is now {entry['stage']}")
+    else:
+        for entry in registry.versions(args.name):
+            print(f"{entry['name']:12s} v{entry['version']:<4d} {entry['stage']:10s} {entry['path']}")
+    return 0
+
+
+def profile_import(module, python=sys.executable):
+    """
+    Import `module` in a fresh interpreter with -X importtime. Returns
+    (total_ms, [(package, self_ms, cumulative_ms), ...]) or raises
+    RuntimeError with the child's stderr if the import fails.
+    """
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    pattern = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+    entries = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        match = pattern.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        if len(indent) == 1 and name == module:
+            total_us = int(cumulative_us)
+        elif len(indent) == 3:
+            # Direct dependencies of a top-level import (two extra spaces per level)
+            entries.append((name, int(self_us) / 1000, int(cumulative_us) / 1000))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    entries.sort(key=lambda e: e[2], reverse=True)
+    return total_us / 1000, entries
+
+
+def cmd_profile_imports(args):
+    report = {}
+    failed = False
+    for module in args.modules:
+        try:
+            total_ms, entries = profile_import(module)
+        except RuntimeError as e:
+            report[module] = {"error": str(e)}
+            continue
+        report[module] = {
+            "total_ms": round(total_ms, 1),
+            "top": [{"package": n, "cumulative_ms": round(c, 1)} for n, _s, c in entries[:args.top]],
+        }
+        if args.max_ms and total_ms > args.max_ms:
+            failed = True
+            report[module]["over_budget"] = True
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for module, info in report.items():
+            if "error" in info:
+                print(f"{module:20s}  ERROR  {info['error']}")
+                continue
+            flag = "  OVER BUDGET" if info.get("over_budget") else ""
+            print(f"{module:20s} {info['total_ms']:9.1f} ms{flag}")
+            for entry in info["top"]:
+                print(f"    {entry['package']:30s} {entry['cumulative_ms']:9.1f} ms")
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="AI trader")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_data_args(p):
+        p.add_argument("--products", nargs="+", default=DEFAULT_PRODUCTS)
+        p.add_argument("--days", type=int, default=7, help="history to fetch when --data is not given")
+        p.add_argument("--data", help="dataset written by `fetch` instead of calling the API")
+        p.add_argument("--resolutions", nargs="*", type=int,
+                       help="coarser candle sizes in seconds resampled from the base candles "
+                            "(default: CANDLE_RESOLUTIONS)")
+
+    def add_model_arg(p):
+        from config import MODEL_SAVE_PATH
+        p.add_argument("--model", default=MODEL_SAVE_PATH)
+
+    p = sub.add_parser("fetch", help="download candles + indicators to a file")
+    add_data_args(p)
+    p.add_argument("--out", default="data/dataset", help="directory (columnar) or .csv file")
+    p.add_argument("--granularity", type=int, default=3600, help="candle size in seconds")
+    p.set_defaults(func=cmd_fetch)
+
+    p = sub.add_parser("train", help="train the RL policy")
+    add_data_args(p)
+    add_model_arg(p)
+    from config import TRAIN_TIMESTEPS
+    p.add_argument("--timesteps", type=int, default=TRAIN_TIMESTEPS)
+    from config import EPISODE_LENGTH, EPISODE_RECENCY_HALFLIFE
+    p.add_argument("--episode-length", type=int, default=EPISODE_LENGTH,
+                   help="train on random windows of this many bars (0 = whole history)")
+    p.add_argument("--recency-halflife", type=int, default=EPISODE_RECENCY_HALFLIFE,
+                   help="bias window starts toward recent data (half-life in bars, 0 = uniform)")
+    p.set_defaults(func=cmd_train)
+
+    p = sub.add_parser("backtest", help="replay the policy over history")
+    add_data_args(p)
+    add_model_arg(p)
+    p.add_argument("--balance", type=float, default=10000)
+    p.set_defaults(func=cmd_backtest)
+
+    p = sub.add_parser("trade", help="run the live trading loop (no Telegram bot)")
+    p.add_argument("--products", nargs="+", default=DEFAULT_PRODUCTS)
+    p.add_argument("--model", help="saved model to trade (default: the registry's primary, else MODEL_SAVE_PATH)")
+    p.set_defaults(func=cmd_trade)
+
+    p = sub.add_parser("runtime", help="run the multi-tenant trader runtime fed by start_trader")
+    p.add_argument("--products", nargs="+", default=DEFAULT_PRODUCTS)
+    add_model_arg(p)
+    p.add_argument("--house", action="store_true",
+                   help="net tenants inside the house account (default: HOUSE_ACCOUNT_ENABLED)")
+    p.set_defaults(func=cmd_runtime)
+
+    p = sub.add_parser("house", help="fund house-mode sub-accounts and check them against the house account")
+    p.add_argument("action", choices=["deposit", "withdraw", "status"])
+    p.add_argument("wallet", nargs="?")
+    p.add_argument("amount", nargs="?", type=float)
+    p.add_argument("--currency", default="USD")
+    p.set_defaults(func=cmd_house)
+
+    p = sub.add_parser("bot", help="run the Telegram bot")
+    p.set_defaults(func=cmd_bot)
+
+    p = sub.add_parser("api", help="serve a FastAPI app with uvicorn")
+    p.add_argument("--app", default="api:app", help="e.g. api:app or app.main:app")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--port", type=int, default=8000)
+    p.set_defaults(func=cmd_api)
+
+    p = sub.add_parser("replay", help="re-run the live decision code over a recorded tick log")
+    p.add_argument("log", help="file written with TICK_RECORD_PATH")
+    p.add_argument("--model", help="replay with this model instead of the recorded actions")
+    p.add_argument("--show", type=int, default=5, help="mismatching ticks to print")
+    p.set_defaults(func=cmd_replay)
+
+    p = sub.add_parser("stress", help="Monte Carlo stress test of the risk limits over resampled history")
+    add_data_args(p)
+    from config import (MAX_POSITION_PERCENT, MAX_DRAWDOWN_PERCENT, STRESS_PATHS, STRESS_BARS,
+                        STRESS_BLOCK_BARS)
+    p.add_argument("--scenario", default="all", choices=["all", "bootstrap", "correlation", "gap"])
+    p.add_argument("--paths", type=int, default=STRESS_PATHS)
+    p.add_argument("--bars", type=int, default=STRESS_BARS, help="length of each path")
+    p.add_argument("--block", type=int, default=STRESS_BLOCK_BARS, help="bootstrap block length in bars")
+    p.add_argument("--weights", nargs="+", type=float, help="target fraction per product (default equal)")
+    p.add_argument("--max-position", type=float, default=MAX_POSITION_PERCENT)
+    p.add_argument("--max-drawdown", type=float, default=MAX_DRAWDOWN_PERCENT)
+    p.add_argument("--workers", type=int, help="processes (default one per CPU)")
+    p.add_argument("--seed", type=int)
+    p.set_defaults(func=cmd_stress)
+
+    p = sub.add_parser("models", help="list, register and stage versions in the model registry")
+    p.add_argument("action", choices=["list", "register", "stage"])
+    p.add_argument("path", nargs="?", help="saved model to register")
+    p.add_argument("--name", default="policy")
+    p.add_argument("--version", type=int)
+    p.add_argument("--stage", choices=["candidate", "shadow", "primary", "archived"])
+    p.set_defaults(func=cmd_models)
+
+    p = sub.add_parser("profile-imports", help="report import time per entry module")
+    p.add_argument("modules", nargs="*", default=PROFILED_MODULES)
+    p.add_argument("--top", type=int, default=5)
+    p.add_argument("--max-ms", type=float, default=0, help="exit non-zero if any module exceeds this")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_profile_imports)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
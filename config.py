@@ -11,6 +11,12 @@ load_dotenv()  # This will read in the .env file
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "YOUR_TELEGRAM_BOT_TOKEN")
 ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID", "YOUR_TELEGRAM_CHAT_ID")
 
+# =============================
+# SOLANA / SPARK TOKEN
+# =============================
+SOLANA_RPC_URL = os.getenv("SOLANA_RPC_URL", "https://api.mainnet-beta.solana.com")
+SPARK_MINT_ADDRESS = os.getenv("SPARK_MINT_ADDRESS", "")
+
 # =============================
 # COINBASE ADVANCED TRADE
 # =============================
@@ -26,6 +32,41 @@ COINBASE_API_SECRET = os.getenv("COINBASE_API_SECRET", """-----BEGIN EC PRIVATE
 RL_ALGO = "PPO"
 TRAIN_TIMESTEPS = 200000
 MODEL_SAVE_PATH = "models/ppo_trader_v2"
+# Train on random windows of this many bars (0 = walk the whole history each episode)
+EPISODE_LENGTH = int(os.getenv("EPISODE_LENGTH", "0"))
+# Weight recent windows: half-life in bars of the start-offset distribution (0 = uniform)
+EPISODE_RECENCY_HALFLIFE = int(os.getenv("EPISODE_RECENCY_HALFLIFE", "0"))
+
+# Coarser candle sizes (seconds) derived locally from the base candles and
+# added as extra features, e.g. "14400,86400" for 4h + 1d. Empty = base only.
+CANDLE_RESOLUTIONS = [int(s) for s in os.getenv("CANDLE_RESOLUTIONS", "").split(",") if s.strip()]
+
+# =============================
+# ONLINE TRAINING
+# =============================
+# Fine-tune the live policy on recent candles in a background process (online_trainer.py)
+ONLINE_TRAIN_ENABLED = os.getenv("ONLINE_TRAIN_ENABLED", "0") == "1"
+ONLINE_TRAIN_INTERVAL_SECONDS = int(os.getenv("ONLINE_TRAIN_INTERVAL_SECONDS", str(6 * 3600)))
+ONLINE_TRAIN_TIMESTEPS = int(os.getenv("ONLINE_TRAIN_TIMESTEPS", "20000"))
+# Candles fetched per round; the last ONLINE_HOLDOUT_BARS are kept out of training
+ONLINE_TRAIN_WINDOW_DAYS = 30
+ONLINE_HOLDOUT_BARS = 72
+# A candidate replaces the live model only if its holdout Sharpe beats it by this much
+ONLINE_MIN_SHARPE_IMPROVEMENT = 0.0
+# Isolation of the training process: scheduling priority, threads, CPUs and address space
+ONLINE_TRAIN_NICE = 10
+ONLINE_TRAIN_THREADS = 1
+ONLINE_TRAIN_CPUS = [int(c) for c in os.getenv("ONLINE_TRAIN_CPUS", "").split(",") if c.strip()]
+ONLINE_TRAIN_MAX_MEMORY_MB = int(os.getenv("ONLINE_TRAIN_MAX_MEMORY_MB", "4096"))
+
+# =============================
+# MODEL REGISTRY
+# =============================
+# Versioned policies (model_registry.py)
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "models/registry")
+# Score the registry's shadow versions on every live tick and trade them on paper
+SHADOW_MODE_ENABLED = os.getenv("SHADOW_MODE_ENABLED", "0") == "1"
+PAPER_INITIAL_BALANCE = 10000.0
 
 # =============================
 # RISK MANAGEMENT
@@ -34,6 +75,26 @@ MAX_POSITION_PERCENT = 0.2
 MAX_DRAWDOWN_PERCENT = 0.3
 TRANSACTION_FEE_PERCENT = 0.001
 
+# Pre-trade checks on every order path (pretrade_risk.py)
+MAX_ORDER_NOTIONAL = float(os.getenv("MAX_ORDER_NOTIONAL", "1000"))  # USD per order
+MAX_ORDERS_PER_MINUTE = int(os.getenv("MAX_ORDERS_PER_MINUTE", "20"))
+PRICE_BAND_PERCENT = 0.05          # fat-finger band around the reference price
+PRETRADE_LATENCY_BUDGET_US = 50    # per-order check budget
+# Processes without the trading loop (API, Telegram bot) re-read balances
+# this often so the position and drawdown checks see a current net worth
+PRETRADE_PORTFOLIO_REFRESH_SECONDS = 30
+# Reference prices older than this are re-read before a single order is
+# checked outside the trading loop (API, Telegram bot)
+PRETRADE_PRICE_MAX_AGE_SECONDS = float(os.getenv("PRETRADE_PRICE_MAX_AGE_SECONDS", "60"))
+
+# Streaming portfolio risk (risk_engine.py)
+RISK_EWMA_HALFLIFE = 48        # bars
+RISK_WARMUP_BARS = 24          # bars before covariance-based limits kick in
+VAR_CONFIDENCE = 0.95
+MAX_VAR_PERCENT = 0.03         # max one-bar VaR as a fraction of net worth
+TARGET_ANNUAL_VOL = 0.8        # annualized portfolio volatility target
+BARS_PER_YEAR = 24 * 365       # hourly candles
+
 # =============================
 # SENTIMENT 
 # =============================
@@ -48,4 +109,150 @@ TWITTER_ACCESS_TOKEN = os.getenv("TWITTER_ACCESS_TOKEN", "")
 TWITTER_ACCESS_SECRET = os.getenv("TWITTER_ACCESS_SECRET", "")
 TWITTER_BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN", "")
 
+# =============================
+# USER STORE
+# =============================
+USER_DB_PATH = os.getenv("USER_DB_PATH", "data/users.db")
+# Fernet key used to encrypt exchange credentials at rest; must be shared by all workers
+USER_STORE_KEY = os.getenv("USER_STORE_KEY", "")
+# How often (seconds) a worker checks the DB for writes made by other processes
+USER_CACHE_CHECK_INTERVAL = float(os.getenv("USER_CACHE_CHECK_INTERVAL", "0.5"))
+
+# =============================
+# TRADER RUNTIME
+# =============================
+# Broker shared by the API/Celery workers and the multi-tenant runtime.
+# Use "memory://" for tests and single-process runs.
+BROKER_URL = os.getenv("BROKER_URL", "redis://localhost:6379/0")
+RUNTIME_TICK_SECONDS = 300
+# House mode: tenants are internal sub-accounts of the house Coinbase account,
+# opposing rebalances are netted and their balances live in the trade ledger.
+# Sub-accounts start empty and are funded with `python cli.py house deposit`.
+HOUSE_ACCOUNT_ENABLED = os.getenv("HOUSE_ACCOUNT_ENABLED", "0") == "1"
+
+# =============================
+# TRADE LEDGER
+# =============================
+# Append-only SQLite record of orders and fills (trade_ledger.py)
+LEDGER_DB_PATH = os.getenv("LEDGER_DB_PATH", "data/ledger.db")
+# The writer thread commits up to this many records per transaction...
+LEDGER_BATCH_SIZE = 500
+# ...waiting at most this long (seconds) to fill a batch
+LEDGER_FLUSH_SECONDS = 0.2
+# Ledger wallet for the single-account loop in main.py
+LEDGER_HOUSE_WALLET = os.getenv("LEDGER_HOUSE_WALLET", "house")
+
+# =============================
+# ORDER FILLS
+# =============================
+# Fills are read back with get_order until the order is terminal, polling
+# this often for at most this long (order_status.py)
+ORDER_FILL_TIMEOUT_SECONDS = float(os.getenv("ORDER_FILL_TIMEOUT_SECONDS", "5"))
+ORDER_FILL_POLL_SECONDS = 0.25
+# Threads polling fills in the background (order_status.FillReconciler)
+ORDER_FILL_WORKERS = int(os.getenv("ORDER_FILL_WORKERS", "8"))
+
+# =============================
+# PERFORMANCE AGGREGATES
+# =============================
+# Default and maximum points in a /performance equity series
+PERFORMANCE_CHART_POINTS = 500
+PERFORMANCE_MAX_CHART_POINTS = 2000
+# Equity marks a worker loads when it first serves a wallet; totals and
+# positions come from the ledger's rollups, so older history is not replayed
+PERFORMANCE_WARM_MARKS = int(os.getenv("PERFORMANCE_WARM_MARKS", "20000"))
+
+# =============================
+# ORDER BOOK
+# =============================
+# Keep local L2 books from the Coinbase level2 websocket for price/depth queries
+ORDER_BOOK_ENABLED = os.getenv("ORDER_BOOK_ENABLED", "1") == "1"
+# A book with no feed traffic for this long is not trusted
+ORDER_BOOK_STALE_SECONDS = 10
+# Rebalance market orders are shrunk so expected VWAP stays within this of the touch
+MAX_SLIPPAGE_PERCENT = float(os.getenv("MAX_SLIPPAGE_PERCENT", "0.005"))
+
+# =============================
+# PRODUCT CATALOG
+# =============================
+# Increments, min/max sizes and trading status of every spot product,
+# re-read from Coinbase this often (product_catalog.py)
+PRODUCT_CATALOG_REFRESH_SECONDS = int(os.getenv("PRODUCT_CATALOG_REFRESH_SECONDS", "3600"))
+
+# =============================
+# STRESS TESTING
+# =============================
+# Monte Carlo paths per scenario and their length (stress_test.py)
+STRESS_PATHS = int(os.getenv("STRESS_PATHS", "10000"))
+STRESS_BARS = BARS_PER_YEAR
+# Length of the blocks of consecutive historical bars resampled together
+STRESS_BLOCK_BARS = 24
+# Paths simulated per worker task (memory per task ~ paths * bars * (assets + 1) * 8 bytes)
+STRESS_CHUNK_PATHS = 250
+# Shocked-correlation scenario: pull correlations this far toward 1 and scale vols by this
+STRESS_CORRELATION_SHOCK = 0.8
+STRESS_VOL_SCALE = 2.0
+# Gap scenario: market-wide jumps of this size, this many per year on average
+STRESS_GAP_SIZE = -0.3
+STRESS_GAPS_PER_YEAR = 2.0
+
+# =============================
+# MARKET MAKING
+# =============================
+# USD notional of each quote (per side, before inventory skew)
+MM_QUOTE_NOTIONAL = float(os.getenv("MM_QUOTE_NOTIONAL", "50"))
+# Distance of each quote from the (skewed) center, as a fraction of mid
+MM_HALF_SPREAD = float(os.getenv("MM_HALF_SPREAD", "0.001"))
+# Inventory (USD, either direction) at which the adding side stops quoting
+MM_MAX_INVENTORY_USD = float(os.getenv("MM_MAX_INVENTORY_USD", "500"))
+# Center shift at max inventory, in half-spreads
+MM_INVENTORY_SKEW = 1.0
+# Resting quotes are only replaced when the price moved more than this fraction of mid...
+MM_REPRICE_TOLERANCE = 0.0005
+# ...or the size is off by more than this fraction
+MM_SIZE_TOLERANCE = 0.25
+# After a rejected quote (e.g. the account's pre-trade order rate limit) the
+# product is not requoted for this many seconds
+MM_REJECT_BACKOFF_SECONDS = float(os.getenv("MM_REJECT_BACKOFF_SECONDS", "15"))
+# Exchange clients that do not push fills (CoinbaseClient) have their resting
+# quotes' fills read back this often, on the order book delivery thread
+MM_FILL_POLL_SECONDS = float(os.getenv("MM_FILL_POLL_SECONDS", "2"))
+
+# =============================
+# ARBITRAGE
+# =============================
+# Both legs are sent at once as immediate-or-cancel orders; a leg not
+# acknowledged within this many seconds is treated as unfilled until it reports
+ARB_LEG_TIMEOUT_SECONDS = float(os.getenv("ARB_LEG_TIMEOUT_SECONDS", "2.0"))
+# USD notional cap per arbitrage
+ARB_MAX_NOTIONAL = float(os.getenv("ARB_MAX_NOTIONAL", "500"))
+# Leg limit prices are this fraction through the observed price; depth is sized within it
+ARB_MAX_SLIPPAGE_PERCENT = 0.001
+# Minimum edge after both legs' fees and slippage, as a fraction of the buy price
+ARB_MIN_EDGE_PERCENT = 0.001
+ARB_FEE_PERCENT = float(os.getenv("ARB_FEE_PERCENT", "0.001"))
+# A leg's order status is re-read this often until terminal or the leg times out
+ARB_FILL_POLL_SECONDS = 0.05
+# Cached exchange balances used for sizing are re-read after this long
+ARB_BALANCE_TTL_SECONDS = 30
+
+# =============================
+# STATE SNAPSHOTS
+# =============================
+# Live-loop state (candles, risk peaks, sentiment, last orders) for warm restarts
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "data/trader_state.pkl")
+# Minimum seconds between snapshots (ticks that send orders always snapshot)
+SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300"))
+
+# =============================
+# METRICS
+# =============================
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Log one JSON line with per-stage timings for every trading tick
+TICK_TIMING_LOG = os.getenv("TICK_TIMING_LOG", "0") == "1"
+# Port for the standalone /metrics exporter in main.py (0 = off)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+# Append every live tick's inputs and outputs here for tick_recorder.replay (empty = off)
+TICK_RECORD_PATH = os.getenv("TICK_RECORD_PATH", "")
+
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
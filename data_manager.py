@@ -2,26 +2,46 @@ import time
 import pandas as pd
 import numpy as np
 import datetime
-import cbpro
 
 from coinbase.rest import RESTClient
-from config import COINBASE_API_KEY, COINBASE_API_SECRET
+from config import COINBASE_API_KEY, COINBASE_API_SECRET, CANDLE_RESOLUTIONS
+import metrics
+from dataset_store import ColumnarDataset
+from resampler import BASE_FEATURES, MultiResolutionResampler, resample_candles, resolution_label, feature_names
 
 class DataManager:
-    def __init__(self, product_ids=None, granularity=3600):
+    def __init__(self, product_ids=None, granularity=3600, resolutions=None, client=None,
+                 cache_candles=True):
         """
         product_ids: list of trading pairs, e.g., ['BTC-USD', 'ETH-USD', 'SOL-USD']
         granularity: candle duration in seconds (e.g. 60 = 1 min, 3600 = 1 hour, etc.)
                      But for Advanced Trade, we'll map these to the required string enums.
+        resolutions: coarser candle sizes in seconds (multiples of granularity).
+                     They are resampled locally from the base candles, so only
+                     the base granularity is ever fetched.
+        client: REST client override (e.g. tick_recorder's offline candle source).
+        cache_candles: keep the last fetched candles per product so the next
+                     request for an overlapping window only fetches the gap.
         """
         self.product_ids = product_ids or ["BTC-USD"]
         self.granularity = granularity
+        # product_id -> raw candles of the last request (see fetch_candles);
+        # also what state_snapshot saves so a restart only fetches the gap
+        self.candle_cache = {} if cache_candles else None
+        self.resolutions = sorted(CANDLE_RESOLUTIONS if resolutions is None else resolutions)
+        for seconds in self.resolutions:
+            if seconds <= granularity or seconds % granularity:
+                raise ValueError(f"Resolution {seconds}s must be a larger multiple of {granularity}s")
+        # Live ticks (cached candles) fold each newly closed base bar into
+        # the coarser candles instead of re-resampling the whole window
+        self.live_resampler = (MultiResolutionResampler(self.product_ids, granularity, self.resolutions)
+                               if self.resolutions and cache_candles else None)
 
         # Create a Coinbase REST client using your Advanced Trade API Key + Secret
-        self.client = RESTClient(
+        self.client = client or metrics.instrument(RESTClient(
             api_key=COINBASE_API_KEY,
             api_secret=COINBASE_API_SECRET
-        )
+        ), "coinbase")
 
     def fetch_historical_data(self, product_id, start, end):
     # Convert start/end to datetime objects
@@ -77,6 +97,33 @@ class DataManager:
         df.drop_duplicates(subset=["time"], inplace=True)
         return df
 
+    def fetch_candles(self, product_id, start, end):
+        """
+        fetch_historical_data for [start, end], reusing the cached candles of
+        the previous call: if they cover `start`, only the bars from the last
+        cached one (which may still have been forming) up to `end` are
+        requested. Returns a fresh copy the caller may modify.
+        """
+        if self.candle_cache is None or start is None or end is None:
+            return self.fetch_historical_data(product_id, start, end)
+        start = pd.to_datetime(start, utc=True)
+        end = pd.to_datetime(end, utc=True)
+
+        cached = self.candle_cache.get(product_id)
+        if cached is not None and not cached.empty and cached["time"].iloc[0] <= start <= cached["time"].iloc[-1] <= end:
+            last = cached["time"].iloc[-1]
+            gap = self.fetch_historical_data(product_id, last, end)
+            if not gap.empty:
+                cached = pd.concat([cached[cached["time"] < last], gap], ignore_index=True)
+            df = cached
+        else:
+            df = self.fetch_historical_data(product_id, start, end)
+        if df.empty:
+            return df
+        df = df[(df["time"] >= start) & (df["time"] <= end)].reset_index(drop=True)
+        self.candle_cache[product_id] = df
+        return df.copy()
+
     def _get_granularity_str(self):
     # Map numeric granularity to Coinbase's string enums
         granularity_map = {
@@ -144,10 +191,15 @@ class DataManager:
         """
         final_df = None
         for pid in self.product_ids:
-            df = self.fetch_historical_data(pid, start, end)
-            df = self.add_technical_indicators(df, pid)
+            with metrics.span("fetch_candles"):
+                df = self.fetch_candles(pid, start, end)
+            with metrics.span("indicators"):
+                df = self.add_technical_indicators(df, pid)
             if df.empty:
                 continue
+            if self.resolutions:
+                with metrics.span("resample"):
+                    df = self.add_resolution_features(df, self._live_coarse_candles(pid, df, end))
             # rename columns to avoid overlap
             rename_dict = {}
             for col in df.columns:
@@ -159,12 +211,87 @@ class DataManager:
                 final_df = df
             else:
                 # merge on 'time' using asof merge
-                final_df = pd.merge_asof(final_df, df, on="time", direction="forward")
+                with metrics.span("merge"):
+                    final_df = pd.merge_asof(final_df, df, on="time", direction="forward")
 
         if final_df is not None:
             final_df.dropna(inplace=True)
         return final_df
 
+    def build_columnar_dataset(self, start, end, path, chunk="30 days", warmup_bars=250):
+        """
+        Fetch [start, end) chunk by chunk and append it to the ColumnarDataset
+        at `path`, so multi-year histories never have to fit in memory.
+        Each chunk is fetched with `warmup_bars` of extra lookback so the
+        rolling indicators are continuous across chunk boundaries. If the
+        dataset already exists, only bars after its last row are fetched.
+        """
+        start = pd.Timestamp(start)
+        end = pd.Timestamp(end)
+        if start.tzinfo is None:
+            start = start.tz_localize("UTC")
+        if end.tzinfo is None:
+            end = end.tz_localize("UTC")
+        step = pd.Timedelta(seconds=self.granularity)
+
+        dataset = ColumnarDataset.open(path) if ColumnarDataset.exists(path) else None
+        if dataset is not None and len(dataset):
+            start = max(start, dataset.timestamps(len(dataset) - 1)[0] + step)
+
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + pd.Timedelta(chunk), end)
+            df = self.build_multiasset_dataset(chunk_start - warmup_bars * step, chunk_end)
+            if df is not None and not df.empty:
+                df = df[df["time"] >= chunk_start]
+                if dataset is None:
+                    dataset = ColumnarDataset.from_frame(df, path)
+                else:
+                    dataset.append(df)
+            chunk_start = chunk_end
+        return dataset
+
+    def feature_names(self):
+        """Per-product observation features, e.g. ('close', ..., '4h_rsi')."""
+        return feature_names(self.resolutions)
+
+    def _live_coarse_candles(self, product_id, df, end):
+        """
+        {resolution: coarse candles} from the live resampler after feeding it
+        the newly closed bars of `df`, or None outside the live loop (no
+        candle cache, or an open-ended fetch) so the window is resampled.
+        """
+        if self.live_resampler is None or end is None:
+            return None
+        self.live_resampler.feed(product_id, df, end)
+        return {seconds: self.live_resampler.candles(product_id, seconds) for seconds in self.resolutions}
+
+    def add_resolution_features(self, df, coarse_candles=None):
+        """
+        Resample the base candles in `df` to each coarser resolution (or take
+        them from `coarse_candles`, {resolution: candles}), compute the same
+        indicators there and attach them as '<label>_<feature>' columns. A
+        coarse bar only becomes visible on the base row whose candle closes
+        when (or after) the coarse bar closes, so there is no lookahead:
+        merge_asof(direction="backward") on the coarse close time.
+        """
+        shift = pd.Timedelta(seconds=self.granularity)
+        for seconds in self.resolutions:
+            if coarse_candles is not None:
+                coarse = coarse_candles[seconds]
+            else:
+                coarse = resample_candles(df, seconds, base_seconds=self.granularity)
+            coarse = self.add_technical_indicators(coarse)
+            if coarse.empty:
+                df = df.assign(**{f"{resolution_label(seconds)}_{f}": np.nan for f in BASE_FEATURES})
+                continue
+            label = resolution_label(seconds)
+            coarse = coarse[["time", *BASE_FEATURES]].rename(columns={f: f"{label}_{f}" for f in BASE_FEATURES})
+            # Key each coarse bar by the start of the last base bar it contains
+            coarse["time"] = coarse["time"] + pd.Timedelta(seconds=seconds) - shift
+            df = pd.merge_asof(df, coarse, on="time", direction="backward")
+        return df
+
     def add_technical_indicators(self, df, prefix=""):
         if df.empty:
             return df
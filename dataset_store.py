@@ -0,0 +1,169 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+META_FILE = "meta.json"
+TIME_FILE = "time.i64"
+
+
+def _column_file(name, dtype):
+    suffix = "i32" if np.dtype(dtype) == np.int32 else "f32"
+    return f"{name}.{suffix}"
+
+
+class ColumnarDataset:
+    """
+    Compact on-disk market dataset: one raw little-endian file per column,
+    float32 for prices/indicators, int32 for integer columns, and the time
+    index as int64 second offsets from `time_origin`.
+
+    Columns are opened with np.memmap, so the env, backtester and live loop
+    read them zero-copy and only the pages they touch are resident; peak
+    RSS does not grow with history length. New bars are appended in place.
+
+    Layout of a dataset directory:
+        meta.json        {"columns": {...name: dtype}, "n_rows": N, "time_origin": epoch_s}
+        time.i64         int64 offsets (seconds) from time_origin
+        <column>.f32     float32 values, one per row
+    """
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self._maps = {}
+
+    # ------------------------------------------------------------------
+    # Creation / opening
+    @classmethod
+    def create(cls, path, columns, time_origin):
+        """Create an empty dataset. `columns` maps name -> 'float32' | 'int32'."""
+        os.makedirs(path, exist_ok=True)
+        meta = {"columns": dict(columns), "n_rows": 0, "time_origin": int(time_origin)}
+        for name, dtype in meta["columns"].items():
+            open(os.path.join(path, _column_file(name, dtype)), "wb").close()
+        open(os.path.join(path, TIME_FILE), "wb").close()
+        dataset = cls(path, meta)
+        dataset._write_meta()
+        return dataset
+
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, META_FILE)) as f:
+            return cls(path, json.load(f))
+
+    @classmethod
+    def from_frame(cls, df, path):
+        """Write a DataFrame with a 'time' column (e.g. build_multiasset_dataset output)."""
+        times = pd.to_datetime(df["time"], utc=True)
+        columns = {}
+        for col in df.columns:
+            if col == "time":
+                continue
+            columns[col] = "int32" if pd.api.types.is_integer_dtype(df[col]) else "float32"
+        origin = int(times.iloc[0].timestamp()) if len(df) else 0
+        dataset = cls.create(path, columns, origin)
+        dataset.append(df)
+        return dataset
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, META_FILE))
+
+    def _write_meta(self):
+        # Write-then-rename so readers never see a half-written meta.json
+        tmp = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.path, META_FILE))
+
+    # ------------------------------------------------------------------
+    # Writing
+    def append(self, df):
+        """
+        Append rows (must be newer than the last stored row). Rows at or
+        before the current last timestamp are skipped, so overlapping
+        fetches can be appended safely.
+        """
+        if df is None or df.empty:
+            return 0
+        offsets = (pd.to_datetime(df["time"], utc=True).astype("int64") // 10**9
+                   - self.time_origin).to_numpy(dtype=np.int64)
+        if len(self):
+            keep = offsets > int(self.time_offsets[-1])
+            df, offsets = df[keep], offsets[keep]
+            if df.empty:
+                return 0
+
+        with open(os.path.join(self.path, TIME_FILE), "ab") as f:
+            f.write(offsets.astype("<i8").tobytes())
+        for name, dtype in self.columns.items():
+            values = df[name].to_numpy(dtype=np.dtype(dtype).newbyteorder("<"))
+            with open(os.path.join(self.path, _column_file(name, dtype)), "ab") as f:
+                f.write(values.tobytes())
+
+        self.meta["n_rows"] += len(df)
+        self._maps.clear()
+        self._write_meta()
+        return len(df)
+
+    # ------------------------------------------------------------------
+    # Reading
+    @property
+    def columns(self):
+        return self.meta["columns"]
+
+    @property
+    def time_origin(self):
+        return self.meta["time_origin"]
+
+    def __len__(self):
+        return self.meta["n_rows"]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def _map(self, filename, dtype):
+        if filename not in self._maps:
+            if len(self) == 0:
+                self._maps[filename] = np.zeros(0, dtype=dtype)
+            else:
+                self._maps[filename] = np.memmap(
+                    os.path.join(self.path, filename), dtype=dtype, mode="r", shape=(len(self),)
+                )
+        return self._maps[filename]
+
+    def column(self, name):
+        """Zero-copy read-only view of one column."""
+        dtype = self.columns[name]
+        return self._map(_column_file(name, dtype), np.dtype(dtype).newbyteorder("<"))
+
+    @property
+    def time_offsets(self):
+        return self._map(TIME_FILE, np.dtype("<i8"))
+
+    def timestamps(self, start=0, stop=None):
+        """UTC timestamps for rows [start, stop)."""
+        offsets = np.asarray(self.time_offsets[start:stop]) + self.time_origin
+        return pd.to_datetime(offsets, unit="s", utc=True)
+
+    def index_at(self, timestamp):
+        """First row at or after `timestamp`."""
+        offset = int(pd.Timestamp(timestamp).timestamp()) - self.time_origin
+        return int(np.searchsorted(self.time_offsets, offset, side="left"))
+
+    def row(self, i):
+        """One row as {column: float} (e.g. the latest bar for the live loop)."""
+        return {name: float(self.column(name)[i]) for name in self.columns}
+
+    def to_frame(self, start=0, stop=None, columns=None):
+        """Materialize rows [start, stop) as a DataFrame (copies only that slice)."""
+        names = columns or list(self.columns)
+        data = {"time": self.timestamps(start, stop)}
+        for name in names:
+            data[name] = np.asarray(self.column(name)[start:stop])
+        return pd.DataFrame(data)
+
+    def tail(self, n):
+        return self.to_frame(max(0, len(self) - n))
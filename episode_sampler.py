@@ -0,0 +1,94 @@
+import math
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class EpisodeWindow:
+    """
+    A contiguous slice of history copied into memory. Exposes the same
+    `len()` / `column(name)` interface as ColumnarDataset, so the env reads
+    it exactly like a full dataset.
+    """
+
+    def __init__(self, start, columns):
+        self.start = start
+        self.columns = columns
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def column(self, name):
+        return self.columns[name]
+
+
+class EpisodeSampler:
+    """
+    Draws fixed-length episode windows at random offsets from a history
+    (a ColumnarDataset, whose columns are memory-mapped, or a DataFrame).
+
+    Only the window's rows are read, so the cost of a window depends on
+    `window` and the number of columns, not on the length of the history.
+    With `recency_halflife` (in rows) a window starting `age` rows before
+    the newest possible start is `2 ** (age / halflife)` times less likely
+    than the newest; offsets are drawn by inverse CDF in O(1).
+    A background thread keeps up to `prefetch` windows ready.
+    """
+
+    def __init__(self, data, window, columns=None, recency_halflife=None, prefetch=2, seed=None):
+        if len(data) < window:
+            raise ValueError(f"History has {len(data)} rows, shorter than the {window}-row window")
+        names = list(columns) if columns is not None else [c for c in data.columns if c != "time"]
+        if isinstance(data, pd.DataFrame):
+            self._source = {name: data[name].to_numpy() for name in names}
+        else:
+            self._source = {name: data.column(name) for name in names}
+        self.window = window
+        self.n_starts = len(data) - window + 1
+        self.recency_halflife = recency_halflife
+        self.rng = np.random.default_rng(seed)
+
+        self._queue = None
+        self._stop = threading.Event()
+        if prefetch:
+            self._queue = queue.Queue(maxsize=prefetch)
+            self._thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+            self._thread.start()
+
+    def sample_start(self):
+        if not self.recency_halflife:
+            return int(self.rng.integers(self.n_starts))
+        # Truncated exponential over age = n_starts - 1 - start
+        rate = math.log(2) / self.recency_halflife
+        u = self.rng.random()
+        age = -math.log1p(-u * -math.expm1(-rate * self.n_starts)) / rate
+        return self.n_starts - 1 - min(int(age), self.n_starts - 1)
+
+    def load(self, start):
+        stop = start + self.window
+        return EpisodeWindow(start, {
+            name: np.array(col[start:stop]) for name, col in self._source.items()
+        })
+
+    def next_window(self):
+        if self._queue is None:
+            return self.load(self.sample_start())
+        return self._queue.get()
+
+    def _prefetch_loop(self):
+        while not self._stop.is_set():
+            window = self.load(self.sample_start())
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(window, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def close(self):
+        self._stop.set()
@@ -1,35 +1,45 @@
+import os
+import sys
 import threading
 import time
 import queue
+import functools
 import pandas as pd
-import requests, time, hmac, hashlib
 import numpy as np
 
 from config import (
     MODEL_SAVE_PATH,
-    TRAIN_TIMESTEPS,
     ADMIN_CHAT_ID,
     SENTIMENT_THRESHOLD,
-    RL_ALGO
+    RL_ALGO,
+    METRICS_PORT,
+    TICK_RECORD_PATH,
+    SNAPSHOT_PATH,
+    SNAPSHOT_INTERVAL_SECONDS,
+    ORDER_BOOK_ENABLED,
+    LEDGER_HOUSE_WALLET,
+    ONLINE_TRAIN_ENABLED,
+    SHADOW_MODE_ENABLED
 )
+import metrics
 from data_manager import DataManager
-from ml_engine import MLEngine
 from trade_manager import CoinbaseClient
-from bot import main_bot
+from risk_manager import RiskManager
+from risk_engine import StreamingRiskEngine
 from utils import send_telegram_message
-from sentiment_manager import SentimentManager
-from x_scraper import start_twitter_stream
-# app/main.py
-@app.post("/start_trader")
-async def start_trader(settings: dict, user: User = Depends(get_current_user)):
-    # Start Celery task (see Step 4)
-    task = run_trader.delay(user.dict(), settings)
-    return {"task_id": task.id}
-
-@app.get("/trading_history")
-async def get_trading_history(user: User = Depends(get_current_user)):
-    # Fetch from database
-    return {"history": user.trading_history}
+from tick_recorder import TickRecorder, NO_RECORDER
+from observation import ObservationBuilder
+from order_book import OrderBooks
+from rebalance_planner import orders_from_flows, rebalance_diffs, step_flows
+from product_catalog import get_product_catalog
+from trade_ledger import get_trade_ledger
+from order_status import FillReconciler, accepted_order_id, filled, order_error
+from performance import fill_event, order_event
+from app.broadcaster import publisher
+from model_registry import ModelRegistry, ShadowEvaluator
+from state_snapshot import save_snapshot, load_snapshot, capture_trader_state, restore_trader_state
+# ML (torch/transformers/stable_baselines3), Telegram and tweepy are imported
+# inside the functions that need them, see cli.py for the per-command entry points.
 
 def tweet_consumer_loop(tweet_queue, sentiment_manager):
     """
@@ -46,164 +56,395 @@ def tweet_consumer_loop(tweet_queue, sentiment_manager):
             print(f"Error in tweet_consumer_loop: {e}")
         time.sleep(0.1)
 
-def ai_trading_loop(model, product_ids, sentiment_manager):
-    coinbase_client = CoinbaseClient()
-    data_manager = DataManager(product_ids=product_ids)
+@functools.lru_cache(maxsize=8)
+def _observation_builder(product_ids, features):
+    return ObservationBuilder(product_ids, features)
 
-    while True:
-        try:
-            sentiment_score = sentiment_manager.get_market_sentiment()
-            if sentiment_score < 1 - SENTIMENT_THRESHOLD:
-                msg = f"[AI] X sentiment is bearish ({sentiment_score:.2f}). Sitting on stables buying dips."
-                send_telegram_message(ADMIN_CHAT_ID, msg)
-                time.sleep(300)
-                continue
+def _record_house_fill(ledger, order, order_id, status):
+    """FillReconciler callback: ledger row and websocket event for a live-loop fill."""
+    fill = filled(status, order_id)
+    if fill is not None:
+        _house_fill(ledger, order, order_id, *fill)
 
-            balances = coinbase_client.get_account_balances()
-            if isinstance(balances, dict) and "error" in balances:
-                # Something went wrong
-                time.sleep(60)
-                continue
+def _house_fill(ledger, order, order_id, size, price, fee):
+    event = fill_event(LEDGER_HOUSE_WALLET, order["product_id"], order["side"], size, price, fee)
+    ledger.record_fill(LEDGER_HOUSE_WALLET, order["product_id"], order["side"], size, price, fee,
+                       order_id=order_id, timestamp=event["time"])
+    publisher.publish_threadsafe("trades", event, LEDGER_HOUSE_WALLET)
+
+def reconcile_pending_orders(orders, coinbase_client, ledger, fill_reconciler):
+    """
+    Orders the previous run sent before it stopped (the snapshot's
+    pending_orders): read what they filled, record whatever the ledger does
+    not have yet (their fills may never have been read back), then re-read
+    the pre-trade gate's positions from the exchange. Returns the number of
+    fills recorded.
+    """
+    orders = [order for order in orders if order.get("order_id")]
+    if not orders:
+        return 0
+    statuses = fill_reconciler.resolve([(coinbase_client, order["order_id"]) for order in orders])
+    recorded = 0
+    for order, status in zip(orders, statuses):
+        fill = filled(status, order["order_id"])
+        if fill is None:
+            continue
+        size, price, fee = fill
+        known_size, known_fee = ledger.order_fills(order["order_id"])
+        if size - known_size <= 1e-12:
+            continue
+        _house_fill(ledger, order, order["order_id"], size - known_size, price, max(0.0, fee - known_fee))
+        recorded += 1
+    coinbase_client.risk_gate.sync_portfolio(coinbase_client)
+    return recorded
+
+def trading_tick(model, product_ids, sentiment_manager, coinbase_client, data_manager, risk_manager,
+                 now=None, recorder=None, notify=None, sent_orders=None, ledger=None,
+                 fill_reconciler=None):
+    """
+    One decision step of the live loop. Returns how many seconds to wait
+    before the next tick.
+
+    `now`, `notify` and `recorder` let tick_recorder.replay drive the same
+    code with a recorded clock and no Telegram, and capture what it decided.
+    Orders sent to the exchange are appended to `sent_orders` if given.
+    If `ledger` (trade_ledger.TradeLedger) is given the tick's equity mark
+    and the orders are recorded in it, and `fill_reconciler`
+    (order_status.FillReconciler) records their fills in the background.
+    """
+    risk_gate = coinbase_client.risk_gate
+    notify = notify or send_telegram_message
+    if recorder is None:
+        recorder = NO_RECORDER
+    recorder.record_risk_state(risk_manager, risk_gate)
+
+    with metrics.span("sentiment"):
+        sentiment_score = sentiment_manager.get_market_sentiment()
+    recorder.record("sentiment", float(sentiment_score))
+    if sentiment_score < 1 - SENTIMENT_THRESHOLD:
+        msg = f"[AI] X sentiment is bearish ({sentiment_score:.2f}). Sitting on stables buying dips."
+        with metrics.span("telegram"):
+            notify(ADMIN_CHAT_ID, msg)
+        return 300
+
+    with metrics.span("balances"):
+        balances = coinbase_client.get_account_balances()
+    recorder.record("balances", balances)
+    if isinstance(balances, dict) and "error" in balances:
+        # Something went wrong
+        metrics.RETRIES.inc(reason="balances")
+        return 60
+
+    total_usd_value = 0.0
+    usd_balance = 0.0
+    coin_positions = {}
+
+    for b in balances:
+        currency = b["currency"]
+        amount = float(b["balance"])
+        if amount <= 0:
+            continue
+        if currency == "USD":
+            usd_balance += amount 
+            total_usd_value += amount
+        else:
+            pid = f"{currency}-USD"
+            if pid in product_ids:
+                coin_positions[currency] = amount
+
+    end = now if now is not None else pd.Timestamp.utcnow()
+    start = end - pd.Timedelta("3 days")
+    # Candle fetch and indicator time are split into their own spans inside DataManager
+    df_live = data_manager.build_multiasset_dataset(start, end)
+    if df_live is None or df_live.empty:
+        metrics.RETRIES.inc(reason="no_candles")
+        return 60
+
+    latest_row = df_live.iloc[-1]
+
+    # 4) For each product, add to total_usd_value
+    #    using the latest close to value them
+    for currency, amount in coin_positions.items():
+        pid = f"{currency}-USD"
+        current_px = float(latest_row.get(f"{pid}_close", 0))
+        total_usd_value += amount * current_px
+
+    # Keep the pre-trade gate's in-memory state current for this tick
+    for pid in product_ids:
+        risk_gate.update_price(pid, float(latest_row[f"{pid}_close"]))
+    risk_gate.update_portfolio(
+        total_usd_value,
+        {f"{currency}-USD": amount for currency, amount in coin_positions.items()}
+    )
+    if ledger is not None:
+        # House equity curve for /performance/house
+        ledger.record_mark(LEDGER_HOUSE_WALLET, total_usd_value, usd_balance,
+                           {pid: float(latest_row[f"{pid}_close"]) for pid in product_ids},
+                           timestamp=end.timestamp())
+
+    # 5) Build observation vector (obs) with the same builder the env uses;
+    #    shape (1, size) for model.predict
+    builder = _observation_builder(tuple(product_ids), tuple(data_manager.feature_names()))
+    obs_array = builder.build_batch(builder.market_from_frame(df_live), total_usd_value, usd_balance)
+
+    # 6) Predict action from the RL model
+    with metrics.span("predict"):
+        action, _states = model.predict(obs_array, deterministic=True)
+
+    # If your action is multi-dimensional:
+    if len(action.shape) > 1:
+        action = action[0]
+    recorder.record("obs", obs_array[0])
+    recorder.record("action", action)
+
+    # Filter out very small positions (avoid micro trades)
+    action = np.where(np.abs(action) < 0.01, 0, action).astype(np.float32)
+
+    # Same position/drawdown rules and streaming risk model the model was
+    # trained under; the engine sees each completed bar once
+    risk_manager.update_bars(
+        df_live["time"].astype("int64").to_numpy() // 10**9,
+        df_live[[f"{pid}_close" for pid in product_ids]].to_numpy(dtype=np.float64)
+    )
+    action = risk_manager.apply_risk_constraints(
+        action, None, usd_balance, latest_row, total_usd_value
+    )
 
-            total_usd_value = 0.0
-            usd_balance = 0.0
-            coin_positions = {}
-
-            for b in balances:
-                currency = b["currency"]
-                amount = float(b["balance"])
-                if amount <= 0:
-                    continue
-                if currency == "USD":
-                    usd_balance += amount 
-                    total_usd_value += amount
+    # 7) Plan the rebalance (same vectorized planner as the multi-user
+    #    runtime), then pre-trade check all orders as one batch
+    prices = np.array([float(latest_row[f"{pid}_close"]) for pid in product_ids])
+    positions = np.array([coin_positions.get(pid.split("-")[0], 0.0) for pid in product_ids])
+    if isinstance(model, ShadowEvaluator):
+        # Shadow policies trade this tick's prices on paper next to the primary
+        model.paper_step(prices)
+    # Per-product increments, minimums and trading status, all in memory
+    catalog = getattr(coinbase_client, "catalog", None) or get_product_catalog()
+    recorder.record_catalog(catalog, product_ids)
+    diffs = rebalance_diffs(total_usd_value, action, positions, prices)
+    flows = step_flows(diffs, prices, minimums=catalog.minimums(product_ids))
+    orders = [
+        dict(order, target=float(action[j]))
+        for _i, j, order in orders_from_flows(flows, prices, product_ids, catalog)
+    ]
+
+    # Shrink orders that would walk the book past MAX_SLIPPAGE_PERCENT
+    # (local L2 book, no API call); they are re-quantized below
+    if coinbase_client.order_books is not None:
+        with metrics.span("depth"):
+            depth = {}
+            for order in orders:
+                limit = coinbase_client.order_books.max_fill(order["product_id"], order["side"])
+                if limit is None:
+                    continue  # no fresh book: send as sized
+                depth[f"{order['product_id']}:{order['side']}"] = limit
+                max_base, max_quote = limit
+                if order["side"] == "buy":
+                    order["funds"] = min(order["funds"], max_quote)
                 else:
-                    pid = f"{currency}-USD"
-                    if pid in product_ids:
-                        coin_positions[currency] = amount
-
-            end = pd.Timestamp.utcnow()
-            start = end - pd.Timedelta("3 days")
-            df_live = data_manager.build_multiasset_dataset(start, end)
-            if df_live is None or df_live.empty:
-                time.sleep(60)
+                    order["size"] = min(order["size"], max_base)
+            recorder.record("depth", depth)
+
+    # Drop orders the exchange would reject (size, increments, status)
+    # before they cost a round trip
+    valid = []
+    for order in orders:
+        reason = catalog.check_order(order)
+        if reason:
+            print(f"Skipping {order['side']} {order['product_id']}: {reason}")
+        else:
+            valid.append(order)
+    orders = valid
+
+    with metrics.span("risk_checks"):
+        checks = risk_gate.reserve_batch(orders)
+    recorder.record("orders", [
+        {"product_id": o["product_id"], "side": o["side"], "funds": o.get("funds"),
+         "size": o.get("size"), "ok": ok, "reason": reason}
+        for o, (ok, reason, _reservation) in zip(orders, checks)
+    ])
+    for order, (ok, reason, reservation) in zip(orders, checks):
+        if not ok:
+            print(f"Pre-trade check rejected {order['side']} {order['product_id']}: {reason}")
+            continue
+        try:
+            with metrics.span("orders"):
+                res = coinbase_client.place_market_order(
+                    order["product_id"], order["side"],
+                    funds=order.get("funds"), size=order.get("size"), prechecked=True,
+                    reservation=reservation
+                )
+            order_id = accepted_order_id(res)
+            if ledger is not None:
+                ledger.record_result(LEDGER_HOUSE_WALLET, order, res)
+            publisher.publish_threadsafe("trades", order_event(LEDGER_HOUSE_WALLET, order, res),
+                                         LEDGER_HOUSE_WALLET)
+            if order_id is None:
+                print(f"Order {order['side']} {order['product_id']} not accepted: {order_error(res)}")
                 continue
+            if ledger is not None and fill_reconciler is not None:
+                # What the exchange actually filled, not the tick's reference
+                # price; read back off the trading thread
+                fill_reconciler.submit(coinbase_client, order_id,
+                                       functools.partial(_record_house_fill, ledger, order, order_id))
+            if sent_orders is not None:
+                sent_orders.append({
+                    "product_id": order["product_id"], "side": order["side"],
+                    "funds": order.get("funds"), "size": order.get("size"),
+                    "order_id": order_id, "time": time.time(),
+                })
+            currency = order["product_id"].split("-")[0]
+            if order["side"] == "buy":
+                msg = f"[AI] Buying {currency} with ${order['funds']:.2f} (target: {order['target']*100:.1f}%)"
+            else:
+                msg = f"[AI] Selling {order['size']:.6f} {currency} (target: {order['target']*100:.1f}%)"
+            with metrics.span("telegram"):
+                notify(ADMIN_CHAT_ID, msg + f" [Sentiment: {sentiment_score:.2f}]")
+
+        except Exception as e:  # fix the spelling here
+            metrics.ERRORS.inc(stage="orders")
+            print(f"Error in processing {order['product_id']}: {e}")
+            continue
+
+    return 300  # Wait 5 min
 
-            latest_row = df_live.iloc[-1]
-
-            # 4) For each product, add to total_usd_value
-            #    using the latest close to value them
-            for currency, amount in coin_positions.items():
-                pid = f"{currency}-USD"
-                current_px = float(latest_row.get(f"{pid}_close", 0))
-                total_usd_value += amount * current_px
-
-            # 5) Build observation vector (obs)
-            obs = []
-            for pid in product_ids:
-                obs.extend([
-                    float(latest_row[f"{pid}_close"]),
-                    float(latest_row[f"{pid}_ma_50"]),
-                    float(latest_row[f"{pid}_ma_200"]),
-                    float(latest_row[f"{pid}_rsi"])
-                ])
-
-            # Add mock net_worth & fraction_in_crypto, etc.
-            fraction_in_crypto = 0.0
-            if total_usd_value > 0:
-                fraction_in_crypto = (total_usd_value - usd_balance) / total_usd_value
-
-            obs.extend([
-                total_usd_value,
-                fraction_in_crypto,
-                #usd_balance
-            ])
-
-            # Convert obs to the correct shape for model.predict
-            obs_array = np.array(obs, dtype=np.float32).reshape(1, -1)
-
-            # 6) Predict action from the RL model
-            action, _states = model.predict(obs_array, deterministic=True)
-
-            # If your action is multi-dimensional:
-            if len(action.shape) > 1:
-                action = action[0]
-
-            # Filter out very small positions (avoid micro trades)
-            action = np.where(np.abs(action) < 0.01, 0, action).astype(np.float32)
-
-            # 7) Rebalance accordingly
-            for i, pid in enumerate(product_ids):
-                currency = pid.split("-")[0]
-                current_px = float(latest_row[f"{pid}_close"])
-                target_value = float(total_usd_value) * float(action[i])
-
-                # Current value of the coin position
-                current_value = 0.0
-                if currency in coin_positions:
-                    current_value = coin_positions[currency] * current_px
-
-                diff = target_value - current_value
-                # If the difference is tiny, skip
-                if abs(diff) < 1.0:
-                    continue
-
-                try:
-                    if diff > 0:
-                        # Buy
-                        buy_usd = diff * 0.5
-                        # Avoid minuscule trades
-                        if buy_usd < 5.0:
-                            continue
-                        res = coinbase_client.place_market_order(pid, "buy", funds=round(buy_usd, 2))
-                        msg = f"[AI] Buying {currency} with ${buy_usd:.2f} (target: {action[i]*100:.1f}%)"
-                    else:
-                        # Sell
-                        sell_amount = (abs(diff) * 0.5) / current_px
-                        if sell_amount < 0.0001:
-                            continue
-                        res = coinbase_client.place_market_order(pid, "sell", size=round(sell_amount, 6))
-                        msg = f"[AI] Selling {sell_amount:.6f} {currency} (target: {action[i]*100:.1f}%)"
-
-                    send_telegram_message(ADMIN_CHAT_ID, msg + f" [Sentiment: {sentiment_score:.2f}]")
-
-                except Exception as e:  # fix the spelling here
-                    print(f"Error in processing {currency}: {e}")
-                    continue
-
-            # Sleep
-            time.sleep(300)  # Wait 5 min
+def ai_trading_loop(model, product_ids, sentiment_manager, snapshot_path=SNAPSHOT_PATH):
+    order_books = None
+    if ORDER_BOOK_ENABLED:
+        # Local L2 books: mid prices and depth checks without REST calls
+        try:
+            order_books = OrderBooks(product_ids).start()
+        except Exception as e:
+            print(f"Order book feed unavailable, sizing orders without depth: {e}")
+            order_books = None
+    coinbase_client = CoinbaseClient(order_books=order_books)
+    # Product increments/minimums for in-memory order checks, refreshed in the background
+    coinbase_client.catalog.start(coinbase_client.client)
+    risk_manager = RiskManager(risk_engine=StreamingRiskEngine(len(product_ids)))
+    data_manager = DataManager(product_ids=product_ids)
+
+    ledger = get_trade_ledger()
+    fill_reconciler = FillReconciler()
+
+    # Warm restart: candles, drawdown peaks, kill switch, sentiment and the
+    # last orders come back from the snapshot; the first tick only fetches
+    # the candles missing since it was taken
+    state, saved_at = load_snapshot(snapshot_path) if snapshot_path else (None, None)
+    if state is not None:
+        restore_trader_state(state, data_manager, risk_manager, coinbase_client.risk_gate, sentiment_manager)
+        print(f"Restored trader state from {snapshot_path} ({time.time() - saved_at:.0f}s old)")
+        try:
+            recorded = reconcile_pending_orders(state.get("pending_orders", []), coinbase_client,
+                                                ledger, fill_reconciler)
+            if recorded:
+                print(f"Recorded {recorded} fills of orders sent before the restart")
+        except Exception as e:
+            metrics.ERRORS.inc(stage="snapshot")
+            print(f"Error reconciling orders sent before the restart: {e}")
+    last_snapshot = 0.0
+    recorder = NO_RECORDER
+    if TICK_RECORD_PATH:
+        # Inputs/outputs of every tick, for tick_recorder.replay
+        recorder = TickRecorder(TICK_RECORD_PATH, product_ids,
+                                data_manager.granularity, data_manager.resolutions)
+        recorder.attach(data_manager)
 
+    while True:
+        now = pd.Timestamp.utcnow()
+        recorder.begin(now)
+        sent_orders = []
+        try:
+            with metrics.tick("ai_trading_loop"):
+                delay = trading_tick(
+                    model, product_ids, sentiment_manager,
+                    coinbase_client, data_manager, risk_manager,
+                    now=now, recorder=recorder, sent_orders=sent_orders, ledger=ledger,
+                    fill_reconciler=fill_reconciler
+                )
+            recorder.commit(delay)
         except Exception as e:
+            metrics.ERRORS.inc(stage="tick")
+            metrics.RETRIES.inc(reason="tick_error")
             print(f"Error in AI trading loop: {e}")
-            time.sleep(60)
-            continue
+            delay = 60
+            recorder.commit(delay, error=str(e))
 
+        if snapshot_path and (sent_orders or time.time() - last_snapshot >= SNAPSHOT_INTERVAL_SECONDS):
+            try:
+                with metrics.span("snapshot"):
+                    save_snapshot(snapshot_path, capture_trader_state(
+                        data_manager, risk_manager, coinbase_client.risk_gate,
+                        sentiment_manager, sent_orders
+                    ))
+                last_snapshot = time.time()
+            except Exception as e:
+                metrics.ERRORS.inc(stage="snapshot")
+                print(f"Error saving trader snapshot: {e}")
+        time.sleep(delay)
+
+
+
+def load_live_model(product_ids, features, registry, model_path=None):
+    """
+    The model to trade: `model_path` if given, else the registry's primary
+    version, else MODEL_SAVE_PATH. Returns (model, path); raises
+    FileNotFoundError if there is no saved model.
+    """
+    algo = RL_ALGO
+    if model_path is None:
+        entry = registry.primary()
+        if entry is not None:
+            model_path, algo = entry["path"], entry["algo"]
+        else:
+            model_path = MODEL_SAVE_PATH
+    if not os.path.exists(f"{model_path}.zip"):
+        raise FileNotFoundError(f"No saved model at {model_path}.zip")
+    from ml_engine import MLEngine
+    return MLEngine(None, product_ids, model_path, algo=algo, features=features).load_model(), model_path
+
+
+def wrap_live_model(model, product_ids, registry, model_path):
+    """Online fine-tuning and shadow scoring around the live model, as configured."""
+    if ONLINE_TRAIN_ENABLED:
+        # Fine-tune in a background process; ticks pick up accepted models between ticks
+        from online_trainer import ModelRef, OnlineTrainer
+        model = ModelRef(model)
+        OnlineTrainer(model, product_ids, registry=registry, base_path=model_path).start()
+    if SHADOW_MODE_ENABLED:
+        # Primary and shadow versions scored in one batch; only the primary trades
+        model = registry.shadow_evaluator(model, product_ids)
+    return model
 
 
 def main():
     product_ids = ["BTC-USD", "TRUMP-USD", "ETH-USD", "SOL-USD"]
 
-    # 1) Prepare training data for RL model
+    if METRICS_PORT:
+        # Per-stage tick timings and API counters for this process
+        metrics.start_http_server(METRICS_PORT)
+
+    # 1-2) Load the RL model: the registry's primary version, else
+    #      MODEL_SAVE_PATH. Training is never started here (it would hold
+    #      up the bot and the trading loop for the whole run); the trading
+    #      loop warm-starts from its own snapshot (see ai_trading_loop).
     dm = DataManager(product_ids=product_ids)
-    end = pd.Timestamp.utcnow()
-    start = end - pd.Timedelta("7 days")
+    registry = ModelRegistry()
+    try:
+        model, model_path = load_live_model(product_ids, dm.feature_names(), registry)
+    except FileNotFoundError as e:
+        print(f"{e}. Train one first with `python cli.py train`, "
+              f"or register one with `python cli.py models register <path> --stage primary`.")
+        return 1
 
-    df = dm.build_multiasset_dataset(start, end)
-    if df is None or df.empty:
-        print("No historical data found. Exiting.")
-        return
+    model = wrap_live_model(model, product_ids, registry, model_path)
 
-    # 2) Train or Load RL model
-    ml_engine = MLEngine(df, product_ids, MODEL_SAVE_PATH, algo=RL_ALGO)
-    # Uncomment to retrain model if needed:
-    #model = ml_engine.train_model(timesteps=TRAIN_TIMESTEPS)
-    model = ml_engine.load_model()
+    from sentiment_manager import SentimentManager
+    from bot import main_bot
 
     # 3) Create Sentiment Manager
     sentiment_manager = SentimentManager()
 
     # 4) Start real-time X (Twitter) streaming => tweets go into 'tweet_queue'
+    #from x_scraper import start_twitter_stream
     #tweet_queue = queue.Queue()
     #keywords = ["crypto", "bitcoin", "ethereum", "bonk", "trump"]
     #stream = start_twitter_stream(keywords, tweet_queue)
@@ -228,4 +469,4 @@ def main():
     main_bot()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,280 @@
+import json
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_ENABLED, TICK_TIMING_LOG
+
+tick_logger = logging.getLogger("tick_timing")
+
+# Latency buckets in seconds (1ms .. 60s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self.values[_label_key(labels)] = value
+
+    def get(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # label key -> [bucket counts..., +Inf count], sum
+        self.counts = {}
+        self.sums = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self.counts.get(key)
+            if counts is None:
+                counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+                self.sums[key] = 0.0
+            counts[idx] += 1
+            self.sums[key] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        return sum(self.counts.get(_label_key(labels), ()))
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key in sorted(self.counts):
+            cumulative = 0
+            for bound, n in zip(self.buckets, self.counts[key]):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+            cumulative += self.counts[key][-1]
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {self.sums[key]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def counter(name, help_text):
+    """Get or create a process-wide counter."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Counter(name, help_text)
+        return _registry[name]
+
+
+def gauge(name, help_text):
+    """Get or create a process-wide gauge."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Gauge(name, help_text)
+        return _registry[name]
+
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS):
+    """Get or create a process-wide histogram."""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Histogram(name, help_text, buckets)
+        return _registry[name]
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in list(_registry.values()):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------------------------------------------------
+# Tick spans
+STAGE_SECONDS = histogram("tick_stage_seconds", "Time spent per trading-tick stage")
+TICK_SECONDS = histogram("tick_seconds", "Total trading-tick duration")
+ERRORS = counter("errors_total", "Errors by stage")
+RETRIES = counter("retries_total", "Retried ticks/calls by reason")
+
+_current = threading.local()
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a stage of the current tick. Durations go to tick_stage_seconds and,
+    inside a `tick()` block, into that tick's timing record (summed if the
+    same stage runs several times, e.g. once per product).
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        record = getattr(_current, "record", None)
+        if record is not None:
+            record[stage] = record.get(stage, 0.0) + elapsed
+
+
+@contextmanager
+def tick(loop_name, **fields):
+    """
+    Wrap one iteration of a trading loop. On exit the total duration is
+    recorded and, with TICK_TIMING_LOG on, one JSON line with every stage's
+    duration is written to the "tick_timing" logger.
+    """
+    if not METRICS_ENABLED:
+        yield {}
+        return
+    record = {}
+    _current.record = record
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        total = time.perf_counter() - start
+        _current.record = None
+        TICK_SECONDS.observe(total, loop=loop_name)
+        if TICK_TIMING_LOG:
+            entry = {"loop": loop_name, "ts": time.time(), "total_ms": round(total * 1000, 3)}
+            entry.update(fields)
+            entry["stages_ms"] = {k: round(v * 1000, 3) for k, v in record.items()}
+            tick_logger.info(json.dumps(entry))
+
+
+# ----------------------------------------------------------------------
+# Client instrumentation
+API_CALLS = counter("api_calls_total", "External API calls by client and method")
+API_ERRORS = counter("api_errors_total", "External API calls that raised, by client and method")
+API_SECONDS = histogram("api_call_seconds", "External API call latency by client and method")
+
+
+class InstrumentedClient:
+    """
+    Proxy that counts and times every method call on a wrapped API client
+    (e.g. the Coinbase RESTClient) without touching the call sites.
+    """
+
+    def __init__(self, client, client_name):
+        self._client = client
+        self._client_name = client_name
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr) or not METRICS_ENABLED:
+            return attr
+        client_name = self._client_name
+
+        def wrapper(*args, **kwargs):
+            API_CALLS.inc(client=client_name, method=name)
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            except Exception:
+                API_ERRORS.inc(client=client_name, method=name)
+                raise
+            finally:
+                API_SECONDS.observe(time.perf_counter() - start, client=client_name, method=name)
+
+        return wrapper
+
+
+def instrument(client, client_name):
+    return InstrumentedClient(client, client_name) if METRICS_ENABLED else client
+
+
+# ----------------------------------------------------------------------
+# Standalone exporter for processes without the FastAPI app (e.g. main.py)
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve /metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
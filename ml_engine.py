@@ -1,21 +1,41 @@
-import gym
 import numpy as np
 from stable_baselines3 import PPO, A2C
 from stable_baselines3.common.vec_env import DummyVecEnv
 from rl_env import MultiAssetTradingEnv
+from resampler import BASE_FEATURES
+from episode_sampler import EpisodeSampler
+from config import EPISODE_LENGTH, EPISODE_RECENCY_HALFLIFE
 
 class MLEngine:
-    def __init__(self, df, product_ids, model_save_path, algo="PPO"):
+    def __init__(self, df, product_ids, model_save_path, algo="PPO", features=BASE_FEATURES,
+                 episode_length=EPISODE_LENGTH, recency_halflife=EPISODE_RECENCY_HALFLIFE):
         self.df = df
+        self.features = features
         self.product_ids = product_ids
         self.model_save_path = model_save_path
         self.algo = algo
+        self.episode_length = episode_length
+        self.recency_halflife = recency_halflife
 
-    def train_model(self, timesteps=200000):
+    def make_sampler(self):
+        """Random-window sampler over self.df (reads only the env's columns)."""
+        columns = {f"{pid}_close" for pid in self.product_ids}
+        columns.update(f"{pid}_{f}" for pid in self.product_ids for f in self.features)
+        return EpisodeSampler(self.df, self.episode_length, columns=sorted(columns),
+                              recency_halflife=self.recency_halflife or None)
+
+    def make_vec_env(self):
         def make_env():
-            return MultiAssetTradingEnv(self.df, self.product_ids)
+            if self.episode_length and len(self.df) > self.episode_length:
+                # Episodes on random windows: cost per episode is independent of history length
+                return MultiAssetTradingEnv(None, self.product_ids, features=self.features,
+                                            sampler=self.make_sampler())
+            return MultiAssetTradingEnv(self.df, self.product_ids, features=self.features)
+
+        return DummyVecEnv([make_env])
 
-        env = DummyVecEnv([make_env])
+    def train_model(self, timesteps=200000):
+        env = self.make_vec_env()
 
         if self.algo == "PPO":
             model = PPO("MlpPolicy", env, verbose=1)
@@ -26,6 +46,12 @@ class MLEngine:
         model.save(self.model_save_path)
         return model
 
+    def fine_tune(self, model, timesteps):
+        """Continue training `model` on self.df, keeping its weights and optimizer state."""
+        model.set_env(self.make_vec_env())
+        model.learn(total_timesteps=timesteps, reset_num_timesteps=False)
+        return model
+
     def load_model(self):
         if self.algo == "PPO":
             model = PPO.load(self.model_save_path)
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import shutil
+import threading
+
+import numpy as np
+
+import metrics
+from config import (
+    MODEL_REGISTRY_DIR,
+    RL_ALGO,
+    PAPER_INITIAL_BALANCE,
+    TRANSACTION_FEE_PERCENT
+)
+from online_trainer import ModelRef
+from rebalance_planner import rebalance_diffs, step_flows
+from risk_manager import RiskManager
+
+DEFAULT_NAME = "policy"
+STAGES = ("candidate", "shadow", "primary", "archived")
+ACTIVATIONS = {"Tanh": np.tanh, "ReLU": lambda x: np.maximum(x, 0.0)}
+MIN_ACTION = 0.01  # same micro-trade filter as the live loop
+
+
+def _numpy(tensor):
+    if hasattr(tensor, "detach"):
+        tensor = tensor.detach().cpu().numpy()
+    return np.asarray(tensor, dtype=np.float32)
+
+
+def export_policy(model):
+    """
+    The deterministic actor of a stable-baselines3 MlpPolicy as numpy
+    arrays: {"layers": [(W, b), ...], "activation", "low", "high"}, or
+    None when the model has some other shape (state-dependent noise,
+    squashed outputs, custom extractors...).
+    """
+    try:
+        policy = model.policy
+        if getattr(policy, "use_sde", False) or getattr(policy, "squash_output", False):
+            return None
+        modules = [m for m in policy.mlp_extractor.policy_net if hasattr(m, "weight")]
+        modules.append(policy.action_net)
+        layers = [(_numpy(m.weight), _numpy(m.bias)) for m in modules]
+        activation = policy.activation_fn.__name__
+        if activation not in ACTIVATIONS:
+            return None
+        return {"layers": layers, "activation": activation,
+                "low": np.asarray(model.action_space.low, dtype=np.float32),
+                "high": np.asarray(model.action_space.high, dtype=np.float32)}
+    except (AttributeError, TypeError):
+        return None
+
+
+class BatchedPolicies:
+    """
+    Deterministic actions of several policies on one observation batch.
+
+    Policies whose exported actors have the same layer shapes are stacked
+    and evaluated together: one batched matmul per layer for the whole
+    group, instead of one framework call per model. Every exported policy
+    is checked against its own predict() on a probe batch first; policies
+    that cannot be exported or do not match fall back to predict().
+    """
+
+    def __init__(self, models, atol=1e-4):
+        self.models = list(models)
+        self.groups = {}      # (activation, layer shapes) -> [index, ...]
+        self.fallback = []
+        exported = {}
+        for i, model in enumerate(self.models):
+            policy = export_policy(model)
+            if policy is not None and self._matches(model, policy, atol):
+                key = (policy["activation"], tuple(w.shape for w, _b in policy["layers"]))
+                self.groups.setdefault(key, []).append(i)
+                exported[i] = policy
+            else:
+                self.fallback.append(i)
+        self.stacks = []
+        for (activation, _shapes), indices in self.groups.items():
+            policies = [exported[i] for i in indices]
+            layers = [
+                (np.stack([p["layers"][k][0] for p in policies]).transpose(0, 2, 1),
+                 np.stack([p["layers"][k][1] for p in policies])[:, None, :])
+                for k in range(len(policies[0]["layers"]))
+            ]
+            low = np.stack([p["low"] for p in policies])[:, None, :]
+            high = np.stack([p["high"] for p in policies])[:, None, :]
+            self.stacks.append((np.array(indices), ACTIVATIONS[activation], layers, low, high))
+
+    @staticmethod
+    def _forward(obs, activation, layers, low, high):
+        h = obs[None, :, :]
+        for k, (w, b) in enumerate(layers):
+            h = np.matmul(h, w) + b
+            if k < len(layers) - 1:
+                h = activation(h)
+        return np.clip(h, low, high)
+
+    def _matches(self, model, policy, atol):
+        probe = np.random.default_rng(0).standard_normal((4, policy["layers"][0][0].shape[1])).astype(np.float32)
+        ours = self._forward(probe, ACTIVATIONS[policy["activation"]],
+                             [(w.T[None], b[None, None]) for w, b in policy["layers"]],
+                             policy["low"], policy["high"])[0]
+        theirs = np.asarray(model.predict(probe, deterministic=True)[0], dtype=np.float32)
+        return theirs.shape == ours.shape and np.allclose(ours, theirs, atol=atol)
+
+    def predict(self, obs):
+        """Actions (n_models, n_obs, n_actions) for obs (n_obs, obs_size)."""
+        obs = np.asarray(obs, dtype=np.float32)
+        obs = obs.reshape(-1, obs.shape[-1])
+        results = [None] * len(self.models)
+        for indices, activation, layers, low, high in self.stacks:
+            actions = self._forward(obs, activation, layers, low, high)
+            for slot, i in enumerate(indices):
+                results[i] = actions[slot]
+        for i in self.fallback:
+            actions, _states = self.models[i].predict(obs, deterministic=True)
+            results[i] = np.asarray(actions, dtype=np.float32).reshape(len(obs), -1)
+        return np.stack(results)
+
+
+class PaperPortfolios:
+    """
+    One simulated account per policy, rebalanced every tick with the live
+    loop's rules: micro-trade filter, RiskManager limits, the planner's
+    step and minimums, and TRANSACTION_FEE_PERCENT on every flow.
+    """
+
+    def __init__(self, labels, n_assets, initial_balance=PAPER_INITIAL_BALANCE, fee=TRANSACTION_FEE_PERCENT):
+        self.labels = list(labels)
+        self.initial_balance = float(initial_balance)
+        self.fee = fee
+        self.risk_manager = RiskManager()
+        k = len(self.labels)
+        self.cash = np.full(k, self.initial_balance)
+        self.holdings = np.zeros((k, n_assets))
+        self.peaks = self.cash.copy()
+        self.net_worth = self.cash.copy()
+        self.max_drawdown = np.zeros(k)
+        self.fees = np.zeros(k)
+        self.trades = np.zeros(k, dtype=np.int64)
+        self.ticks = 0
+
+    def step(self, actions, prices):
+        """Mark to `prices` (n_assets,) and rebalance each portfolio toward its `actions` row."""
+        prices = np.asarray(prices, dtype=np.float64)
+        self.net_worth = self.cash + self.holdings @ prices
+        actions = np.asarray(actions, dtype=np.float64)
+        actions = np.where(np.abs(actions) < MIN_ACTION, 0.0, actions)
+        targets = self.risk_manager.apply_risk_constraints_batch(actions, self.net_worth, self.peaks)
+        np.maximum(self.max_drawdown, 1 - self.net_worth / self.peaks, out=self.max_drawdown)
+
+        flows = step_flows(rebalance_diffs(self.net_worth, targets, self.holdings, prices), prices)
+        fees = np.abs(flows) * self.fee
+        self.cash -= flows.sum(axis=1) + fees.sum(axis=1)
+        self.holdings += flows / prices
+        self.fees += fees.sum(axis=1)
+        self.trades += np.count_nonzero(flows, axis=1)
+        self.ticks += 1
+
+    def summary(self):
+        return {
+            label: {
+                "net_worth": float(self.net_worth[i]),
+                "pnl": float(self.net_worth[i] - self.initial_balance),
+                "return": float(self.net_worth[i] / self.initial_balance - 1),
+                "max_drawdown": float(self.max_drawdown[i]),
+                "fees": float(self.fees[i]),
+                "trades": int(self.trades[i]),
+                "ticks": self.ticks,
+            }
+            for i, label in enumerate(self.labels)
+        }
+
+
+PAPER_PNL = metrics.gauge("shadow_paper_pnl_usd", "Paper PnL of the primary and each shadow policy")
+PAPER_DRAWDOWN = metrics.gauge("shadow_paper_max_drawdown", "Paper max drawdown of each policy")
+PAPER_TRADES = metrics.gauge("shadow_paper_trades", "Paper trades of each policy")
+
+
+class ShadowEvaluator:
+    """
+    Drop-in for the live model: predict() scores the observation batch
+    with the primary and every shadow policy in one BatchedPolicies pass
+    and returns only the primary's actions, which are what gets executed.
+    paper_step() then trades every policy's actions for the first
+    observation row in PaperPortfolios, so the shadows' hypothetical PnL
+    is tracked next to the primary's on identical ticks; every step exports
+    summary() per policy as shadow_paper_* gauges.
+
+    `primary` may be a ModelRef; the batch is rebuilt when it is swapped.
+    """
+
+    def __init__(self, primary, shadows, product_ids, primary_label="primary",
+                 initial_balance=PAPER_INITIAL_BALANCE):
+        self.primary = primary
+        self.shadows = dict(shadows)
+        self.labels = [primary_label] + list(self.shadows)
+        self.paper = PaperPortfolios(self.labels, len(product_ids), initial_balance)
+        self.last_actions = None
+        self._batched = None
+        self._primary_model = None
+
+    def _current(self):
+        model = self.primary.model if isinstance(self.primary, ModelRef) else self.primary
+        if model is not self._primary_model:
+            self._batched = BatchedPolicies([model] + list(self.shadows.values()))
+            self._primary_model = model
+        return self._batched
+
+    def predict(self, obs, deterministic=True):
+        actions = self._current().predict(obs)
+        self.last_actions = actions[:, 0]
+        return actions[0], None
+
+    def paper_step(self, prices):
+        if self.last_actions is None:
+            return
+        self.paper.step(self.last_actions, prices)
+        self.last_actions = None
+        for label, stats in self.summary().items():
+            PAPER_PNL.set(stats["pnl"], policy=label)
+            PAPER_DRAWDOWN.set(stats["max_drawdown"], policy=label)
+            PAPER_TRADES.set(stats["trades"], policy=label)
+
+    def summary(self):
+        return self.paper.summary()
+
+
+class ModelRegistry:
+    """
+    Versioned policies on disk: root/<name>/v<N>.zip plus an index.json
+    with each version's stage (candidate, shadow, primary, archived),
+    algorithm and metadata. The index is rewritten
+    atomically, so a reader never sees a half-written file.
+    """
+
+    def __init__(self, root=MODEL_REGISTRY_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        self.entries = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.entries = json.load(f)
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.index_path)
+
+    def register(self, source, name=DEFAULT_NAME, algo=RL_ALGO, stage="candidate", metadata=None):
+        """Copy a saved model (path with or without .zip) in as the next version of `name`."""
+        if stage not in STAGES:
+            raise ValueError(f"unknown stage {stage!r}, expected one of {STAGES}")
+        source = source if source.endswith(".zip") else f"{source}.zip"
+        with self._lock:
+            version = 1 + max((e["version"] for e in self.entries if e["name"] == name), default=0)
+            path = os.path.join(self.root, name, f"v{version}")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(source, f"{path}.zip")
+            entry = {"name": name, "version": version, "path": path, "algo": algo, "stage": "candidate",
+                     "created": time.time(), "metadata": metadata or {}}
+            self.entries.append(entry)
+            self._save()
+        if stage != "candidate":
+            self.set_stage(name, version, stage)
+        return entry
+
+    def get(self, name, version):
+        for entry in self.entries:
+            if entry["name"] == name and entry["version"] == version:
+                return entry
+        raise KeyError(f"{name} v{version} is not registered")
+
+    def versions(self, name=None, stage=None):
+        return [e for e in self.entries
+                if (name is None or e["name"] == name) and (stage is None or e["stage"] == stage)]
+
+    def set_stage(self, name, version, stage):
+        """Move a version to `stage`; a new primary archives the previous one."""
+        if stage not in STAGES:
+            raise ValueError(f"unknown stage {stage!r}, expected one of {STAGES}")
+        with self._lock:
+            entry = self.get(name, version)
+            if stage == "primary":
+                for other in self.entries:
+                    if other["name"] == name and other["stage"] == "primary":
+                        other["stage"] = "archived"
+            entry["stage"] = stage
+            self._save()
+        return entry
+
+    def primary(self, name=DEFAULT_NAME):
+        entries = self.versions(name, "primary")
+        return entries[-1] if entries else None
+
+    def load(self, entry, product_ids=()):
+        from ml_engine import MLEngine
+        return MLEngine(None, list(product_ids), entry["path"], algo=entry["algo"]).load_model()
+
+    def shadow_evaluator(self, primary, product_ids, name=DEFAULT_NAME, loader=None):
+        """ShadowEvaluator running `primary` live and every `shadow` version of `name` on paper."""
+        loader = loader or (lambda entry: self.load(entry, product_ids))
+        shadows = {f"{e['name']}:v{e['version']}": loader(e) for e in self.versions(name, "shadow")}
+        current = self.primary(name)
+        label = f"{name}:v{current['version']}" if current else "primary"
+        return ShadowEvaluator(primary, shadows, product_ids, primary_label=label)
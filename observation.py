@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from resampler import BASE_FEATURES
+
+
+def fraction_in_crypto(cash, net_worth):
+    """
+    1 - cash / net_worth, elementwise; 1.0 where net_worth <= 0. This is the
+    definition the policy is trained with, so every caller must use it.
+    """
+    cash = np.asarray(cash, dtype=np.float64)
+    net_worth = np.asarray(net_worth, dtype=np.float64)
+    ratio = np.divide(cash, net_worth, out=np.ones_like(net_worth), where=net_worth > 0)
+    return np.where(net_worth > 0, 1.0 - ratio, 1.0)
+
+
+class ObservationBuilder:
+    """
+    Builds policy observations: for each product the features in `features`
+    (columns '<pid>_<feature>'), then [net_worth, fraction_in_crypto].
+
+    Configured once from product ids and a feature spec; the column order is
+    fixed here and shared by the env, the backtester, the live loop and the
+    multi-tenant runtime, so training and inference cannot drift apart.
+
+      - bind(data) + build(step, net_worth, cash): per-step observations over
+        a DataFrame, ColumnarDataset or EpisodeWindow, written into a
+        preallocated float32 buffer.
+      - market_from_frame(df) + build_batch(market, net_worths, cash): one
+        shared market vector and N portfolios -> an (N, size) batch.
+    """
+
+    def __init__(self, product_ids, features=BASE_FEATURES):
+        self.product_ids = list(product_ids)
+        self.features = tuple(features)
+        self.columns = [f"{pid}_{f}" for pid in self.product_ids for f in self.features]
+        self.n_market = len(self.columns)
+        self.size = self.n_market + 2
+        self.buffer = np.zeros(self.size, dtype=np.float32)
+        self._matrix = None
+        self._arrays = None
+
+    def bind(self, data):
+        """
+        Precompute the feature columns of `data`. In-memory data is stacked
+        into one (n_rows, n_market) float32 matrix so a step is a single row
+        copy; memory-mapped columns are kept as is and gathered per step, so
+        a long ColumnarDataset is never loaded whole.
+        """
+        if isinstance(data, pd.DataFrame):
+            arrays = [data[name].to_numpy() for name in self.columns]
+        else:
+            arrays = [data.column(name) for name in self.columns]
+        if arrays and isinstance(arrays[0], np.memmap):
+            self._arrays, self._matrix = arrays, None
+        else:
+            self._matrix = np.column_stack(arrays).astype(np.float32) if arrays else None
+            self._arrays = None
+
+    def build(self, step, net_worth, cash, out=None):
+        """Observation at row `step` of the bound data (written into `out` or self.buffer)."""
+        out = self.buffer if out is None else out
+        if self._matrix is not None:
+            out[:self.n_market] = self._matrix[step]
+        else:
+            for j, col in enumerate(self._arrays):
+                out[j] = col[step]
+        out[self.n_market] = net_worth
+        out[self.n_market + 1] = fraction_in_crypto(cash, net_worth)
+        return out
+
+    def market_from_frame(self, df, i=-1):
+        """Market part of the observation from row `i` of a feature frame."""
+        indexer = df.columns.get_indexer(self.columns)
+        if (indexer < 0).any():
+            missing = [c for c, j in zip(self.columns, indexer) if j < 0]
+            raise KeyError(f"Missing feature columns: {missing}")
+        return df.iloc[i, indexer].to_numpy(dtype=np.float32)
+
+    def build_batch(self, market, net_worths, cash, out=None):
+        """(N, size) observations for N portfolios sharing one market vector."""
+        net_worths = np.atleast_1d(np.asarray(net_worths, dtype=np.float64))
+        cash = np.atleast_1d(np.asarray(cash, dtype=np.float64))
+        if out is None:
+            out = np.empty((len(net_worths), self.size), dtype=np.float32)
+        out[:, :self.n_market] = market
+        out[:, self.n_market] = net_worths
+        out[:, self.n_market + 1] = fraction_in_crypto(cash, net_worths)
+        return out
@@ -0,0 +1,221 @@
+import os
+import time
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import metrics
+from config import (
+    MODEL_SAVE_PATH,
+    RL_ALGO,
+    MAX_DRAWDOWN_PERCENT,
+    ONLINE_TRAIN_INTERVAL_SECONDS,
+    ONLINE_TRAIN_TIMESTEPS,
+    ONLINE_TRAIN_WINDOW_DAYS,
+    ONLINE_HOLDOUT_BARS,
+    ONLINE_MIN_SHARPE_IMPROVEMENT,
+    ONLINE_TRAIN_NICE,
+    ONLINE_TRAIN_THREADS,
+    ONLINE_TRAIN_CPUS,
+    ONLINE_TRAIN_MAX_MEMORY_MB
+)
+
+MODEL_SWAPS = metrics.counter("model_swaps_total", "Live model replacements by the online trainer")
+TRAIN_ROUNDS = metrics.counter("online_train_rounds_total", "Online fine-tuning rounds by outcome")
+
+
+class ModelRef:
+    """
+    The live policy, replaceable while the trading loop runs. The model
+    and its version are held in one tuple so swap() is a single reference
+    store; each tick calls predict() once, so it sees either the old or
+    the new model, never a mix.
+    """
+
+    def __init__(self, model, version=0):
+        self._current = (model, version)
+
+    @property
+    def model(self):
+        return self._current[0]
+
+    @property
+    def version(self):
+        return self._current[1]
+
+    def swap(self, model, version):
+        self._current = (model, version)
+
+    def predict(self, obs, deterministic=True):
+        model, _version = self._current
+        return model.predict(obs, deterministic=deterministic)
+
+
+def accept_candidate(candidate, current, min_improvement=ONLINE_MIN_SHARPE_IMPROVEMENT,
+                     max_drawdown=MAX_DRAWDOWN_PERCENT):
+    """(accepted, reason) from the holdout backtest stats of both models."""
+    if candidate["max_drawdown"] > max_drawdown:
+        return False, f"holdout drawdown {candidate['max_drawdown']:.1%} over limit"
+    if candidate["sharpe"] < current["sharpe"] + min_improvement:
+        return False, f"holdout sharpe {candidate['sharpe']:.2f} vs live {current['sharpe']:.2f}"
+    return True, f"holdout sharpe {candidate['sharpe']:.2f} vs live {current['sharpe']:.2f}"
+
+
+def fine_tune(spec):
+    """
+    One training round, run in the trainer process: fetch the last
+    `window_days` of candles, continue training the live model on all but
+    the last `holdout_bars`, backtest both models on the holdout and save
+    the candidate to `candidate_path` if it is accepted.
+    """
+    import pandas as pd
+    from data_manager import DataManager
+    from ml_engine import MLEngine
+    from backtester import run_backtest
+
+    dm = DataManager(product_ids=spec["product_ids"])
+    end = pd.Timestamp.utcnow()
+    df = dm.build_multiasset_dataset(end - pd.Timedelta(days=spec["window_days"]), end)
+    holdout_bars = spec["holdout_bars"]
+    if df is None or len(df) < 2 * holdout_bars:
+        return {"accepted": False, "reason": "not enough candles"}
+    train = df.iloc[:-holdout_bars].reset_index(drop=True)
+    holdout = df.iloc[-holdout_bars:].reset_index(drop=True)
+
+    features = dm.feature_names()
+    engine = MLEngine(train, spec["product_ids"], spec["base_path"], algo=spec["algo"], features=features)
+    current_stats = run_backtest(engine.load_model(), holdout, spec["product_ids"], features=features)
+    # Loaded again: fine_tune trains in place
+    candidate = engine.fine_tune(engine.load_model(), spec["timesteps"])
+    candidate_stats = run_backtest(candidate, holdout, spec["product_ids"], features=features)
+    current_stats.pop("equity_curve")
+    candidate_stats.pop("equity_curve")
+
+    accepted, reason = accept_candidate(candidate_stats, current_stats, spec["min_improvement"])
+    if accepted:
+        candidate.save(spec["candidate_path"])
+    return {"accepted": accepted, "reason": reason, "path": spec["candidate_path"],
+            "candidate": candidate_stats, "current": current_stats, "train_rows": len(train)}
+
+
+def _isolate_worker(nice, threads, cpus, max_memory_mb):
+    """Trainer-process initializer: lower priority, cap threads, pin CPUs, bound memory."""
+    if nice:
+        os.nice(nice)
+    if threads:
+        # Read by torch/numpy when they are first imported in this process
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[var] = str(threads)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    if max_memory_mb:
+        import resource
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+class OnlineTrainer:
+    """
+    Periodically fine-tunes the live policy in a separate process and
+    hot-swaps it into a ModelRef when it wins on the holdout.
+
+    Each round runs `job(spec)` (default fine_tune) in a freshly spawned
+    process with its own memory, lowered priority, capped threads and
+    optional CPU pinning and address-space limit, so training never
+    competes with the trading loop for the GIL and its memory is returned
+    when the round ends. The scheduling thread here only waits on the
+    result, loads an accepted model and swaps it in; ticks keep using the
+    previous model until then. Accepted models are also copied over
+    `model_path` so a restart picks up the latest one.
+    """
+
+    def __init__(self, model_ref, product_ids, model_path=MODEL_SAVE_PATH, algo=RL_ALGO,
+                 interval=ONLINE_TRAIN_INTERVAL_SECONDS, timesteps=ONLINE_TRAIN_TIMESTEPS,
+                 window_days=ONLINE_TRAIN_WINDOW_DAYS, holdout_bars=ONLINE_HOLDOUT_BARS,
+                 min_improvement=ONLINE_MIN_SHARPE_IMPROVEMENT, job=fine_tune, loader=None,
+                 nice=ONLINE_TRAIN_NICE, threads=ONLINE_TRAIN_THREADS, cpus=ONLINE_TRAIN_CPUS,
+                 max_memory_mb=ONLINE_TRAIN_MAX_MEMORY_MB, registry=None, base_path=None):
+        self.model_ref = model_ref
+        self.product_ids = list(product_ids)
+        self.model_path = model_path
+        # What the live model was loaded from (e.g. the registry's primary)
+        self.current_path = base_path or model_path
+        self.algo = algo
+        self.interval = interval
+        self.timesteps = timesteps
+        self.window_days = window_days
+        self.holdout_bars = holdout_bars
+        self.min_improvement = min_improvement
+        self.job = job
+        self.loader = loader or self._load
+        self.isolation = (nice, threads, cpus, max_memory_mb)
+        # Optional model_registry.ModelRegistry: accepted models become its primary version
+        self.registry = registry
+        self.history = deque(maxlen=100)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _load(self, path):
+        from ml_engine import MLEngine
+        return MLEngine(None, self.product_ids, path, algo=self.algo).load_model()
+
+    def spec(self):
+        return {
+            "product_ids": self.product_ids,
+            "algo": self.algo,
+            "base_path": self.current_path,
+            "candidate_path": f"{self.model_path}_online_{self.model_ref.version + 1}",
+            "timesteps": self.timesteps,
+            "window_days": self.window_days,
+            "holdout_bars": self.holdout_bars,
+            "min_improvement": self.min_improvement,
+        }
+
+    def run_once(self):
+        """Run one round in a fresh trainer process; returns its result."""
+        started = time.time()
+        executor = ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn"),
+                                       initializer=_isolate_worker, initargs=self.isolation)
+        try:
+            result = executor.submit(self.job, self.spec()).result()
+        finally:
+            executor.shutdown()
+        result["seconds"] = time.time() - started
+        if result.get("accepted"):
+            version = self.model_ref.version + 1
+            self.model_ref.swap(self.loader(result["path"]), version)
+            self.current_path = result["path"]
+            self._promote(result["path"])
+            if self.registry is not None:
+                self.registry.register(result["path"], algo=self.algo, stage="primary",
+                                       metadata={"source": "online", "holdout": result.get("candidate")})
+            MODEL_SWAPS.inc()
+            print(f"Online trainer: swapped in model v{version} ({result.get('reason', '')})")
+        TRAIN_ROUNDS.inc(outcome="accepted" if result.get("accepted") else "rejected")
+        self.history.append(result)
+        return result
+
+    def _promote(self, path):
+        # Copy then rename, so a crash never leaves a half-written model at model_path
+        tmp = f"{self.model_path}.zip.tmp"
+        shutil.copyfile(f"{path}.zip", tmp)
+        os.replace(tmp, f"{self.model_path}.zip")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                metrics.ERRORS.inc(stage="online_train")
+                TRAIN_ROUNDS.inc(outcome="error")
+                print(f"Error in online training round: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="online-trainer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
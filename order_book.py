@@ -0,0 +1,373 @@
+import json
+import time
+import threading
+
+from sortedcontainers import SortedDict
+
+import metrics
+from config import COINBASE_API_KEY, COINBASE_API_SECRET, ORDER_BOOK_STALE_SECONDS, MAX_SLIPPAGE_PERCENT
+
+GAPS = metrics.counter("order_book_gaps_total", "Sequence gaps in the level2 feed")
+RESYNCS = metrics.counter("order_book_resyncs_total", "Re-snapshots of the books after a gap, by source")
+LISTENER_ERRORS = metrics.counter("order_book_listener_errors_total", "Exceptions raised by book listeners")
+
+
+class OrderBook:
+    """
+    Level-2 book for one product: price -> size per side in SortedDicts, so
+    an update is O(log n) and the best bid/ask is an O(1) peek at either end.
+
+    Depth queries walk levels from the touch and stop as soon as the
+    requested amount is filled, so their cost depends on how many levels
+    the order would consume, not on the size of the book. Slippage is
+    measured against the touch (best ask for buys, best bid for sells).
+    """
+
+    def __init__(self, product_id, clock=time.time):
+        self.product_id = product_id
+        self.clock = clock
+        self.bids = SortedDict()
+        self.asks = SortedDict()
+        self.valid = False       # True once a snapshot has been applied
+        self.updated_at = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    def apply_snapshot(self, bids, asks):
+        """Replace the book with (price, size) levels."""
+        with self._lock:
+            self.bids = SortedDict({float(p): float(s) for p, s in bids if float(s) > 0})
+            self.asks = SortedDict({float(p): float(s) for p, s in asks if float(s) > 0})
+            self.valid = True
+            self.updated_at = self.clock()
+
+    def update(self, side, price, size):
+        """Set one level's size ('bid'/'buy' or 'offer'/'ask'/'sell'); size 0 removes it."""
+        price, size = float(price), float(size)
+        with self._lock:
+            levels = self.bids if side in ("bid", "buy") else self.asks
+            if size > 0:
+                levels[price] = size
+            else:
+                levels.pop(price, None)
+            self.updated_at = self.clock()
+
+    def invalidate(self):
+        """Mark the book unusable until the next snapshot (e.g. after a sequence gap)."""
+        self.valid = False
+
+    def is_fresh(self, max_age=ORDER_BOOK_STALE_SECONDS):
+        return (self.valid and self.updated_at is not None
+                and self.clock() - self.updated_at <= max_age
+                and bool(self.bids) and bool(self.asks))
+
+    # ------------------------------------------------------------------
+    # Top of book
+    def best_bid(self):
+        return self.bids.peekitem(-1) if self.bids else None
+
+    def best_ask(self):
+        return self.asks.peekitem(0) if self.asks else None
+
+    def mid(self):
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return (bid[0] + ask[0]) / 2.0
+
+    def spread(self):
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return ask[0] - bid[0]
+
+    # ------------------------------------------------------------------
+    # Depth queries
+    def _walk(self, side):
+        """(price, size) levels a `side` market order consumes, best first."""
+        if side == "buy":
+            for price in self.asks.irange():
+                yield price, self.asks[price]
+        else:
+            for price in self.bids.irange(reverse=True):
+                yield price, self.bids[price]
+
+    def fill(self, side, base=None, quote=None):
+        """
+        Simulate a market order for `base` units or `quote` USD against the
+        book. Returns {filled_base, filled_quote, vwap, slippage, levels,
+        complete}; slippage is vwap relative to the touch (>= 0 is worse).
+        """
+        if (base is None) == (quote is None):
+            raise ValueError("Give exactly one of base or quote")
+        with self._lock:
+            filled_base = filled_quote = 0.0
+            levels = 0
+            touch = None
+            for price, size in self._walk(side):
+                touch = price if touch is None else touch
+                levels += 1
+                if base is not None:
+                    take = min(size, base - filled_base)
+                else:
+                    take = min(size, (quote - filled_quote) / price)
+                filled_base += take
+                filled_quote += take * price
+                if (base is not None and filled_base >= base - 1e-12) or \
+                        (quote is not None and filled_quote >= quote - 1e-9):
+                    break
+        if filled_base <= 0:
+            return {"filled_base": 0.0, "filled_quote": 0.0, "vwap": None, "slippage": None,
+                    "levels": 0, "complete": False}
+        vwap = filled_quote / filled_base
+        wanted = base if base is not None else quote
+        got = filled_base if base is not None else filled_quote
+        return {
+            "filled_base": filled_base,
+            "filled_quote": filled_quote,
+            "vwap": vwap,
+            "slippage": (vwap / touch - 1) if side == "buy" else (1 - vwap / touch),
+            "levels": levels,
+            "complete": got >= wanted * (1 - 1e-9),
+        }
+
+    def max_fill(self, side, max_slippage):
+        """
+        Largest market order whose VWAP stays within `max_slippage` of the
+        touch. Returns (base, quote). Solved exactly inside the last level
+        taken: for a buy with limit L, taking x more at price p keeps
+        (Q + x p) / (B + x) <= L while x <= (L B - Q) / (p - L).
+        """
+        with self._lock:
+            filled_base = filled_quote = 0.0
+            limit = None
+            for price, size in self._walk(side):
+                if limit is None:
+                    limit = price * (1 + max_slippage) if side == "buy" else price * (1 - max_slippage)
+                within = price <= limit if side == "buy" else price >= limit
+                if within:
+                    take = size
+                else:
+                    # Levels past the limit still fit while earlier ones leave VWAP room
+                    room = (limit * filled_base - filled_quote) if side == "buy" else (filled_quote - limit * filled_base)
+                    take = max(0.0, min(size, room / abs(price - limit)))
+                filled_base += take
+                filled_quote += take * price
+                if take < size:
+                    break
+        return filled_base, filled_quote
+
+
+class OrderBooks:
+    """
+    Books for several products fed by the Coinbase Advanced Trade
+    `level2` websocket channel (l2_data snapshot + update events). A gap in
+    sequence_num invalidates every book and asks a background thread to
+    re-snapshot them: level2 is re-subscribed on the feed (fresh snapshots
+    in sequence with later updates), or without a feed each book is loaded
+    from `rest_client`. The websocket client cannot be called from its own
+    callback, hence the thread.
+
+    Listeners added with add_listener() are called as listener(product_id,
+    book) on a separate delivery thread, never on the feed thread, so a
+    listener making REST calls does not hold up the feed. Events are
+    coalesced per product: a product whose book changed several times
+    while listeners were busy is delivered once, with its latest state.
+    A listener that raises is counted and logged; the others still run.
+    """
+
+    def __init__(self, product_ids, clock=time.time, rest_client=None, resync_retry=1.0):
+        self.clock = clock
+        self.books = {pid: OrderBook(pid, clock=clock) for pid in product_ids}
+        self.last_message_at = None
+        self.last_sequence = None
+        self.gaps = 0
+        self.resyncs = 0
+        self.ws = None
+        self.rest_client = rest_client
+        self.resync_retry = resync_retry
+        self.listeners = []
+        self._resync = threading.Event()
+        self._stop = threading.Event()
+        self._resync_thread = None
+        self._pending = {}        # product_id -> book changed since its last delivery
+        self._delivering = False
+        self._deliver = threading.Condition()
+        self._listener_thread = None
+
+    def __getitem__(self, product_id):
+        return self.books[product_id]
+
+    def get(self, product_id):
+        """
+        The product's book if it is usable right now, else None. A quiet
+        book is still fresh while the feed itself is alive (heartbeats).
+        """
+        book = self.books.get(product_id)
+        if book is None or not book.valid or not book.bids or not book.asks:
+            return None
+        last = max(book.updated_at or 0, self.last_message_at or 0)
+        return book if self.clock() - last <= ORDER_BOOK_STALE_SECONDS else None
+
+    def mid(self, product_id):
+        book = self.get(product_id)
+        return book.mid() if book is not None else None
+
+    def max_fill(self, product_id, side, max_slippage=MAX_SLIPPAGE_PERCENT):
+        """(base, quote) of the largest order within `max_slippage`, or None without a fresh book."""
+        book = self.get(product_id)
+        return book.max_fill(side, max_slippage) if book is not None else None
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def on_message(self, message):
+        """WSClient on_message callback (raw JSON string or parsed dict)."""
+        msg = json.loads(message) if isinstance(message, (str, bytes)) else message
+        self.last_message_at = self.clock()
+        sequence = msg.get("sequence_num")
+        if sequence is not None:
+            if self.last_sequence is not None and sequence != self.last_sequence + 1:
+                self.gaps += 1
+                GAPS.inc()
+                for book in self.books.values():
+                    book.invalidate()
+                self._request_resync()
+            self.last_sequence = sequence
+        if msg.get("channel") != "l2_data":
+            return
+
+        for event in msg.get("events", []):
+            book = self.books.get(event.get("product_id"))
+            if book is None:
+                continue
+            updates = event.get("updates", [])
+            if event.get("type") == "snapshot":
+                book.apply_snapshot(
+                    [(u["price_level"], u["new_quantity"]) for u in updates if u["side"] == "bid"],
+                    [(u["price_level"], u["new_quantity"]) for u in updates if u["side"] != "bid"],
+                )
+            elif book.valid:
+                for u in updates:
+                    book.update(u["side"], u["price_level"], u["new_quantity"])
+            if book.valid:
+                self._notify(book)
+
+    # ------------------------------------------------------------------
+    # Listener delivery
+    def _notify(self, book):
+        if not self.listeners:
+            return
+        with self._deliver:
+            self._pending[book.product_id] = book
+            if self._listener_thread is None:
+                self._listener_thread = threading.Thread(target=self._deliver_loop, name="order-book-listeners",
+                                                         daemon=True)
+                self._listener_thread.start()
+            self._deliver.notify()
+
+    def _deliver_loop(self):
+        while True:
+            with self._deliver:
+                while not self._pending and not self._stop.is_set():
+                    self._deliver.wait()
+                if self._stop.is_set():
+                    return
+                pending, self._pending = self._pending, {}
+                self._delivering = True
+            try:
+                for product_id, book in pending.items():
+                    for listener in list(self.listeners):
+                        try:
+                            listener(product_id, book)
+                        except Exception as e:
+                            LISTENER_ERRORS.inc(product_id=product_id)
+                            print(f"Order book listener failed for {product_id}: {e}")
+            finally:
+                with self._deliver:
+                    self._delivering = False
+                    self._deliver.notify_all()
+
+    def wait_idle(self, timeout=5.0):
+        """Block until every book change so far has been delivered to the listeners."""
+        with self._deliver:
+            return self._deliver.wait_for(lambda: not self._pending and not self._delivering, timeout)
+
+    def load_rest_snapshot(self, client, product_id, limit=500):
+        """Seed one book from REST get_product_book (e.g. before the feed is up)."""
+        resp = client.get_product_book(product_id=product_id, limit=limit)
+        pricebook = resp["pricebook"] if isinstance(resp, dict) else resp.pricebook
+        bids = [(level["price"], level["size"]) for level in _levels(pricebook, "bids")]
+        asks = [(level["price"], level["size"]) for level in _levels(pricebook, "asks")]
+        self.books[product_id].apply_snapshot(bids, asks)
+
+    def resync(self):
+        """Re-snapshot every book: re-subscribe level2 on the feed, else load them over REST."""
+        if self.ws is not None:
+            products = list(self.books)
+            self.ws.unsubscribe(product_ids=products, channels=["level2"])
+            self.ws.subscribe(product_ids=products, channels=["level2"])
+            source = "websocket"
+        elif self.rest_client is not None:
+            for product_id in self.books:
+                self.load_rest_snapshot(self.rest_client, product_id)
+            source = "rest"
+        else:
+            return
+        self.resyncs += 1
+        RESYNCS.inc(source=source)
+
+    def _request_resync(self):
+        self._resync.set()
+        if self._resync_thread is None:
+            self._resync_thread = threading.Thread(target=self._resync_loop, name="order-book-resync",
+                                                   daemon=True)
+            self._resync_thread.start()
+
+    def _resync_loop(self):
+        while True:
+            self._resync.wait()
+            if self._stop.is_set():
+                return
+            # Gaps reported while this one is handled are covered by it
+            self._resync.clear()
+            try:
+                self.resync()
+            except Exception as e:
+                metrics.ERRORS.inc(stage="order_book_resync")
+                print(f"Order book re-snapshot failed, retrying: {e}")
+                if self._stop.wait(self.resync_retry):
+                    return
+                self._resync.set()
+
+    def start(self, api_key=COINBASE_API_KEY, api_secret=COINBASE_API_SECRET):
+        """Subscribe to level2 (+ heartbeats) on a background websocket."""
+        from coinbase.websocket import WSClient
+        self.ws = WSClient(api_key=api_key, api_secret=api_secret, on_message=self.on_message,
+                           on_open=self._on_open, retry=True)
+        self.ws.open()
+        # WSClient re-subscribes by itself after a reconnect
+        self.ws.subscribe(product_ids=list(self.books), channels=["level2", "heartbeats"])
+        return self
+
+    def _on_open(self):
+        # Every (re)connection starts a new sequence and sends fresh snapshots
+        self.last_sequence = None
+
+    def stop(self):
+        self._stop.set()
+        self._resync.set()
+        with self._deliver:
+            self._deliver.notify_all()
+        if self.ws is not None:
+            self.ws.close()
+
+
+def _levels(pricebook, side):
+    levels = pricebook[side] if isinstance(pricebook, dict) else getattr(pricebook, side)
+    return [lvl if isinstance(lvl, dict) else {"price": lvl.price, "size": lvl.size} for lvl in levels]
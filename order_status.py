@@ -0,0 +1,124 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from config import ORDER_FILL_TIMEOUT_SECONDS, ORDER_FILL_POLL_SECONDS, ORDER_FILL_WORKERS
+
+# get_order statuses after which filled_size no longer changes
+TERMINAL_STATUSES = ("FILLED", "CANCELLED", "EXPIRED", "FAILED")
+
+
+def accepted_order_id(resp):
+    """
+    Order id from a CreateOrderResponse dict, or None if the order was not
+    accepted. Coinbase reports rejections as {"success": False,
+    "error_response": {...}} with no "error" key, so `success` is checked too.
+    """
+    if not isinstance(resp, dict) or "error" in resp or not resp.get("success", True):
+        return None
+    return (resp.get("success_response") or {}).get("order_id") or resp.get("order_id")
+
+
+def order_error(resp):
+    """Why an order was not accepted, for logs and the ledger (None if it was)."""
+    if accepted_order_id(resp) is not None:
+        return None
+    if not isinstance(resp, dict):
+        return f"unexpected response {resp!r}"
+    if "error" in resp:
+        return str(resp["error"])
+    details = resp.get("error_response") or {}
+    return str(details.get("message") or details.get("error") or resp.get("failure_reason") or "order not accepted")
+
+
+def wait_for_fill(client, order_id, timeout=ORDER_FILL_TIMEOUT_SECONDS, poll=ORDER_FILL_POLL_SECONDS):
+    """
+    Poll client.get_order until the order reaches a terminal status or
+    `timeout` seconds pass. Returns the last status dict ({status,
+    filled_size, average_filled_price, ...}) with "terminal" set, or the
+    error dict if the status could not be read at all.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get_order(order_id)
+        if not isinstance(status, dict):
+            status = {"error": f"unexpected order status {status!r}"}
+        if "error" not in status:
+            status["terminal"] = str(status.get("status", "")).upper() in TERMINAL_STATUSES
+            if status["terminal"]:
+                return status
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return status
+        time.sleep(min(poll, remaining))
+
+
+def filled(status, order_id=None):
+    """
+    (size, average_price, fee) of a wait_for_fill status, or None if nothing
+    filled or the status could not be read.
+    """
+    if "error" in status:
+        print(f"Could not read fill of order {order_id}: {status['error']}")
+        return None
+    if not status.get("terminal"):
+        print(f"Order {order_id} still {status.get('status')}; recording the fill so far")
+    size = float(status.get("filled_size") or 0)
+    if size <= 0:
+        return None
+    return size, float(status["average_filled_price"]), float(status.get("fee") or 0)
+
+
+class FillReconciler:
+    """
+    Reads back what accepted orders filled without holding up the trading
+    thread. submit() returns at once; a pool of `workers` threads runs
+    wait_for_fill for many orders concurrently and passes each final status
+    to its callback (which records the fill). resolve() polls a batch
+    concurrently and waits, for callers that need the fills before going on.
+    """
+
+    def __init__(self, workers=ORDER_FILL_WORKERS, timeout=ORDER_FILL_TIMEOUT_SECONDS,
+                 poll=ORDER_FILL_POLL_SECONDS):
+        self.timeout = timeout
+        self.poll = poll
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fills")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, client, order_id, callback):
+        future = self._pool.submit(self._resolve, client, order_id, callback)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _resolve(self, client, order_id, callback):
+        status = wait_for_fill(client, order_id, self.timeout, self.poll)
+        try:
+            callback(status)
+        except Exception as e:
+            print(f"Error recording fill of order {order_id}: {e}")
+        return status
+
+    def resolve(self, orders):
+        """wait_for_fill for every (client, order_id) at once; statuses in the same order."""
+        futures = [self._pool.submit(wait_for_fill, client, order_id, self.timeout, self.poll)
+                   for client, order_id in orders]
+        return [future.result() for future in futures]
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def join(self, timeout=None):
+        """Wait until every submitted order has been resolved; False on timeout."""
+        with self._lock:
+            futures = list(self._pending)
+        _done, not_done = wait(futures, timeout=timeout)
+        return not not_done
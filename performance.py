@@ -0,0 +1,347 @@
+import time
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from config import PERFORMANCE_CHART_POINTS, PERFORMANCE_MAX_CHART_POINTS, PERFORMANCE_WARM_MARKS
+from order_status import accepted_order_id, order_error
+from trade_ledger import get_trade_ledger
+
+
+def lttb(t, v, n):
+    """
+    Largest-Triangle-Three-Buckets downsampling of (t, v) to `n` points.
+    Keeps the first and last point; from each bucket in between keeps the
+    point forming the largest triangle with the previously kept point and
+    the mean of the next bucket.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    if n >= len(t) or n < 3:
+        return t, v
+    edges = np.linspace(1, len(t) - 1, n - 1).astype(np.int64)
+    keep = np.empty(n, dtype=np.int64)
+    keep[0], keep[-1] = 0, len(t) - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else len(t)
+        avg_t, avg_v = t[nlo:nhi].mean(), v[nlo:nhi].mean()
+        area = np.abs((t[a] - avg_t) * (v[lo:hi] - v[a]) - (t[a] - t[lo:hi]) * (avg_v - v[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return t[keep], v[keep]
+
+
+class SeriesPyramid:
+    """
+    Append-only time series kept at every power-of-two decimation.
+
+    Level k holds one bucket per 2**k raw points, each bucket storing its
+    min and max point, so peaks and troughs survive any level. Appends cost
+    amortized O(1). series(max_points) reads from the coarsest level that
+    still has enough buckets, so its cost depends on `max_points`, not on
+    the length of the history.
+    """
+
+    def __init__(self):
+        # level -> list of (t_min, v_min, t_max, v_max)
+        self.levels = [[]]
+        self.count = 0
+
+    def append(self, t, v):
+        bucket = (t, v, t, v)
+        level = 0
+        while True:
+            self.levels[level].append(bucket)
+            if len(self.levels[level]) % 2:
+                break
+            a, b = self.levels[level][-2], self.levels[level][-1]
+            bucket = (a[0], a[1]) if a[1] <= b[1] else (b[0], b[1])
+            bucket += (a[2], a[3]) if a[3] >= b[3] else (b[2], b[3])
+            level += 1
+            if level == len(self.levels):
+                self.levels.append([])
+        self.count += 1
+
+    def series(self, max_points):
+        """(t, v) arrays with at most about 4 * max_points points, in time order."""
+        level = 0
+        while level + 1 < len(self.levels) and 2 * len(self.levels[level]) > 4 * max_points:
+            level += 1
+        # Buckets of the chosen level, then the trailing bucket of each finer
+        # level that has not been merged upward yet
+        buckets = list(self.levels[level])
+        for finer in range(level - 1, -1, -1):
+            if len(self.levels[finer]) % 2:
+                buckets.append(self.levels[finer][-1])
+        points = []
+        for t_min, v_min, t_max, v_max in buckets:
+            if t_min == t_max:
+                points.append((t_min, v_min))
+            else:
+                points.extend(sorted(((t_min, v_min), (t_max, v_max))))
+        if not points:
+            return np.empty(0), np.empty(0)
+        t, v = zip(*points)
+        return np.array(t), np.array(v)
+
+
+class PerformanceAggregate:
+    """
+    One wallet's running performance, updated per event:
+
+      - realized PnL, trade count, volume and win rate of closing trades
+        from ledger fill rows (apply_fill), whose realized PnL the ledger
+        has already computed against its average-cost positions
+      - positions with their cost basis, as the ledger rolls them up
+        (set_positions)
+      - equity curve and unrealized PnL from periodic marks (mark)
+
+    summary() and chart() never scan the trade history: summary reads the
+    running totals and chart() downsamples a bounded slice of the
+    SeriesPyramid, cached until the next event changes `version`.
+    """
+
+    def __init__(self, wallet):
+        self.wallet = wallet
+        self.positions = {}   # symbol -> {"amount", "cost"}
+        self.realized_pnl = 0.0
+        self.fees = 0.0
+        self.volume = 0.0
+        self.trade_count = 0
+        self.wins = 0
+        self.closing_trades = 0
+        self.equity = 0.0
+        self.cash = 0.0
+        self.prices = {}
+        self.curve = SeriesPyramid()
+        self.version = 0
+        self._charts = {}     # points -> (version, chart)
+
+    def load_totals(self, totals):
+        """Start from TradeLedger.totals() instead of replaying the fills they sum."""
+        self.realized_pnl = float(totals["realized_pnl"])
+        self.fees = float(totals["fees"])
+        self.volume = float(totals["volume"])
+        self.trade_count = int(totals["trades"])
+        self.closing_trades = int(totals["closing_trades"])
+        self.wins = int(totals["wins"])
+        self.version += 1
+
+    def set_positions(self, positions):
+        """TradeLedger.positions() rows: [{product_id, amount, cost}]."""
+        self.positions = {p["product_id"].split("-")[0]: {"amount": p["amount"], "cost": p["cost"]}
+                          for p in positions if p["amount"] > 1e-12}
+        self.version += 1
+
+    def apply_fill(self, fill):
+        """fill: a ledger fills row {product_id, side, size, price, fee, realized_pnl}."""
+        symbol = fill["product_id"].split("-")[0]
+        size, price, fee = float(fill["size"]), float(fill["price"]), float(fill.get("fee", 0.0))
+        if fill["side"] != "buy":
+            pnl = float(fill.get("realized_pnl", 0.0))
+            self.realized_pnl += pnl
+            self.closing_trades += 1
+            self.wins += pnl > 0
+        self.prices[symbol] = price
+        self.fees += fee
+        self.volume += size * price
+        self.trade_count += 1
+        self.version += 1
+
+    def mark(self, timestamp, equity, cash=None, prices=None):
+        """Record account value at `timestamp` (epoch seconds) and latest prices."""
+        self.equity = float(equity)
+        if cash is not None:
+            self.cash = float(cash)
+        for pid, price in (prices or {}).items():
+            self.prices[pid.split("-")[0]] = float(price)
+        self.curve.append(float(timestamp), self.equity)
+        self.version += 1
+
+    def unrealized_pnl(self):
+        return sum(
+            p["amount"] * self.prices.get(symbol, 0.0) - p["cost"]
+            for symbol, p in self.positions.items()
+        )
+
+    def summary(self):
+        unrealized = self.unrealized_pnl()
+        return {
+            "positions": [{"symbol": s, "amount": p["amount"]} for s, p in sorted(self.positions.items())],
+            "pnl": self.realized_pnl + unrealized,
+            "realizedPnl": self.realized_pnl,
+            "unrealizedPnl": unrealized,
+            "balance": self.equity,
+            "cash": self.cash,
+            "tradeCount": self.trade_count,
+            "volume": self.volume,
+            "fees": self.fees,
+            "winRate": self.wins / self.closing_trades if self.closing_trades else None,
+        }
+
+    def chart(self, points=PERFORMANCE_CHART_POINTS):
+        """Equity curve as chart.js line data, at most `points` points."""
+        cached = self._charts.get(points)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        t, v = lttb(*self.curve.series(points), points)
+        chart = {
+            "labels": [datetime.fromtimestamp(x, tz=timezone.utc).isoformat() for x in t],
+            "datasets": [{"label": "Equity (USD)", "data": [round(float(x), 2) for x in v]}],
+        }
+        self._charts[points] = (self.version, chart)
+        return chart
+
+
+def chart_points(points):
+    """Clamp a requested series length to [3, PERFORMANCE_MAX_CHART_POINTS]."""
+    return max(3, min(int(points), PERFORMANCE_MAX_CHART_POINTS))
+
+
+class PerformanceStore:
+    """
+    Per-wallet aggregates over the trade ledger, which the trader runtime
+    writes every fill and equity mark to.
+
+    The first read of a wallet starts from the ledger's rollups (totals,
+    positions and the last `warm_marks` equity marks, TradeLedger.rollup),
+    so a restarted worker does not replay the wallet's whole history.
+    Before each read the fills and marks written since are applied (one
+    range scan per table by row id), so every API worker follows the same
+    shared ledger without consuming a queue, and a wallet's ETag, built
+    from the last fill and mark ids applied, is the same on every worker
+    and across restarts.
+    """
+
+    def __init__(self, ledger=None, batch=10000, warm_marks=PERFORMANCE_WARM_MARKS):
+        self.ledger = ledger
+        self.batch = batch
+        self.warm_marks = warm_marks
+        self.aggregates = {}
+        self.cursors = {}     # wallet -> (last fill id, last mark id) applied
+        self._lock = threading.Lock()
+
+    def get(self, wallet):
+        return self.aggregates.get(wallet)
+
+    def apply(self, event):
+        wallet = event["wallet"]
+        with self._lock:
+            aggregate = self.aggregates.get(wallet)
+            if aggregate is None:
+                aggregate = self.aggregates[wallet] = PerformanceAggregate(wallet)
+            if event["type"] == "fill":
+                aggregate.apply_fill(event)
+            elif event["type"] == "mark":
+                aggregate.mark(event["time"], event["equity"], event.get("cash"), event.get("prices"))
+
+    def sync(self, wallet):
+        """Apply the wallet's ledger rows written since the last sync; returns the number applied."""
+        if self.ledger is None:
+            return 0
+        applied = 0
+        with self._lock:
+            if wallet not in self.cursors:
+                applied += self._warm(wallet)
+            fill_id, mark_id = self.cursors[wallet]
+            while True:
+                fills, marks = self.ledger.changes(wallet, fill_id, mark_id, self.batch)
+                if not fills and not marks:
+                    break
+                events = [dict(f, type="fill") for f in fills] + [dict(m, type="mark") for m in marks]
+                # Marks and fills interleave; the equity curve needs time order
+                events.sort(key=lambda e: e["time"])
+                aggregate = self.aggregates.get(wallet)
+                if aggregate is None:
+                    aggregate = self.aggregates[wallet] = PerformanceAggregate(wallet)
+                for event in events:
+                    if event["type"] == "fill":
+                        aggregate.apply_fill(event)
+                    else:
+                        aggregate.mark(event["time"], event["equity"], event["cash"], event["prices"])
+                if fills:
+                    # Cost basis as the ledger computed it for these fills
+                    aggregate.set_positions(self.ledger.positions(wallet))
+                fill_id = fills[-1]["id"] if fills else fill_id
+                mark_id = marks[-1]["id"] if marks else mark_id
+                applied += len(events)
+            self.cursors[wallet] = (fill_id, mark_id)
+        return applied
+
+    def _warm(self, wallet):
+        """Aggregate for a wallet not seen yet, from the ledger's rollups; returns the marks loaded."""
+        rollup = self.ledger.rollup(wallet, self.warm_marks)
+        aggregate = self.aggregates[wallet] = PerformanceAggregate(wallet)
+        aggregate.load_totals(rollup["totals"])
+        aggregate.set_positions(rollup["positions"])
+        # Latest prices as replaying would leave them: the last fill or mark, whichever is newer
+        events = [dict(f, type="fill") for f in rollup["last_fills"]] + [dict(m, type="mark") for m in rollup["marks"]]
+        for event in sorted(events, key=lambda e: e["time"]):
+            if event["type"] == "fill":
+                aggregate.prices[event["product_id"].split("-")[0]] = float(event["price"])
+            else:
+                aggregate.mark(event["time"], event["equity"], event["cash"], event["prices"])
+        self.cursors[wallet] = (rollup["fill_id"], rollup["mark_id"])
+        return len(rollup["marks"])
+
+    def etag(self, wallet, kind, points=0):
+        if self.ledger is None:
+            aggregate = self.aggregates.get(wallet)
+            fill_id, mark_id = 0, aggregate.version if aggregate is not None else 0
+        else:
+            fill_id, mark_id = self.cursors.get(wallet, (0, 0))
+        return f'"{kind}-{fill_id}-{mark_id}-{points}"'
+
+    def summary(self, wallet):
+        aggregate = self.aggregates.get(wallet)
+        if aggregate is None:
+            return {"positions": [], "pnl": 0.0, "balance": 0.0, "tradeCount": 0}
+        with self._lock:
+            return aggregate.summary()
+
+    def chart(self, wallet, points=PERFORMANCE_CHART_POINTS):
+        points = chart_points(points)
+        aggregate = self.aggregates.get(wallet)
+        if aggregate is None:
+            return {"labels": [], "datasets": [{"label": "Equity (USD)", "data": []}]}
+        with self._lock:
+            return aggregate.chart(points)
+
+
+def fill_event(wallet, product_id, side, size, price, fee=0.0, timestamp=None):
+    return {"type": "fill", "wallet": wallet, "product_id": product_id, "side": side,
+            "size": float(size), "price": float(price), "fee": float(fee),
+            "time": timestamp if timestamp is not None else time.time()}
+
+
+def order_event(wallet, order, result, timestamp=None):
+    """An order and whether the exchange accepted it, for the websocket feed."""
+    order_id = accepted_order_id(result)
+    return {"type": "order", "wallet": wallet, "product_id": order["product_id"], "side": order["side"],
+            "funds": order.get("funds"), "size": order.get("size"), "order_id": order_id,
+            "status": "accepted" if order_id is not None else "rejected",
+            "error": order_error(result),
+            "time": timestamp if timestamp is not None else time.time()}
+
+
+def mark_event(wallet, equity, cash=None, prices=None, timestamp=None):
+    return {"type": "mark", "wallet": wallet, "equity": float(equity),
+            "cash": None if cash is None else float(cash), "prices": prices or {},
+            "time": timestamp if timestamp is not None else time.time()}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_performance_store():
+    """Process-wide PerformanceStore over the shared trade ledger."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PerformanceStore(get_trade_ledger())
+    return _store
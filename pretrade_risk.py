@@ -0,0 +1,322 @@
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+import metrics
+from config import (
+    MAX_POSITION_PERCENT,
+    MAX_DRAWDOWN_PERCENT,
+    MAX_ORDER_NOTIONAL,
+    MAX_ORDERS_PER_MINUTE,
+    PRICE_BAND_PERCENT,
+    PRETRADE_LATENCY_BUDGET_US,
+    PRETRADE_PORTFOLIO_REFRESH_SECONDS
+)
+
+class PreTradeRiskGate:
+    """
+    In-memory checks run before any order reaches the exchange:
+
+      - drawdown kill switch (only risk-reducing sells pass once tripped)
+      - max order notional
+      - max position as a fraction of net worth
+      - max orders per rolling minute
+      - fat-finger band: an order's price must be within PRICE_BAND_PERCENT
+        of the last reference price for the product
+
+    All state (reference prices, positions, net worth, recent order times)
+    is kept in plain dicts/deques and fed by the caller, so a check does no
+    I/O. Check latency is measured and compared against a budget.
+
+    An order that passes reserves its rate-limit slot and projected
+    position; release() gives them back when the exchange call fails or
+    the order is rejected. The live loop feeds prices and the portfolio
+    every tick; other processes call start(client) to have balances
+    re-read in the background (sync_portfolio).
+    """
+
+    def __init__(self, max_position_percent=MAX_POSITION_PERCENT, max_drawdown=MAX_DRAWDOWN_PERCENT,
+                 max_order_notional=MAX_ORDER_NOTIONAL, max_orders_per_minute=MAX_ORDERS_PER_MINUTE,
+                 price_band=PRICE_BAND_PERCENT, latency_budget_us=PRETRADE_LATENCY_BUDGET_US,
+                 clock=time.monotonic):
+        self.max_position_percent = max_position_percent
+        self.max_drawdown = max_drawdown
+        self.max_order_notional = max_order_notional
+        self.max_orders_per_minute = max_orders_per_minute
+        self.price_band = price_band
+        self.latency_budget_ns = latency_budget_us * 1000
+        self.clock = clock
+
+        self.prices = {}      # product_id -> reference price
+        self.price_times = {}  # product_id -> clock() when the price was set
+        self.positions = {}   # product_id -> base units held
+        self.positions_version = 0   # bumped whenever positions are replaced
+        self.net_worth = None
+        self.peak_net_worth = None
+        self.killed = False
+        self.order_times = deque()
+
+        self.latencies_ns = deque(maxlen=10000)
+        self.budget_breaches = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # State updates
+    def update_price(self, product_id, price):
+        self.prices[product_id] = float(price)
+        self.price_times[product_id] = self.clock()
+
+    def has_price(self, product_id, max_age=None):
+        """Whether there is a reference price, set within `max_age` seconds if given."""
+        if product_id not in self.prices:
+            return False
+        if max_age is None:
+            return True
+        set_at = self.price_times.get(product_id)
+        return set_at is not None and self.clock() - set_at <= max_age
+
+    def update_portfolio(self, net_worth, positions=None):
+        """Latest net worth (USD) and, optionally, base-unit positions per product."""
+        self.net_worth = float(net_worth)
+        if self.peak_net_worth is None or self.net_worth > self.peak_net_worth:
+            self.peak_net_worth = self.net_worth
+        if self.peak_net_worth > 0 and 1 - self.net_worth / self.peak_net_worth > self.max_drawdown:
+            self.killed = True
+        if positions is not None:
+            self.positions = {pid: float(amount) for pid, amount in positions.items()}
+            self.positions_version += 1
+
+    def sync_portfolio(self, client):
+        """
+        update_portfolio from the client's balances. The reference price of
+        every held product is re-read on each sync (client.get_current_price:
+        the local book's mid when fresh, else REST); if that fails the last
+        price is kept, and currencies with no price at all are left out.
+        Returns the net worth, or None if balances failed.
+        """
+        balances = client.get_account_balances()
+        if isinstance(balances, dict) or any("error" in b for b in balances):
+            return None
+        net_worth = 0.0
+        positions = {}
+        for b in balances:
+            amount = float(b["balance"])
+            if b["currency"] == "USD":
+                net_worth += amount
+                continue
+            product_id = f"{b['currency']}-USD"
+            px = client.get_current_price(product_id)
+            if not isinstance(px, dict):
+                self.update_price(product_id, px)
+            elif product_id not in self.prices:
+                continue
+            positions[product_id] = amount
+            net_worth += amount * self.prices[product_id]
+        self.update_portfolio(net_worth, positions)
+        return net_worth
+
+    def _run(self, client):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.sync_portfolio(client)
+            except Exception as e:
+                metrics.ERRORS.inc(stage="pretrade_portfolio")
+                print(f"Error refreshing pre-trade portfolio: {e}")
+
+    def start(self, client, refresh_interval=PRETRADE_PORTFOLIO_REFRESH_SECONDS):
+        """
+        Sync the portfolio now, then every `refresh_interval` seconds on a
+        daemon thread. Calls after the first are no-ops.
+        """
+        if self._thread is not None:
+            return self
+        self.refresh_interval = refresh_interval
+        try:
+            self.sync_portfolio(client)
+        except Exception as e:
+            metrics.ERRORS.inc(stage="pretrade_portfolio")
+            print(f"Pre-trade portfolio unavailable: {e}")
+        self._thread = threading.Thread(target=self._run, args=(client,), name="pretrade-portfolio", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def reset_kill_switch(self):
+        """Manually re-arm trading after a drawdown stop (also resets the peak)."""
+        self.killed = False
+        self.peak_net_worth = self.net_worth
+
+    # ------------------------------------------------------------------
+    # Checks
+    def _evaluate(self, order, positions, order_count, now):
+        """
+        Core check against the given (possibly projected) state.
+        Returns (ok, reason, notional, base_size).
+        """
+        product_id = order["product_id"]
+        side = order["side"].lower()
+        funds = order.get("funds")
+        size = order.get("size")
+        ref = self.prices.get(product_id)
+        price = order.get("price")
+
+        if price is not None and ref:
+            if abs(float(price) / ref - 1.0) > self.price_band:
+                return False, f"price {price} outside {self.price_band:.1%} band around {ref}", 0.0, 0.0
+        px = float(price) if price is not None else ref
+
+        if funds is not None:
+            notional = float(funds)
+            base_size = notional / px if px else None
+        elif px:
+            base_size = float(size)
+            notional = base_size * px
+        else:
+            return False, f"no reference price for {product_id}", 0.0, 0.0
+
+        if self.killed:
+            held = positions.get(product_id, 0.0)
+            if side != "sell" or base_size is None or base_size > held + 1e-12:
+                return False, "drawdown kill switch active", notional, base_size or 0.0
+
+        if notional > self.max_order_notional:
+            return False, f"notional {notional:.2f} exceeds max {self.max_order_notional:.2f}", notional, base_size or 0.0
+
+        if side == "buy" and self.net_worth and px:
+            new_value = (positions.get(product_id, 0.0) + (base_size or 0.0)) * px
+            if new_value > self.max_position_percent * self.net_worth:
+                return False, (f"position in {product_id} would be {new_value / self.net_worth:.1%} "
+                               f"of net worth (max {self.max_position_percent:.1%})"), notional, base_size or 0.0
+
+        if order_count >= self.max_orders_per_minute:
+            return False, f"order rate limit of {self.max_orders_per_minute}/min reached", notional, base_size or 0.0
+
+        return True, None, notional, base_size or 0.0
+
+    def _recent_order_count(self, now):
+        cutoff = now - 60.0
+        while self.order_times and self.order_times[0] < cutoff:
+            self.order_times.popleft()
+        return len(self.order_times)
+
+    def _record_latency(self, start_ns, n_orders=1):
+        elapsed = time.perf_counter_ns() - start_ns
+        self.latencies_ns.append(elapsed / n_orders)
+        if elapsed > self.latency_budget_ns * n_orders:
+            self.budget_breaches += 1
+
+    def reserve(self, product_id, side, funds=None, size=None, price=None):
+        """
+        Check a single order. If it passes, it is counted against the rate
+        limit and the projected position. Returns (ok, reason, reservation);
+        pass the reservation to release() if the order is not placed.
+        """
+        start = time.perf_counter_ns()
+        reservation = None
+        with self._lock:
+            now = self.clock()
+            order = {"product_id": product_id, "side": side, "funds": funds, "size": size, "price": price}
+            ok, reason, _notional, base_size = self._evaluate(
+                order, self.positions, self._recent_order_count(now), now
+            )
+            if ok:
+                reservation = self._commit(product_id, side, base_size, now)
+        self._record_latency(start)
+        return ok, reason, reservation
+
+    def check(self, product_id, side, funds=None, size=None, price=None):
+        """reserve() without the reservation: (ok, reason)."""
+        return self.reserve(product_id, side, funds, size, price)[:2]
+
+    def reserve_batch(self, orders, atomic=False):
+        """
+        Check a list of order dicts (product_id, side, funds/size, price) in
+        one pass, each against the state projected by the orders before it,
+        so a multi-order rebalance cannot exceed limits in aggregate.
+
+        With atomic=True nothing is committed unless every order passes.
+        Returns a list of (ok, reason, reservation).
+        """
+        start = time.perf_counter_ns()
+        results = []
+        with self._lock:
+            now = self.clock()
+            positions = dict(self.positions)
+            count = self._recent_order_count(now)
+            accepted = []
+            for order in orders:
+                ok, reason, _notional, base_size = self._evaluate(order, positions, count, now)
+                results.append((ok, reason))
+                if ok:
+                    delta = base_size if order["side"].lower() == "buy" else -base_size
+                    positions[order["product_id"]] = positions.get(order["product_id"], 0.0) + delta
+                    count += 1
+                    accepted.append((order["product_id"], order["side"], base_size))
+
+            if atomic and not all(ok for ok, _ in results):
+                results = [(False, reason or "batch rejected", None) for _ok, reason in results]
+            else:
+                reservations = iter([self._commit(product_id, side, base_size, now)
+                                     for product_id, side, base_size in accepted])
+                results = [(ok, reason, next(reservations) if ok else None) for ok, reason in results]
+        self._record_latency(start, max(1, len(orders)))
+        return results
+
+    def check_batch(self, orders, atomic=False):
+        """reserve_batch() without the reservations: a list of (ok, reason)."""
+        return [(ok, reason) for ok, reason, _reservation in self.reserve_batch(orders, atomic)]
+
+    def _commit(self, product_id, side, base_size, now):
+        delta = base_size if side.lower() == "buy" else -base_size
+        self.positions[product_id] = self.positions.get(product_id, 0.0) + delta
+        self.order_times.append(now)
+        return product_id, delta, now, self.positions_version
+
+    def release(self, reservation):
+        """Undo a reservation whose order failed or was rejected by the exchange."""
+        if reservation is None:
+            return
+        product_id, delta, now, version = reservation
+        with self._lock:
+            if version == self.positions_version:
+                # Positions read since then never included this order
+                self.positions[product_id] = self.positions.get(product_id, 0.0) - delta
+            try:
+                self.order_times.remove(now)
+            except ValueError:
+                pass  # already outside the rate-limit window
+
+    def latency_stats(self):
+        """Per-order check latency in microseconds."""
+        if not self.latencies_ns:
+            return {"count": 0, "p50_us": 0.0, "p99_us": 0.0, "max_us": 0.0,
+                    "budget_us": self.latency_budget_ns / 1000, "budget_breaches": 0}
+        lat = np.fromiter(self.latencies_ns, dtype=np.float64) / 1000.0
+        return {
+            "count": len(lat),
+            "p50_us": float(np.percentile(lat, 50)),
+            "p99_us": float(np.percentile(lat, 99)),
+            "max_us": float(lat.max()),
+            "budget_us": self.latency_budget_ns / 1000,
+            "budget_breaches": self.budget_breaches,
+        }
+
+
+_default_gate = None
+_default_gate_lock = threading.Lock()
+
+
+def get_risk_gate():
+    """Process-wide gate shared by every order path of the house account."""
+    global _default_gate
+    if _default_gate is None:
+        with _default_gate_lock:
+            if _default_gate is None:
+                _default_gate = PreTradeRiskGate()
+    return _default_gate
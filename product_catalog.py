@@ -0,0 +1,261 @@
+import time
+import threading
+from decimal import Decimal, ROUND_DOWN, ROUND_UP
+
+import numpy as np
+
+import metrics
+from config import PRODUCT_CATALOG_REFRESH_SECONDS
+
+# Used for every product until the catalog is loaded (tests, replay, paper
+# trading): the limits the trading loop used to hard-code
+DEFAULT_BASE_INCREMENT = "0.000001"
+DEFAULT_QUOTE_INCREMENT = "0.01"
+DEFAULT_PRICE_INCREMENT = "0.01"
+DEFAULT_BASE_MIN_SIZE = 0.0001
+DEFAULT_QUOTE_MIN_SIZE = 5.0
+
+REJECTIONS = metrics.counter("catalog_rejections_total", "Orders rejected by product metadata checks, by product")
+
+
+def _quantize(value, step, rounding):
+    """`value` to a multiple of `step` (Decimal); repr() keeps 0.29 from becoming 0.2899..."""
+    return float((Decimal(repr(float(value))) / step).to_integral_value(rounding) * step)
+
+
+def _float(value, default=None):
+    return float(value) if value not in (None, "") else default
+
+
+class Product:
+    """Order rules of one product: increments, size limits and trading status."""
+
+    __slots__ = ("product_id", "base_increment", "quote_increment", "price_increment",
+                 "base_min_size", "base_max_size", "quote_min_size", "quote_max_size",
+                 "status", "trading_disabled", "cancel_only", "limit_only", "post_only")
+
+    def __init__(self, product_id, base_increment=DEFAULT_BASE_INCREMENT, quote_increment=DEFAULT_QUOTE_INCREMENT,
+                 price_increment=DEFAULT_PRICE_INCREMENT, base_min_size=DEFAULT_BASE_MIN_SIZE, base_max_size=None,
+                 quote_min_size=DEFAULT_QUOTE_MIN_SIZE, quote_max_size=None, status="online",
+                 trading_disabled=False, cancel_only=False, limit_only=False, post_only=False):
+        self.product_id = product_id
+        self.base_increment = Decimal(str(base_increment))
+        self.quote_increment = Decimal(str(quote_increment))
+        self.price_increment = Decimal(str(price_increment))
+        self.base_min_size = float(base_min_size)
+        self.base_max_size = float(base_max_size) if base_max_size else float("inf")
+        self.quote_min_size = float(quote_min_size)
+        self.quote_max_size = float(quote_max_size) if quote_max_size else float("inf")
+        self.status = status
+        self.trading_disabled = bool(trading_disabled)
+        self.cancel_only = bool(cancel_only)
+        self.limit_only = bool(limit_only)
+        self.post_only = bool(post_only)
+
+    @classmethod
+    def from_dict(cls, row):
+        """From a Coinbase product (get_products) as a dict of strings."""
+        return cls(
+            row["product_id"],
+            base_increment=row.get("base_increment") or DEFAULT_BASE_INCREMENT,
+            quote_increment=row.get("quote_increment") or DEFAULT_QUOTE_INCREMENT,
+            price_increment=row.get("price_increment") or row.get("quote_increment") or DEFAULT_PRICE_INCREMENT,
+            base_min_size=_float(row.get("base_min_size"), 0.0),
+            base_max_size=_float(row.get("base_max_size")),
+            quote_min_size=_float(row.get("quote_min_size"), 0.0),
+            quote_max_size=_float(row.get("quote_max_size")),
+            status=row.get("status") or "online",
+            trading_disabled=row.get("trading_disabled") or row.get("is_disabled"),
+            cancel_only=row.get("cancel_only"),
+            limit_only=row.get("limit_only"),
+            post_only=row.get("post_only"),
+        )
+
+    def to_dict(self):
+        """The product as a Coinbase product dict; from_dict() gives it back."""
+        return {
+            "product_id": self.product_id,
+            "base_increment": str(self.base_increment),
+            "quote_increment": str(self.quote_increment),
+            "price_increment": str(self.price_increment),
+            "base_min_size": self.base_min_size,
+            "base_max_size": None if self.base_max_size == float("inf") else self.base_max_size,
+            "quote_min_size": self.quote_min_size,
+            "quote_max_size": None if self.quote_max_size == float("inf") else self.quote_max_size,
+            "status": self.status,
+            "trading_disabled": self.trading_disabled,
+            "cancel_only": self.cancel_only,
+            "limit_only": self.limit_only,
+            "post_only": self.post_only,
+        }
+
+    # ------------------------------------------------------------------
+    # Quantization
+    def size(self, value, rounding=ROUND_DOWN):
+        """Base units on the product's base increment (rounded down: never more than asked)."""
+        return _quantize(value, self.base_increment, rounding)
+
+    def funds(self, value, rounding=ROUND_DOWN):
+        """Quote funds on the product's quote increment."""
+        return _quantize(value, self.quote_increment, rounding)
+
+    def price(self, value, side):
+        """Limit price on the price increment, rounded away from the market (buys down, sells up)."""
+        return _quantize(value, self.price_increment, ROUND_DOWN if side == "buy" else ROUND_UP)
+
+    # ------------------------------------------------------------------
+    # Validation
+    def tradable(self, market=True):
+        """None if new orders (market ones, with `market`) are accepted, else the reason."""
+        if self.trading_disabled or str(self.status).lower() != "online":
+            return f"{self.product_id} is not trading (status {self.status})"
+        if self.cancel_only:
+            return f"{self.product_id} is cancel-only"
+        if market and (self.limit_only or self.post_only):
+            return f"{self.product_id} accepts limit orders only"
+        return None
+
+    def check(self, funds=None, size=None, price=None, market=True):
+        """None if an (already quantized) order meets the product's rules, else the reason."""
+        reason = self.tradable(market)
+        if reason:
+            return reason
+        if funds is not None:
+            if funds < self.quote_min_size or funds <= 0:
+                return f"funds {funds} below minimum {self.quote_min_size}"
+            if funds > self.quote_max_size:
+                return f"funds {funds} above maximum {self.quote_max_size}"
+        if size is not None:
+            if size < self.base_min_size or size <= 0:
+                return f"size {size} below minimum {self.base_min_size}"
+            if size > self.base_max_size:
+                return f"size {size} above maximum {self.base_max_size}"
+            if price is not None and size * price < self.quote_min_size:
+                return f"notional {size * price:.2f} below minimum {self.quote_min_size}"
+        return None
+
+    def prepare(self, side, funds=None, size=None, price=None, market=True):
+        """Quantize an order's fields and check them: (funds, size, price, reason)."""
+        funds = self.funds(funds) if funds is not None else None
+        size = self.size(size) if size is not None else None
+        price = self.price(price, side) if price is not None else None
+        return funds, size, price, self.check(funds, size, price, market)
+
+
+class ProductCatalog:
+    """
+    Order rules for every product, held in memory so orders are quantized
+    and validated before they reach the network.
+
+    One get_products call loads all spot products; refresh() replaces the
+    whole dict in a single reference store, so lookups take no lock and
+    cost one dict get. start() loads once and then refreshes every
+    `refresh_interval` seconds on a daemon thread; a failed refresh keeps
+    the previous catalog. Until the first load every product gets
+    `default` (the old hard-coded limits); once loaded, unknown products
+    are rejected. minimums() serves the planner per-product arrays, cached
+    per product list until the next refresh.
+    """
+
+    def __init__(self, client=None, refresh_interval=PRODUCT_CATALOG_REFRESH_SECONDS, default=None):
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.default = default or Product("*")
+        self.products = {}     # product_id -> Product
+        self.loaded_at = None
+        self._arrays = {}      # tuple(product_ids) -> (min_funds, min_size)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self, rows):
+        """Replace the catalog with Coinbase product dicts; returns the product count."""
+        products = {}
+        for row in rows:
+            product = Product.from_dict(row)
+            products[product.product_id] = product
+        self.products = products
+        self._arrays = {}
+        self.loaded_at = time.time()
+        return len(products)
+
+    def refresh(self):
+        response = self.client.get_products(product_type="SPOT")
+        return self.load(p.to_dict() if hasattr(p, "to_dict") else p for p in (response.products or []))
+
+    def get(self, product_id):
+        products = self.products
+        if not products:
+            return self.default
+        product = products.get(product_id)
+        if product is None:
+            return Product(product_id, status="unlisted")
+        return product
+
+    def minimums(self, product_ids):
+        """
+        (min_funds, min_size) arrays for `product_ids`, for step_flows.
+        Products that take no market orders get infinite minimums.
+        """
+        key = tuple(product_ids)
+        arrays = self._arrays.get(key)
+        if arrays is None:
+            products = [self.get(pid) for pid in key]
+            blocked = np.array([p.tradable() is not None for p in products])
+            min_funds = np.where(blocked, np.inf, [p.quote_min_size for p in products])
+            min_size = np.where(blocked, np.inf, [p.base_min_size for p in products])
+            arrays = self._arrays[key] = (min_funds, min_size)
+        return arrays
+
+    def check_order(self, order, market=True):
+        """Quantize an order dict (product_id, side, funds/size/price) in place; None or the reason."""
+        funds, size, price, reason = self.get(order["product_id"]).prepare(
+            order["side"], order.get("funds"), order.get("size"), order.get("price"), market)
+        for key, value in (("funds", funds), ("size", size), ("price", price)):
+            if value is not None:
+                order[key] = value
+        if reason:
+            REJECTIONS.inc(product_id=order["product_id"])
+        return reason
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                metrics.ERRORS.inc(stage="product_catalog")
+                print(f"Error refreshing product catalog: {e}")
+
+    def start(self, client=None):
+        """
+        Load now (keeping the defaults if that fails), then refresh in the
+        background. Calls after the first are no-ops.
+        """
+        if self._thread is not None:
+            return self
+        if client is not None:
+            self.client = client
+        try:
+            print(f"Product catalog: {self.refresh()} products")
+        except Exception as e:
+            metrics.ERRORS.inc(stage="product_catalog")
+            print(f"Product catalog unavailable, using default order limits: {e}")
+        self._thread = threading.Thread(target=self._run, name="product-catalog", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+_default_catalog = None
+_default_catalog_lock = threading.Lock()
+
+
+def get_product_catalog():
+    """Process-wide catalog shared by every order path."""
+    global _default_catalog
+    if _default_catalog is None:
+        with _default_catalog_lock:
+            if _default_catalog is None:
+                _default_catalog = ProductCatalog()
+    return _default_catalog
@@ -0,0 +1,195 @@
+from decimal import ROUND_HALF_EVEN
+
+import numpy as np
+
+from product_catalog import DEFAULT_BASE_MIN_SIZE, DEFAULT_QUOTE_MIN_SIZE, get_product_catalog
+
+# Thresholds shared by the single-account loop (main.py) and the runtime
+MIN_DIFF_USD = 1.0     # ignore rebalances smaller than $1
+REBALANCE_STEP = 0.5   # move halfway to the target each tick
+CASH_HEADROOM = 0.01   # buys keep 1% of cash back for fees and fill-price slippage
+
+
+def rebalance_diffs(totals, actions, positions, prices):
+    """
+    USD to buy (+) or sell (-) per account and product, shape (U, P), from
+    net worths (U,), target fractions (U, P), base positions (U, P) and
+    prices (P,).
+    """
+    totals = np.asarray(totals, dtype=np.float64).reshape(-1)
+    actions = np.asarray(actions, dtype=np.float64).reshape(len(totals), -1)
+    positions = np.asarray(positions, dtype=np.float64).reshape(actions.shape)
+    return totals[:, None] * actions - positions * np.asarray(prices, dtype=np.float64)
+
+
+def step_flows(diffs, prices, step=REBALANCE_STEP, order_minimums=True, minimums=None):
+    """
+    This tick's signed USD flow per (account, product): `step` of the diff,
+    zeroed where the diff is under MIN_DIFF_USD or, with `order_minimums`,
+    where the order would be under the exchange minimums. `minimums` is
+    (min_funds, min_size) per product, from ProductCatalog.minimums();
+    the catalog defaults apply to every product without it.
+    """
+    diffs = np.asarray(diffs, dtype=np.float64)
+    flows = diffs * step
+    keep = np.abs(diffs) >= MIN_DIFF_USD
+    if order_minimums:
+        min_funds, min_size = minimums if minimums is not None else (DEFAULT_QUOTE_MIN_SIZE, DEFAULT_BASE_MIN_SIZE)
+        keep &= np.where(flows > 0, flows >= min_funds, -flows / prices >= min_size)
+    return np.where(keep, flows, 0.0)
+
+
+def clamp_flows(flows, cash, positions, prices, headroom=CASH_HEADROOM):
+    """
+    Limit each account's (U, P) USD flows to what it holds: sells to its
+    base position, and its buys, scaled down together, to its cash less
+    `headroom`. Proceeds of this tick's sells are not counted.
+    """
+    flows = np.asarray(flows, dtype=np.float64)
+    held = np.asarray(positions, dtype=np.float64) * np.asarray(prices, dtype=np.float64)
+    flows = np.maximum(flows, -np.clip(held, 0, None))
+    buys = np.clip(flows, 0, None).sum(axis=1)
+    budget = np.clip(np.asarray(cash, dtype=np.float64).reshape(-1), 0, None) * (1 - headroom)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(buys > budget, budget / buys, 1.0)
+    return np.where(flows > 0, flows * scale[:, None], flows)
+
+
+def orders_from_flows(flows, prices, product_ids, catalog=None):
+    """
+    Market orders for every non-zero flow, as (account, product_index, order)
+    in account then product order. Buys are USD funds, sells base size,
+    rounded to the nearest quote/base increment of the product.
+    """
+    catalog = catalog or get_product_catalog()
+    flows = np.atleast_2d(flows)
+    rows, cols = np.nonzero(flows)
+    orders = []
+    for i, j in zip(rows.tolist(), cols.tolist()):
+        usd = float(flows[i, j])
+        product = catalog.get(product_ids[j])
+        if usd > 0:
+            order = {"product_id": product_ids[j], "side": "buy", "funds": product.funds(usd, ROUND_HALF_EVEN)}
+        else:
+            size = product.size(-usd / float(prices[j]), ROUND_HALF_EVEN)
+            order = {"product_id": product_ids[j], "side": "sell", "size": size}
+        if order.get("funds", order.get("size")) > 0:
+            orders.append((i, j, order))
+    return orders
+
+
+def executed_usd(order, price):
+    """Signed USD an order moved (buys +, sells -) at `price`."""
+    if order["side"] == "buy":
+        return float(order["funds"])
+    return -float(order["size"]) * float(price)
+
+
+class NettingPlan:
+    """
+    Rebalance for many accounts held in one exchange account (omnibus).
+
+    Per product, opposing flows are crossed internally at the reference
+    price and only the net goes to the exchange as a single order, so the
+    exchange order count is at most one per product no matter how many
+    accounts trade. allocate() splits the result back to accounts: the
+    smaller side is filled in full from the larger one, and the larger side
+    pro rata from the crossed volume plus whatever the exchange order
+    actually filled.
+    """
+
+    def __init__(self, flows, prices, product_ids, catalog=None):
+        self.flows = np.atleast_2d(np.asarray(flows, dtype=np.float64))
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.product_ids = list(product_ids)
+        self.buys = np.clip(self.flows, 0, None).sum(axis=0)
+        self.sells = np.clip(-self.flows, 0, None).sum(axis=0)
+        self.net = self.buys - self.sells
+        self.crossed = np.minimum(self.buys, self.sells)
+        # The net order is subject to the exchange minimums; below them it is not sent
+        catalog = catalog or get_product_catalog()
+        net = step_flows(self.net[None, :], self.prices, step=1.0, minimums=catalog.minimums(self.product_ids))
+        self.orders = [order for _i, _j, order in orders_from_flows(net, self.prices, self.product_ids, catalog)]
+
+    def allocate(self, executed=None):
+        """
+        USD filled per (account, product), signed like the flows. `executed`
+        is the signed USD the exchange orders filled per product (defaults
+        to every order in full).
+        """
+        if executed is None:
+            executed = np.zeros(len(self.product_ids))
+            for order in self.orders:
+                j = self.product_ids.index(order["product_id"])
+                executed[j] = executed_usd(order, self.prices[j])
+        executed = np.asarray(executed, dtype=np.float64)
+        buy_fill = np.minimum(self.buys, self.sells + np.clip(executed, 0, None))
+        sell_fill = np.minimum(self.sells, self.buys + np.clip(-executed, 0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            buy_frac = np.where(self.buys > 0, buy_fill / self.buys, 0.0)
+            sell_frac = np.where(self.sells > 0, sell_fill / self.sells, 0.0)
+        return np.where(self.flows > 0, self.flows * buy_frac, self.flows * sell_frac)
+
+    def allocate_fills(self, size, price, fee):
+        """
+        Fills per (account, product) as (signed base size, average price,
+        fee), from what the exchange orders filled per product: signed base
+        `size`, average `price` and `fee`. Crossed volume moves at the
+        reference price with no fee; the accounts on the side of the
+        exchange order share its actual notional and fee pro rata.
+        """
+        size = np.asarray(size, dtype=np.float64)
+        price = np.asarray(price, dtype=np.float64)
+        fee = np.asarray(fee, dtype=np.float64)
+        base = self.allocate(size * self.prices) / self.prices
+        on_side = (np.sign(base) == np.sign(size)) & (size != 0)
+        side_total = np.where(on_side, np.abs(base), 0.0).sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Part of each on-side account's volume that came from the exchange
+            share = np.where(side_total > 0, np.minimum(np.abs(size) / side_total, 1.0), 0.0)
+            fee_per_unit = np.where(size != 0, fee / np.abs(size), 0.0)
+        share = np.where(on_side, share, 0.0)
+        prices = (1 - share) * self.prices + share * np.where(size != 0, price, self.prices)
+        fees = np.abs(base) * share * fee_per_unit
+        return base, prices, fees
+
+
+class InternalAccount:
+    """
+    One user's sub-account of the omnibus exchange account: balances are
+    kept here and moved by NettingPlan allocations, with the same
+    get_account_balances() shape CoinbaseClient returns.
+
+    With a `ledger` (trade_ledger.TradeLedger) the balances are stored
+    under `wallet`: a sub-account already in the ledger is loaded from it
+    (`balances` only seeds a new one) and every fill is written back.
+    """
+
+    def __init__(self, balances=None, wallet=None, ledger=None):
+        self.wallet = wallet
+        self.ledger = ledger
+        stored = ledger.balances(wallet) if ledger is not None else {}
+        self.balances = {currency: float(amount) for currency, amount in (stored or balances or {}).items()}
+        if ledger is not None and not stored:
+            for currency, amount in self.balances.items():
+                ledger.record_balance(wallet, currency, amount)
+
+    def get_account_balances(self):
+        return [{"currency": c, "balance": str(v)} for c, v in self.balances.items()]
+
+    def apply_fill(self, product_id, size, price, fee=0.0):
+        """Move `size` base units (+ bought, - sold) at `price`, paying `fee` in the quote currency."""
+        base, quote = product_id.split("-")
+        self._move(base, size)
+        self._move(quote, -size * price - fee)
+
+    def deposit(self, currency, amount):
+        """Credit (or, negative, debit) `amount` of `currency`; the caller checks the house can back it."""
+        if self.balances.get(currency, 0.0) + amount < 0:
+            raise ValueError(f"Cannot withdraw {-amount} {currency}: balance is {self.balances.get(currency, 0.0)}")
+        self._move(currency, amount)
+
+    def _move(self, currency, amount):
+        self.balances[currency] = self.balances.get(currency, 0.0) + amount
+        if self.ledger is not None:
+            self.ledger.record_balance(self.wallet, currency, self.balances[currency])
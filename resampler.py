@@ -0,0 +1,176 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+CANDLE_COLUMNS = ["time", "low", "high", "open", "close", "volume"]
+# Per-product indicator columns produced by DataManager.add_technical_indicators
+BASE_FEATURES = ("close", "ma_50", "ma_200", "rsi")
+
+
+def feature_names(resolutions=()):
+    """
+    Per-product observation features: the base candle features followed by
+    the same features for each coarser resolution, e.g. '4h_rsi'.
+    """
+    names = list(BASE_FEATURES)
+    for seconds in resolutions:
+        names.extend(f"{resolution_label(seconds)}_{name}" for name in BASE_FEATURES)
+    return tuple(names)
+
+
+def resolution_label(seconds):
+    """60 -> '1m', 3600 -> '1h', 86400 -> '1d'."""
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+def resample_candles(df, seconds, base_seconds=None, drop_partial=True):
+    """
+    Aggregate sorted base candles into `seconds`-wide candles aligned to the
+    epoch: open = first open, high = max, low = min, close = last close,
+    volume = sum. Missing base bars (no trades) are simply absent from the
+    bucket. With drop_partial, a trailing bucket that has not closed yet
+    (its end is after the last base bar's end) is dropped.
+    """
+    if df.empty:
+        return df.iloc[0:0][CANDLE_COLUMNS].copy()
+
+    epoch = df["time"].astype("int64").to_numpy() // 10**9
+    buckets = epoch - epoch % seconds
+    # Start index of each bucket (input is sorted by time)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    out = pd.DataFrame({
+        "time": pd.to_datetime(buckets[starts], unit="s", utc=True),
+        "low": np.minimum.reduceat(df["low"].to_numpy(), starts),
+        "high": np.maximum.reduceat(df["high"].to_numpy(), starts),
+        "open": df["open"].to_numpy()[starts],
+        "close": df["close"].to_numpy()[ends],
+        "volume": np.add.reduceat(df["volume"].to_numpy(), starts),
+    })
+
+    if drop_partial:
+        if not base_seconds and len(epoch) > 1:
+            base_seconds = int(np.min(np.diff(epoch)))
+        if base_seconds and buckets[-1] + seconds > epoch[-1] + base_seconds:
+            out = out.iloc[:-1]
+    return out
+
+
+class IncrementalResampler:
+    """
+    Builds `seconds`-wide candles from base candles as they close.
+
+    Feed closed base bars in time order with `update`; it returns the
+    coarser bar as soon as it is complete: either when its last base bar
+    arrives, or when a bar from a later bucket shows the previous one ended
+    early (missing base bars).
+    """
+
+    def __init__(self, base_seconds, seconds):
+        if seconds % base_seconds:
+            raise ValueError(f"{seconds}s is not a multiple of the base granularity {base_seconds}s")
+        self.base_seconds = base_seconds
+        self.seconds = seconds
+        self.current = None
+
+    def update(self, bar):
+        """
+        `bar` is a dict with time (Timestamp or epoch seconds), open, high,
+        low, close, volume. Returns a list of completed coarser bars (0-2).
+        """
+        t = bar["time"]
+        epoch = int(t.timestamp()) if hasattr(t, "timestamp") else int(t)
+        bucket = epoch - epoch % self.seconds
+        completed = []
+
+        if self.current is not None and bucket != self.current["bucket"]:
+            completed.append(self._emit())
+
+        if self.current is None:
+            self.current = {
+                "bucket": bucket,
+                "open": float(bar["open"]),
+                "high": float(bar["high"]),
+                "low": float(bar["low"]),
+                "close": float(bar["close"]),
+                "volume": float(bar["volume"]),
+            }
+        else:
+            cur = self.current
+            cur["high"] = max(cur["high"], float(bar["high"]))
+            cur["low"] = min(cur["low"], float(bar["low"]))
+            cur["close"] = float(bar["close"])
+            cur["volume"] += float(bar["volume"])
+
+        # Last base bar of the bucket just closed
+        if epoch + self.base_seconds >= bucket + self.seconds:
+            completed.append(self._emit())
+        return completed
+
+    def _emit(self):
+        cur = self.current
+        self.current = None
+        return {
+            "time": pd.Timestamp(cur["bucket"], unit="s", tz="UTC"),
+            "low": cur["low"],
+            "high": cur["high"],
+            "open": cur["open"],
+            "close": cur["close"],
+            "volume": cur["volume"],
+        }
+
+
+class MultiResolutionResampler:
+    """
+    One IncrementalResampler per (product, resolution) for the live loop.
+    The last `history` completed bars of each are kept, so a tick only
+    folds in the base bars that closed since the previous one instead of
+    re-resampling its whole window.
+    """
+
+    def __init__(self, product_ids, base_seconds, resolutions, history=250):
+        self.base_seconds = base_seconds
+        self.resamplers = {
+            pid: {res: IncrementalResampler(base_seconds, res) for res in resolutions}
+            for pid in product_ids
+        }
+        self.bars = {pid: {res: deque(maxlen=history) for res in resolutions} for pid in product_ids}
+        self.fed_until = {}    # product_id -> epoch of the last base bar fed
+
+    def update(self, product_id, bar):
+        """Feed a closed base bar; returns {resolution: [completed bars]}."""
+        completed = {
+            res: bars
+            for res, resampler in self.resamplers[product_id].items()
+            if (bars := resampler.update(bar))
+        }
+        for res, bars in completed.items():
+            self.bars[product_id][res].extend(bars)
+        return completed
+
+    def feed(self, product_id, candles, end):
+        """
+        Feed the base candles in `candles` that had closed by `end` and were
+        not fed before (a still-forming last bar waits for the next call).
+        Returns how many were fed.
+        """
+        if candles.empty:
+            return 0
+        epoch = candles["time"].astype("int64").to_numpy() // 10**9
+        mask = (epoch > self.fed_until.get(product_id, -np.inf)) & \
+               (epoch + self.base_seconds <= pd.Timestamp(end).timestamp())
+        rows = candles.loc[mask, CANDLE_COLUMNS].to_dict("records")
+        for row in rows:
+            self.update(product_id, row)
+        if rows:
+            self.fed_until[product_id] = int(epoch[mask][-1])
+        return len(rows)
+
+    def candles(self, product_id, seconds):
+        """Completed `seconds`-wide candles of a product, oldest first."""
+        return pd.DataFrame(list(self.bars[product_id][seconds]), columns=CANDLE_COLUMNS)
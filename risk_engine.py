@@ -0,0 +1,125 @@
+import numpy as np
+from statistics import NormalDist
+
+from config import (
+    RISK_EWMA_HALFLIFE,
+    RISK_WARMUP_BARS,
+    VAR_CONFIDENCE,
+    MAX_VAR_PERCENT,
+    TARGET_ANNUAL_VOL,
+    BARS_PER_YEAR
+)
+
+class StreamingRiskEngine:
+    """
+    Portfolio risk model updated one bar at a time.
+
+    Keeps exponentially weighted mean and covariance of per-asset log returns,
+    updated in O(n_assets^2) per bar with no history buffer, and derives
+    portfolio volatility, parametric (normal) VaR / expected shortfall and
+    volatility-targeted weight caps. All portfolio queries accept either one
+    weight vector (n_assets,) or a batch (n_portfolios, n_assets).
+    """
+
+    def __init__(self, n_assets, halflife=RISK_EWMA_HALFLIFE, confidence=VAR_CONFIDENCE,
+                 target_annual_vol=TARGET_ANNUAL_VOL, bars_per_year=BARS_PER_YEAR,
+                 max_var=MAX_VAR_PERCENT, warmup=RISK_WARMUP_BARS):
+        self.n_assets = n_assets
+        self.alpha = 1.0 - 0.5 ** (1.0 / halflife)
+        self.confidence = confidence
+        self.z = NormalDist().inv_cdf(confidence)
+        # Expected shortfall multiplier for a normal distribution: pdf(z) / (1 - c)
+        self.es_factor = NormalDist().pdf(self.z) / (1.0 - confidence)
+        self.target_vol = target_annual_vol / np.sqrt(bars_per_year)  # per bar
+        self.max_var = max_var
+        self.warmup = warmup
+        self.reset()
+
+    def reset(self):
+        self.last_prices = None
+        self.mean = np.zeros(self.n_assets)
+        self.cov = np.zeros((self.n_assets, self.n_assets))
+        self.n_updates = 0
+
+    def state(self):
+        """The running estimates as plain lists (JSON-able); load_state() puts them back."""
+        return {
+            "last_prices": None if self.last_prices is None else self.last_prices.tolist(),
+            "mean": self.mean.tolist(),
+            "cov": self.cov.tolist(),
+            "n_updates": self.n_updates,
+        }
+
+    def load_state(self, state):
+        last = state["last_prices"]
+        self.last_prices = None if last is None else np.asarray(last, dtype=np.float64)
+        self.mean = np.asarray(state["mean"], dtype=np.float64)
+        self.cov = np.asarray(state["cov"], dtype=np.float64)
+        self.n_updates = int(state["n_updates"])
+
+    @property
+    def ready(self):
+        return self.n_updates >= self.warmup
+
+    def update(self, prices):
+        """Feed the latest close for each asset (one bar)."""
+        prices = np.asarray(prices, dtype=np.float64)
+        if self.last_prices is None:
+            self.last_prices = prices
+            return
+        valid = (prices > 0) & (self.last_prices > 0)
+        returns = np.zeros(self.n_assets)
+        np.log(prices / np.where(valid, self.last_prices, 1.0), out=returns, where=valid)
+        self.last_prices = prices
+
+        # West's incremental EW mean/covariance
+        delta = returns - self.mean
+        self.mean += self.alpha * delta
+        self.cov = (1.0 - self.alpha) * (self.cov + self.alpha * np.outer(delta, delta))
+        self.n_updates += 1
+
+    def volatility(self):
+        """Per-asset per-bar volatility."""
+        return np.sqrt(np.diag(self.cov))
+
+    def correlation(self):
+        vol = self.volatility()
+        denom = np.outer(vol, vol)
+        return np.divide(self.cov, denom, out=np.eye(self.n_assets), where=denom > 0)
+
+    def portfolio_volatility(self, weights):
+        w = np.asarray(weights, dtype=np.float64)
+        variance = np.einsum("...i,ij,...j->...", w, self.cov, w)
+        return np.sqrt(np.maximum(variance, 0.0))
+
+    def value_at_risk(self, weights):
+        """One-bar VaR as a fraction of net worth (positive = loss)."""
+        w = np.asarray(weights, dtype=np.float64)
+        return self.z * self.portfolio_volatility(w) - w @ self.mean
+
+    def expected_shortfall(self, weights):
+        """One-bar expected shortfall as a fraction of net worth."""
+        w = np.asarray(weights, dtype=np.float64)
+        return self.es_factor * self.portfolio_volatility(w) - w @ self.mean
+
+    def volatility_caps(self):
+        """Max weight per asset such that the asset alone stays at the vol target."""
+        vol = self.volatility()
+        return np.minimum(1.0, np.divide(self.target_vol, vol, out=np.ones_like(vol), where=vol > 0))
+
+    def constrain(self, weights):
+        """
+        Clip weights to the per-asset vol caps, then scale each portfolio down
+        so both its volatility and its VaR stay within limits. Correlated
+        assets therefore share one risk budget.
+        """
+        w = np.asarray(weights, dtype=np.float64)
+        if not self.ready:
+            return w
+        w = np.minimum(w, self.volatility_caps())
+        port_vol = self.portfolio_volatility(w)
+        var = self.value_at_risk(w)
+        scale = np.ones_like(port_vol)
+        np.minimum(scale, np.divide(self.target_vol, port_vol, out=np.ones_like(port_vol), where=port_vol > 0), out=scale)
+        np.minimum(scale, np.divide(self.max_var, var, out=np.ones_like(var), where=var > 0), out=scale)
+        return w * scale[..., None] if w.ndim > 1 else w * float(scale)
@@ -2,13 +2,47 @@ import numpy as np
 from config import MAX_POSITION_PERCENT, MAX_DRAWDOWN_PERCENT
 
 class RiskManager:
-    def __init__(self):
+    def __init__(self, risk_engine=None, max_position=MAX_POSITION_PERCENT, max_drawdown=MAX_DRAWDOWN_PERCENT):
         self.peak_net_worth = None
+        # Optional StreamingRiskEngine for correlation/volatility-aware limits
+        self.risk_engine = risk_engine
+        # Time of the last bar fed to the risk engine by update_bars
+        self.last_bar_time = None
+        self.max_position = max_position
+        self.max_drawdown = max_drawdown
+
+    def reset(self):
+        self.peak_net_worth = None
+        self.last_bar_time = None
+        if self.risk_engine is not None:
+            self.risk_engine.reset()
+
+    def update_market(self, prices):
+        """Feed the latest close of each asset to the risk engine (once per bar)."""
+        if self.risk_engine is not None:
+            self.risk_engine.update(prices)
+
+    def update_bars(self, times, prices):
+        """
+        update_market for each completed bar not fed yet. `times` (n_bars,)
+        and `prices` (n_bars, n_assets) are a candle window in time order
+        whose last row may still be forming, so it is held back. A live loop
+        that ticks several times per bar thus feeds every bar exactly once,
+        as the training env does, and a cold start warms up from the window.
+        """
+        if self.risk_engine is None or len(times) < 2:
+            return
+        start = 0 if self.last_bar_time is None else int(np.searchsorted(times[:-1], self.last_bar_time, side="right"))
+        for i in range(start, len(times) - 1):
+            self.risk_engine.update(prices[i])
+        if start < len(times) - 1:
+            self.last_bar_time = times[-2]
 
     def apply_risk_constraints(self, action, asset_holdings, cash_balance, row, current_net_worth):
         """
         1. Ensure no single position > MAX_POSITION_PERCENT of net worth.
         2. If drawdown > MAX_DRAWDOWN_PERCENT, reduce risk drastically (e.g., go mostly to cash).
+        3. With a risk engine, cap volatility and VaR of the whole portfolio.
         """
         if self.peak_net_worth is None:
             self.peak_net_worth = current_net_worth
@@ -16,17 +50,36 @@ class RiskManager:
             self.peak_net_worth = max(self.peak_net_worth, current_net_worth)
 
         dd = 1 - (current_net_worth / self.peak_net_worth)
-        if dd > MAX_DRAWDOWN_PERCENT:
+        if dd > self.max_drawdown:
             # Force mostly cash
             new_action = np.zeros_like(action)
             # perhaps leave a small fraction in stable allocations
             return new_action
 
         # If not in a drawdown, just ensure no single fraction > MAX_POSITION_PERCENT
-        new_action = np.minimum(action, MAX_POSITION_PERCENT)
+        new_action = np.minimum(action, self.max_position)
         sum_action = np.sum(new_action)
         if sum_action > 1.0:
             # scale down proportionally
             new_action = new_action / sum_action
 
+        if self.risk_engine is not None:
+            new_action = self.risk_engine.constrain(new_action).astype(np.asarray(action).dtype)
+
         return new_action
+
+    def apply_risk_constraints_batch(self, actions, net_worths, peaks):
+        """
+        Rules 1 and 2 for many independent portfolios at once: `actions`
+        (n_portfolios, n_assets), `net_worths` (n_portfolios,) and each
+        portfolio's running peak `peaks`, updated in place. The risk engine
+        is not applied, since it models a single market.
+        """
+        np.maximum(peaks, net_worths, out=peaks)
+        # Same test as 1 - net_worth / peak > max_drawdown, without dividing by an empty account's zero peak
+        halted = net_worths < peaks * (1 - self.max_drawdown)
+        new_actions = np.minimum(actions, self.max_position)
+        total = new_actions.sum(axis=1, keepdims=True)
+        new_actions = np.where(total > 1.0, new_actions / np.maximum(total, 1.0), new_actions)
+        new_actions[halted] = 0.0
+        return new_actions
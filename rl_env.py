@@ -5,36 +5,46 @@ from gym import spaces
 
 from config import TRANSACTION_FEE_PERCENT
 from risk_manager import RiskManager
+from risk_engine import StreamingRiskEngine
+from resampler import BASE_FEATURES
+from observation import ObservationBuilder
 
 class MultiAssetTradingEnv(gym.Env):
     """
     RL environment for multiple crypto assets.
     Observations:
-      - For each asset, [close, ma_50, ma_200, rsi]
+      - For each asset, `features` (default [close, ma_50, ma_200, rsi],
+        optionally followed by coarser-resolution features like '4h_rsi')
       - plus portfolio info: [net_worth, fraction_in_crypto]
 
     Actions:
       - For each asset, a fraction in [0,1] of total net worth to allocate.
 
-    The environment steps through a pandas DataFrame row by row,
-    simulating trades at each step.
+    The environment steps through market data row by row, simulating
+    trades at each step. `df` is either a pandas DataFrame or a
+    ColumnarDataset; columns are read through per-column arrays (memmaps
+    for a ColumnarDataset), so the data is never copied.
+
+    With an EpisodeSampler, every reset() starts a new episode on a
+    window drawn from the sampler instead of replaying `df` from row 0.
     """
 
-    def __init__(self, df: pd.DataFrame, product_ids, initial_balance=10000):
+    def __init__(self, df, product_ids, initial_balance=10000, features=BASE_FEATURES, sampler=None):
         super().__init__()
-        # Store market data
-        self.df = df.reset_index(drop=True)
+        self.sampler = sampler
         self.product_ids = product_ids
         self.n_assets = len(product_ids)
         self.initial_balance = float(initial_balance)
 
-        # Each asset has 4 observation values: [close, ma_50, ma_200, rsi].
+        # Each asset has len(features) observation values.
         # We add 2 more for [net_worth, fraction_in_crypto].
-        self.obs_per_asset = 4
+        self.features = tuple(features)
+        self.obs_per_asset = len(self.features)
+        self.observation_builder = ObservationBuilder(product_ids, self.features)
         self.observation_space = spaces.Box(
             low=-np.inf,
             high=np.inf,
-            shape=(self.n_assets * self.obs_per_asset + 2,),
+            shape=(self.observation_builder.size,),
             dtype=np.float32
         )
 
@@ -46,8 +56,11 @@ class MultiAssetTradingEnv(gym.Env):
             dtype=np.float32
         )
 
-        # Risk manager
-        self.risk_manager = RiskManager()
+        if sampler is None:
+            self._bind(df)
+
+        # Risk manager (with correlation-aware portfolio limits)
+        self.risk_manager = RiskManager(risk_engine=StreamingRiskEngine(self.n_assets))
 
         # Initialize
         self.reset()
@@ -57,57 +70,58 @@ class MultiAssetTradingEnv(gym.Env):
         Reset the environment state for a new episode.
         Returns the initial observation.
         """
+        if self.sampler is not None:
+            self._bind(self.sampler.next_window())
         self.current_step = 0
         self.cash_balance = self.initial_balance
         # Float32 zeros to store how many "units" of each asset we hold
         self.asset_holdings = np.zeros(self.n_assets, dtype=np.float32)
         self.prev_net_worth = self.initial_balance
+        self.risk_manager.reset()
 
         # Return the first observation
         return self._get_observation()
 
+    def _bind(self, df):
+        # Store market data as per-column arrays (no reset_index copy)
+        self.df = df
+        self.n_rows = len(df)
+        self._close = [self._column(f"{pid}_close") for pid in self.product_ids]
+        self.observation_builder.bind(df)
+
+    def _column(self, name):
+        if isinstance(self.df, pd.DataFrame):
+            return self.df[name].to_numpy()
+        return self.df.column(name)
+
+    def _prices(self, step):
+        return np.array([col[step] for col in self._close], dtype=np.float64)
+
     def _get_observation(self):
         """
         Build an observation vector containing:
-          [close, ma_50, ma_200, rsi] for each asset
+          the per-asset features for each asset
           plus [net_worth, fraction_in_crypto].
         """
         # Clamp step in case we are at the very end
-        if self.current_step >= len(self.df):
-            self.current_step = len(self.df) - 1
-
-        row = self.df.loc[self.current_step]
-
-        # Gather per-asset features
-        obs = []
-        for pid in self.product_ids:
-            # Convert row values to float to avoid type errors
-            close = float(row[f"{pid}_close"])
-            ma50 = float(row[f"{pid}_ma_50"])
-            ma200 = float(row[f"{pid}_ma_200"])
-            rsi = float(row[f"{pid}_rsi"])
-            obs.extend([close, ma50, ma200, rsi])
-
-        # Portfolio info
-        net_worth = self._calculate_net_worth(row)
-        if net_worth > 0:
-            fraction_in_crypto = 1.0 - (self.cash_balance / net_worth)
-        else:
-            fraction_in_crypto = 1.0
-
-        obs.append(net_worth)
-        obs.append(fraction_in_crypto)
-
-        return np.array(obs, dtype=np.float32)
-
-    def _calculate_net_worth(self, row):
+        if self.current_step >= self.n_rows:
+            self.current_step = self.n_rows - 1
+
+        step = self.current_step
+        # Shared with the backtester and live loop; copy because the
+        # builder reuses its buffer and callers may keep observations
+        obs = self.observation_builder.build(
+            step, self._calculate_net_worth(step), self.cash_balance
+        )
+        return obs.copy()
+
+    def _calculate_net_worth(self, step):
         """
         net_worth = cash_balance + sum(asset_holdings[i] * close_price_i).
         """
         net = float(self.cash_balance)
-        for i, pid in enumerate(self.product_ids):
-            close_price = float(row[f"{pid}_close"])
-            net += float(self.asset_holdings[i]) * close_price
+        for i, col in enumerate(self._close):
+            net += float(self.asset_holdings[i]) * float(col[step])
         return net
 
     # Comment this out or redefine properly if needed
@@ -127,24 +141,26 @@ class MultiAssetTradingEnv(gym.Env):
         *current* prices.
         """
         # 1) If we've run out of data, the episode is done
-        if self.current_step >= len(self.df):
+        if self.current_step >= self.n_rows:
             # Provide a final observation (clamped)
             obs = self._get_observation()
             return obs, 0.0, True, {}
 
         # 2) Current row & net worth
-        row = self.df.loc[self.current_step]
-        current_net_worth = self._calculate_net_worth(row)
+        step = self.current_step
+        prices = self._prices(step)
+        current_net_worth = self._calculate_net_worth(step)
 
         # 3) Risk constraints
+        self.risk_manager.update_market(prices)
         action = self.risk_manager.apply_risk_constraints(
-            action, self.asset_holdings, self.cash_balance, row, current_net_worth
+            action, self.asset_holdings, self.cash_balance, prices, current_net_worth
         )
 
         # 4) Rebalance based on the new action
         desired_allocation = action  # fraction of net worth for each asset
         for i, pid in enumerate(self.product_ids):
-            asset_price = float(row[f"{pid}_close"])
+            asset_price = float(prices[i])
             target_value = current_net_worth * float(desired_allocation[i])
             current_value = float(self.asset_holdings[i]) * asset_price
             diff = target_value - current_value
@@ -169,14 +185,13 @@ class MultiAssetTradingEnv(gym.Env):
 
         # 5) Advance step
         self.current_step += 1
-        done = (self.current_step >= len(self.df))
+        done = (self.current_step >= self.n_rows)
         if done:
             # clamp step so _get_observation() won't fail
-            self.current_step = len(self.df) - 1
+            self.current_step = self.n_rows - 1
 
         # 6) Calculate new net worth & reward
-        new_row = self.df.loc[self.current_step] if not done else row
-        new_net_worth = self._calculate_net_worth(new_row)
+        new_net_worth = self._calculate_net_worth(self.current_step if not done else step)
         reward = new_net_worth - current_net_worth
 
         # 7) Build next observation
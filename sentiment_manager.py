@@ -5,11 +5,13 @@ import numpy as np
 import time
 
 class SentimentManager:
-    def __init__(self):
-        self.model_name = "distilbert-base-uncased-finetuned-sst-2-english"
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+    def __init__(self, model_name="distilbert-base-uncased-finetuned-sst-2-english", tokenizer=None, model=None):
+        """tokenizer/model: preloaded overrides (e.g. a small offline model for benchmarks)."""
+        self.model_name = model_name
+        self.tokenizer = tokenizer if tokenizer is not None else AutoTokenizer.from_pretrained(self.model_name)
+        self.model = model if model is not None else AutoModelForSequenceClassification.from_pretrained(self.model_name)
         self.realtime_tweets = []
+        self.last_score = 0.5
 
     def add_tweet(self, tweet_text):
 
@@ -37,6 +39,7 @@ class SentimentManager:
 
         sample_tweets = self.realtime_tweets[-50:]
         tweet_score = self.analyze_texts(sample_tweets)
+        self.last_score = tweet_score
 
 
         return tweet_score
@@ -0,0 +1,175 @@
+import itertools
+from collections import defaultdict
+
+
+class SimulatedExchange:
+    """
+    Local stand-in for CoinbaseClient with resting limit orders, for
+    strategy tests, benchmarks and paper trading.
+
+    The market is driven by the caller: set_touch() moves a product's best
+    bid/ask and trade() prints a trade. Resting orders fill when the market
+    reaches their price (a buy when the ask or a trade is at or below it, a
+    sell when the bid or a trade is at or above it) at the order's own
+    price. Every fill updates balances and is passed to the listeners as
+    {order_id, product_id, side, price, size}. Responses mirror the shapes
+    CoinbaseClient returns (CreateOrderResponse / CancelOrdersResponse
+    dicts).
+    """
+
+    def __init__(self, balances=None, fee_rate=0.0):
+        self.balances = defaultdict(float, balances or {})
+        self.fee_rate = fee_rate
+        self.orders = {}       # order_id -> open order dict
+        self.touch = {}        # product_id -> (best_bid, best_ask)
+        self.touch_size = {}   # product_id -> (bid_size, ask_size), None = unlimited
+        self.closed = {}       # order_id -> final status of immediate-or-cancel orders
+        self.fills = []
+        self.listeners = []
+        self.placed = 0
+        self.cancelled = 0
+        self._ids = itertools.count(1)
+
+    # ------------------------------------------------------------------
+    # CoinbaseClient interface
+    def place_limit_order(self, product_id, side, limit_price, size, post_only=False):
+        side = side.lower()
+        if side not in ("buy", "sell"):
+            return {"error": "Invalid side. Must be 'buy' or 'sell'."}
+        price, size = float(limit_price), float(size)
+        if size <= 0 or price <= 0:
+            return {"success": False, "error_response": {"error": "INVALID_SIZE_OR_PRICE"}}
+        bid, ask = self.touch.get(product_id, (None, None))
+        crosses = (ask is not None and price >= ask) if side == "buy" else (bid is not None and price <= bid)
+        if crosses and post_only:
+            return {"success": False, "error_response": {"error": "INVALID_LIMIT_PRICE_POST_ONLY"}}
+
+        order_id = f"sim-{next(self._ids)}"
+        self.orders[order_id] = {"order_id": order_id, "product_id": product_id, "side": side,
+                                 "price": price, "size": size, "filled": 0.0}
+        self.placed += 1
+        if crosses:
+            # A marketable limit order takes liquidity at the touch
+            self._fill(self.orders[order_id], size, ask if side == "buy" else bid)
+        return {"success": True, "success_response": {"order_id": order_id, "product_id": product_id,
+                                                      "side": side.upper()}}
+
+    def place_ioc_order(self, product_id, side, limit_price, size):
+        """Fills against the touch (up to its size, if set) when marketable; never rests."""
+        side = side.lower()
+        if side not in ("buy", "sell"):
+            return {"error": "Invalid side. Must be 'buy' or 'sell'."}
+        price, size = float(limit_price), float(size)
+        bid, ask = self.touch.get(product_id, (None, None))
+        bid_size, ask_size = self.touch_size.get(product_id, (None, None))
+        touch, available = (ask, ask_size) if side == "buy" else (bid, bid_size)
+        order_id = f"sim-{next(self._ids)}"
+        order = {"order_id": order_id, "product_id": product_id, "side": side,
+                 "price": price, "size": size, "filled": 0.0}
+        self.placed += 1
+        average = 0.0
+        if touch is not None and (price >= touch if side == "buy" else price <= touch):
+            take = size if available is None else min(size, available)
+            if take > 0:
+                self._fill(order, take, touch)
+                average = touch
+        self.closed[order_id] = {"order_id": order_id, "status": "FILLED" if order["filled"] >= size else "CANCELLED",
+                                 "filled_size": order["filled"], "average_filled_price": average}
+        return {"success": True, "success_response": {"order_id": order_id, "product_id": product_id,
+                                                      "side": side.upper()}}
+
+    def get_order(self, order_id):
+        if order_id in self.closed:
+            return dict(self.closed[order_id])
+        order = self.orders.get(order_id)
+        if order is None:
+            return {"error": f"Unknown order {order_id}"}
+        return {"order_id": order_id, "status": "OPEN", "filled_size": order["filled"],
+                "average_filled_price": order["price"] if order["filled"] else 0.0}
+
+    def cancel_orders(self, order_ids):
+        results = []
+        for order_id in order_ids:
+            ok = self.orders.pop(order_id, None) is not None
+            self.cancelled += ok
+            results.append({"success": ok, "order_id": order_id,
+                            "failure_reason": "" if ok else "UNKNOWN_CANCEL_ORDER"})
+        return {"results": results}
+
+    def place_market_order(self, product_id, side, funds=None, size=None, prechecked=False, reservation=None):
+        bid, ask = self.touch.get(product_id, (None, None))
+        price = ask if side == "buy" else bid
+        if price is None:
+            return {"error": f"No market for {product_id}"}
+        size = float(size) if size is not None else float(funds) / price
+        order_id = f"sim-{next(self._ids)}"
+        order = {"order_id": order_id, "product_id": product_id, "side": side,
+                 "price": price, "size": size, "filled": 0.0}
+        self._fill(order, size, price)
+        return {"success": True, "success_response": {"order_id": order_id, "product_id": product_id,
+                                                      "side": side.upper()}}
+
+    def get_open_orders(self, product_id=None):
+        return [dict(o) for o in self.orders.values() if product_id in (None, o["product_id"])]
+
+    def get_account_balances(self):
+        return [{"currency": c, "balance": str(v)} for c, v in self.balances.items()]
+
+    def get_current_price(self, product_id="BTC-USD"):
+        bid, ask = self.touch.get(product_id, (None, None))
+        if bid is None or ask is None:
+            return {"error": "No bids or asks returned."}
+        return (bid + ask) / 2.0
+
+    # ------------------------------------------------------------------
+    # Market simulation
+    def set_touch(self, product_id, best_bid, best_ask, bid_size=None, ask_size=None):
+        """Move the top of book; resting orders the new touch reaches are filled."""
+        self.touch[product_id] = (float(best_bid), float(best_ask))
+        self.touch_size[product_id] = (bid_size, ask_size)
+        for order in self._open(product_id):
+            if order["order_id"] not in self.orders:
+                continue  # cancelled by a fill listener
+            if (order["side"] == "buy" and order["price"] >= best_ask) or \
+                    (order["side"] == "sell" and order["price"] <= best_bid):
+                self._fill(order, order["size"] - order["filled"], order["price"])
+
+    def trade(self, product_id, price, size):
+        """A trade prints at `price`: resting orders at that price or better fill, best first."""
+        remaining = float(size)
+        candidates = [o for o in self._open(product_id)
+                      if (o["side"] == "buy" and o["price"] >= price) or (o["side"] == "sell" and o["price"] <= price)]
+        candidates.sort(key=lambda o: -o["price"] if o["side"] == "buy" else o["price"])
+        for order in candidates:
+            if remaining <= 0:
+                break
+            if order["order_id"] not in self.orders:
+                continue
+            take = min(remaining, order["size"] - order["filled"])
+            self._fill(order, take, order["price"])
+            remaining -= take
+        return float(size) - remaining
+
+    def _open(self, product_id):
+        return [o for o in self.orders.values() if o["product_id"] == product_id]
+
+    def _fill(self, order, size, price):
+        base, quote = order["product_id"].split("-")
+        notional = size * price
+        fee = notional * self.fee_rate
+        if order["side"] == "buy":
+            self.balances[base] += size
+            self.balances[quote] -= notional + fee
+        else:
+            self.balances[base] -= size
+            self.balances[quote] += notional - fee
+        order["filled"] += size
+        if order["filled"] >= order["size"] - 1e-12:
+            self.orders.pop(order["order_id"], None)
+            self.closed[order["order_id"]] = {"order_id": order["order_id"], "status": "FILLED",
+                                              "filled_size": order["filled"], "average_filled_price": price}
+        fill = {"order_id": order["order_id"], "product_id": order["product_id"],
+                "side": order["side"], "price": price, "size": size}
+        self.fills.append(fill)
+        for listener in self.listeners:
+            listener(fill)
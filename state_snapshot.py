@@ -0,0 +1,157 @@
+import os
+import time
+import pickle
+from collections import deque
+
+from risk_engine import StreamingRiskEngine
+
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(path, state):
+    """
+    Atomically write `state`: pickle to a temp file in the same directory,
+    fsync, then os.replace over the old snapshot. A crash at any point
+    leaves either the previous snapshot or the new one, never a torn file.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump({"version": SNAPSHOT_VERSION, "saved_at": time.time(), "state": state},
+                    f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_snapshot(path):
+    """Return (state, saved_at) or (None, None) if there is no usable snapshot."""
+    if not os.path.exists(path):
+        return None, None
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable snapshot {path}: {e}")
+        return None, None
+    if payload.get("version") != SNAPSHOT_VERSION:
+        print(f"Ignoring snapshot {path} with version {payload.get('version')}")
+        return None, None
+    return payload["state"], payload["saved_at"]
+
+
+def capture_trader_state(data_manager, risk_manager, risk_gate, sentiment_manager, pending_orders=()):
+    """
+    Everything the live loop needs to resume without a cold start:
+      - raw candles per product (indicators are recomputed from them)
+      - RiskManager drawdown peak and risk-engine statistics
+      - pre-trade gate peak, kill switch, prices and positions
+      - recent tweets and the last sentiment score
+      - orders sent by the last tick (ids and wall-clock times), whose
+        fills main.reconcile_pending_orders records after a restart
+    """
+    return {
+        "candles": {pid: df.copy() for pid, df in (data_manager.candle_cache or {}).items()},
+        "risk_manager": {
+            "peak_net_worth": risk_manager.peak_net_worth,
+            "risk_engine": risk_manager.risk_engine,
+            "last_bar_time": risk_manager.last_bar_time,
+        },
+        "risk_gate": {
+            "peak_net_worth": risk_gate.peak_net_worth,
+            "net_worth": risk_gate.net_worth,
+            "killed": risk_gate.killed,
+            "prices": dict(risk_gate.prices),
+            "positions": dict(risk_gate.positions),
+        },
+        "sentiment": {
+            "tweets": list(getattr(sentiment_manager, "realtime_tweets", [])),
+            "last_score": getattr(sentiment_manager, "last_score", None),
+        },
+        "pending_orders": list(pending_orders),
+    }
+
+
+def capture_risk_state(risk_manager, risk_gate):
+    """
+    The RiskManager and pre-trade gate state a tick starts from, as plain
+    JSON types for tick logs (tick_recorder.replay restores it before each
+    tick). Gate order times are stored as ages, since the replay clock is
+    not the live one.
+    """
+    engine = risk_manager.risk_engine
+    now = risk_gate.clock()
+    return {
+        "risk_manager": {
+            "peak_net_worth": risk_manager.peak_net_worth,
+            "last_bar_time": None if risk_manager.last_bar_time is None else int(risk_manager.last_bar_time),
+            "risk_engine": engine.state() if engine is not None else None,
+        },
+        "risk_gate": {
+            "peak_net_worth": risk_gate.peak_net_worth,
+            "net_worth": risk_gate.net_worth,
+            "killed": risk_gate.killed,
+            "prices": dict(risk_gate.prices),
+            "positions": dict(risk_gate.positions),
+            "order_ages": [now - t for t in risk_gate.order_times],
+        },
+    }
+
+
+def restore_risk_state(state, risk_manager, risk_gate):
+    """Put a capture_risk_state() back, with order times on the gate's clock."""
+    manager = state["risk_manager"]
+    risk_manager.peak_net_worth = manager["peak_net_worth"]
+    risk_manager.last_bar_time = manager["last_bar_time"]
+    engine = manager["risk_engine"]
+    if engine is None:
+        risk_manager.risk_engine = None
+    else:
+        n_assets = len(engine["mean"])
+        if risk_manager.risk_engine is None or risk_manager.risk_engine.n_assets != n_assets:
+            risk_manager.risk_engine = StreamingRiskEngine(n_assets)
+        risk_manager.risk_engine.load_state(engine)
+
+    gate = state["risk_gate"]
+    risk_gate.peak_net_worth = gate["peak_net_worth"]
+    risk_gate.net_worth = gate["net_worth"]
+    risk_gate.killed = gate["killed"]
+    risk_gate.prices = dict(gate["prices"])
+    risk_gate.positions = dict(gate["positions"])
+    risk_gate.positions_version += 1
+    now = risk_gate.clock()
+    risk_gate.order_times = deque(now - age for age in gate["order_ages"])
+
+
+def restore_trader_state(state, data_manager, risk_manager, risk_gate, sentiment_manager):
+    """Load a captured state back into freshly constructed objects."""
+    if data_manager.candle_cache is not None:
+        data_manager.candle_cache.update(state.get("candles", {}))
+
+    risk_manager.peak_net_worth = state["risk_manager"]["peak_net_worth"]
+    engine = state["risk_manager"]["risk_engine"]
+    if (risk_manager.risk_engine is not None and engine is not None
+            and engine.n_assets == risk_manager.risk_engine.n_assets):
+        # Covariance estimates and the last bar they include carry over
+        risk_manager.risk_engine = engine
+        risk_manager.last_bar_time = state["risk_manager"].get("last_bar_time")
+
+    gate = state["risk_gate"]
+    risk_gate.peak_net_worth = gate["peak_net_worth"]
+    risk_gate.net_worth = gate["net_worth"]
+    risk_gate.killed = gate["killed"]
+    risk_gate.prices.update(gate["prices"])
+    risk_gate.positions = dict(gate["positions"])
+    # Orders sent before the restart still count toward the per-minute limit;
+    # convert their wall-clock times onto the gate's (monotonic) clock
+    offset = risk_gate.clock() - time.time()
+    for order in state.get("pending_orders", []):
+        risk_gate.order_times.append(order["time"] + offset)
+
+    sentiment = state.get("sentiment", {})
+    if hasattr(sentiment_manager, "realtime_tweets"):
+        sentiment_manager.realtime_tweets = list(sentiment.get("tweets", []))
+    if sentiment.get("last_score") is not None:
+        sentiment_manager.last_score = sentiment["last_score"]
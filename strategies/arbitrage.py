@@ -1,7 +1,35 @@
 # ai_trader/strategies/arbitrage.py
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+import metrics
+from config import (
+    ARB_LEG_TIMEOUT_SECONDS,
+    ARB_MAX_NOTIONAL,
+    ARB_MAX_SLIPPAGE_PERCENT,
+    ARB_MIN_EDGE_PERCENT,
+    ARB_FEE_PERCENT,
+    ARB_FILL_POLL_SECONDS,
+    ARB_BALANCE_TTL_SECONDS
+)
+from order_status import accepted_order_id, order_error, wait_for_fill
+from product_catalog import get_product_catalog
 from .base_strategy import Strategy
 
+LEG_SECONDS = metrics.histogram("arb_leg_seconds", "Send to fill report per arbitrage leg, by side")
+LEG_SKEW_SECONDS = metrics.histogram("arb_leg_skew_seconds", "Time between the two legs' fill reports")
+EXECUTIONS = metrics.counter("arb_executions_total", "Arbitrage attempts by outcome")
+
+
 class ArbitrageStrategy(Strategy):
+    def __init__(self, executor=None):
+        # ArbitrageExecutor, created from the clients on first execute_trades if not given
+        self.executor = executor
+
     def generate_signals(self, market_data):
         signals = []
         for pair in market_data:
@@ -13,13 +41,265 @@ class ArbitrageStrategy(Strategy):
                     'pair': pair,
                     'buy_exchange': min(prices, key=prices.get),
                     'sell_exchange': max(prices, key=prices.get),
+                    'buy_price': min_price,
+                    'sell_price': max_price,
                     'profit': max_price - min_price
                 })
         return signals
 
     def execute_trades(self, signals, exchange_clients):
-        for signal in signals:
-            buy_client = exchange_clients[signal['buy_exchange']]
-            sell_client = exchange_clients[signal['sell_exchange']]
-            buy_client.place_order(signal['pair'], 'buy', signal['profit'] / 2)
-            sell_client.place_order(signal['pair'], 'sell', signal['profit'] / 2)
\ No newline at end of file
+        if self.executor is None:
+            self.executor = ArbitrageExecutor(exchange_clients)
+        return [self.executor.execute(signal) for signal in signals]
+
+
+class ArbitrageExecutor:
+    """
+    Sends both legs of an arbitrage at the same time, as immediate-or-cancel
+    limit orders `max_slippage` through the observed prices, from a thread
+    pool so neither leg waits on the other's round trip.
+
+    Size is the smallest of: `max_notional`, the buy exchange's quote
+    balance, the sell exchange's base balance and, where an OrderBooks is
+    given for an exchange, the depth within `max_slippage`, rounded down
+    to the product's base increment from `catalog`; limit prices are on its
+    price increment and a size under its minimum is skipped. Balances are
+    cached per exchange for `balance_ttl` seconds and moved by the legs'
+    fills, so sizing rarely makes a network call; a hedge or an unknown
+    fill drops the cache for a refresh.
+
+    Each leg has `leg_timeout` to report its fill: its order is polled
+    until terminal (FILLED, CANCELLED, EXPIRED, FAILED) within that time,
+    and a leg still open at the end counts as unknown rather than
+    unfilled, so no hedge is sent against it. Once both have reported,
+    any base imbalance between them is hedged: the short leg is completed
+    with a market order on its own exchange, or if that is rejected the
+    excess is unwound where it was filled. A leg past its deadline is
+    settled when it finally reports. The time between the two legs' fill
+    reports (leg skew) is the exposure window; it goes to the
+    arb_leg_skew_seconds histogram and `skews`.
+    """
+
+    def __init__(self, clients, order_books=None, leg_timeout=ARB_LEG_TIMEOUT_SECONDS,
+                 max_notional=ARB_MAX_NOTIONAL, max_slippage=ARB_MAX_SLIPPAGE_PERCENT,
+                 min_edge=ARB_MIN_EDGE_PERCENT, fee=ARB_FEE_PERCENT, catalog=None, workers=4,
+                 poll=ARB_FILL_POLL_SECONDS, balance_ttl=ARB_BALANCE_TTL_SECONDS):
+        self.clients = clients
+        self.order_books = dict(order_books or {})
+        self.leg_timeout = leg_timeout
+        self.max_notional = max_notional
+        self.max_slippage = max_slippage
+        self.min_edge = min_edge
+        self.fee = fee
+        self.catalog = catalog or get_product_catalog()
+        self.poll = poll
+        self.balance_ttl = balance_ttl
+        self.balances = {}    # exchange -> {currency: available}
+        self.balances_read = {}   # exchange -> monotonic time of the last read
+        self.skews = deque(maxlen=1000)
+        self.results = deque(maxlen=1000)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="arb-leg")
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Sizing
+    def refresh_balances(self, exchanges=None):
+        """Re-read balances from the given exchanges (default all), concurrently."""
+        exchanges = list(exchanges or self.clients)
+        futures = {ex: self.pool.submit(self.clients[ex].get_account_balances) for ex in exchanges}
+        for exchange, future in futures.items():
+            rows = future.result()
+            if isinstance(rows, dict) or any("error" in row for row in rows):
+                continue
+            with self._lock:
+                self.balances[exchange] = {row["currency"]: float(row["balance"]) for row in rows}
+                self.balances_read[exchange] = time.monotonic()
+        return self.balances
+
+    def _available(self, exchange, currency):
+        read = self.balances_read.get(exchange)
+        if exchange not in self.balances or read is None or time.monotonic() - read > self.balance_ttl:
+            self.refresh_balances([exchange])
+        return self.balances.get(exchange, {}).get(currency, 0.0)
+
+    def limits(self, signal):
+        """IOC limit prices of the (buy, sell) legs, on the product's price increment."""
+        product = self.catalog.get(signal["pair"])
+        return (product.price(signal["buy_price"] * (1 + self.max_slippage), "buy"),
+                product.price(signal["sell_price"] * (1 - self.max_slippage), "sell"))
+
+    def edge(self, signal):
+        """Worst-case edge per unit after fees, at the leg limits, as a fraction of the buy price."""
+        buy_limit, sell_limit = self.limits(signal)
+        return (sell_limit * (1 - self.fee) - buy_limit * (1 + self.fee)) / buy_limit
+
+    def size(self, signal):
+        """Base units both legs can fill, rounded down to the base increment."""
+        pair = signal["pair"]
+        base, quote = pair.split("-")
+        buy_limit, _sell_limit = self.limits(signal)
+        caps = [
+            self.max_notional / buy_limit,
+            self._available(signal["buy_exchange"], quote) / (buy_limit * (1 + self.fee)),
+            self._available(signal["sell_exchange"], base),
+        ]
+        for exchange, side in ((signal["buy_exchange"], "buy"), (signal["sell_exchange"], "sell")):
+            books = self.order_books.get(exchange)
+            depth = books.max_fill(pair, side, self.max_slippage) if books is not None else None
+            if depth is not None:
+                caps.append(depth[0])
+        return self.catalog.get(pair).size(max(0.0, min(caps)))
+
+    # ------------------------------------------------------------------
+    # Execution
+    def execute(self, signal):
+        """
+        Run one arbitrage. Returns a result dict whose "outcome" is final
+        (filled, partial, hedged, unhedged, missed, unknown, skipped) unless
+        a leg missed its deadline, in which case it reads "pending" until
+        the late leg reports and the result is settled in place.
+        """
+        result = {"pair": signal["pair"], "buy_exchange": signal["buy_exchange"],
+                  "sell_exchange": signal["sell_exchange"], "size": 0.0, "legs": {}}
+        if self.edge(signal) < self.min_edge:
+            return self._finish(result, "skipped", reason="edge below minimum after fees")
+        size = self.size(signal)
+        buy_limit, sell_limit = self.limits(signal)
+        reason = self.catalog.get(signal["pair"]).check(size=size, price=buy_limit, market=False)
+        if reason:
+            return self._finish(result, "skipped", reason=reason)
+        result["size"] = size
+
+        start = time.perf_counter()
+        futures = {
+            "buy": self.pool.submit(self._leg, signal["buy_exchange"], signal["pair"], "buy", buy_limit, size, start),
+            "sell": self.pool.submit(self._leg, signal["sell_exchange"], signal["pair"], "sell", sell_limit, size, start),
+        }
+        _done, pending = wait(futures.values(), timeout=self.leg_timeout)
+        result["outcome"] = "pending"
+        result["timed_out"] = sorted(side for side, f in futures.items() if f in pending)
+        self.results.append(result)
+        for side, future in futures.items():
+            future.add_done_callback(lambda f, side=side: self._leg_reported(result, side, f))
+        return result
+
+    def _leg(self, exchange, pair, side, limit, size, start):
+        client = self.clients[exchange]
+        sent = time.perf_counter()
+        report = {"exchange": exchange, "side": side, "limit": limit, "size": size,
+                  "order_id": None, "filled": 0.0, "price": None, "sent": sent - start}
+        try:
+            resp = client.place_ioc_order(pair, side, limit, size)
+            report["order_id"] = accepted_order_id(resp)
+            if report["order_id"] is None:
+                report["error"] = order_error(resp)
+            else:
+                remaining = self.leg_timeout - (time.perf_counter() - start)
+                status = wait_for_fill(client, report["order_id"], timeout=max(0.0, remaining), poll=self.poll)
+                if "error" in status:
+                    # Placed, but its fill is unknown
+                    report["filled"] = None
+                    report["error"] = status["error"]
+                elif not status["terminal"]:
+                    # Still working: more may fill, so it is neither filled nor unfilled yet
+                    report["filled"] = None
+                    report["error"] = f"order still {status.get('status')}"
+                else:
+                    report["filled"] = float(status["filled_size"])
+                    report["price"] = float(status["average_filled_price"]) or None
+        except Exception as e:
+            report["filled"] = None if report["order_id"] else 0.0
+            report["error"] = str(e)
+        report["done"] = time.perf_counter() - start
+        LEG_SECONDS.observe(report["done"] - report["sent"], side=side)
+        return report
+
+    def _leg_reported(self, result, side, future):
+        with self._lock:
+            result["legs"][side] = future.result()
+            if len(result["legs"]) < 2:
+                return
+        self._settle(result)
+
+    def _settle(self, result):
+        buy, sell = result["legs"]["buy"], result["legs"]["sell"]
+        skew = abs(buy["done"] - sell["done"])
+        result["leg_skew"] = skew
+        LEG_SKEW_SECONDS.observe(skew)
+        self.skews.append(skew)
+
+        if buy["filled"] is None or sell["filled"] is None:
+            # Cannot hedge blind: leave it to reconciliation, refresh balances first
+            self._invalidate(buy["exchange"], sell["exchange"])
+            return self._finish(result, "unknown")
+
+        base, quote = result["pair"].split("-")
+        self._apply_fill(buy["exchange"], base, quote, buy["filled"], buy["price"], "buy")
+        self._apply_fill(sell["exchange"], base, quote, sell["filled"], sell["price"], "sell")
+        matched = min(buy["filled"], sell["filled"])
+        result["matched"] = matched
+        result["expected_pnl"] = (
+            matched * (sell["price"] * (1 - self.fee) - buy["price"] * (1 + self.fee)) if matched > 0 else 0.0
+        )
+        imbalance = buy["filled"] - sell["filled"]
+        result["imbalance"] = imbalance
+        # Under the minimum order size there is nothing the exchange would let us hedge
+        min_size = self.catalog.get(result["pair"]).base_min_size
+        if abs(imbalance) < min_size:
+            if matched <= 0:
+                return self._finish(result, "missed")
+            return self._finish(result, "filled" if matched >= result["size"] - min_size else "partial")
+        result["hedge"] = self._hedge(result["pair"], buy["exchange"], sell["exchange"], imbalance)
+        return self._finish(result, "hedged" if result["hedge"]["ok"] else "unhedged")
+
+    def _hedge(self, pair, buy_exchange, sell_exchange, imbalance):
+        """Flatten `imbalance` base units (+ long from an unfilled sell, - short from an unfilled buy)."""
+        size = self.catalog.get(pair).size(abs(imbalance))
+        if imbalance > 0:
+            # Complete the sell where it was meant to go, else sell back where it was bought
+            attempts = [(sell_exchange, "sell"), (buy_exchange, "sell")]
+        else:
+            attempts = [(buy_exchange, "buy"), (sell_exchange, "buy")]
+        hedge = {"size": size, "ok": False, "attempts": []}
+        for exchange, side in attempts:
+            resp = self.clients[exchange].place_market_order(pair, side, size=size)
+            ok = accepted_order_id(resp) is not None
+            hedge["attempts"].append({"exchange": exchange, "side": side, "ok": ok})
+            if ok:
+                hedge.update(exchange=exchange, side=side, ok=True, order_id=accepted_order_id(resp))
+                break
+        self._invalidate(buy_exchange, sell_exchange)
+        return hedge
+
+    def _apply_fill(self, exchange, base, quote, size, price, side):
+        if not size:
+            return
+        with self._lock:
+            balances = self.balances.get(exchange)
+            if balances is None:
+                return
+            sign = 1 if side == "buy" else -1
+            balances[base] = balances.get(base, 0.0) + sign * size
+            balances[quote] = balances.get(quote, 0.0) - sign * size * price - size * price * self.fee
+
+    def _invalidate(self, *exchanges):
+        with self._lock:
+            for exchange in exchanges:
+                self.balances.pop(exchange, None)
+
+    def _finish(self, result, outcome, reason=None):
+        result["outcome"] = outcome
+        if reason:
+            result["reason"] = reason
+        EXECUTIONS.inc(outcome=outcome)
+        return result
+
+    def skew_percentiles(self, quantiles=(50, 90, 99)):
+        """Leg skew (seconds) at the given percentiles over recent arbitrages."""
+        if not self.skews:
+            return {}
+        values = np.percentile(np.fromiter(self.skews, dtype=np.float64), quantiles)
+        return {f"p{q}": float(v) for q, v in zip(quantiles, values)}
+
+    def close(self):
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,287 @@
+# ai_trader/strategies/market_making.py
+import math
+import time
+import threading
+
+import metrics
+from config import (
+    MM_QUOTE_NOTIONAL,
+    MM_HALF_SPREAD,
+    MM_MAX_INVENTORY_USD,
+    MM_INVENTORY_SKEW,
+    MM_REPRICE_TOLERANCE,
+    MM_SIZE_TOLERANCE,
+    MM_REJECT_BACKOFF_SECONDS
+)
+from order_status import accepted_order_id
+from product_catalog import get_product_catalog
+from .base_strategy import Strategy
+
+SIZE_DECIMALS = 8
+
+QUOTE_ORDERS = metrics.counter("mm_orders_total", "Market-making quote placements and cancels")
+
+
+class _Book:
+    """Per-product quoting state: last touch, inventory and the two resting quotes."""
+    __slots__ = ("best_bid", "best_ask", "inventory", "bid", "ask", "paused_until")
+
+    def __init__(self):
+        self.best_bid = None
+        self.best_ask = None
+        self.inventory = 0.0
+        self.bid = None   # resting quote: {"order_id", "price", "size" (unfilled), "filled"}
+        self.ask = None
+        self.paused_until = 0.0   # no requotes before this (clock) time after a rejection
+
+
+class MarketMakingStrategy(Strategy):
+    """
+    Event-driven two-sided quoting for a set of products on one exchange
+    client (CoinbaseClient or sim_exchange.SimulatedExchange).
+
+    Quotes sit `half_spread` either side of a center price that is skewed
+    away from the current inventory: long inventory moves both quotes down
+    (sell more readily, buy less readily) and shrinks the bid, short
+    inventory the opposite. At `max_inventory_usd` the side that would add
+    to the position is not quoted at all.
+
+    on_book() is the hot path. An unchanged touch returns immediately, and a
+    resting quote is only cancelled and replaced when the desired price
+    moved more than `reprice_tolerance` (fraction of mid), its size is off
+    by more than `size_tolerance`, or it would no longer be passive, so
+    most book updates cause no exchange traffic. A rejected quote (e.g.
+    by the account's pre-trade order rate limit) pauses requoting of that
+    product for `reject_backoff` seconds instead of retrying on every
+    book event. Fills come in through on_fill(), either pushed by the
+    exchange or, with `fill_poll_interval`, read back by poll_fills() from
+    on_order_book at most that often; sync() reconciles inventory and open
+    orders with the exchange's view.
+    """
+
+    def __init__(self, exchange, product_ids, quote_notional=MM_QUOTE_NOTIONAL, half_spread=MM_HALF_SPREAD,
+                 max_inventory_usd=MM_MAX_INVENTORY_USD, skew=MM_INVENTORY_SKEW,
+                 reprice_tolerance=MM_REPRICE_TOLERANCE, size_tolerance=MM_SIZE_TOLERANCE, tick_sizes=None,
+                 catalog=None, reject_backoff=MM_REJECT_BACKOFF_SECONDS, clock=time.monotonic,
+                 fill_poll_interval=None):
+        self.exchange = exchange
+        self.quote_notional = quote_notional
+        self.half_spread = half_spread
+        self.max_inventory_usd = max_inventory_usd
+        self.skew = skew
+        self.reprice_tolerance = reprice_tolerance
+        self.size_tolerance = size_tolerance
+        self.reject_backoff = reject_backoff
+        self.clock = clock
+        self.fill_poll_interval = fill_poll_interval
+        self._last_fill_poll = None
+        # Price tick overrides; otherwise ticks, size increments and minimums come from the catalog
+        self.tick_sizes = dict(tick_sizes or {})
+        self.catalog = catalog or get_product_catalog()
+        self.books = {pid: _Book() for pid in product_ids}
+
+        self.updates = 0
+        self.placed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        # Fills may arrive on another thread (or re-entrantly from a simulated exchange)
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # Quote model
+    def desired_quotes(self, product_id, best_bid, best_ask, inventory):
+        """
+        ((bid_price, bid_size), (ask_price, ask_size)) for the given touch and
+        inventory (base units). A size of 0 means that side is not quoted.
+        """
+        product = self.catalog.get(product_id)
+        tick = self.tick_sizes.get(product_id) or float(product.price_increment)
+        mid = (best_bid + best_ask) / 2.0
+        ratio = max(-1.0, min(1.0, inventory * mid / self.max_inventory_usd))
+        center = mid * (1 - self.skew * self.half_spread * ratio)
+
+        bid = math.floor(center * (1 - self.half_spread) / tick + 1e-9) * tick
+        ask = math.ceil(center * (1 + self.half_spread) / tick - 1e-9) * tick
+        # Stay passive: never at or through the opposite side of the book
+        bid = round(min(bid, best_ask - tick), 10)
+        ask = round(max(ask, best_bid + tick), 10)
+
+        size = self.quote_notional / mid
+        step = float(product.base_increment)
+        bid_size = _lots(size * min(1.0, 1.0 - ratio), step, product.base_min_size)
+        ask_size = _lots(size * min(1.0, 1.0 + ratio), step, product.base_min_size)
+        return (bid, bid_size), (ask, ask_size)
+
+    def _keep(self, resting, price, size, mid):
+        return (size > 0
+                and abs(resting["price"] - price) <= self.reprice_tolerance * mid
+                and abs(resting["size"] - size) <= self.size_tolerance * size)
+
+    # ------------------------------------------------------------------
+    # Events
+    def on_book(self, product_id, best_bid, best_ask):
+        """Top-of-book change for `product_id`. Returns the exchange responses it caused."""
+        book = self.books.get(product_id)
+        if book is None or (best_bid == book.best_bid and best_ask == book.best_ask):
+            return []
+        with self._lock:
+            self.updates += 1
+            book.best_bid, book.best_ask = best_bid, best_ask
+            return self._requote(product_id, book)
+
+    def on_order_book(self, product_id, book):
+        """order_book.OrderBooks listener."""
+        bid, ask = book.best_bid(), book.best_ask()
+        if bid is not None and ask is not None:
+            self.on_book(product_id, bid[0], ask[0])
+        if self.fill_poll_interval is not None and (
+                self._last_fill_poll is None or self.clock() - self._last_fill_poll >= self.fill_poll_interval):
+            self.poll_fills()
+
+    def poll_fills(self):
+        """
+        Ask the exchange (get_order) how much each resting quote has filled
+        and pass whatever on_fill has not seen yet to it. Returns the
+        exchange responses of the requotes that caused.
+        """
+        self._last_fill_poll = self.clock()
+        with self._lock:
+            quotes = [(pid, side, dict(quote)) for pid, book in self.books.items()
+                      for side, quote in (("buy", book.bid), ("sell", book.ask)) if quote is not None]
+        results = []
+        for pid, side, quote in quotes:
+            status = self.exchange.get_order(quote["order_id"])
+            if "error" in status:
+                continue
+            new = float(status.get("filled_size") or 0) - quote["filled"]
+            if new > 10 ** -SIZE_DECIMALS:
+                results.extend(self.on_fill({"order_id": quote["order_id"], "product_id": pid, "side": side,
+                                             "price": float(status.get("average_filled_price") or quote["price"]),
+                                             "size": new}))
+        return results
+
+    def on_fill(self, fill):
+        """A fill of one of our quotes: {order_id, product_id, side, price, size}."""
+        book = self.books.get(fill["product_id"])
+        if book is None:
+            return []
+        with self._lock:
+            size = float(fill["size"])
+            book.inventory += size if fill["side"] == "buy" else -size
+            resting = book.bid if fill["side"] == "buy" else book.ask
+            if resting is not None and resting["order_id"] == fill["order_id"]:
+                resting["size"] -= size
+                resting["filled"] += size
+                if resting["size"] <= 10 ** -SIZE_DECIMALS:
+                    if fill["side"] == "buy":
+                        book.bid = None
+                    else:
+                        book.ask = None
+            if book.best_bid is None:
+                return []
+            return self._requote(fill["product_id"], book)
+
+    def sync(self, inventory, open_order_ids=None):
+        """
+        Take the exchange's positions (product_id -> base units) and, if
+        given, its open order ids as the truth, forget quotes that are no
+        longer open, and requote every product.
+        """
+        results = []
+        with self._lock:
+            for pid, book in self.books.items():
+                book.inventory = float(inventory.get(pid, 0.0))
+                if open_order_ids is not None:
+                    if book.bid is not None and book.bid["order_id"] not in open_order_ids:
+                        book.bid = None
+                    if book.ask is not None and book.ask["order_id"] not in open_order_ids:
+                        book.ask = None
+                if book.best_bid is not None:
+                    results.extend(self._requote(pid, book))
+        return results
+
+    def cancel_all(self):
+        """Pull every resting quote."""
+        with self._lock:
+            ids = []
+            for book in self.books.values():
+                ids += [q["order_id"] for q in (book.bid, book.ask) if q is not None]
+                book.bid = book.ask = None
+            if not ids:
+                return []
+            self.cancelled += len(ids)
+            QUOTE_ORDERS.inc(len(ids), action="cancel")
+            return [self.exchange.cancel_orders(ids)]
+
+    # ------------------------------------------------------------------
+    # Strategy interface (batch form of the same logic)
+    def generate_signals(self, market_data):
+        """market_data: {product_id: {"bid": price, "ask": price}} -> desired quotes per product."""
+        signals = []
+        for pid, data in market_data.items():
+            book = self.books.get(pid)
+            if book is None:
+                continue
+            bid, ask = self.desired_quotes(pid, data["bid"], data["ask"], book.inventory)
+            signals.append({"product_id": pid, "best_bid": data["bid"], "best_ask": data["ask"],
+                            "bid": bid, "ask": ask})
+        return signals
+
+    def execute_trades(self, signals, exchange_clients=None):
+        """Bring resting quotes in line with `signals` (quotes go to self.exchange)."""
+        results = []
+        for signal in signals:
+            results.extend(self.on_book(signal["product_id"], signal["best_bid"], signal["best_ask"]))
+        return results
+
+    # ------------------------------------------------------------------
+    # Order management
+    def _requote(self, product_id, book):
+        if self.clock() < book.paused_until:
+            return []
+        bid, ask = self.desired_quotes(product_id, book.best_bid, book.best_ask, book.inventory)
+        mid = (book.best_bid + book.best_ask) / 2.0
+
+        cancels, places = [], []
+        for side, (price, size) in (("buy", bid), ("sell", ask)):
+            resting = book.bid if side == "buy" else book.ask
+            if resting is not None:
+                passive = resting["price"] < book.best_ask if side == "buy" else resting["price"] > book.best_bid
+                if passive and self._keep(resting, price, size, mid):
+                    continue
+                cancels.append(resting["order_id"])
+                if side == "buy":
+                    book.bid = None
+                else:
+                    book.ask = None
+            if size > 0:
+                places.append((side, price, size))
+
+        results = []
+        if cancels:
+            self.cancelled += len(cancels)
+            QUOTE_ORDERS.inc(len(cancels), action="cancel")
+            results.append(self.exchange.cancel_orders(cancels))
+        for side, price, size in places:
+            resp = self.exchange.place_limit_order(product_id, side, price, size, post_only=True)
+            results.append(resp)
+            order_id = accepted_order_id(resp)
+            if order_id is None:
+                self.rejected += 1
+                QUOTE_ORDERS.inc(action="rejected")
+                book.paused_until = self.clock() + self.reject_backoff
+                continue
+            self.placed += 1
+            QUOTE_ORDERS.inc(action="place")
+            quote = {"order_id": order_id, "price": price, "size": size, "filled": 0.0}
+            if side == "buy":
+                book.bid = quote
+            else:
+                book.ask = quote
+        return results
+
+
+def _lots(size, step, min_size):
+    """`size` rounded down to `step`; 0 (not quoted) when under `min_size`."""
+    size = round(math.floor(size / step + 1e-9) * step, 10)
+    return size if size >= min_size else 0.0
@@ -0,0 +1,238 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import (
+    BARS_PER_YEAR,
+    MAX_POSITION_PERCENT,
+    MAX_DRAWDOWN_PERCENT,
+    TRANSACTION_FEE_PERCENT,
+    STRESS_PATHS,
+    STRESS_BARS,
+    STRESS_BLOCK_BARS,
+    STRESS_CHUNK_PATHS,
+    STRESS_CORRELATION_SHOCK,
+    STRESS_VOL_SCALE,
+    STRESS_GAP_SIZE,
+    STRESS_GAPS_PER_YEAR
+)
+from risk_manager import RiskManager
+
+SCENARIOS = ("bootstrap", "correlation", "gap")
+
+# Simulated arrays are time-major, (n_bars, n_paths, n_assets), so each
+# bar of every path is one contiguous slice.
+
+
+def log_returns(closes):
+    """Per-bar log returns (n_rows - 1, n_assets) of a close matrix, skipping rows with gaps in the data."""
+    closes = np.asarray(closes, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(closes), axis=0)
+    return returns[np.isfinite(returns).all(axis=1)]
+
+
+def block_bootstrap(returns, n_paths, n_bars, block=STRESS_BLOCK_BARS, rng=None):
+    """
+    Paths of `n_bars` log returns built from randomly chosen blocks of
+    `block` consecutive historical bars. Whole rows are sampled, so
+    cross-asset correlation and short-range autocorrelation (volatility
+    clustering within a block) are kept.
+    """
+    rng = rng or np.random.default_rng()
+    returns = np.asarray(returns, dtype=np.float64)
+    block = max(1, min(block, len(returns)))
+    n_blocks = -(-n_bars // block)
+    starts = rng.integers(0, len(returns) - block + 1, size=(n_blocks, 1, n_paths))
+    index = (starts + np.arange(block)[None, :, None]).reshape(n_blocks * block, n_paths)[:n_bars]
+    return returns[index]
+
+
+def shocked_correlation(returns, n_paths, n_bars, shock=STRESS_CORRELATION_SHOCK,
+                        vol_scale=STRESS_VOL_SCALE, rng=None):
+    """
+    Gaussian log returns with the historical means, volatilities scaled by
+    `vol_scale` and every correlation pulled `shock` of the way toward 1,
+    the way assets move together in a sell-off.
+    """
+    rng = rng or np.random.default_rng()
+    returns = np.asarray(returns, dtype=np.float64)
+    n_assets = returns.shape[1]
+    vol = returns.std(axis=0) * vol_scale
+    corr = np.nan_to_num(np.atleast_2d(np.corrcoef(returns, rowvar=False)))
+    np.fill_diagonal(corr, 1.0)
+    corr = corr + shock * (1.0 - corr)
+    # Square root by eigendecomposition: the shocked matrix may be singular
+    eigvals, eigvecs = np.linalg.eigh(corr * np.outer(vol, vol))
+    root = eigvecs * np.sqrt(np.clip(eigvals, 0.0, None))
+    draws = rng.standard_normal((n_bars, n_paths, n_assets))
+    return returns.mean(axis=0) + draws @ root.T
+
+
+def add_gaps(paths, size=STRESS_GAP_SIZE, per_year=STRESS_GAPS_PER_YEAR, rng=None,
+             bars_per_year=BARS_PER_YEAR):
+    """
+    Add market-wide gaps in place: every asset moves by `size` (e.g. -0.3)
+    within one bar, a Poisson number of times per path averaging `per_year`.
+    """
+    rng = rng or np.random.default_rng()
+    n_bars, n_paths = paths.shape[:2]
+    counts = rng.poisson(per_year * n_bars / bars_per_year, n_paths)
+    hit_paths = np.repeat(np.arange(n_paths), counts)
+    hit_bars = rng.integers(0, n_bars, len(hit_paths))
+    np.add.at(paths, (hit_bars, hit_paths), np.log1p(size))
+    return paths
+
+
+def generate_returns(scenario, returns, n_paths, n_bars, rng=None, block=STRESS_BLOCK_BARS,
+                     shock=STRESS_CORRELATION_SHOCK, vol_scale=STRESS_VOL_SCALE,
+                     gap_size=STRESS_GAP_SIZE, gaps_per_year=STRESS_GAPS_PER_YEAR):
+    """Log-return paths (n_bars, n_paths, n_assets) for one of SCENARIOS."""
+    rng = rng or np.random.default_rng()
+    if scenario == "bootstrap":
+        return block_bootstrap(returns, n_paths, n_bars, block, rng)
+    if scenario == "correlation":
+        return shocked_correlation(returns, n_paths, n_bars, shock, vol_scale, rng)
+    if scenario == "gap":
+        return add_gaps(block_bootstrap(returns, n_paths, n_bars, block, rng), gap_size, gaps_per_year, rng)
+    raise ValueError(f"unknown scenario {scenario!r}, expected one of {SCENARIOS}")
+
+
+def price_paths(paths):
+    """Turn log-return paths into prices starting from 1.0, in place."""
+    np.cumsum(paths, axis=0, out=paths)
+    return np.exp(paths, out=paths)
+
+
+def simulate(prices, weights, risk_manager=None, initial_balance=10000, fee=TRANSACTION_FEE_PERCENT):
+    """
+    Rebalance every path to `weights` (n_assets,) or (n_paths, n_assets)
+    at each bar of `prices` (n_bars, n_paths, n_assets), under the
+    RiskManager position and drawdown rules, with the same per-asset
+    trade order, fees and cash check as MultiAssetTradingEnv.step.
+
+    Returns per-path arrays: final_net_worth, max_drawdown, halt_bar
+    (first bar the drawdown limit tripped, -1 if never), breach_bars (bars
+    where price drift had pushed a position over the cap before the
+    rebalance), max_position (largest such fraction) and fees.
+    """
+    risk_manager = risk_manager or RiskManager()
+    prices = np.asarray(prices, dtype=np.float64)
+    n_bars, n_paths, n_assets = prices.shape
+    weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), (n_paths, n_assets))
+
+    cash = np.full(n_paths, float(initial_balance))
+    holdings = np.zeros((n_paths, n_assets))
+    peaks = cash.copy()
+    max_drawdown = np.zeros(n_paths)
+    halt_bar = np.full(n_paths, -1, dtype=np.int64)
+    breach_bars = np.zeros(n_paths, dtype=np.int64)
+    max_position = np.zeros(n_paths)
+    fees = np.zeros(n_paths)
+
+    for t in range(n_bars):
+        bar = prices[t]
+        values = holdings * bar
+        net_worth = cash + values.sum(axis=1)
+        target = risk_manager.apply_risk_constraints_batch(weights, net_worth, peaks)
+
+        drawdown = 1 - net_worth / peaks
+        np.maximum(max_drawdown, drawdown, out=max_drawdown)
+        halt_bar[(halt_bar < 0) & (drawdown > risk_manager.max_drawdown)] = t
+        position = values.max(axis=1) / np.where(net_worth > 0, net_worth, np.inf)
+        np.maximum(max_position, position, out=max_position)
+        breach_bars += position > risk_manager.max_position + 1e-9
+
+        diffs = net_worth[:, None] * target - values
+        for i in range(n_assets):
+            diff = diffs[:, i]
+            fee_usd = np.abs(diff) * fee
+            # Buys only go through when cash covers them; sells always do.
+            # Either way cash moves by -(diff + fee).
+            trade = (diff <= -1e-8) | ((diff >= 1e-8) & (diff + fee_usd <= cash))
+            cash -= np.where(trade, diff + fee_usd, 0.0)
+            holdings[:, i] += np.where(trade, diff / bar[:, i], 0.0)
+            fees += np.where(trade, fee_usd, 0.0)
+
+    final = cash + (holdings * prices[-1]).sum(axis=1)
+    np.maximum(max_drawdown, 1 - final / np.maximum(peaks, final), out=max_drawdown)
+    return {
+        "final_net_worth": final,
+        "max_drawdown": max_drawdown,
+        "halt_bar": halt_bar,
+        "breach_bars": breach_bars,
+        "max_position": max_position,
+        "fees": fees,
+    }
+
+
+def _stress_chunk(task):
+    """One worker task: generate a chunk of paths and simulate it."""
+    rng = np.random.default_rng(task["seed"])
+    paths = generate_returns(task["scenario"], task["returns"], task["n_paths"], task["n_bars"],
+                             rng, **task["options"])
+    risk_manager = RiskManager(max_position=task["max_position"], max_drawdown=task["max_drawdown"])
+    return simulate(price_paths(paths), task["weights"], risk_manager, task["initial_balance"])
+
+
+def summarize(results, n_bars, initial_balance=10000):
+    """Drawdown and return distributions plus limit-hit rates over all paths."""
+    drawdown = results["max_drawdown"]
+    total_return = results["final_net_worth"] / initial_balance - 1
+    halted = results["halt_bar"] >= 0
+    n_paths = len(drawdown)
+    quantiles = (5, 25, 50, 75, 95, 99)
+
+    def distribution(x):
+        stats = {"mean": float(x.mean())}
+        stats.update({f"p{q}": float(v) for q, v in zip(quantiles, np.percentile(x, quantiles))})
+        stats["max"] = float(x.max())
+        return stats
+
+    counts, edges = np.histogram(drawdown, bins=20, range=(0.0, 1.0))
+    return {
+        "paths": n_paths,
+        "bars": n_bars,
+        "max_drawdown": distribution(drawdown),
+        "total_return": distribution(total_return),
+        "drawdown_limit_hit_rate": float(halted.mean()),
+        "median_bars_to_halt": float(np.median(results["halt_bar"][halted])) if halted.any() else None,
+        "position_limit_breach_rate": float(results["breach_bars"].sum() / (n_paths * n_bars)),
+        "max_position": distribution(results["max_position"]),
+        "fees": distribution(results["fees"]),
+        "drawdown_histogram": {"edges": edges.round(2).tolist(), "counts": counts.tolist()},
+    }
+
+
+def run_stress(returns, scenario="bootstrap", n_paths=STRESS_PATHS, n_bars=STRESS_BARS, weights=None,
+               max_position=MAX_POSITION_PERCENT, max_drawdown=MAX_DRAWDOWN_PERCENT, initial_balance=10000,
+               workers=None, chunk_paths=STRESS_CHUNK_PATHS, seed=None, **options):
+    """
+    Monte Carlo stress test of the RiskManager limits: `n_paths` paths of
+    `n_bars` bars generated from historical log `returns` (n_rows,
+    n_assets) for `scenario`, each rebalanced to `weights` (default equal
+    weight, fully invested). Paths are split into chunks of `chunk_paths`
+    simulated on a pool of `workers` processes (default one per CPU, 1 =
+    in this process). Returns summarize() of all paths.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    n_assets = returns.shape[1]
+    if weights is None:
+        weights = np.full(n_assets, 1.0 / n_assets)
+    sizes = [min(chunk_paths, n_paths - start) for start in range(0, n_paths, chunk_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [
+        {"scenario": scenario, "returns": returns, "n_paths": size, "n_bars": n_bars,
+         "weights": np.asarray(weights, dtype=np.float64), "max_position": max_position,
+         "max_drawdown": max_drawdown, "initial_balance": initial_balance, "seed": s, "options": options}
+        for size, s in zip(sizes, seeds)
+    ]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        chunks = [_stress_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            chunks = list(pool.map(_stress_chunk, tasks))
+    results = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+    return summarize(results, n_bars, initial_balance)
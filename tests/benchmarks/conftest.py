@@ -0,0 +1,126 @@
+# tests/benchmarks/conftest.py
+"""
+Offline micro-benchmarks for the hot paths, compared against JSON baselines.
+Timings depend on the machine, so they are skipped in a plain `pytest` run
+and only run when asked for:
+
+    BENCH=1 python -m pytest tests/benchmarks                 # check against baselines
+    BENCH=1 BENCH_UPDATE=1 python -m pytest tests/benchmarks  # re-record baselines
+    BENCH_TOLERANCE=0.25 ...                          # fail if >25% slower
+    BENCH_RESULTS=bench.json ...                      # also dump this run's numbers
+
+Each metric is seconds per operation, taken as the best of several timed
+repeats, so background noise only ever makes a run look slower.
+"""
+import os
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "1.0"))
+ENABLED = os.getenv("BENCH") == "1"
+UPDATE = os.getenv("BENCH_UPDATE") == "1"
+RESULTS_PATH = os.getenv("BENCH_RESULTS")
+SEED = 1234
+
+
+def measure(fn, repeat=5, min_time=0.05):
+    """Best per-call time of `fn` over `repeat` batches of at least `min_time` seconds."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+class BenchRecorder:
+    def __init__(self):
+        self.baselines = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as f:
+                self.baselines = json.load(f)
+        self.results = {}
+
+    def check(self, name, seconds_per_op):
+        self.results[name] = seconds_per_op
+        if UPDATE:
+            self.baselines[name] = seconds_per_op
+            return
+        baseline = self.baselines.get(name)
+        if baseline is None:
+            return
+        limit = baseline * (1 + TOLERANCE)
+        assert seconds_per_op <= limit, (
+            f"{name} regressed: {seconds_per_op * 1e6:.1f}us/op vs baseline "
+            f"{baseline * 1e6:.1f}us/op (tolerance {TOLERANCE:.0%})"
+        )
+
+
+def pytest_collection_modifyitems(config, items):
+    if ENABLED:
+        return
+    skip = pytest.mark.skip(reason="benchmarks run with BENCH=1")
+    here = os.path.dirname(__file__)
+    for item in items:
+        if str(item.fspath).startswith(here):
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+def bench():
+    recorder = BenchRecorder()
+    yield recorder
+    if UPDATE:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(dict(sorted(recorder.baselines.items())), f, indent=2)
+            f.write("\n")
+    if RESULTS_PATH:
+        with open(RESULTS_PATH, "w") as f:
+            json.dump(recorder.results, f, indent=2)
+
+
+def synthetic_candles(n_rows, seed=SEED, start="2024-01-01", freq="1h", jitter_seconds=0):
+    """Random-walk OHLCV candles in the shape DataManager.fetch_historical_data returns."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_rows)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.005, n_rows)) * close
+    time_index = pd.date_range(start, periods=n_rows, freq=freq, tz="UTC")
+    if jitter_seconds:
+        time_index = time_index + pd.to_timedelta(rng.integers(0, jitter_seconds, n_rows), unit="s")
+    return pd.DataFrame({
+        "time": time_index,
+        "low": np.minimum(open_, close) - spread,
+        "high": np.maximum(open_, close) + spread,
+        "open": open_,
+        "close": close,
+        "volume": rng.uniform(1, 100, n_rows),
+    })
+
+
+def synthetic_feature_frame(product_ids, n_rows, seed=SEED):
+    """Merged multi-asset frame with the columns MultiAssetTradingEnv reads."""
+    rng = np.random.default_rng(seed)
+    data = {"time": pd.date_range("2024-01-01", periods=n_rows, freq="1h", tz="UTC")}
+    for pid in product_ids:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_rows)))
+        data[f"{pid}_close"] = close
+        data[f"{pid}_ma_50"] = pd.Series(close).rolling(50, min_periods=1).mean().to_numpy()
+        data[f"{pid}_ma_200"] = pd.Series(close).rolling(200, min_periods=1).mean().to_numpy()
+        data[f"{pid}_rsi"] = rng.uniform(0, 100, n_rows)
+    return pd.DataFrame(data)
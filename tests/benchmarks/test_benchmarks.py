@@ -0,0 +1,220 @@
+# tests/benchmarks/test_benchmarks.py
+import os
+
+import numpy as np
+import pytest
+
+from conftest import SEED, measure, synthetic_candles, synthetic_feature_frame
+
+PRODUCTS = ["BTC-USD", "ETH-USD", "SOL-USD", "TRUMP-USD"]
+
+
+def _offline_data_manager(product_ids, frames=None):
+    """DataManager whose candles are served from `frames` by a replay client instead of REST."""
+    data_manager = pytest.importorskip("data_manager")
+    from tick_recorder import ReplayCandleClient
+
+    source = ReplayCandleClient()
+    if frames is not None:
+        source.apply({
+            pid: [[int(t.timestamp()), *row] for t, *row in
+                  frame[["time", "low", "high", "open", "close", "volume"]].itertuples(index=False)]
+            for pid, frame in frames.items()
+        })
+    return data_manager.DataManager(product_ids, resolutions=[], client=source)
+
+
+def test_add_technical_indicators(bench):
+    dm = _offline_data_manager(PRODUCTS)
+    candles = synthetic_candles(5000)
+    per_call = measure(lambda: dm.add_technical_indicators(candles.copy(), "BTC-USD"))
+    bench.check("data_manager.add_technical_indicators[5000]", per_call)
+
+
+def test_build_multiasset_dataset_alignment(bench):
+    # Per-product timestamps are jittered so merge_asof has real alignment work
+    frames = {
+        pid: synthetic_candles(2000, seed=SEED + i, jitter_seconds=600 if i else 0)
+        for i, pid in enumerate(PRODUCTS)
+    }
+    dm = _offline_data_manager(PRODUCTS, frames)
+    start = min(frame["time"].iloc[0] for frame in frames.values())
+    end = max(frame["time"].iloc[-1] for frame in frames.values())
+    df = dm.build_multiasset_dataset(start, end)
+    assert df is not None and not df.empty
+    # Later calls hit the candle cache, as on every live tick
+    per_call = measure(lambda: dm.build_multiasset_dataset(start, end), repeat=3)
+    bench.check("data_manager.build_multiasset_dataset[4x2000]", per_call)
+
+
+def test_env_step_throughput(bench):
+    pytest.importorskip("gym")
+    from rl_env import MultiAssetTradingEnv
+
+    df = synthetic_feature_frame(PRODUCTS, 5000)
+    env = MultiAssetTradingEnv(df, PRODUCTS)
+    rng = np.random.default_rng(SEED)
+    actions = rng.uniform(0, 1, size=(1024, len(PRODUCTS))).astype(np.float32)
+    state = {"i": 0}
+
+    def step():
+        i = state["i"]
+        _obs, _reward, done, _info = env.step(actions[i % len(actions)])
+        state["i"] = i + 1
+        if done:
+            env.reset()
+
+    bench.check("rl_env.MultiAssetTradingEnv.step", measure(step))
+
+
+def test_risk_manager_apply_risk_constraints(bench):
+    from risk_manager import RiskManager
+
+    risk_manager = RiskManager()
+    rng = np.random.default_rng(SEED)
+    action = rng.uniform(0, 1, len(PRODUCTS)).astype(np.float32)
+    holdings = np.zeros(len(PRODUCTS), dtype=np.float32)
+    per_call = measure(lambda: risk_manager.apply_risk_constraints(action, holdings, 1000.0, None, 10000.0))
+    bench.check("risk_manager.apply_risk_constraints", per_call)
+
+
+def _tiny_sentiment_manager(tmp_path):
+    """SentimentManager backed by a small randomly initialised DistilBERT (no download)."""
+    pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    from sentiment_manager import SentimentManager
+
+    words = ["bitcoin", "moon", "dump", "pump", "bull", "bear", "crypto", "buy", "sell", "hold"]
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words
+    vocab_file = os.path.join(tmp_path, "vocab.txt")
+    with open(vocab_file, "w") as f:
+        f.write("\n".join(vocab))
+
+    config = transformers.DistilBertConfig(vocab_size=len(vocab), dim=64, hidden_dim=128,
+                                           n_layers=2, n_heads=2, num_labels=2)
+    import torch
+    torch.manual_seed(SEED)
+    manager = SentimentManager("tiny-distilbert",
+                               tokenizer=transformers.DistilBertTokenizerFast(vocab_file=vocab_file),
+                               model=transformers.DistilBertForSequenceClassification(config).eval())
+    return manager, words
+
+
+@pytest.mark.parametrize("batch_size", [1, 8, 32, 64])
+def test_sentiment_analyze_texts_batch(bench, tmp_path, batch_size):
+    manager, words = _tiny_sentiment_manager(tmp_path)
+    rng = np.random.default_rng(SEED)
+    texts = [" ".join(rng.choice(words, size=20)) for _ in range(batch_size)]
+    per_text = measure(lambda: manager.analyze_texts(texts), repeat=3) / batch_size
+    bench.check(f"sentiment_manager.analyze_texts[batch={batch_size}]/text", per_text)
+
+
+def _market_data(n_pairs, n_exchanges=5, seed=SEED):
+    rng = np.random.default_rng(seed)
+    prices = 100 + rng.normal(0, 0.5, size=(n_pairs, n_exchanges))
+    return {
+        f"PAIR{i}-USD": {f"ex{j}": {"price": float(prices[i, j])} for j in range(n_exchanges)}
+        for i in range(n_pairs)
+    }
+
+
+def test_arbitrage_generate_signals_scaling(bench):
+    from strategies.arbitrage import ArbitrageStrategy
+
+    strategy = ArbitrageStrategy()
+    per_pair = {}
+    for n_pairs in (100, 1000):
+        market_data = _market_data(n_pairs)
+        per_pair[n_pairs] = measure(lambda: strategy.generate_signals(market_data), repeat=3) / n_pairs
+        bench.check(f"arbitrage.generate_signals[pairs={n_pairs}]/pair", per_pair[n_pairs])
+    # Cost per pair should stay flat (linear scaling), allowing for noise
+    assert per_pair[1000] <= per_pair[100] * 3
+
+
+def test_market_making_book_updates(bench):
+    from sim_exchange import SimulatedExchange
+    from strategies.market_making import MarketMakingStrategy
+
+    rng = np.random.default_rng(SEED)
+    # Random-walk touch in 1-tick steps: most updates fall inside the reprice tolerance
+    mids = 30000.0 + 0.01 * np.cumsum(rng.choice([-1, 0, 1], size=8192))
+    bids, asks = np.round(mids - 0.5, 2), np.round(mids + 0.5, 2)
+    exchange = SimulatedExchange({"USD": 1e6})
+    maker = MarketMakingStrategy(exchange, ["BTC-USD"])
+    state = {"i": 0}
+
+    def update():
+        i = state["i"] % 8192
+        maker.on_book("BTC-USD", bids[i], asks[i])
+        state["i"] += 1
+
+    bench.check("market_making.on_book", measure(update))
+
+
+def test_trade_ledger_writes(bench, tmp_path):
+    from trade_ledger import TradeLedger
+
+    ledger = TradeLedger(os.path.join(tmp_path, "ledger.db"))
+    state = {"i": 0}
+
+    def record():
+        state["i"] += 1
+        ledger.record_fill(f"w{state['i'] % 1000}", "BTC-USD", "buy", 0.01, 100.0, timestamp=1_704_067_200 + state["i"])
+
+    # Caller-side cost only: the trading thread enqueues and moves on
+    bench.check("trade_ledger.record_fill[enqueue]", measure(record))
+    ledger.flush(timeout=120)
+
+    def write_rebalance():
+        # One multi-tenant rebalance: 1000 users x 4 products, committed
+        for i in range(4000):
+            ledger.record_fill(f"w{i // 4}", ("BTC-USD", "ETH-USD", "SOL-USD", "ADA-USD")[i % 4], "buy",
+                               0.01, 100.0, timestamp=1_704_067_200 + i)
+        ledger.flush(timeout=120)
+
+    bench.check("trade_ledger.rebalance_commit[4000 fills]", measure(write_rebalance, repeat=3))
+    ledger.close()
+
+
+def test_stress_simulation(bench):
+    from stress_test import block_bootstrap, price_paths, simulate
+
+    rng = np.random.default_rng(SEED)
+    history = rng.normal(0, 0.01, (5000, 4))
+    prices = price_paths(block_bootstrap(history, n_paths=250, n_bars=500, rng=rng))
+
+    # One worker chunk: 250 paths x 500 bars x 4 assets
+    bench.check("stress.simulate[250 paths x 500 bars x 4]", measure(lambda: simulate(prices, [0.25] * 4), repeat=3))
+
+
+def test_shadow_batched_inference(bench):
+    from types import SimpleNamespace
+    from model_registry import BatchedPolicies
+
+    rng = np.random.default_rng(SEED)
+
+    class Tanh:
+        pass
+
+    def mlp(n_in=18, hidden=64, n_out=4):
+        def linear(a, b):
+            return SimpleNamespace(weight=rng.normal(0, 0.3, (b, a)).astype(np.float32),
+                                   bias=np.zeros(b, np.float32))
+        net = [linear(n_in, hidden), Tanh(), linear(hidden, hidden), Tanh()]
+        head = linear(hidden, n_out)
+
+        def predict(obs, deterministic=True):
+            h = np.asarray(obs, np.float32)
+            for layer in net[::2]:
+                h = np.tanh(h @ layer.weight.T + layer.bias)
+            return np.clip(h @ head.weight.T + head.bias, 0, 1), None
+
+        return SimpleNamespace(policy=SimpleNamespace(mlp_extractor=SimpleNamespace(policy_net=net),
+                                                      action_net=head, activation_fn=Tanh),
+                               action_space=SimpleNamespace(low=np.zeros(n_out), high=np.ones(n_out)),
+                               predict=predict)
+
+    obs = rng.normal(size=(1, 18)).astype(np.float32)
+    # Primary plus 7 shadow policies, one observation per tick
+    batched = BatchedPolicies([mlp() for _ in range(8)])
+    bench.check("model_registry.batched_predict[8 policies]", measure(lambda: batched.predict(obs)))
@@ -0,0 +1,81 @@
+# tests/fake_x_api.py
+"""
+Local stand-in for the X v2 filtered-stream endpoints, for tests and for
+running x_scraper.XStream without credentials:
+
+    api = FakeXApi(scripts=[503, ["tweet one", "tweet two"], "hold"])
+    base_url = await api.start()
+
+Each stream connection plays the next script entry: an int is returned as
+that HTTP status, a list of texts is streamed (with keep-alives) and then
+the connection is closed, "hold" streams keep-alives until the client
+disconnects.
+"""
+import asyncio
+import json
+
+from aiohttp import web
+
+
+class FakeXApi:
+    def __init__(self, scripts=(), rules=None):
+        self.scripts = list(scripts)
+        self.rules = dict(rules or {})  # id -> value
+        self.rule_calls = []
+        self.connections = 0
+        self.open_connections = 0
+        self.max_open_connections = 0
+        self._next_id = 1000
+        self._runner = None
+
+    async def start(self, host="127.0.0.1"):
+        app = web.Application()
+        app.router.add_get("/2/tweets/search/stream/rules", self.get_rules)
+        app.router.add_post("/2/tweets/search/stream/rules", self.post_rules)
+        app.router.add_get("/2/tweets/search/stream", self.stream)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def close(self):
+        await self._runner.cleanup()
+
+    async def get_rules(self, request):
+        data = [{"id": rule_id, "value": value} for rule_id, value in self.rules.items()]
+        return web.json_response({"data": data} if data else {"meta": {"result_count": 0}})
+
+    async def post_rules(self, request):
+        body = await request.json()
+        self.rule_calls.append(body)
+        for rule_id in body.get("delete", {}).get("ids", []):
+            self.rules.pop(rule_id, None)
+        for rule in body.get("add", []):
+            self._next_id += 1
+            self.rules[str(self._next_id)] = rule["value"]
+        return web.json_response({"meta": {"sent": "now"}})
+
+    async def stream(self, request):
+        self.connections += 1
+        script = self.scripts.pop(0) if self.scripts else "hold"
+        if isinstance(script, int):
+            return web.Response(status=script)
+
+        self.open_connections += 1
+        self.max_open_connections = max(self.max_open_connections, self.open_connections)
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        try:
+            if script == "hold":
+                while True:
+                    await resp.write(b"\r\n")
+                    await asyncio.sleep(0.05)
+            for i, text in enumerate(script):
+                await resp.write(b"\r\n")
+                await resp.write(json.dumps({"data": {"id": str(i), "text": text}}).encode() + b"\r\n")
+            await resp.write_eof()
+            return resp
+        finally:
+            self.open_connections -= 1
@@ -0,0 +1,200 @@
+# tests/test_arbitrage.py
+import time
+
+import pytest
+
+from sim_exchange import SimulatedExchange
+from strategies.arbitrage import ArbitrageExecutor, ArbitrageStrategy
+
+PAIR = "BTC-USD"
+
+
+class SlowClient:
+    """Delays order placement like a network round trip."""
+
+    def __init__(self, exchange, delay, reject_market=False):
+        self.exchange = exchange
+        self.delay = delay
+        self.reject_market = reject_market
+
+    def place_ioc_order(self, *args):
+        time.sleep(self.delay)
+        return self.exchange.place_ioc_order(*args)
+
+    def place_market_order(self, *args, **kwargs):
+        if self.reject_market:
+            return {"error": "Pre-trade check failed: kill switch", "rejected": True}
+        return self.exchange.place_market_order(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.exchange, name)
+
+
+class FakeBooks:
+    def __init__(self, max_base):
+        self.max_base = max_base
+
+    def max_fill(self, product_id, side, max_slippage):
+        return self.max_base, self.max_base * 100
+
+
+def _venues(buy_bid_size=None, sell_bid_size=None):
+    cheap = SimulatedExchange({"USD": 10000.0, "BTC": 0.0})
+    rich = SimulatedExchange({"USD": 0.0, "BTC": 5.0})
+    cheap.set_touch(PAIR, 99.9, 100.0, ask_size=buy_bid_size)
+    rich.set_touch(PAIR, 101.0, 101.1, bid_size=sell_bid_size)
+    return cheap, rich
+
+
+def _signal():
+    market = {PAIR: {"cheap": {"price": 100.0}, "rich": {"price": 101.0}}}
+    [signal] = ArbitrageStrategy().generate_signals(market)
+    return signal
+
+
+def test_both_legs_fill_and_size_is_not_the_profit():
+    cheap, rich = _venues()
+    strategy = ArbitrageStrategy(ArbitrageExecutor({"cheap": cheap, "rich": rich}, max_notional=300.0))
+    [result] = strategy.execute_trades([_signal()], {"cheap": cheap, "rich": rich})
+    assert result["outcome"] == "filled"
+    # Sized from the notional cap, not `profit / 2` (= 0.5)
+    assert result["size"] == pytest.approx(300.0 / (100.0 * 1.001), rel=1e-6)
+    assert cheap.balances["BTC"] == pytest.approx(result["size"])
+    assert rich.balances["BTC"] == pytest.approx(5.0 - result["size"])
+    assert result["expected_pnl"] == pytest.approx(result["size"] * (101.0 * 0.999 - 100.0 * 1.001))
+    assert result["leg_skew"] >= 0 and strategy.executor.skew_percentiles()["p50"] == result["leg_skew"]
+    # Cached balances moved with the fills
+    assert strategy.executor.balances["cheap"]["BTC"] == pytest.approx(result["size"])
+
+
+def test_legs_are_sent_concurrently():
+    cheap, rich = _venues()
+    executor = ArbitrageExecutor({"cheap": SlowClient(cheap, 0.2), "rich": SlowClient(rich, 0.2)})
+    executor.refresh_balances()
+    started = time.perf_counter()
+    result = executor.execute(_signal())
+    elapsed = time.perf_counter() - started
+    assert result["outcome"] == "filled"
+    # One round trip, not two; both legs left at once
+    assert elapsed < 0.35
+    assert abs(result["legs"]["buy"]["sent"] - result["legs"]["sell"]["sent"]) < 0.05
+    assert result["leg_skew"] < 0.05
+
+
+def test_sizing_uses_balances_and_depth():
+    cheap, rich = _venues()
+    cheap.balances["USD"] = 50.0
+    executor = ArbitrageExecutor({"cheap": cheap, "rich": rich})
+    # Rounded down to the base increment
+    assert executor.size(_signal()) == 0.499001
+
+    cheap.balances["USD"] = 10000.0
+    rich.balances["BTC"] = 0.7
+    executor = ArbitrageExecutor({"cheap": cheap, "rich": rich}, max_notional=10000.0)
+    assert executor.size(_signal()) == pytest.approx(0.7)
+
+    executor = ArbitrageExecutor({"cheap": cheap, "rich": rich}, order_books={"cheap": FakeBooks(0.25)},
+                                 max_notional=10000.0)
+    assert executor.size(_signal()) == pytest.approx(0.25)
+
+    # Edge gone after fees and slippage
+    executor = ArbitrageExecutor({"cheap": cheap, "rich": rich}, fee=0.006)
+    result = executor.execute(_signal())
+    assert result["outcome"] == "skipped" and cheap.placed == rich.placed == 0
+
+
+def test_partial_sell_is_completed_with_a_market_order():
+    cheap, rich = _venues(sell_bid_size=0.3)
+    executor = ArbitrageExecutor({"cheap": cheap, "rich": rich}, max_notional=100.0)
+    result = executor.execute(_signal())
+    assert result["legs"]["sell"]["filled"] == pytest.approx(0.3)
+    assert result["imbalance"] == pytest.approx(result["size"] - 0.3)
+    assert result["outcome"] == "hedged"
+    assert result["hedge"]["exchange"] == "rich" and result["hedge"]["side"] == "sell"
+    # Flat across the two venues
+    assert cheap.balances["BTC"] + rich.balances["BTC"] == pytest.approx(5.0)
+    # Balances are re-read after a hedge
+    assert executor.balances == {}
+
+
+def test_rejected_hedge_unwinds_on_the_filled_venue():
+    cheap, rich = _venues(sell_bid_size=0.0)
+    executor = ArbitrageExecutor({"cheap": cheap, "rich": SlowClient(rich, 0.0, reject_market=True)},
+                                 max_notional=100.0)
+    result = executor.execute(_signal())
+    assert result["outcome"] == "hedged"
+    assert [a["exchange"] for a in result["hedge"]["attempts"]] == ["rich", "cheap"]
+    assert cheap.balances["BTC"] == pytest.approx(0.0)
+
+
+def test_late_leg_is_settled_when_it_reports():
+    cheap, rich = _venues(sell_bid_size=0.0)
+    executor = ArbitrageExecutor({"cheap": cheap, "rich": SlowClient(rich, 0.3)}, leg_timeout=0.05,
+                                 max_notional=100.0)
+    executor.refresh_balances()
+    result = executor.execute(_signal())
+    assert result["outcome"] == "pending" and result["timed_out"] == ["sell"]
+    deadline = time.time() + 2
+    while result["outcome"] == "pending" and time.time() < deadline:
+        time.sleep(0.01)
+    assert result["outcome"] == "hedged"
+    assert result["leg_skew"] >= 0.2
+    assert cheap.balances["BTC"] + rich.balances["BTC"] == pytest.approx(5.0)
+
+
+class WorkingClient(SlowClient):
+    """Reports the leg as OPEN for the first `open_reads` status reads (forever with None)."""
+
+    def __init__(self, exchange, open_reads=None):
+        super().__init__(exchange, 0.0)
+        self.open_reads = open_reads
+        self.reads = 0
+
+    def get_order(self, order_id):
+        self.reads += 1
+        if self.open_reads is None or self.reads <= self.open_reads:
+            return {"order_id": order_id, "status": "OPEN", "filled_size": 0.0, "average_filled_price": 0.0}
+        return self.exchange.get_order(order_id)
+
+
+def test_leg_status_is_polled_until_terminal():
+    cheap, rich = _venues()
+    rich_client = WorkingClient(rich, open_reads=2)
+    executor = ArbitrageExecutor({"cheap": cheap, "rich": rich_client}, max_notional=100.0, poll=0.001)
+    result = executor.execute(_signal())
+    assert result["outcome"] == "filled" and rich_client.reads == 3
+    assert result["legs"]["sell"]["filled"] == pytest.approx(result["size"])
+
+
+def test_leg_still_working_at_the_deadline_is_unknown_not_unfilled():
+    cheap, rich = _venues()
+    executor = ArbitrageExecutor({"cheap": cheap, "rich": WorkingClient(rich)}, leg_timeout=0.05,
+                                 max_notional=100.0, poll=0.005)
+    executor.refresh_balances()
+    result = executor.execute(_signal())
+    deadline = time.time() + 2
+    while result["outcome"] == "pending" and time.time() < deadline:
+        time.sleep(0.01)
+    # No hedge against a leg that may still fill; balances are re-read instead
+    assert result["outcome"] == "unknown" and result["legs"]["sell"]["filled"] is None
+    assert "hedge" not in result and executor.balances == {}
+
+
+def test_cached_balances_expire():
+    cheap, rich = _venues()
+
+    class Counting(SlowClient):
+        reads = 0
+
+        def get_account_balances(self):
+            Counting.reads += 1
+            return self.exchange.get_account_balances()
+
+    executor = ArbitrageExecutor({"cheap": Counting(cheap, 0.0), "rich": Counting(rich, 0.0)}, balance_ttl=60)
+    executor.size(_signal())
+    executor.size(_signal())
+    assert Counting.reads == 2
+    executor.balance_ttl = 0.0
+    time.sleep(0.001)
+    executor.size(_signal())
+    assert Counting.reads == 4
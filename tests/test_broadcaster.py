@@ -0,0 +1,152 @@
+# tests/test_broadcaster.py
+import os
+import sys
+import json
+import asyncio
+import subprocess
+
+import pandas as pd
+import pytest
+
+from app.broadcaster import Broadcaster, BrokerPublisher, BrokerRelay, pump
+from broker import RedisBroker
+from test_trader_runtime import FakeUser, make_runtime
+from trader import start_trader
+
+
+async def _received(sub, count, timeout=2.0):
+    """The first `count` events queued to `sub`, waiting for the relay thread."""
+    events = []
+    deadline = asyncio.get_running_loop().time() + timeout
+    while len(events) < count and asyncio.get_running_loop().time() < deadline:
+        while not sub.queue.empty():
+            events.append(json.loads(sub.queue.get_nowait()))
+        await asyncio.sleep(0.01)
+    return events
+
+
+def test_runtime_events_reach_api_sockets_through_the_broker():
+    async def scenario():
+        runtime, broker, _clients = make_runtime()
+        # API side: its own broadcaster, fed only by the broker relay
+        api_broadcaster = Broadcaster()
+        mine = api_broadcaster.subscribe("w0", topics=("trades",))
+        other = api_broadcaster.subscribe("w1", topics=("trades",))
+        relay = BrokerRelay(api_broadcaster, broker, poll=0.05).start()
+        try:
+            start_trader(FakeUser("w0", tier=1), {"strategy": "basic"}, broker=broker)
+            # Trading side: no subscriber and no event loop of its own
+            assert isinstance(runtime.broadcaster, BrokerPublisher)
+            runtime.tick(end=pd.Timestamp("2024-01-01", tz="UTC"))
+            events = await _received(mine, 4)
+        finally:
+            relay.stop()
+        return events, other.queue.qsize()
+
+    events, others = asyncio.run(scenario())
+    assert [(e["type"], e["product_id"]) for e in events] == [
+        ("order", "BTC-USD"), ("order", "ETH-USD"), ("fill", "BTC-USD"), ("fill", "ETH-USD")
+    ]
+    assert events[0]["status"] == "accepted" and events[2]["size"] == 2.5
+    assert others == 0
+
+
+def test_events_published_from_another_process_reach_the_relay():
+    redis = pytest.importorskip("redis")
+    url = os.getenv("REDIS_TEST_URL", "redis://localhost:6379/15")
+    try:
+        redis.Redis.from_url(url).ping()
+    except redis.RedisError:
+        pytest.skip(f"no Redis at {url}")
+
+    async def scenario():
+        api_broadcaster = Broadcaster()
+        sub = api_broadcaster.subscribe("w", topics=("trades",))
+        relay = BrokerRelay(api_broadcaster, RedisBroker(url), poll=0.05).start()
+        code = ("from app.broadcaster import BrokerPublisher\n"
+                "from broker import RedisBroker\n"
+                f"BrokerPublisher(RedisBroker({url!r})).publish_threadsafe('trades', {{'n': 1}}, 'w')")
+        try:
+            subprocess.run([sys.executable, "-c", code], check=True,
+                           cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            return await _received(sub, 1)
+        finally:
+            relay.stop()
+
+    assert asyncio.run(scenario()) == [{"n": 1}]
+
+
+def test_publisher_never_raises_into_the_trading_thread():
+    class DownBroker:
+        def broadcast(self, channel, message):
+            raise ConnectionError("broker down")
+
+    BrokerPublisher(DownBroker()).publish_threadsafe("trades", {"n": 1}, "w")
+
+
+def test_disconnect_ends_an_idle_subscription():
+    async def scenario():
+        broadcaster = Broadcaster()
+        sub = broadcaster.subscribe("w", topics=("trades",))
+        sent = []
+        gone = asyncio.Event()
+
+        async def send(message):
+            sent.append(message)
+
+        task = asyncio.ensure_future(pump(sub, send, gone.wait()))
+        broadcaster.publish("trades", {"n": 1}, "w")
+        await asyncio.sleep(0.01)
+        # No further events: only the watcher notices the client leaving
+        gone.set()
+        await asyncio.wait_for(task, 1)
+        broadcaster.unsubscribe(sub)
+        return sent, broadcaster.subscriber_count()
+
+    sent, remaining = asyncio.run(scenario())
+    assert sent == ['{"n": 1}'] and remaining == 0
+
+
+def test_threadsafe_publish_without_a_live_loop_is_a_no_op():
+    broadcaster = Broadcaster()
+    broadcaster.publish_threadsafe("trades", {"n": 1})
+
+    async def subscribe():
+        broadcaster.subscribe("w")
+
+    asyncio.run(subscribe())
+    # The loop the subscriber ran on is closed now
+    broadcaster.publish_threadsafe("trades", {"n": 2})
+
+
+def test_websocket_endpoint_unsubscribes_on_disconnect():
+    pytest.importorskip("fastapi")
+    from app.broadcaster import broadcaster
+    from app.websockets import websocket_endpoint
+
+    class FakeSocket:
+        def __init__(self):
+            self.received = asyncio.Queue()
+
+        async def accept(self):
+            pass
+
+        async def send_text(self, message):
+            pass
+
+        async def receive(self):
+            return await self.received.get()
+
+    class User:
+        wallet_public_key = "ws-user"
+
+    async def scenario():
+        socket = FakeSocket()
+        task = asyncio.ensure_future(websocket_endpoint(socket, User()))
+        await asyncio.sleep(0.01)
+        assert broadcaster.subscriber_count("trades") == 1
+        socket.received.put_nowait({"type": "websocket.disconnect"})
+        await asyncio.wait_for(task, 1)
+        return broadcaster.subscriber_count("trades")
+
+    assert asyncio.run(scenario()) == 0
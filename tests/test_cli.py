@@ -0,0 +1,86 @@
+# tests/test_cli.py
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+import cli
+
+# Packages the lazy imports keep out of light entry points
+HEAVY = {"torch", "stable_baselines3", "transformers", "pandas", "numpy", "telegram", "fastapi", "uvicorn"}
+
+
+def test_runtime_subcommand():
+    args = cli.build_parser().parse_args(["runtime", "--products", "BTC-USD", "ETH-USD", "--model", "m"])
+    assert args.func is cli.cmd_runtime
+    assert args.products == ["BTC-USD", "ETH-USD"] and args.model == "m"
+    args = cli.build_parser().parse_args(["runtime"])
+    assert args.products == cli.DEFAULT_PRODUCTS and not args.house
+    assert cli.build_parser().parse_args(["runtime", "--house"]).house
+
+
+def test_subcommands_parse_with_config_defaults():
+    from config import MODEL_SAVE_PATH, STRESS_PATHS, TRAIN_TIMESTEPS
+
+    args = cli.build_parser().parse_args(["train", "--data", "data/dataset", "--resolutions"])
+    assert args.func is cli.cmd_train and args.data == "data/dataset"
+    assert args.timesteps == TRAIN_TIMESTEPS and args.model == MODEL_SAVE_PATH
+    # An empty --resolutions means base candles only, not the configured default
+    assert args.resolutions == [] and cli._resolutions(args) == []
+
+    args = cli.build_parser().parse_args(["trade"])
+    assert args.func is cli.cmd_trade and args.model is None
+
+    args = cli.build_parser().parse_args(["stress", "--scenario", "gap", "--weights", "0.5", "0.5"])
+    assert args.scenario == "gap" and args.weights == [0.5, 0.5] and args.paths == STRESS_PATHS
+
+    args = cli.build_parser().parse_args(["models", "stage", "--version", "3", "--stage", "primary"])
+    assert (args.action, args.version, args.stage) == ("stage", 3, "primary")
+
+    args = cli.build_parser().parse_args(["house", "deposit", "w0", "250", "--currency", "USDC"])
+    assert args.func is cli.cmd_house and (args.wallet, args.amount, args.currency) == ("w0", 250.0, "USDC")
+
+    args = cli.build_parser().parse_args(["api", "--app", "app.main:app", "--port", "9000"])
+    assert args.func is cli.cmd_api and (args.app, args.port) == ("app.main:app", 9000)
+
+
+@pytest.mark.parametrize("argv", [[], ["stress", "--scenario", "crash"], ["models", "delete"], ["api", "--port", "x"]])
+def test_invalid_arguments_exit(argv):
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(argv)
+
+
+def _loaded_after(code):
+    """Top-level packages loaded by running `code` in a fresh interpreter."""
+    script = f"import sys\n{code}\nprint(' '.join(sorted({{m.split('.')[0] for m in sys.modules}})))"
+    proc = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(cli.__file__)))
+    assert proc.returncode == 0, proc.stderr
+    return set(proc.stdout.split())
+
+
+def test_cli_imports_no_heavy_packages():
+    total_ms, entries = cli.profile_import("cli")
+    assert total_ms > 0
+    assert not HEAVY & {name.split(".")[0] for name, _self, _cumulative in entries}
+    # Building the parser for any subcommand only reads config
+    assert not HEAVY & _loaded_after("import cli\ncli.build_parser().parse_args(['stress'])")
+
+
+def test_api_does_not_load_the_ml_stack():
+    pytest.importorskip("fastapi")
+    total_ms, entries = cli.profile_import("api")
+    assert total_ms > 0 and entries
+    assert not {"torch", "stable_baselines3", "transformers", "telegram"} & _loaded_after("import api")
+
+
+def test_profile_imports_reports_budget_and_failures(capsys):
+    assert cli.main(["profile-imports", "json", "--json"]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report["json"]["total_ms"] > 0 and "over_budget" not in report["json"]
+
+    assert cli.main(["profile-imports", "json", "no_such_module", "--max-ms", "0.001"]) == 1
+    out = capsys.readouterr().out
+    assert "OVER BUDGET" in out and "No module named 'no_such_module'" in out
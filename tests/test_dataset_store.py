@@ -0,0 +1,64 @@
+# tests/test_dataset_store.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_store import ColumnarDataset
+
+START = pd.Timestamp("2024-01-01", tz="UTC")
+
+
+def _frame(n=48, start=START, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "time": pd.date_range(start, periods=n, freq="h"),
+        "BTC-USD_close": 40000 + rng.normal(0, 100, n).cumsum(),
+        "BTC-USD_rsi": rng.uniform(0, 100, n),
+        "trades": rng.integers(0, 1000, n).astype("int32"),
+    })
+
+
+def test_from_frame_round_trips_through_open(tmp_path):
+    df = _frame()
+    ColumnarDataset.from_frame(df, str(tmp_path / "ds"))
+    assert ColumnarDataset.exists(str(tmp_path / "ds")) and not ColumnarDataset.exists(str(tmp_path))
+
+    dataset = ColumnarDataset.open(str(tmp_path / "ds"))
+    assert len(dataset) == 48 and dataset.columns == {"BTC-USD_close": "float32", "BTC-USD_rsi": "float32",
+                                                      "trades": "int32"}
+    # Times are second offsets from the first bar
+    assert dataset.time_origin == int(START.timestamp())
+    np.testing.assert_array_equal(dataset.time_offsets, np.arange(48) * 3600)
+    assert dataset.column("trades").dtype == np.int32 and isinstance(dataset.column("trades"), np.memmap)
+
+    frame = dataset.to_frame()
+    pd.testing.assert_series_equal(frame["time"], df["time"].dt.as_unit("ns"), check_names=False)
+    np.testing.assert_array_equal(frame["trades"], df["trades"])
+    np.testing.assert_allclose(frame["BTC-USD_close"], df["BTC-USD_close"], rtol=1e-6)
+    assert dataset.row(5)["BTC-USD_rsi"] == pytest.approx(df["BTC-USD_rsi"][5], rel=1e-6)
+    assert dataset.index_at(START + pd.Timedelta(hours=10, minutes=1)) == 11
+    assert list(dataset.tail(3)["time"]) == list(df["time"][-3:])
+
+
+def test_append_skips_overlap_and_extends_offsets(tmp_path):
+    df = _frame(72)
+    dataset = ColumnarDataset.from_frame(df[:48], str(tmp_path / "ds"))
+    before = dataset.column("BTC-USD_close")
+    # The refetch overlaps the last 8 stored bars; only the 24 new ones are written
+    assert dataset.append(df[40:]) == 24
+    assert dataset.append(df[60:]) == 0 and dataset.append(df[:0]) == 0
+    assert len(dataset) == 72 and len(before) == 48
+
+    reopened = ColumnarDataset.open(str(tmp_path / "ds"))
+    for ds in (dataset, reopened):
+        np.testing.assert_array_equal(ds.time_offsets, np.arange(72) * 3600)
+        np.testing.assert_array_equal(ds.column("trades"), df["trades"])
+        assert ds.timestamps(71, 72)[0] == df["time"].iloc[-1]
+
+
+def test_an_empty_dataset_is_readable(tmp_path):
+    dataset = ColumnarDataset.create(str(tmp_path / "ds"), {"close": "float32"}, START.timestamp())
+    assert len(dataset) == 0 and dataset.to_frame().empty and "close" in dataset
+    # Bars before the origin get negative offsets
+    dataset.append(pd.DataFrame({"time": [START - pd.Timedelta(hours=1)], "close": [1.0]}))
+    assert list(ColumnarDataset.open(str(tmp_path / "ds")).time_offsets) == [-3600]
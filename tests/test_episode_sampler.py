@@ -0,0 +1,65 @@
+# tests/test_episode_sampler.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_store import ColumnarDataset
+from episode_sampler import EpisodeSampler
+
+PRODUCTS = ["BTC-USD", "ETH-USD"]
+
+
+def _frame(n):
+    rng = np.random.default_rng(0)
+    data = {"time": pd.date_range("2024-01-01", periods=n, freq="h", tz="UTC")}
+    for pid in PRODUCTS:
+        close = 100 + np.cumsum(rng.normal(0, 1, n))
+        data.update({f"{pid}_close": close, f"{pid}_ma_50": close, f"{pid}_ma_200": close,
+                     f"{pid}_rsi": rng.uniform(0, 100, n)})
+    return pd.DataFrame(data)
+
+
+def test_windows_match_memory_mapped_history(tmp_path):
+    df = _frame(1000)
+    dataset = ColumnarDataset.from_frame(df, str(tmp_path / "ds"))
+    sampler = EpisodeSampler(dataset, 64, seed=1)
+    try:
+        for _ in range(5):
+            window = sampler.next_window()
+            assert len(window) == 64
+            expected = df["BTC-USD_close"].to_numpy(dtype=np.float32)[window.start:window.start + 64]
+            np.testing.assert_array_equal(window.column("BTC-USD_close"), expected)
+    finally:
+        sampler.close()
+
+
+def test_recency_weighting_prefers_recent_windows():
+    df = _frame(10000)
+    uniform = EpisodeSampler(df, 100, prefetch=0, seed=2)
+    recent = EpisodeSampler(df, 100, recency_halflife=500, prefetch=0, seed=2)
+    uniform_starts = np.array([uniform.sample_start() for _ in range(2000)])
+    recent_starts = np.array([recent.sample_start() for _ in range(2000)])
+
+    assert uniform_starts.min() >= 0 and uniform_starts.max() <= recent.n_starts - 1
+    assert recent_starts.max() <= recent.n_starts - 1
+    # Half of the mass lies within one half-life of the newest start
+    assert np.median(recent.n_starts - 1 - recent_starts) == pytest.approx(500, rel=0.15)
+    assert np.median(uniform_starts) < np.median(recent_starts)
+
+
+def test_env_episodes_are_drawn_from_the_sampler():
+    pytest.importorskip("gym")
+    from rl_env import MultiAssetTradingEnv
+
+    sampler = EpisodeSampler(_frame(2000), 32, prefetch=0, seed=3)
+    env = MultiAssetTradingEnv(None, PRODUCTS, sampler=sampler)
+    starts = set()
+    for _ in range(4):
+        env.reset()
+        starts.add(env.df.start)
+        steps, done = 0, False
+        while not done:
+            _obs, _reward, done, _info = env.step(np.full(len(PRODUCTS), 0.3, dtype=np.float32))
+            steps += 1
+        assert steps == 32
+    assert len(starts) > 1
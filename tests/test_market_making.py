@@ -0,0 +1,156 @@
+# tests/test_market_making.py
+import pandas as pd
+import pytest
+
+from broker import InMemoryBroker
+from order_book import OrderBooks
+from sim_exchange import SimulatedExchange
+from strategies.market_making import MarketMakingStrategy
+from trader_runtime import MultiTenantRuntime
+
+PID = "BTC-USD"
+
+
+def _maker(**kwargs):
+    exchange = SimulatedExchange({"USD": 10000.0})
+    params = dict(quote_notional=100.0, half_spread=0.001, max_inventory_usd=1000.0, skew=1.0,
+                  reprice_tolerance=0.0005, size_tolerance=0.25)
+    params.update(kwargs)
+    maker = MarketMakingStrategy(exchange, [PID], **params)
+    exchange.listeners.append(maker.on_fill)
+    return maker, exchange
+
+
+def _market(exchange, maker, bid, ask):
+    exchange.set_touch(PID, bid, ask)
+    return maker.on_book(PID, bid, ask)
+
+
+def test_quotes_skew_away_from_inventory():
+    maker, _ = _maker()
+    (bid, bid_size), (ask, ask_size) = maker.desired_quotes(PID, 99.99, 100.01, 0.0)
+    assert (bid, ask) == (99.9, 100.1) and bid_size == ask_size == 1.0
+
+    # Long $500: center moves down half a half-spread, the bid shrinks
+    (long_bid, long_bid_size), (long_ask, long_ask_size) = maker.desired_quotes(PID, 99.99, 100.01, 5.0)
+    assert long_bid < bid and long_ask < ask
+    assert long_bid_size == 0.5 and long_ask_size == 1.0
+
+    # At the inventory limit the buying side is not quoted at all
+    (_, full_bid_size), _ask = maker.desired_quotes(PID, 99.99, 100.01, 10.0)
+    assert full_bid_size == 0
+
+    # Quotes never cross the book even in a wide skew
+    (bid, _), (ask, _) = maker.desired_quotes(PID, 99.0, 99.05, -10.0)
+    assert bid < 99.05 and ask > 99.0
+
+
+def test_small_moves_cause_no_order_churn():
+    maker, exchange = _maker()
+    _market(exchange, maker, 99.99, 100.01)
+    assert exchange.placed == 2 and len(exchange.orders) == 2
+
+    # Jitter inside the reprice tolerance: every update processed, no exchange traffic
+    for i in range(200):
+        _market(exchange, maker, 99.99 + 0.01 * (i % 3), 100.01 + 0.01 * (i % 3))
+    assert maker.updates > 100
+    assert exchange.placed == 2 and exchange.cancelled == 0
+
+    # A real move replaces both quotes exactly once
+    _market(exchange, maker, 100.09, 100.11)
+    assert exchange.placed == 4 and exchange.cancelled == 2
+    prices = sorted(o["price"] for o in exchange.orders.values())
+    assert prices == [99.99, 100.21]
+
+
+def test_fills_move_inventory_and_requote():
+    maker, exchange = _maker(max_inventory_usd=50.0)
+    _market(exchange, maker, 99.99, 100.01)
+    exchange.trade(PID, 99.9, 0.4)
+
+    book = maker.books[PID]
+    assert book.inventory == pytest.approx(0.4)
+    assert exchange.balances["BTC"] == pytest.approx(0.4)
+    # 80% of max inventory: both quotes move down, the bid shrinks
+    assert (book.bid["price"], book.bid["size"]) == (99.82, pytest.approx(0.2))
+    assert (book.ask["price"], book.ask["size"]) == (100.02, pytest.approx(1.0))
+    assert len(exchange.orders) == 2
+
+    # The market runs through the bid: at the limit only the ask is quoted
+    _market(exchange, maker, 99.5, 99.8)
+    assert book.inventory == pytest.approx(0.6)
+    assert book.bid is None and book.ask is not None
+
+    # Exchange state is the truth on sync: a quote it no longer has is forgotten and re-placed
+    lost = book.ask["order_id"]
+    exchange.orders.pop(lost)
+    maker.sync({PID: exchange.balances["BTC"]}, {o["order_id"] for o in exchange.orders.values()})
+    assert book.ask["order_id"] != lost and book.ask["order_id"] in exchange.orders
+
+
+def test_runtime_runs_market_making_tenants_from_order_book_events():
+    class FakeDataManager:
+        def build_multiasset_dataset(self, start, end):
+            return pd.DataFrame([{"time": end, f"{PID}_close": 100.0, f"{PID}_ma_50": 100.0,
+                                  f"{PID}_ma_200": 100.0, f"{PID}_rsi": 50.0}])
+
+        def feature_names(self):
+            return ("close", "ma_50", "ma_200", "rsi")
+
+    exchange = SimulatedExchange({"USD": 1000.0})
+    books = OrderBooks([PID])
+    runtime = MultiTenantRuntime(None, [PID], FakeDataManager(), broker=InMemoryBroker(),
+                                 client_factory=lambda user: exchange, order_books=books)
+    user = {"wallet_public_key": "mm", "tier": 3, "exchanges": []}
+    with pytest.raises(ValueError):
+        MultiTenantRuntime(None, [PID], FakeDataManager(), broker=InMemoryBroker()).register(
+            user, {"strategy": "market_making"})
+    runtime.register(user, {"strategy": "market_making"})
+
+    exchange.set_touch(PID, 99.99, 100.01)
+    books.on_message({"channel": "l2_data", "events": [{"type": "snapshot", "product_id": PID, "updates": [
+        {"side": "bid", "price_level": "99.99", "new_quantity": "1"},
+        {"side": "offer", "price_level": "100.01", "new_quantity": "1"}]}]})
+    assert books.wait_idle() and len(exchange.orders) == 2
+
+    # The tick only re-syncs the engine; no policy inference for this tenant
+    runtime.tick(end=pd.Timestamp("2024-01-01", tz="UTC"))
+    assert len(exchange.orders) == 2 and exchange.cancelled == 0
+
+    # The simulated exchange pushes no fills to this engine: they are read
+    # back with get_order on the next book event
+    engine = runtime.tenants["mm"].engine
+    engine.fill_poll_interval = 0.0
+    bid = dict(engine.books[PID].bid)
+    # Fully filled, so the order is gone from the exchange's open orders
+    exchange.trade(PID, bid["price"], bid["size"])
+    books.on_message({"channel": "l2_data", "events": [{"type": "update", "product_id": PID, "updates": [
+        {"side": "bid", "price_level": "99.98", "new_quantity": "1"}]}]})
+    assert books.wait_idle()
+    assert engine.books[PID].inventory == pytest.approx(bid["size"])
+    # ...and requoted
+    assert engine.books[PID].bid["order_id"] in exchange.orders
+    # Already seen: polling again changes nothing
+    assert engine.poll_fills() == []
+    assert engine.books[PID].inventory == pytest.approx(bid["size"])
+
+    runtime.unregister("mm")
+    assert exchange.orders == {} and books.listeners == []
+
+
+def test_rejected_quotes_back_off_instead_of_retrying_every_event():
+    now = [0.0]
+    maker, exchange = _maker(reject_backoff=10.0, clock=lambda: now[0])
+    place = exchange.place_limit_order
+    exchange.place_limit_order = lambda *args, **kwargs: {
+        "error": "Pre-trade check failed: order rate limit of 20/min reached", "rejected": True}
+    _market(exchange, maker, 99.99, 100.01)
+    assert maker.rejected == 2
+    # Book events during the pause send nothing
+    _market(exchange, maker, 99.98, 100.02)
+    assert maker.rejected == 2
+
+    exchange.place_limit_order = place
+    now[0] += 10.0
+    _market(exchange, maker, 99.99, 100.01)
+    assert maker.placed == 2 and len(exchange.orders) == 2
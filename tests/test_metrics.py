@@ -0,0 +1,120 @@
+# tests/test_metrics.py
+import json
+import logging
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+from metrics import Counter, Gauge, Histogram, InstrumentedClient
+
+
+def test_counter_and_gauge_exposition():
+    requests = Counter("requests_total", "Requests by route")
+    requests.inc(route="/a")
+    requests.inc(2, route="/b", code="200")
+    requests.inc(route="/a")
+    assert requests.get(route="/a") == 2 and requests.get(route="/c") == 0
+    assert requests.render() == [
+        "# HELP requests_total Requests by route",
+        "# TYPE requests_total counter",
+        'requests_total{code="200",route="/b"} 2',
+        'requests_total{route="/a"} 2',
+    ]
+
+    depth = Gauge("queue_depth", "Queued items")
+    depth.set(5)
+    depth.set(3)
+    assert depth.render()[1:] == ["# TYPE queue_depth gauge", "queue_depth 3"]
+
+
+def test_histogram_buckets_are_cumulative():
+    latency = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value, op="read")
+    assert latency.count(op="read") == 4
+    assert latency.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{op="read",le="0.1"} 2',
+        'latency_seconds_bucket{op="read",le="1.0"} 3',
+        'latency_seconds_bucket{op="read",le="+Inf"} 4',
+        'latency_seconds_sum{op="read"} 2.65',
+        'latency_seconds_count{op="read"} 4',
+    ]
+
+
+def test_registry_returns_the_same_metric_and_renders_it():
+    first = metrics.counter("test_registry_total", "Registry test")
+    assert metrics.counter("test_registry_total", "ignored") is first
+    first.inc(kind="x")
+    assert 'test_registry_total{kind="x"} 1' in metrics.render_prometheus().splitlines()
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    hits = Counter("hits_total", "Hits")
+    hits.inc()
+    with metrics.span("disabled_stage"):
+        pass
+    assert hits.get() == 0 and metrics.STAGE_SECONDS.count(stage="disabled_stage") == 0
+    client = object()
+    assert metrics.instrument(client, "x") is client
+
+
+def test_spans_sum_into_the_tick_record(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "TICK_TIMING_LOG", True)
+    before = metrics.STAGE_SECONDS.count(stage="test_predict")
+    with caplog.at_level(logging.INFO, logger="tick_timing"):
+        with metrics.tick("test_loop", tick=3) as record:
+            for _ in range(2):
+                with metrics.span("test_predict"):
+                    pass
+            with metrics.span("test_execute"):
+                pass
+    assert set(record) == {"test_predict", "test_execute"}
+    assert metrics.STAGE_SECONDS.count(stage="test_predict") == before + 2
+    assert metrics.TICK_SECONDS.count(loop="test_loop") >= 1
+    entry = json.loads(caplog.records[-1].getMessage())
+    assert entry["loop"] == "test_loop" and entry["tick"] == 3
+    assert set(entry["stages_ms"]) == {"test_predict", "test_execute"}
+    # Outside a tick a span still feeds the histogram
+    with metrics.span("test_predict"):
+        pass
+    assert metrics.STAGE_SECONDS.count(stage="test_predict") == before + 3
+
+
+class FakeRest:
+    timeout = 10
+
+    def get_product(self, product_id):
+        return {"product_id": product_id}
+
+    def get_orders(self):
+        raise ConnectionError("down")
+
+
+def test_instrumented_client_counts_times_and_passes_through():
+    client = InstrumentedClient(FakeRest(), "test_rest")
+    assert client.get_product("BTC-USD") == {"product_id": "BTC-USD"}
+    with pytest.raises(ConnectionError):
+        client.get_orders()
+    assert client.timeout == 10
+    assert metrics.API_CALLS.get(client="test_rest", method="get_product") == 1
+    assert metrics.API_CALLS.get(client="test_rest", method="get_orders") == 1
+    assert metrics.API_ERRORS.get(client="test_rest", method="get_orders") == 1
+    assert metrics.API_ERRORS.get(client="test_rest", method="get_product") == 0
+    assert metrics.API_SECONDS.count(client="test_rest", method="get_orders") == 1
+
+
+def test_http_exporter_serves_metrics():
+    server = metrics.start_http_server(0, host="127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        body = urllib.request.urlopen(f"{url}/metrics", timeout=5).read().decode()
+        assert "# TYPE tick_stage_seconds histogram" in body
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+    finally:
+        server.shutdown()
@@ -0,0 +1,203 @@
+# tests/test_model_registry.py
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_manager import DataManager
+import main
+import metrics
+from main import load_live_model, trading_tick
+from model_registry import BatchedPolicies, ModelRegistry, PaperPortfolios, ShadowEvaluator, export_policy
+from online_trainer import ModelRef
+from pretrade_risk import PreTradeRiskGate
+from risk_manager import RiskManager
+from test_tick_recorder import PRODUCTS, START, LinearModel, _candles
+from tick_recorder import ReplayCandleClient, ReplayClock, ReplayExchange, ReplaySentiment
+
+
+class Tanh:
+    pass
+
+
+class Linear:
+    def __init__(self, rng, n_in, n_out):
+        self.weight = rng.normal(0, 0.5, (n_out, n_in)).astype(np.float32)
+        self.bias = rng.normal(0, 0.1, n_out).astype(np.float32)
+
+
+class FakeMlpModel:
+    """Shaped like a stable-baselines3 PPO MlpPolicy, with a plain numpy predict()."""
+
+    def __init__(self, seed, n_in=10, n_out=2, hidden=(16, 16)):
+        rng = np.random.default_rng(seed)
+        sizes = (n_in,) + hidden
+        net = []
+        for a, b in zip(sizes, sizes[1:]):
+            net += [Linear(rng, a, b), Tanh()]
+        self.policy = SimpleNamespace(mlp_extractor=SimpleNamespace(policy_net=net),
+                                      action_net=Linear(rng, sizes[-1], n_out), activation_fn=Tanh)
+        self.action_space = SimpleNamespace(low=np.zeros(n_out, np.float32), high=np.ones(n_out, np.float32))
+        self.calls = 0
+
+    def predict(self, obs, deterministic=True):
+        self.calls += 1
+        h = np.asarray(obs, dtype=np.float32)
+        for layer in self.policy.mlp_extractor.policy_net:
+            h = np.tanh(h @ layer.weight.T + layer.bias) if isinstance(layer, Linear) else h
+        h = h @ self.policy.action_net.weight.T + self.policy.action_net.bias
+        return np.clip(h, 0, 1), None
+
+
+class OffByOneModel(FakeMlpModel):
+    """Exports fine but predicts something else: must not be batched."""
+
+    def predict(self, obs, deterministic=True):
+        actions, state = super().predict(obs, deterministic)
+        return np.clip(actions + 0.5, 0, 1), state
+
+
+def test_batched_policies_match_each_model():
+    models = [FakeMlpModel(seed) for seed in range(4)]
+    models += [FakeMlpModel(9, hidden=(8,)), LinearModel(), OffByOneModel(5)]
+    batched = BatchedPolicies(models)
+    # The four same-shape MLPs share one stack; the 1-layer MLP gets its own
+    assert sorted(len(indices) for indices, *_rest in batched.stacks) == [1, 4]
+    assert batched.fallback == [5, 6]
+
+    obs = np.random.default_rng(1).uniform(0, 100, (3, 10)).astype(np.float32)
+    calls = [getattr(m, "calls", 0) for m in models]
+    actions = batched.predict(obs)
+    assert actions.shape == (7, 3, 2)
+    for model, got in zip(models, actions):
+        np.testing.assert_allclose(got, model.predict(obs)[0], atol=1e-5)
+    # Exported models were not called for the batch
+    assert [getattr(m, "calls", 0) for m in models][:5] == [c + 1 for c in calls[:5]]
+
+
+def test_export_policy_rejects_other_shapes():
+    assert export_policy(LinearModel()) is None
+    model = FakeMlpModel(0)
+    model.policy.use_sde = True
+    assert export_policy(model) is None
+
+
+def test_shadow_evaluator_returns_primary_and_tracks_paper():
+    primary, shadow = FakeMlpModel(0), FakeMlpModel(1)
+    ref = ModelRef(primary)
+    evaluator = ShadowEvaluator(ref, {"policy:v2": shadow}, PRODUCTS, primary_label="policy:v1")
+    obs = np.random.default_rng(2).uniform(0, 1, (1, 10)).astype(np.float32)
+    actions, _state = evaluator.predict(obs)
+    np.testing.assert_allclose(actions, primary.predict(obs)[0], atol=1e-5)
+
+    prices = np.array([100.0, 10.0])
+    evaluator.paper_step(prices)
+    for scale in (1.1, 0.9, 1.2):
+        evaluator.predict(obs)
+        evaluator.paper_step(prices * scale)
+    summary = evaluator.summary()
+    assert set(summary) == {"policy:v1", "policy:v2"}
+    assert summary["policy:v1"]["ticks"] == 4
+    assert summary["policy:v1"]["net_worth"] != summary["policy:v2"]["net_worth"]
+    # Exported per policy for /metrics
+    exposition = metrics.render_prometheus()
+    for label in ("policy:v1", "policy:v2"):
+        assert f'shadow_paper_pnl_usd{{policy="{label}"}} {summary[label]["pnl"]}' in exposition
+
+    # A hot-swapped primary is picked up on the next tick
+    replacement = FakeMlpModel(3)
+    ref.swap(replacement, 1)
+    actions, _state = evaluator.predict(obs)
+    np.testing.assert_allclose(actions, replacement.predict(obs)[0], atol=1e-5)
+
+
+def test_paper_portfolios_follow_risk_limits():
+    paper = PaperPortfolios(["a", "b"], 2, initial_balance=1000, fee=0.0)
+    prices = np.array([10.0, 20.0])
+    for _ in range(20):
+        paper.step(np.array([[0.9, 0.9], [0.0, 0.0]]), prices)
+    # "a" asked for 90% per asset but is capped at 20% each; "b" stays in cash
+    np.testing.assert_allclose(paper.holdings[0] * prices / paper.net_worth[0], 0.2, atol=0.01)
+    assert paper.summary()["b"] == {"net_worth": 1000.0, "pnl": 0.0, "return": 0.0, "max_drawdown": 0.0,
+                                    "fees": 0.0, "trades": 0, "ticks": 20}
+
+
+def test_registry_versions_and_stages(tmp_path):
+    source = tmp_path / "saved"
+    (tmp_path / "saved.zip").write_text("model")
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    v1 = registry.register(str(source), stage="primary")
+    v2 = registry.register(str(source), stage="shadow", metadata={"note": "wider net"})
+    v3 = registry.register(str(source) + ".zip")
+    assert [e["version"] for e in registry.versions("policy")] == [1, 2, 3]
+    assert (tmp_path / "registry" / "policy" / "v3.zip").read_text() == "model"
+
+    registry.set_stage("policy", 3, "primary")
+    reloaded = ModelRegistry(str(tmp_path / "registry"))
+    assert reloaded.primary()["version"] == 3
+    assert reloaded.get("policy", 1)["stage"] == "archived"
+    assert reloaded.get("policy", 2)["metadata"] == {"note": "wider net"}
+    with pytest.raises(ValueError):
+        reloaded.set_stage("policy", 2, "retired")
+
+    evaluator = reloaded.shadow_evaluator(LinearModel(), PRODUCTS, loader=lambda entry: FakeMlpModel(entry["version"]))
+    assert evaluator.labels == ["policy:v3", "policy:v2"]
+    assert v1["path"] != v2["path"] != v3["path"]
+
+
+def test_trading_tick_in_shadow_mode():
+    history = {pid: _candles(120, seed) for seed, pid in enumerate(PRODUCTS)}
+    source = ReplayCandleClient()
+    data_manager = DataManager(PRODUCTS, resolutions=[], client=source)
+    clock = ReplayClock()
+    exchange = ReplayExchange(PreTradeRiskGate(clock=clock))
+    exchange.balances = [{"currency": "USD", "balance": "10000"}]
+    sentiment = ReplaySentiment()
+    sentiment.score = 0.9
+    evaluator = ShadowEvaluator(LinearModel(), {"mlp": FakeMlpModel(0)}, PRODUCTS)
+
+    for i in range(3):
+        now = START + pd.Timedelta(hours=80 + i)
+        clock.now = now.timestamp()
+        source.apply({pid: [row for row in rows if row[0] <= now.timestamp()] for pid, rows in history.items()})
+        trading_tick(evaluator, PRODUCTS, sentiment, exchange, data_manager, RiskManager(),
+                     now=now, notify=lambda *args: None)
+
+    summary = evaluator.summary()
+    assert summary["primary"]["ticks"] == summary["mlp"]["ticks"] == 3
+    assert summary["primary"]["trades"] > 0
+
+
+def test_live_model_is_the_registry_primary(tmp_path, monkeypatch):
+    loaded = []
+
+    class FakeEngine:
+        def __init__(self, df, product_ids, path, algo=None, features=None):
+            self.path, self.algo = path, algo
+
+        def load_model(self):
+            loaded.append((self.path, self.algo))
+            return self.path
+
+    monkeypatch.setitem(sys.modules, "ml_engine", SimpleNamespace(MLEngine=FakeEngine))
+    (tmp_path / "saved.zip").write_text("model")
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    with pytest.raises(FileNotFoundError):
+        load_live_model(PRODUCTS, [], registry, str(tmp_path / "missing"))
+
+    registry.register(str(tmp_path / "saved"), algo="A2C", stage="primary")
+    registry.register(str(tmp_path / "saved"), algo="PPO", stage="shadow")
+    model, path = load_live_model(PRODUCTS, [], registry)
+    assert path == registry.primary()["path"] and loaded == [(path, "A2C")]
+    # An explicit path wins over the registry
+    assert load_live_model(PRODUCTS, [], registry, str(tmp_path / "saved"))[1] == str(tmp_path / "saved")
+
+
+def test_main_exits_instead_of_training_without_a_model(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(main, "MODEL_SAVE_PATH", str(tmp_path / "missing"))
+    monkeypatch.setattr(main, "ModelRegistry", lambda: ModelRegistry(str(tmp_path / "registry")))
+    monkeypatch.setattr(main, "METRICS_PORT", None)
+    assert main.main() == 1
+    assert "cli.py train" in capsys.readouterr().out
@@ -0,0 +1,68 @@
+# tests/test_observation.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_store import ColumnarDataset
+from observation import ObservationBuilder, fraction_in_crypto
+
+PRODUCTS = ["BTC-USD", "ETH-USD"]
+
+
+def _frame(n=50):
+    rng = np.random.default_rng(0)
+    data = {"time": pd.date_range("2024-01-01", periods=n, freq="h", tz="UTC")}
+    for pid in PRODUCTS:
+        # Columns deliberately not in observation order
+        data[f"{pid}_rsi"] = rng.uniform(0, 100, n)
+        data[f"{pid}_close"] = 100 + rng.normal(0, 1, n)
+        data[f"{pid}_ma_200"] = 100 + rng.normal(0, 1, n)
+        data[f"{pid}_ma_50"] = 100 + rng.normal(0, 1, n)
+    return pd.DataFrame(data)
+
+
+def test_fraction_in_crypto():
+    np.testing.assert_allclose(fraction_in_crypto([250.0, 0.0, 5.0], [1000.0, 0.0, -1.0]), [0.75, 1.0, 1.0])
+
+
+def test_step_batch_and_frame_paths_agree(tmp_path):
+    df = _frame()
+    builder = ObservationBuilder(PRODUCTS)
+    expected_market = np.array(
+        [df[f"{pid}_{f}"].iloc[7] for pid in PRODUCTS for f in ("close", "ma_50", "ma_200", "rsi")],
+        dtype=np.float32
+    )
+
+    builder.bind(df)
+    obs = builder.build(7, 1000.0, 250.0).copy()
+    np.testing.assert_array_equal(obs[:-2], expected_market)
+    np.testing.assert_allclose(obs[-2:], [1000.0, 0.75])
+
+    # Memory-mapped columns give the same observation
+    builder.bind(ColumnarDataset.from_frame(df, str(tmp_path / "ds")))
+    np.testing.assert_array_equal(builder.build(7, 1000.0, 250.0), obs)
+
+    # Live/runtime path: one market vector, N portfolios
+    market = builder.market_from_frame(df, 7)
+    batch = builder.build_batch(market, [1000.0, 500.0], [250.0, 500.0])
+    assert batch.shape == (2, builder.size)
+    np.testing.assert_array_equal(batch[0], obs)
+    assert batch[1, -1] == 0.0
+
+
+def test_missing_feature_column_is_reported():
+    builder = ObservationBuilder(PRODUCTS, features=("close", "4h_rsi"))
+    with pytest.raises(KeyError, match="4h_rsi"):
+        builder.market_from_frame(_frame())
+
+
+def test_env_uses_builder():
+    pytest.importorskip("gym")
+    from rl_env import MultiAssetTradingEnv
+
+    df = _frame()
+    env = MultiAssetTradingEnv(df, PRODUCTS)
+    obs = env.reset()
+    builder = ObservationBuilder(PRODUCTS)
+    expected = builder.build_batch(builder.market_from_frame(df, 0), 10000.0, 10000.0)[0]
+    np.testing.assert_array_equal(obs, expected)
@@ -0,0 +1,92 @@
+# tests/test_online_trainer.py
+import os
+import time
+import threading
+
+import numpy as np
+
+from online_trainer import ModelRef, OnlineTrainer, accept_candidate
+
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+
+    def predict(self, obs, deterministic=True):
+        return np.full(2, 0.1), self.name
+
+
+def accepting_job(spec):
+    # Runs in the spawned trainer process
+    time.sleep(0.3)
+    with open(f"{spec['candidate_path']}.zip", "w") as f:
+        f.write("candidate")
+    return {"accepted": True, "reason": "better", "path": spec["candidate_path"],
+            "pid": os.getpid(), "nice": os.nice(0), "base_path": spec["base_path"]}
+
+
+def rejecting_job(spec):
+    return {"accepted": False, "reason": "worse", "pid": os.getpid()}
+
+
+def _trainer(tmp_path, ref, job):
+    model_path = str(tmp_path / "model")
+    with open(f"{model_path}.zip", "w") as f:
+        f.write("original")
+    return OnlineTrainer(ref, ["BTC-USD"], model_path=model_path, job=job, loader=FakeModel,
+                         nice=5, max_memory_mb=0)
+
+
+def test_swap_between_ticks_without_pausing(tmp_path):
+    ref = ModelRef(FakeModel("live"))
+    trainer = _trainer(tmp_path, ref, accepting_job)
+    seen = []
+    done = threading.Event()
+
+    def ticks():
+        while not done.is_set():
+            seen.append(ref.predict(np.zeros(3))[1])
+            time.sleep(0.005)
+
+    ticker = threading.Thread(target=ticks)
+    ticker.start()
+    try:
+        result = trainer.run_once()
+        time.sleep(0.05)
+    finally:
+        done.set()
+        ticker.join()
+
+    # Training ran in another process, at lower priority, while ticks kept predicting
+    assert result["pid"] != os.getpid()
+    assert result["nice"] >= os.nice(0) + 5
+    assert seen[0] == "live" and seen[-1] == result["path"]
+    assert seen.count("live") > 10
+    assert ref.version == 1
+    assert result["base_path"] == str(tmp_path / "model")
+    assert trainer.current_path == result["path"]
+    # The accepted model replaces the saved one for restarts
+    with open(str(tmp_path / "model.zip")) as f:
+        assert f.read() == "candidate"
+    assert trainer.spec()["base_path"] == result["path"]
+    assert trainer.spec()["candidate_path"].endswith("_online_2")
+
+
+def test_rejected_candidate_keeps_live_model(tmp_path):
+    ref = ModelRef(FakeModel("live"))
+    trainer = _trainer(tmp_path, ref, rejecting_job)
+    result = trainer.run_once()
+    assert not result["accepted"]
+    assert ref.version == 0 and ref.model.name == "live"
+    assert list(trainer.history) == [result]
+    with open(str(tmp_path / "model.zip")) as f:
+        assert f.read() == "original"
+
+
+def test_accept_candidate():
+    live = {"sharpe": 1.0, "max_drawdown": 0.1}
+    assert accept_candidate({"sharpe": 1.5, "max_drawdown": 0.1}, live)[0]
+    assert not accept_candidate({"sharpe": 0.5, "max_drawdown": 0.1}, live)[0]
+    assert not accept_candidate({"sharpe": 1.5, "max_drawdown": 0.1}, live, min_improvement=1.0)[0]
+    accepted, reason = accept_candidate({"sharpe": 3.0, "max_drawdown": 0.5}, live, max_drawdown=0.3)
+    assert not accepted and "drawdown" in reason
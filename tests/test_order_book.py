@@ -0,0 +1,167 @@
+# tests/test_order_book.py
+import time
+
+import pytest
+
+from order_book import OrderBook, OrderBooks
+
+
+def _book():
+    book = OrderBook("BTC-USD")
+    book.apply_snapshot(
+        bids=[(99.0, 1.0), (98.0, 2.0), (97.0, 5.0)],
+        asks=[(101.0, 1.0), (102.0, 2.0), (104.0, 5.0)],
+    )
+    return book
+
+
+def test_updates_keep_levels_sorted():
+    book = _book()
+    assert book.best_bid() == (99.0, 1.0) and book.best_ask() == (101.0, 1.0)
+    book.update("bid", 100.0, 0.5)
+    book.update("offer", 101.0, 0)
+    assert book.best_bid() == (100.0, 0.5)
+    assert book.best_ask() == (102.0, 2.0)
+    assert book.mid() == 101.0 and book.spread() == 2.0
+
+
+def test_fill_vwap_and_slippage():
+    book = _book()
+    fill = book.fill("buy", base=2.0)
+    assert fill["vwap"] == pytest.approx((101.0 + 102.0) / 2)
+    assert fill["slippage"] == pytest.approx(101.5 / 101.0 - 1)
+    assert fill["levels"] == 2 and fill["complete"]
+
+    fill = book.fill("sell", quote=99.0 + 98.0)
+    assert fill["filled_base"] == pytest.approx(2.0)
+    assert fill["slippage"] == pytest.approx(1 - 98.5 / 99.0)
+
+    assert not book.fill("buy", base=100.0)["complete"]
+
+
+@pytest.mark.parametrize("side", ["buy", "sell"])
+def test_max_fill_lands_exactly_on_the_slippage_limit(side):
+    book = _book()
+    base, quote = book.max_fill(side, 0.01)
+    fill = book.fill(side, base=base)
+    assert fill["filled_quote"] == pytest.approx(quote)
+    assert fill["slippage"] == pytest.approx(0.01)
+    # Anything larger is worse than the limit
+    assert book.fill(side, base=base * 1.01)["slippage"] > 0.01
+
+
+def test_l2_feed_messages_and_sequence_gaps():
+    now = [1000.0]
+    books = OrderBooks(["BTC-USD"], clock=lambda: now[0])
+    books.on_message({"channel": "l2_data", "sequence_num": 0, "events": [{
+        "type": "snapshot", "product_id": "BTC-USD", "updates": [
+            {"side": "bid", "price_level": "99.5", "new_quantity": "1"},
+            {"side": "offer", "price_level": "100.5", "new_quantity": "2"},
+        ]}]})
+    books.on_message('{"channel": "l2_data", "sequence_num": 1, "events": [{"type": "update", '
+                     '"product_id": "BTC-USD", "updates": [{"side": "offer", "price_level": "100.25", '
+                     '"new_quantity": "0.5"}]}]}')
+    assert books.mid("BTC-USD") == pytest.approx((99.5 + 100.25) / 2)
+    assert books.max_fill("BTC-USD", "buy", 0.0) == (0.5, 0.5 * 100.25)
+
+    # Heartbeats keep a quiet book fresh; silence makes it stale
+    now[0] += 8
+    books.on_message({"channel": "heartbeats", "sequence_num": 2})
+    now[0] += 8
+    assert books.get("BTC-USD") is not None
+    now[0] += 10
+    assert books.get("BTC-USD") is None
+
+    # A missed message invalidates the book until the next snapshot
+    books.on_message({"channel": "heartbeats", "sequence_num": 4})
+    assert books.gaps == 1 and books.get("BTC-USD") is None
+
+
+def _wait(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_gap_resubscribes_level2_off_the_feed_thread():
+    class FakeWS:
+        def __init__(self):
+            self.calls = []
+
+        def unsubscribe(self, product_ids, channels):
+            self.calls.append(("unsubscribe", product_ids, channels))
+
+        def subscribe(self, product_ids, channels):
+            self.calls.append(("subscribe", product_ids, channels))
+
+        def close(self):
+            pass
+
+    books = OrderBooks(["BTC-USD", "ETH-USD"])
+    books.ws = FakeWS()
+    books.on_message({"channel": "heartbeats", "sequence_num": 1})
+    books.on_message({"channel": "heartbeats", "sequence_num": 3})
+    assert _wait(lambda: books.resyncs == 1)
+    assert books.ws.calls == [("unsubscribe", ["BTC-USD", "ETH-USD"], ["level2"]),
+                              ("subscribe", ["BTC-USD", "ETH-USD"], ["level2"])]
+    books.stop()
+
+
+def test_gap_without_a_feed_reloads_books_over_rest():
+    class FakeRest:
+        def __init__(self):
+            self.failures = 1
+
+        def get_product_book(self, product_id, limit):
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("timeout")
+            return {"pricebook": {"bids": [{"price": "99", "size": "1"}], "asks": [{"price": "101", "size": "1"}]}}
+
+    books = OrderBooks(["BTC-USD"], rest_client=FakeRest(), resync_retry=0.01)
+    books.on_message({"channel": "heartbeats", "sequence_num": 1})
+    books.on_message({"channel": "heartbeats", "sequence_num": 5})
+    assert books.gaps == 1
+    # The first attempt fails and is retried
+    assert _wait(lambda: books.get("BTC-USD") is not None)
+    assert books.mid("BTC-USD") == 100.0 and books.resyncs == 1
+    books.stop()
+
+
+def _snapshot(product_id, bid, ask):
+    return {"channel": "l2_data", "events": [{"type": "snapshot", "product_id": product_id, "updates": [
+        {"side": "bid", "price_level": str(bid), "new_quantity": "1"},
+        {"side": "offer", "price_level": str(ask), "new_quantity": "1"}]}]}
+
+
+def test_listeners_run_off_the_feed_thread_coalesced_and_isolated():
+    import threading
+
+    books = OrderBooks(["BTC-USD", "ETH-USD"])
+    release = threading.Event()
+    seen = []
+
+    def slow(product_id, book):
+        release.wait(2)
+        seen.append((product_id, book.best_bid()[0], threading.current_thread().name))
+
+    def broken(product_id, book):
+        raise RuntimeError("boom")
+
+    books.add_listener(broken)
+    books.add_listener(slow)
+    started = time.perf_counter()
+    for bid in (99, 98, 97):
+        books.on_message(_snapshot("BTC-USD", bid, 101))
+    books.on_message(_snapshot("ETH-USD", 9, 11))
+    # The feed thread never waited on the blocked listener
+    assert time.perf_counter() - started < 0.5
+    release.set()
+    assert books.wait_idle()
+    # Three BTC changes while the listener was blocked: at most the one in flight plus one
+    # more delivery, both seeing the latest book
+    assert [pid for pid, _, _ in seen] in (["BTC-USD", "ETH-USD"], ["BTC-USD", "BTC-USD", "ETH-USD"])
+    assert {bid for pid, bid, _ in seen if pid == "BTC-USD"} == {97.0}
+    assert {name for _, _, name in seen} == {"order-book-listeners"}
+    books.stop()
@@ -0,0 +1,134 @@
+# tests/test_performance.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from performance import PerformanceAggregate, PerformanceStore, SeriesPyramid, lttb
+from test_trader_runtime import FakeUser, make_runtime
+from trade_ledger import TradeLedger
+from trader import start_trader
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    t = np.arange(10000, dtype=float)
+    v = np.sin(t / 500)
+    v[4321] = 50.0
+    dt, dv = lttb(t, v, 200)
+    assert len(dt) == 200
+    assert (dt[0], dt[-1]) == (0.0, 9999.0)
+    assert 50.0 in dv
+    assert np.all(np.diff(dt) > 0)
+
+
+def test_pyramid_read_is_bounded_and_keeps_extremes():
+    pyramid = SeriesPyramid()
+    rng = np.random.default_rng(0)
+    values = np.cumsum(rng.normal(0, 1, 100_000))
+    for i, x in enumerate(values):
+        pyramid.append(float(i), float(x))
+
+    t, v = pyramid.series(250)
+    assert len(t) <= 4 * 250 + len(pyramid.levels)
+    assert np.all(np.diff(t) > 0)
+    assert v.max() == values.max() and v.min() == values.min()
+    # The newest point is always included
+    assert t[-1] == 99_999.0
+
+
+def test_fills_and_marks_update_running_totals():
+    agg = PerformanceAggregate("w")
+    # Ledger rows: the sell's realized PnL is the ledger's (average cost 150)
+    agg.apply_fill({"product_id": "BTC-USD", "side": "buy", "size": 1.0, "price": 100.0, "realized_pnl": 0.0})
+    agg.apply_fill({"product_id": "BTC-USD", "side": "buy", "size": 1.0, "price": 200.0, "realized_pnl": 0.0})
+    agg.apply_fill({"product_id": "BTC-USD", "side": "sell", "size": 1.0, "price": 250.0, "fee": 1.0,
+                    "realized_pnl": 99.0})
+    agg.set_positions([{"product_id": "BTC-USD", "amount": 1.0, "cost": 150.0}])
+    agg.mark(1_700_000_000, 1300.0, cash=1000.0, prices={"BTC-USD": 300.0})
+
+    summary = agg.summary()
+    assert summary["positions"] == [{"symbol": "BTC", "amount": 1.0}]
+    assert summary["realizedPnl"] == pytest.approx(99.0)
+    assert summary["unrealizedPnl"] == pytest.approx(150.0)
+    assert summary["pnl"] == pytest.approx(249.0)
+    assert summary["balance"] == 1300.0 and summary["tradeCount"] == 3
+    assert summary["winRate"] == 1.0
+
+    chart = agg.chart(10)
+    assert chart["datasets"][0]["data"] == [1300.0]
+    assert chart["labels"] == ["2023-11-14T22:13:20+00:00"]
+
+
+def test_store_follows_the_ledger_and_versions_etags(tmp_path):
+    ledger = TradeLedger(str(tmp_path / "ledger.db"))
+    store = PerformanceStore(ledger, batch=1000)
+    assert store.sync("w") == 0 and store.summary("w")["tradeCount"] == 0
+    etag = store.etag("w", "performance", 100)
+
+    for i in range(5000):
+        ledger.record_mark("w", 1000.0 + i, timestamp=1_700_000_000 + 300 * i)
+    ledger.record_fill("w", "ETH-USD", "buy", 2.0, 10.0, timestamp=1_700_000_000)
+    ledger.flush()
+    assert store.sync("w") == 5001
+
+    assert store.etag("w", "performance", 100) != etag
+    etag = store.etag("w", "performance", 100)
+    chart = store.chart("w", 100)
+    assert len(chart["labels"]) == 100
+    # Nothing new: same ETag, cached chart
+    assert store.sync("w") == 0
+    assert store.etag("w", "performance", 100) == etag and store.chart("w", 100) is chart
+    assert store.summary("w")["tradeCount"] == 1
+
+    # A second worker reading the same ledger serves the same state and ETag
+    other = PerformanceStore(ledger)
+    other.sync("w")
+    assert other.etag("w", "performance", 100) == etag and other.summary("w") == store.summary("w")
+    ledger.close()
+
+
+def test_restarted_worker_starts_from_the_rollups(tmp_path):
+    ledger = TradeLedger(str(tmp_path / "ledger.db"))
+    for i in range(300):
+        ledger.record_fill("w", "BTC-USD", "buy" if i % 3 else "sell", 1.0, 100.0 + i, fee=0.1,
+                           timestamp=1_700_000_000 + 600 * i)
+        ledger.record_mark("w", 1000.0 + i, prices={"BTC-USD": 100.0 + i}, timestamp=1_700_000_000 + 600 * i + 1)
+    ledger.flush()
+    replayed = PerformanceStore(ledger, warm_marks=0)
+    replayed.cursors["w"] = (0, 0)   # follow from the first row, as before rollups
+    replayed.sync("w")
+
+    warm = PerformanceStore(ledger, warm_marks=50)
+    changes = ledger.changes
+    ledger.changes = lambda wallet, after_fill_id=0, after_mark_id=0, limit=10000: (
+        pytest.fail("history replayed") if after_fill_id == 0 else changes(wallet, after_fill_id, after_mark_id, limit))
+    # Only the bounded mark tail is loaded
+    assert warm.sync("w") == 50
+    assert warm.summary("w") == pytest.approx(replayed.summary("w"))
+    assert warm.etag("w", "summary") == replayed.etag("w", "summary")
+    assert len(warm.chart("w", 100)["labels"]) == 50
+
+    # ...and it follows new rows from there
+    ledger.changes = changes
+    ledger.record_fill("w", "BTC-USD", "sell", 1.0, 500.0, timestamp=1_700_000_000 + 600 * 300)
+    ledger.flush()
+    assert warm.sync("w") == replayed.sync("w") == 1
+    assert warm.summary("w") == pytest.approx(replayed.summary("w"))
+    ledger.close()
+
+
+def test_runtime_writes_marks_and_fills_to_the_ledger(tmp_path):
+    runtime, broker, _clients = make_runtime()
+    runtime.ledger = TradeLedger(str(tmp_path / "ledger.db"))
+    start_trader(FakeUser("w0", tier=1), {"strategy": "basic"}, broker=broker)
+    runtime.tick(end=pd.Timestamp("2024-01-01", tz="UTC"))
+    # Fills are read back in the background
+    runtime.fill_reconciler.join(timeout=5)
+    runtime.ledger.flush()
+
+    store = PerformanceStore(runtime.ledger)
+    store.sync("w0")
+    summary = store.summary("w0")
+    assert summary["balance"] == 1000.0
+    assert summary["tradeCount"] == 2
+    assert {p["symbol"]: p["amount"] for p in summary["positions"]} == {"BTC": 2.5, "ETH": 25.0}
+    runtime.ledger.close()
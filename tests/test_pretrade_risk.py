@@ -0,0 +1,172 @@
+# tests/test_pretrade_risk.py
+from types import SimpleNamespace
+
+import pytest
+
+from pretrade_risk import PreTradeRiskGate
+from product_catalog import ProductCatalog
+from trade_manager import CoinbaseClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _gate(**kwargs):
+    params = dict(max_position_percent=0.3, max_drawdown=0.2, max_order_notional=1000.0,
+                  max_orders_per_minute=3, price_band=0.05, clock=Clock())
+    params.update(kwargs)
+    gate = PreTradeRiskGate(**params)
+    gate.update_price("BTC-USD", 100.0)
+    gate.update_portfolio(10000.0, {"BTC-USD": 10.0})
+    return gate
+
+
+def test_price_band_and_reference_price():
+    gate = _gate()
+    assert gate.check("BTC-USD", "buy", size=1, price=104.0)[0]
+    ok, reason = gate.check("BTC-USD", "buy", size=1, price=106.0)
+    assert not ok and "band" in reason
+    ok, reason = gate.check("ETH-USD", "buy", size=1.0)
+    assert not ok and reason == "no reference price for ETH-USD"
+
+
+def test_max_notional_and_position():
+    gate = _gate()
+    ok, reason = gate.check("BTC-USD", "buy", funds=1500.0)
+    assert not ok and "exceeds max" in reason
+    # 10 BTC ($1000) held; the third $900 buy would make it 37% of $10000
+    ok, reason = gate.check("BTC-USD", "buy", funds=900.0)
+    assert ok
+    ok, reason = gate.check("BTC-USD", "buy", funds=900.0)
+    assert ok and gate.positions["BTC-USD"] == pytest.approx(28.0)
+    ok, reason = gate.check("BTC-USD", "buy", funds=900.0)
+    assert not ok and "of net worth" in reason
+    # Sells are never limited by position size
+    assert gate.check("BTC-USD", "sell", size=1)[0]
+
+
+def test_order_rate_limit_rolls_over():
+    gate = _gate()
+    for _ in range(3):
+        assert gate.check("BTC-USD", "sell", size=0.1)[0]
+    ok, reason = gate.check("BTC-USD", "sell", size=0.1)
+    assert not ok and "rate limit" in reason
+    gate.clock.now += 61
+    assert gate.check("BTC-USD", "sell", size=0.1)[0]
+
+
+def test_drawdown_kill_switch_only_lets_risk_reducing_sells_through():
+    gate = _gate()
+    gate.update_portfolio(7900.0)
+    assert gate.killed
+    ok, reason = gate.check("BTC-USD", "buy", funds=10.0)
+    assert not ok and reason == "drawdown kill switch active"
+    assert gate.check("BTC-USD", "sell", size=5.0)[0]
+    # More than the (projected) holding would open a short
+    assert not gate.check("BTC-USD", "sell", size=6.0)[0]
+    gate.reset_kill_switch()
+    assert gate.check("BTC-USD", "buy", funds=10.0)[0]
+
+
+def test_batch_projects_state_and_atomic_commits_nothing_on_failure():
+    gate = _gate()
+    orders = [{"product_id": "BTC-USD", "side": "buy", "funds": 900.0} for _ in range(3)]
+    # Each order alone would pass; the third breaches the position cap in aggregate
+    assert [ok for ok, _reason in gate.check_batch(orders, atomic=True)] == [False, False, False]
+    assert gate.positions["BTC-USD"] == 10.0 and not gate.order_times
+
+    assert [ok for ok, _reason in gate.check_batch(orders)] == [True, True, False]
+    assert gate.positions["BTC-USD"] == pytest.approx(28.0) and len(gate.order_times) == 2
+
+
+def test_release_gives_back_rate_and_position():
+    gate = _gate()
+    results = gate.reserve_batch([{"product_id": "BTC-USD", "side": "buy", "funds": 500.0}] * 3)
+    for _ok, _reason, reservation in results:
+        gate.release(reservation)
+    assert gate.positions["BTC-USD"] == pytest.approx(10.0) and not gate.order_times
+
+    _ok, _reason, reservation = gate.reserve("BTC-USD", "buy", funds=500.0)
+    # A portfolio read in between already reflects reality: only the rate slot is returned
+    gate.update_portfolio(10000.0, {"BTC-USD": 12.0})
+    gate.release(reservation)
+    assert gate.positions["BTC-USD"] == 12.0 and not gate.order_times
+
+
+class FailingRest:
+    def __init__(self, response):
+        self.response = response
+
+    def market_order_buy(self, **kwargs):
+        if isinstance(self.response, Exception):
+            raise self.response
+        return SimpleNamespace(to_dict=lambda: self.response)
+
+
+@pytest.mark.parametrize("response", [
+    {"success": False, "error_response": {"error": "INSUFFICIENT_FUND"}},
+    ConnectionError("timed out"),
+])
+def test_client_releases_usage_of_orders_that_never_reach_the_book(response):
+    gate = _gate()
+    client = CoinbaseClient(risk_gate=gate, catalog=ProductCatalog())
+    client.client = FailingRest(response)
+    for _ in range(5):
+        client.place_market_order("BTC-USD", "buy", funds=100.0)
+    assert gate.positions["BTC-USD"] == 10.0 and not gate.order_times
+
+    client.client = FailingRest({"success": True, "success_response": {"order_id": "1"}})
+    client.place_market_order("BTC-USD", "buy", funds=100.0)
+    assert gate.positions["BTC-USD"] == pytest.approx(11.0) and len(gate.order_times) == 1
+
+
+def test_sync_portfolio_values_balances_for_processes_without_the_loop():
+    gate = PreTradeRiskGate(max_drawdown=0.2)
+    client = SimpleNamespace(
+        balances=[{"currency": "USD", "balance": "1000"}, {"currency": "BTC", "balance": "2"},
+                  {"currency": "XYZ", "balance": "5"}],
+        get_account_balances=lambda: client.balances,
+        get_current_price=lambda pid: 100.0 if pid == "BTC-USD" else {"error": "no market"},
+    )
+    assert gate.start(client, refresh_interval=3600) is gate
+    assert gate.net_worth == 1200.0 and gate.positions == {"BTC-USD": 2.0}
+    assert gate.start(client) is gate and gate.refresh_interval == 3600
+
+    client.balances = [{"currency": "USD", "balance": "900"}]
+    gate.sync_portfolio(client)
+    assert gate.killed
+    client.balances = [{"error": "unauthorized"}]
+    assert gate.sync_portfolio(client) is None and gate.net_worth == 900.0
+    gate.stop()
+
+
+def test_sync_portfolio_refreshes_held_prices():
+    gate = PreTradeRiskGate(clock=Clock())
+    quotes = {"BTC-USD": 100.0}
+    client = SimpleNamespace(
+        get_account_balances=lambda: [{"currency": "USD", "balance": "0"}, {"currency": "BTC", "balance": "1"}],
+        get_current_price=lambda pid: quotes.get(pid, {"error": "no market"}),
+    )
+    assert gate.sync_portfolio(client) == 100.0
+    quotes["BTC-USD"] = 150.0
+    assert gate.sync_portfolio(client) == 150.0 and gate.prices["BTC-USD"] == 150.0
+    # A failed read keeps the last price
+    del quotes["BTC-USD"]
+    assert gate.sync_portfolio(client) == 150.0
+
+
+def test_client_rereads_stale_reference_prices():
+    gate = _gate()
+    client = CoinbaseClient(risk_gate=gate, catalog=ProductCatalog())
+    client.get_current_price = lambda pid: 50.0
+    client.client = FailingRest({"success": True, "success_response": {"order_id": "1"}})
+    client.place_market_order("BTC-USD", "buy", funds=100.0)
+    assert gate.prices["BTC-USD"] == 100.0
+    gate.clock.now += 3600
+    client.place_market_order("BTC-USD", "buy", funds=100.0)
+    assert gate.prices["BTC-USD"] == 50.0 and gate.has_price("BTC-USD", max_age=1)
@@ -0,0 +1,149 @@
+# tests/test_product_catalog.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from pretrade_risk import PreTradeRiskGate
+from product_catalog import ProductCatalog
+from rebalance_planner import NettingPlan, orders_from_flows, step_flows
+from strategies.market_making import MarketMakingStrategy
+from trade_manager import CoinbaseClient
+
+PRODUCTS = [
+    {"product_id": "BTC-USD", "base_increment": "0.00000001", "quote_increment": "0.01",
+     "price_increment": "0.01", "base_min_size": "0.00000001", "base_max_size": "3400",
+     "quote_min_size": "1", "quote_max_size": "150000000", "status": "online", "trading_disabled": False},
+    {"product_id": "DOGE-USD", "base_increment": "0.1", "quote_increment": "0.00001",
+     "price_increment": "0.00001", "base_min_size": "1", "base_max_size": "",
+     "quote_min_size": "1", "quote_max_size": "", "status": "online"},
+    {"product_id": "OLD-USD", "base_increment": "0.01", "quote_increment": "0.01", "base_min_size": "0.01",
+     "quote_min_size": "1", "status": "delisted", "trading_disabled": True},
+    {"product_id": "NEW-USD", "base_increment": "0.01", "quote_increment": "0.01", "base_min_size": "0.01",
+     "quote_min_size": "1", "status": "online", "limit_only": True},
+]
+
+
+class FakeProducts:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def get_products(self, product_type=None):
+        self.calls += 1
+        return SimpleNamespace(products=[dict(row) for row in self.rows])
+
+
+class FakeRest:
+    """Records what CoinbaseClient would send."""
+
+    def __init__(self):
+        self.sent = []
+
+    def _order(self, name):
+        def send(**kwargs):
+            self.sent.append((name, kwargs))
+            return SimpleNamespace(to_dict=lambda: {"success": True, "success_response": {"order_id": "x"}})
+        return send
+
+    def __getattr__(self, name):
+        return self._order(name)
+
+
+def _catalog():
+    catalog = ProductCatalog(FakeProducts(PRODUCTS))
+    assert catalog.refresh() == 4
+    return catalog
+
+
+def test_quantization_follows_the_increments():
+    catalog = _catalog()
+    btc, doge = catalog.get("BTC-USD"), catalog.get("DOGE-USD")
+    assert btc.size(0.123456789123) == 0.12345678
+    assert btc.funds(0.29) == 0.29        # not 0.28 from 0.28999...
+    assert doge.size(12.39) == 12.3
+    assert btc.price(100.123, "buy") == 100.12 and btc.price(100.121, "sell") == 100.13
+    assert doge.prepare("sell", size=0.95) == (None, 0.9, None, "size 0.9 below minimum 1.0")
+
+
+def test_checks_status_limits_and_unknown_products():
+    catalog = _catalog()
+    assert catalog.get("BTC-USD").check(funds=0.5) == "funds 0.5 below minimum 1.0"
+    assert catalog.get("BTC-USD").check(size=3401) == "size 3401 above maximum 3400.0"
+    assert catalog.get("BTC-USD").check(size=0.001, price=100) == "notional 0.10 below minimum 1.0"
+    assert "not trading" in catalog.get("OLD-USD").check(funds=10)
+    assert catalog.get("NEW-USD").check(funds=10) == "NEW-USD accepts limit orders only"
+    assert catalog.get("NEW-USD").check(size=1, price=10, market=False) is None
+    assert "unlisted" in catalog.get("XYZ-USD").check(funds=10)
+    # Before the first load every product gets the old hard-coded limits
+    empty = ProductCatalog()
+    assert empty.get("XYZ-USD").funds(12.345) == 12.34 and empty.get("XYZ-USD").check(funds=4.99) is not None
+
+
+def test_planner_uses_per_product_minimums_and_increments():
+    catalog = _catalog()
+    ids = ["BTC-USD", "DOGE-USD", "OLD-USD", "NEW-USD"]
+    prices = np.array([100.0, 0.1, 1.0, 1.0])
+    min_funds, min_size = catalog.minimums(ids)
+    np.testing.assert_array_equal(min_funds, [1.0, 1.0, np.inf, np.inf])
+    assert catalog.minimums(ids)[0] is min_funds   # cached until the next refresh
+
+    flows = step_flows(np.array([[4.0, -3.0, 50.0, 50.0], [3.0, -1.5, 0.0, 0.0]]), prices,
+                       minimums=(min_funds, min_size))
+    # $2 BTC buy passes the $1 minimum (the old $5 would drop it), 15 DOGE passes 1 DOGE
+    # but 7.5 DOGE is sized to the 0.1 increment; delisted and limit-only products are never planned
+    assert [o for _i, _j, o in orders_from_flows(flows, prices, ids, catalog)] == [
+        {"product_id": "BTC-USD", "side": "buy", "funds": 2.0},
+        {"product_id": "DOGE-USD", "side": "sell", "size": 15.0},
+        {"product_id": "BTC-USD", "side": "buy", "funds": 1.5},
+        {"product_id": "DOGE-USD", "side": "sell", "size": 7.5},
+    ]
+    plan = NettingPlan(np.array([[4.0, 0.0, 0.0, 0.0], [-2.5, 0.0, 10.0, 0.0]]), prices, ids, catalog)
+    assert plan.orders == [{"product_id": "BTC-USD", "side": "buy", "funds": 1.5}]
+
+    catalog.refresh()
+    assert catalog.minimums(ids)[0] is not min_funds
+
+
+def test_client_rejects_before_sending_and_quantizes():
+    catalog = _catalog()
+    gate = PreTradeRiskGate()
+    gate.update_price("BTC-USD", 100.0)
+    gate.update_price("DOGE-USD", 0.1)
+    client = CoinbaseClient(risk_gate=gate, catalog=catalog)
+    client.client = FakeRest()
+
+    assert client.place_market_order("BTC-USD", "buy", funds=0.5)["rejected"]
+    assert client.place_market_order("OLD-USD", "sell", size=1)["rejected"]
+    assert client.place_limit_order("DOGE-USD", "buy", 0.1, 0.5)["rejected"]
+    assert client.client.sent == []
+
+    client.place_market_order("BTC-USD", "buy", funds=12.3456)
+    client.place_ioc_order("DOGE-USD", "sell", 0.099993, 25.07)
+    assert client.client.sent == [
+        ("market_order_buy", {"client_order_id": "", "product_id": "BTC-USD", "quote_size": "12.34"}),
+        ("limit_order_ioc_sell", {"client_order_id": "", "product_id": "DOGE-USD", "base_size": "25.0",
+                                  "limit_price": "0.1"}),
+    ]
+
+
+def test_market_maker_quotes_on_product_increments():
+    catalog = _catalog()
+    maker = MarketMakingStrategy(None, ["DOGE-USD"], quote_notional=10.0, half_spread=0.01,
+                                 max_inventory_usd=100.0, catalog=catalog)
+    (bid, bid_size), (ask, ask_size) = maker.desired_quotes("DOGE-USD", 0.09999, 0.10001, 0.0)
+    assert (bid, ask) == (0.099, 0.101)
+    assert bid_size == ask_size == 100.0
+    # Shrunk under the 1 DOGE minimum: that side is not quoted
+    (_bid, bid_size), _ask = maker.desired_quotes("DOGE-USD", 0.09999, 0.10001, 995.0)
+    assert bid_size == 0.0
+
+
+def test_failed_refresh_keeps_the_catalog():
+    catalog = _catalog()
+    catalog.client = SimpleNamespace(get_products=lambda **kwargs: 1 / 0)
+    catalog.start()
+    assert catalog.get("BTC-USD").quote_min_size == 1.0
+    catalog.stop()
+    with pytest.raises(ZeroDivisionError):
+        catalog.refresh()
@@ -0,0 +1,256 @@
+# tests/test_rebalance_planner.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from broker import InMemoryBroker
+from risk_manager import RiskManager
+from rebalance_planner import (
+    InternalAccount, NettingPlan, clamp_flows, orders_from_flows, rebalance_diffs, step_flows
+)
+from trade_ledger import TradeLedger
+from trader import fund_house_account
+from trader_runtime import HouseAccounts, MultiTenantRuntime
+
+PRODUCTS = ["BTC-USD", "ETH-USD", "SOL-USD"]
+PRICES = np.array([100.0, 10.0, 1.0])
+
+
+def _per_asset_orders(total, action, positions):
+    """The per-asset loop the planner replaced."""
+    orders = []
+    for i, pid in enumerate(PRODUCTS):
+        diff = total * action[i] - positions[i] * PRICES[i]
+        if abs(diff) < 1.0:
+            continue
+        if diff > 0:
+            if diff * 0.5 >= 5.0:
+                orders.append({"product_id": pid, "side": "buy", "funds": round(diff * 0.5, 2)})
+        elif abs(diff) * 0.5 / PRICES[i] >= 0.0001:
+            orders.append({"product_id": pid, "side": "sell", "size": round(abs(diff) * 0.5 / PRICES[i], 6)})
+    return orders
+
+
+def test_single_account_matches_per_asset_loop():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        total = float(rng.uniform(10, 5000))
+        action = rng.uniform(0, 0.5, 3) * (rng.uniform(size=3) > 0.3)
+        positions = rng.uniform(0, 3, 3) * (rng.uniform(size=3) > 0.3)
+        diffs = rebalance_diffs(total, action, positions, PRICES)
+        planned = [o for _i, _j, o in orders_from_flows(step_flows(diffs, PRICES), PRICES, PRODUCTS)]
+        assert planned == _per_asset_orders(total, action, positions)
+
+
+def test_opposing_flows_net_to_one_order_per_product():
+    flows = np.array([
+        [100.0, -40.0, 0.0],
+        [-30.0, -10.0, 3.0],
+        [-50.0, 60.0, 0.0],
+    ])
+    plan = NettingPlan(flows, PRICES, PRODUCTS)
+    # BTC nets to a $20 buy, ETH to a $10 buy, SOL's $3 is under the exchange minimum
+    assert plan.orders == [{"product_id": "BTC-USD", "side": "buy", "funds": 20.0},
+                           {"product_id": "ETH-USD", "side": "buy", "funds": 10.0}]
+    np.testing.assert_allclose(plan.crossed, [80.0, 50.0, 0.0])
+
+    filled = plan.allocate()
+    # BTC and ETH fill completely; nothing crosses the lone SOL buyer
+    np.testing.assert_allclose(filled[:, :2], flows[:, :2])
+    np.testing.assert_allclose(filled[:, 2], 0.0)
+
+    # The BTC exchange order fails: buyers share the crossed $80 pro rata, sellers fill in full
+    filled = plan.allocate(np.array([0.0, 10.0, 0.0]))
+    np.testing.assert_allclose(filled[:, 0], [80.0, -30.0, -50.0])
+
+
+def test_runtime_omnibus_mode_sends_only_net_orders():
+    class FakeDataManager:
+        def build_multiasset_dataset(self, start, end):
+            row = {"time": end}
+            for pid, px in zip(PRODUCTS, PRICES):
+                row.update({f"{pid}_close": px, f"{pid}_ma_50": px, f"{pid}_ma_200": px, f"{pid}_rsi": 50.0})
+            return pd.DataFrame([row])
+
+        def feature_names(self):
+            return ("close", "ma_50", "ma_200", "rsi")
+
+    class TargetModel:
+        # Even accounts want 30% BTC, odd accounts hold BTC and want none
+        def predict(self, obs, deterministic=True):
+            actions = np.zeros((len(obs), len(PRODUCTS)), dtype=np.float32)
+            actions[::2, 0] = 0.3
+            return actions, None
+
+    class HouseClient:
+        def __init__(self):
+            self.orders = []
+
+        def get_account_balances(self):
+            return [{"currency": "USD", "balance": "85000"}, {"currency": "BTC", "balance": "150"}]
+
+        def place_market_order(self, product_id, side, funds=None, size=None):
+            self.orders.append((product_id, side, funds, size))
+            return {"success": True}
+
+    accounts = {}
+
+    def client_factory(user):
+        i = int(user["wallet_public_key"][1:])
+        balances = {"USD": 1000.0} if i % 2 == 0 else {"USD": 700.0, "BTC": 3.0}
+        accounts[user["wallet_public_key"]] = InternalAccount(balances)
+        return accounts[user["wallet_public_key"]]
+
+    house = HouseClient()
+    runtime = MultiTenantRuntime(TargetModel(), PRODUCTS, FakeDataManager(), broker=InMemoryBroker(),
+                                 client_factory=client_factory, house_client=house,
+                                 risk_manager=RiskManager(max_position=0.3))
+    for i in range(100):
+        runtime.register({"wallet_public_key": f"w{i}", "tier": 1, "exchanges": []}, {"strategy": "basic"})
+
+    results = runtime.tick(end=pd.Timestamp("2024-01-01", tz="UTC"))
+
+    # 50 buyers of $150 against 50 sellers of $150: everything crosses internally
+    assert house.orders == []
+    assert results["w0"] == [{"product_id": "BTC-USD", "side": "buy", "size": pytest.approx(1.5), "price": 100.0,
+                              "fee": 0.0}]
+    assert accounts["w0"].balances == {"USD": pytest.approx(850.0), "BTC": pytest.approx(1.5)}
+    assert accounts["w1"].balances == {"USD": pytest.approx(850.0), "BTC": pytest.approx(1.5)}
+
+
+def test_house_sub_accounts_are_kept_in_the_ledger(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    ledger = TradeLedger(path)
+    accounts = HouseAccounts(ledger)
+    account = accounts({"wallet_public_key": "w0"})
+    assert account.balances == {}
+    accounts.deposit("w0", 1000.0, "USD", [{"currency": "USD", "balance": "1000"}])
+    account.apply_fill("BTC-USD", 1.5, 100.0, fee=0.5)
+    account.apply_fill("BTC-USD", -0.5, 110.0)
+    # Registering again hands back the same account, not a reload of queued rows
+    assert accounts({"wallet_public_key": "w0"}) is account
+    ledger.flush()
+    ledger.close()
+
+    # A restarted runtime gets the stored balances back
+    reopened = TradeLedger(path)
+    restored = HouseAccounts(reopened).account("w0")
+    assert restored.balances == {"USD": pytest.approx(904.5), "BTC": pytest.approx(1.0)}
+    assert reopened.balance_totals() == {"USD": pytest.approx(904.5), "BTC": pytest.approx(1.0)}
+    reopened.close()
+
+
+def test_deposits_must_be_covered_by_the_house_account():
+    accounts = HouseAccounts()
+    house = [{"currency": "USD", "balance": "1000"}]
+    accounts.deposit("w0", 600.0, "USD", house)
+    with pytest.raises(ValueError, match="only 400"):
+        accounts.deposit("w1", 500.0, "USD", house)
+    accounts.deposit("w1", 400.0, "USD", house)
+    with pytest.raises(ValueError, match="Cannot withdraw"):
+        accounts.deposit("w1", -500.0, "USD", house)
+    accounts.deposit("w1", -100.0, "USD", house)
+    assert accounts.allocated() == {"USD": 900.0}
+
+
+def test_flows_are_clamped_to_each_account():
+    flows = np.array([[600.0, 600.0, -50.0], [100.0, 0.0, -50.0]])
+    cash = np.array([1000.0, 1000.0])
+    positions = np.array([[0.0, 0.0, 20.0], [0.0, 0.0, 100.0]])
+    clamped = clamp_flows(flows, cash, positions, PRICES, headroom=0.0)
+    # Buys scaled together to the cash, a sell to the $20 of SOL held
+    np.testing.assert_allclose(clamped, [[500.0, 500.0, -20.0], [100.0, 0.0, -50.0]])
+    np.testing.assert_allclose(clamp_flows(flows, cash, positions, PRICES)[0, :2], [495.0, 495.0])
+
+
+def test_fills_carry_the_exchange_price_and_fee():
+    # Two buyers ($100 and $300 of BTC), one seller of $100: $300 goes to the exchange
+    plan = NettingPlan(np.array([[100.0, 0.0, 0.0], [300.0, 0.0, 0.0], [-100.0, 0.0, 0.0]]), PRICES, PRODUCTS)
+    # The house buys 2.9 BTC (not the 3 planned) at $101 and pays $1.74
+    size, price, fee = plan.allocate_fills([2.9, 0.0, 0.0], [101.0, 0.0, 0.0], [1.74, 0.0, 0.0])
+    np.testing.assert_allclose(size[:, 0], [0.975, 2.925, -1.0])
+    # The seller crossed at the reference price; the buyers pay a blend and share the fee
+    assert price[2, 0] == 100.0 and fee[2, 0] == 0.0
+    np.testing.assert_allclose(price[:2, 0], 100.0 + 2.9 / 3.9)
+    np.testing.assert_allclose(fee[:, 0], [0.435, 1.305, 0.0])
+    # Tenant cash moves add up to the internal cross plus what the house paid
+    cash = -(size[:, 0] * price[:, 0] + fee[:, 0])
+    assert cash.sum() == pytest.approx(-(2.9 * 101.0 + 1.74))
+
+
+class HouseExchange:
+    """House account that fills market orders at `fill_price` with a fee, and reports its balances."""
+
+    def __init__(self, balances, fill_price, fee_rate=0.005):
+        self.balances = dict(balances)
+        self.fill_price = fill_price
+        self.fee_rate = fee_rate
+        self.orders = []
+
+    def get_account_balances(self):
+        return [{"currency": c, "balance": str(v)} for c, v in self.balances.items()]
+
+    def place_market_order(self, product_id, side, funds=None, size=None):
+        price = self.fill_price[product_id]
+        size = funds / price if funds else size
+        self.orders.append({"product_id": product_id, "side": side, "size": size, "price": price,
+                            "fee": size * price * self.fee_rate})
+        return {"success": True, "success_response": {"order_id": str(len(self.orders))}}
+
+    def get_order(self, order_id):
+        order = self.orders[int(order_id) - 1]
+        return {"order_id": order_id, "status": "FILLED", "filled_size": order["size"],
+                "average_filled_price": order["price"], "fee": order["fee"]}
+
+
+class AllInBtc:
+    def predict(self, obs, deterministic=True):
+        actions = np.zeros((len(obs), len(PRODUCTS)), dtype=np.float32)
+        actions[:, 0] = 1.0
+        return actions, None
+
+
+class OneRowData:
+    def build_multiasset_dataset(self, start, end):
+        row = {"time": end}
+        for pid, px in zip(PRODUCTS, PRICES):
+            row.update({f"{pid}_close": px, f"{pid}_ma_50": px, f"{pid}_ma_200": px, f"{pid}_rsi": 50.0})
+        return pd.DataFrame([row])
+
+    def feature_names(self):
+        return ("close", "ma_50", "ma_200", "rsi")
+
+
+def test_house_mode_funds_trades_and_books_what_the_house_paid(tmp_path):
+    ledger = TradeLedger(str(tmp_path / "ledger.db"))
+    house = HouseExchange({"USD": 1000.0}, {"BTC-USD": 102.0})
+    broker = InMemoryBroker()
+    runtime = MultiTenantRuntime(AllInBtc(), PRODUCTS, OneRowData(), broker=broker, client_factory=HouseAccounts(ledger),
+                                 house_client=house, ledger=ledger, risk_manager=RiskManager(max_position=1.0))
+    for wallet in ("w0", "w1"):
+        runtime.register({"wallet_public_key": wallet, "tier": 1, "exchanges": []}, {"strategy": "basic"})
+    fund_house_account("w0", 600.0, broker=broker)
+    fund_house_account("w1", 600.0, broker=broker)   # only $400 left: refused
+
+    results = runtime.tick(end=pd.Timestamp("2024-01-01", tz="UTC"))
+    assert runtime.client_factory.account("w1").balances == {}
+    # w0 wants all of $600 in BTC: half now, less the cash headroom
+    [fill] = results["w0"]
+    [order] = house.orders
+    assert fill["size"] == pytest.approx(order["size"]) and fill["price"] == pytest.approx(102.0)
+    assert fill["fee"] == pytest.approx(order["fee"])
+    account = runtime.client_factory.account("w0")
+    assert account.balances["USD"] == pytest.approx(600.0 - order["size"] * 102.0 - order["fee"])
+
+    ledger.flush()
+    [house_fill] = ledger.fills("house")
+    assert house_fill["price"] == 102.0 and house_fill["fee"] == pytest.approx(order["fee"])
+    assert ledger.fills("w0")[0]["price"] == pytest.approx(102.0)
+
+    # The house account lost money the sub-accounts still show: nothing trades until reconciled
+    house.balances["USD"] = 100.0
+    house.orders.clear()
+    assert runtime.reconcile() == {"USD": pytest.approx(account.balances["USD"] - 100.0),
+                                   "BTC": pytest.approx(account.balances["BTC"])}
+    assert runtime.tick(end=pd.Timestamp("2024-01-01 01:00", tz="UTC")) == {} and house.orders == []
+    ledger.close()
@@ -0,0 +1,103 @@
+# tests/test_resampler.py
+import numpy as np
+import pandas as pd
+
+from resampler import IncrementalResampler, feature_names, resample_candles, resolution_label
+
+
+def _candles(n, seconds=60, seed=0, drop=()):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    open_ = np.r_[close[0], close[:-1]]
+    df = pd.DataFrame({
+        "time": pd.date_range("2024-01-01", periods=n, freq=f"{seconds}s", tz="UTC"),
+        "low": np.minimum(open_, close) - rng.uniform(0, 1, n),
+        "high": np.maximum(open_, close) + rng.uniform(0, 1, n),
+        "open": open_,
+        "close": close,
+        "volume": rng.uniform(1, 10, n),
+    })
+    return df.drop(index=list(drop)).reset_index(drop=True)
+
+
+def test_resample_matches_pandas_ohlcv():
+    # Missing base bars (no trades) must not shift bucket boundaries
+    df = _candles(600, drop=(7, 8, 301))
+    out = resample_candles(df, 300, base_seconds=60)
+
+    expected = df.set_index("time").resample("300s").agg(
+        {"low": "min", "high": "max", "open": "first", "close": "last", "volume": "sum"}
+    ).dropna().reset_index()
+    assert len(out) == len(expected) == 120
+    for col in ("low", "high", "open", "close", "volume"):
+        np.testing.assert_allclose(out[col].to_numpy(), expected[col].to_numpy())
+
+
+def test_resample_drops_unfinished_bucket():
+    df = _candles(62)
+    out = resample_candles(df, 300, base_seconds=60)
+    assert len(out) == 12
+    assert out["time"].iloc[-1] == pd.Timestamp("2024-01-01 00:55", tz="UTC")
+
+
+def test_incremental_matches_batch():
+    df = _candles(600, drop=(7, 8, 299))
+    batch = resample_candles(df, 900, base_seconds=60)
+
+    resampler = IncrementalResampler(60, 900)
+    bars = []
+    for record in df.to_dict("records"):
+        bars.extend(resampler.update(record))
+
+    assert len(bars) == len(batch)
+    np.testing.assert_allclose([b["close"] for b in bars], batch["close"].to_numpy())
+    np.testing.assert_allclose([b["volume"] for b in bars], batch["volume"].to_numpy())
+    assert [b["time"] for b in bars] == list(batch["time"])
+
+
+def test_incremental_emits_when_last_bar_closes():
+    resampler = IncrementalResampler(60, 300)
+    df = _candles(5)
+    emitted = [resampler.update(r) for r in df.to_dict("records")]
+    assert emitted[:4] == [[], [], [], []]
+    assert len(emitted[4]) == 1
+
+
+def test_feature_names():
+    assert resolution_label(300) == "5m"
+    assert resolution_label(14400) == "4h"
+    assert feature_names([86400])[-1] == "1d_rsi"
+
+
+def test_live_ticks_fold_in_only_new_bars():
+    from data_manager import DataManager
+    from test_tick_recorder import START, _candles
+    from tick_recorder import ReplayCandleClient
+
+    history = _candles(400, 0)
+    source = ReplayCandleClient()
+    live = DataManager(["BTC-USD"], resolutions=[14400], client=source)
+    batch = DataManager(["BTC-USD"], resolutions=[14400], client=source, cache_candles=False)
+    fed = []
+    for hour in range(300, 320):
+        end = START + pd.Timedelta(hours=hour)
+        # The bar that opened at `end` is still forming
+        source.apply({"BTC-USD": [row for row in history if row[0] <= end.timestamp()]})
+        live_df = live.build_multiasset_dataset(end - pd.Timedelta("3 days"), end)
+        fed.append(live.live_resampler.fed_until["BTC-USD"])
+        if hour == 300:
+            # First tick: same coarse bars as resampling the window
+            batch_df = batch.build_multiasset_dataset(end - pd.Timedelta("3 days"), end)
+            pd.testing.assert_frame_equal(live_df.iloc[:-4], batch_df.iloc[:-4])
+    # One new closed base bar per tick, never the forming one
+    assert np.diff(fed).tolist() == [3600] * 19
+    assert fed[-1] == (START + pd.Timedelta(hours=318)).timestamp()
+    # Coarse candles kept across ticks match resampling everything fed so far
+    window = pd.DataFrame(history[228:319], columns=["time", "low", "high", "open", "close", "volume"])
+    window["time"] = pd.to_datetime(window["time"], unit="s", utc=True)
+    expected = resample_candles(window, 14400, base_seconds=3600)
+    got = live.live_resampler.candles("BTC-USD", 14400)
+    assert len(got) == len(expected) == 22
+    for col in ("low", "high", "open", "close", "volume"):
+        np.testing.assert_allclose(got[col].to_numpy(), expected[col].to_numpy())
+    assert (got["time"] == expected["time"]).all()
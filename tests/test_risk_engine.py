@@ -0,0 +1,131 @@
+# tests/test_risk_engine.py
+import numpy as np
+import pytest
+
+from risk_engine import StreamingRiskEngine
+from risk_manager import RiskManager
+
+Z_95 = 1.6448536269514722          # standard normal 95% quantile
+ES_95 = 2.0627128075074253         # pdf(Z_95) / 0.05
+
+
+def _prices(n_bars=400, n_assets=3, seed=0):
+    rng = np.random.default_rng(seed)
+    # Correlated log returns with different volatilities
+    chol = np.linalg.cholesky(np.array([[1.0, 0.6, 0.2], [0.6, 1.0, 0.3], [0.2, 0.3, 1.0]]))
+    returns = rng.normal(0.0002, 1.0, (n_bars, n_assets)) @ chol.T * np.array([0.005, 0.02, 0.04])
+    return 100 * np.exp(np.vstack([np.zeros(n_assets), np.cumsum(returns, axis=0)]))
+
+
+def _batch_ewma(prices, halflife):
+    """
+    Reference EW mean/covariance of all log returns at once. The engine
+    starts from a zero mean, which acts as one extra zero return carrying
+    the weight left over by the decayed observations.
+    """
+    returns = np.diff(np.log(prices), axis=0)
+    alpha = 1.0 - 0.5 ** (1.0 / halflife)
+    n = len(returns)
+    weights = alpha * (1 - alpha) ** np.arange(n - 1, -1, -1)
+    x = np.vstack([np.zeros(returns.shape[1]), returns])
+    w = np.r_[(1 - alpha) ** n, weights]
+    mean = w @ x
+    centered = x - mean
+    cov = (centered * w[:, None]).T @ centered
+    return mean, cov
+
+
+def _engine(prices, **kwargs):
+    engine = StreamingRiskEngine(prices.shape[1], **kwargs)
+    for row in prices:
+        engine.update(row)
+    return engine
+
+
+def test_streaming_mean_and_covariance_match_batch():
+    prices = _prices()
+    engine = _engine(prices, halflife=48)
+    mean, cov = _batch_ewma(prices, 48)
+    np.testing.assert_allclose(engine.mean, mean, rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(engine.cov, cov, rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(engine.volatility(), np.sqrt(np.diag(cov)), rtol=1e-9)
+    np.testing.assert_allclose(engine.correlation(), cov / np.outer(np.sqrt(np.diag(cov)), np.sqrt(np.diag(cov))),
+                               rtol=1e-9)
+    assert engine.n_updates == len(prices) - 1
+
+
+def test_var_and_expected_shortfall_are_the_normal_quantities():
+    prices = _prices()
+    engine = _engine(prices, halflife=48, confidence=0.95)
+    mean, cov = _batch_ewma(prices, 48)
+    weights = np.array([[0.2, 0.3, 0.1], [0.0, 0.0, 0.9], [0.0, 0.0, 0.0]])
+    sigma = np.sqrt(np.einsum("ki,ij,kj->k", weights, cov, weights))
+    np.testing.assert_allclose(engine.portfolio_volatility(weights), sigma, rtol=1e-9)
+    np.testing.assert_allclose(engine.value_at_risk(weights), Z_95 * sigma - weights @ mean, rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(engine.expected_shortfall(weights), ES_95 * sigma - weights @ mean,
+                               rtol=1e-9, atol=1e-15)
+    # A single vector gives the same number as its row in the batch
+    assert engine.value_at_risk(weights[0]) == pytest.approx(engine.value_at_risk(weights)[0])
+    assert np.all(engine.expected_shortfall(weights[:2]) > engine.value_at_risk(weights[:2]))
+
+
+def test_volatility_caps_hit_the_per_bar_target():
+    prices = _prices()
+    engine = _engine(prices, halflife=48, target_annual_vol=0.8, bars_per_year=24 * 365)
+    _mean, cov = _batch_ewma(prices, 48)
+    target = 0.8 / np.sqrt(24 * 365)
+    expected = np.minimum(1.0, target / np.sqrt(np.diag(cov)))
+    np.testing.assert_allclose(engine.volatility_caps(), expected, rtol=1e-9)
+    # The low-vol asset is uncapped, the high-vol one is not
+    assert expected[0] == 1.0 and expected[2] < 1.0
+
+
+def test_constrain_matches_a_per_portfolio_reference():
+    prices = _prices()
+    engine = _engine(prices, halflife=48, target_annual_vol=0.8, max_var=0.01, warmup=24)
+    mean, cov = _batch_ewma(prices, 48)
+    target = 0.8 / np.sqrt(24 * 365)
+    caps = np.minimum(1.0, target / np.sqrt(np.diag(cov)))
+    rng = np.random.default_rng(1)
+    weights = rng.dirichlet(np.ones(3), 50)
+
+    expected = []
+    for w in weights:
+        w = np.minimum(w, caps)
+        sigma = np.sqrt(w @ cov @ w)
+        var = Z_95 * sigma - w @ mean
+        scale = min(1.0, target / sigma if sigma > 0 else 1.0, 0.01 / var if var > 0 else 1.0)
+        expected.append(w * scale)
+    constrained = engine.constrain(weights)
+    np.testing.assert_allclose(constrained, expected, rtol=1e-9)
+    np.testing.assert_allclose(engine.constrain(weights[3]), expected[3], rtol=1e-9)
+
+    # Every result is within both limits, and one already inside them is untouched
+    assert np.all(engine.portfolio_volatility(constrained) <= target * (1 + 1e-9))
+    assert np.all(engine.value_at_risk(constrained) <= 0.01 * (1 + 1e-9))
+    small = np.array([0.01, 0.0, 0.0])
+    np.testing.assert_array_equal(engine.constrain(small), small)
+
+
+def test_constrain_is_a_no_op_until_warm():
+    prices = _prices(n_bars=10)
+    engine = _engine(prices, warmup=24)
+    assert not engine.ready
+    weights = np.array([0.5, 0.5, 0.5])
+    np.testing.assert_array_equal(engine.constrain(weights), weights)
+    engine.reset()
+    assert engine.n_updates == 0 and not engine.cov.any()
+
+
+def test_risk_manager_feeds_each_completed_bar_once():
+    prices = _prices(n_bars=100)
+    times = np.arange(len(prices)) * 3600
+    manager = RiskManager(risk_engine=StreamingRiskEngine(prices.shape[1], halflife=48))
+    # Overlapping windows, several ticks per bar; the last row is still forming
+    for end in (40, 40, 41, 60, 60, 80, 101):
+        window = slice(max(0, end - 30), end)
+        manager.update_bars(times[window], prices[window])
+    # Bars before the first window's start were never seen
+    expected = _engine(prices[10:100], halflife=48)
+    np.testing.assert_allclose(manager.risk_engine.cov, expected.cov, rtol=1e-12)
+    assert manager.last_bar_time == times[99]
@@ -0,0 +1,138 @@
+# tests/test_state_snapshot.py
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import LEDGER_HOUSE_WALLET
+from data_manager import DataManager
+from main import reconcile_pending_orders
+from order_status import FillReconciler
+from pretrade_risk import PreTradeRiskGate
+from risk_engine import StreamingRiskEngine
+from risk_manager import RiskManager
+from state_snapshot import capture_trader_state, load_snapshot, restore_trader_state, save_snapshot
+from tick_recorder import ReplayCandleClient
+from trade_ledger import TradeLedger
+
+PRODUCTS = ["BTC-USD"]
+START = pd.Timestamp("2024-01-01", tz="UTC")
+
+
+class CountingCandles(ReplayCandleClient):
+    def __init__(self, n):
+        super().__init__()
+        rng = np.random.default_rng(0)
+        close = 100 + np.cumsum(rng.normal(0, 1, n))
+        times = (START + pd.to_timedelta(np.arange(n), unit="h")).astype("int64") // 10**9
+        self.apply({"BTC-USD": [[float(t), c - 1, c + 1, c, c, 1.0] for t, c in zip(times, close)]})
+        self.requests = []
+
+    def get(self, path, params=None):
+        self.requests.append(params)
+        return super().get(path, params)
+
+
+class FakeSentiment:
+    def __init__(self):
+        self.realtime_tweets = []
+        self.last_score = 0.5
+
+
+def test_snapshot_write_is_atomic_and_corruption_tolerant(tmp_path):
+    path = str(tmp_path / "state.pkl")
+    assert load_snapshot(path) == (None, None)
+    save_snapshot(path, {"a": 1})
+    save_snapshot(path, {"a": 2})
+    state, saved_at = load_snapshot(path)
+    assert state == {"a": 2} and saved_at > 0
+    assert not os.path.exists(path + ".tmp")
+
+    with open(path, "wb") as f:
+        f.write(b"not a pickle")
+    assert load_snapshot(path) == (None, None)
+
+
+def test_restart_restores_risk_state_and_fetches_only_the_gap(tmp_path):
+    path = str(tmp_path / "state.pkl")
+    candles = CountingCandles(200)
+
+    # Before the restart: one tick's worth of state
+    dm = DataManager(PRODUCTS, resolutions=[], client=candles)
+    end = START + pd.Timedelta(hours=150)
+    dm.build_multiasset_dataset(end - pd.Timedelta("3 days"), end)
+    risk_manager = RiskManager(risk_engine=StreamingRiskEngine(1, warmup=2))
+    risk_manager.peak_net_worth = 12000.0
+    risk_manager.update_bars(np.arange(4), np.array([[100.0], [101.0], [99.0], [100.0]]))
+    gate = PreTradeRiskGate()
+    gate.update_portfolio(12000.0, {"BTC-USD": 0.5})
+    gate.update_portfolio(8000.0)
+    assert gate.killed
+    sentiment = FakeSentiment()
+    sentiment.realtime_tweets = ["btc to the moon"]
+    sentiment.last_score = 0.8
+    orders = [{"product_id": "BTC-USD", "side": "buy", "funds": 10.0, "size": None,
+               "order_id": "abc", "time": pd.Timestamp.utcnow().timestamp()}]
+    save_snapshot(path, capture_trader_state(dm, risk_manager, gate, sentiment, orders))
+
+    # After the restart: fresh objects, restored from disk
+    state, _saved_at = load_snapshot(path)
+    dm2 = DataManager(PRODUCTS, resolutions=[], client=candles)
+    risk_manager2 = RiskManager(risk_engine=StreamingRiskEngine(1, warmup=2))
+    gate2, sentiment2 = PreTradeRiskGate(), FakeSentiment()
+    restore_trader_state(state, dm2, risk_manager2, gate2, sentiment2)
+
+    assert risk_manager2.peak_net_worth == 12000.0
+    assert risk_manager2.risk_engine.ready and risk_manager2.last_bar_time == 2
+    assert gate2.killed and gate2.peak_net_worth == 12000.0
+    assert gate2.positions == {"BTC-USD": 0.5}
+    assert len(gate2.order_times) == 1
+    assert sentiment2.realtime_tweets == ["btc to the moon"] and sentiment2.last_score == 0.8
+
+    candles.requests.clear()
+    later = end + pd.Timedelta(hours=2)
+    df = dm2.build_multiasset_dataset(later - pd.Timedelta("3 days"), later)
+    # One request, starting at the last cached bar rather than 3 days back
+    assert len(candles.requests) == 1
+    assert candles.requests[0]["start"] == int(end.timestamp())
+    assert df["time"].iloc[-1] == later
+
+    fresh = DataManager(PRODUCTS, resolutions=[], client=candles, cache_candles=False)
+    expected = fresh.build_multiasset_dataset(later - pd.Timedelta("3 days"), later)
+    pd.testing.assert_frame_equal(df.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_orders_open_at_shutdown_are_reconciled_on_restore(tmp_path):
+    ledger = TradeLedger(str(tmp_path / "ledger.db"))
+    # Before the restart only part of o1 was read back, and all of o2
+    ledger.record_fill(LEDGER_HOUSE_WALLET, "BTC-USD", "buy", 0.5, 100.0, fee=0.1, order_id="o1")
+    ledger.record_fill(LEDGER_HOUSE_WALLET, "BTC-USD", "buy", 1.0, 100.0, order_id="o2")
+    ledger.flush()
+    statuses = {
+        "o1": {"status": "FILLED", "filled_size": "2", "average_filled_price": "100", "fee": "0.4"},
+        "o2": {"status": "FILLED", "filled_size": "1", "average_filled_price": "100"},
+        "o3": {"status": "FILLED", "filled_size": "3", "average_filled_price": "10"},
+    }
+    gate = PreTradeRiskGate()
+    client = SimpleNamespace(
+        risk_gate=gate,
+        get_order=lambda order_id: dict(statuses[order_id]),
+        get_account_balances=lambda: [{"currency": "USD", "balance": "500"}, {"currency": "BTC", "balance": "3"},
+                                      {"currency": "ETH", "balance": "3"}],
+        get_current_price=lambda pid: {"BTC-USD": 100.0, "ETH-USD": 10.0}[pid],
+    )
+    pending = [{"product_id": "BTC-USD", "side": "buy", "order_id": "o1", "time": 0.0},
+               {"product_id": "BTC-USD", "side": "buy", "order_id": "o2", "time": 0.0},
+               {"product_id": "ETH-USD", "side": "buy", "order_id": "o3", "time": 0.0},
+               {"product_id": "ETH-USD", "side": "buy", "order_id": None, "time": 0.0}]
+
+    assert reconcile_pending_orders(pending, client, ledger, FillReconciler(timeout=1, poll=0.01)) == 2
+    ledger.flush()
+    assert ledger.order_fills("o1") == (pytest.approx(2.0), pytest.approx(0.4))
+    assert ledger.order_fills("o2") == (1.0, 0.0)
+    assert ledger.order_fills("o3") == (3.0, 0.0)
+    # The gate sees the positions those fills left
+    assert gate.positions == {"BTC-USD": 3.0, "ETH-USD": 3.0} and gate.net_worth == 830.0
+    ledger.close()
@@ -0,0 +1,110 @@
+# tests/test_stress_test.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from risk_manager import RiskManager
+from stress_test import (
+    add_gaps, block_bootstrap, log_returns, run_stress, shocked_correlation, simulate
+)
+
+PRODUCTS = ["BTC-USD", "ETH-USD"]
+
+
+def _history(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    cov = np.array([[1.0, 0.3], [0.3, 1.0]]) * 1e-4
+    return rng.multivariate_normal([0.0, 0.0], cov, n)
+
+
+def test_simulate_matches_trading_env():
+    from rl_env import MultiAssetTradingEnv
+    # Fewer bars than the risk engine's warmup, so only the RiskManager rules act
+    n = 20
+    closes = np.column_stack([
+        np.linspace(100, 10, n),                  # crashes hard enough to trip the drawdown limit
+        100 * np.exp(np.linspace(0, 0.2, n)),
+    ])
+    data = {"time": pd.date_range("2024-01-01", periods=n, freq="h", tz="UTC")}
+    for i, pid in enumerate(PRODUCTS):
+        data.update({f"{pid}_close": closes[:, i], f"{pid}_ma_50": closes[:, i],
+                     f"{pid}_ma_200": closes[:, i], f"{pid}_rsi": np.full(n, 50.0)})
+    env = MultiAssetTradingEnv(pd.DataFrame(data), PRODUCTS, initial_balance=10000)
+    env.reset()
+    weights = np.array([0.6, 0.3])
+    for _ in range(n):
+        _obs, _reward, done, info = env.step(weights.copy())
+
+    result = simulate(closes[:, None, :], weights, RiskManager(), initial_balance=10000)
+    np.testing.assert_allclose(result["final_net_worth"], [info["net_worth"]], rtol=1e-4)
+    assert result["halt_bar"][0] > 0
+    assert result["max_drawdown"][0] > 0.3
+
+
+def test_drawdown_limit_halts_into_cash():
+    # Two paths: one falls 50%, one rises; fully invested in one asset, no position cap
+    prices = np.stack([np.linspace(1.0, 0.5, 50), np.linspace(1.0, 2.0, 50)], axis=1)[:, :, None]
+    result = simulate(prices, [1.0], RiskManager(max_position=1.0, max_drawdown=0.2), fee=0.0)
+    assert result["halt_bar"][1] == -1
+    assert result["halt_bar"][0] > 0
+    # Once halted the falling path is all cash, so it stops losing near the limit
+    assert 0.2 < result["max_drawdown"][0] < 0.25
+    np.testing.assert_allclose(result["final_net_worth"][1], 20000, rtol=1e-9)
+
+
+def test_position_cap_and_drift_breaches():
+    prices = np.exp(np.cumsum(np.tile([[0.01, -0.01]], (10, 1)), axis=0))[:, None, :]
+    result = simulate(prices, [0.5, 0.5], RiskManager(max_position=0.2), fee=0.0)
+    # The rising asset drifts above 20% between every rebalance after the first
+    assert result["breach_bars"][0] == 9
+    assert 0.2 < result["max_position"][0] < 0.21
+
+
+def test_block_bootstrap_reuses_whole_historical_blocks():
+    history = _history(500)
+    paths = block_bootstrap(history, n_paths=8, n_bars=100, block=24, rng=np.random.default_rng(1))
+    assert paths.shape == (100, 8, 2)
+    for p in range(8):
+        for start in range(0, 100, 24):
+            chunk = paths[start:start + 24, p]
+            i = np.flatnonzero((history == chunk[0]).all(axis=1))[0]
+            np.testing.assert_array_equal(history[i:i + len(chunk)], chunk)
+
+
+def test_shocked_correlation_and_gaps():
+    history = _history()
+    paths = shocked_correlation(history, 2000, 50, shock=0.9, vol_scale=3.0, rng=np.random.default_rng(2))
+    flat = paths.reshape(-1, 2)
+    corr = np.corrcoef(flat, rowvar=False)[0, 1]
+    assert corr == pytest.approx(0.3 + 0.9 * 0.7, abs=0.02)
+    assert flat.std(axis=0) == pytest.approx(history.std(axis=0) * 3.0, rel=0.05)
+
+    gapped = add_gaps(np.zeros((1000, 500, 2)), size=-0.5, per_year=4.0, rng=np.random.default_rng(3),
+                      bars_per_year=1000)
+    hits = gapped[..., 0] != 0
+    assert hits.sum(axis=0).mean() == pytest.approx(4.0, rel=0.15)
+    # Every asset gaps together
+    np.testing.assert_array_equal(gapped[hits][:, 0], gapped[hits][:, 1])
+    assert gapped[hits].max() <= np.log(0.5) + 1e-12
+
+
+def test_run_stress_is_reproducible_across_workers():
+    history = _history()
+    kwargs = dict(scenario="gap", n_paths=60, n_bars=200, chunk_paths=16, seed=7)
+    inline = run_stress(history, workers=1, **kwargs)
+    pooled = run_stress(history, workers=2, **kwargs)
+    assert inline == pooled
+    assert inline["paths"] == 60
+    assert sum(inline["drawdown_histogram"]["counts"]) == 60
+    assert 0.0 <= inline["drawdown_limit_hit_rate"] <= 1.0
+
+    with pytest.raises(ValueError):
+        run_stress(history, scenario="meteor", n_paths=4, n_bars=10, workers=1)
+
+
+def test_log_returns_skip_missing_rows():
+    closes = np.array([[1.0, 2.0], [1.1, np.nan], [1.21, 2.2], [1.331, 2.42]])
+    returns = log_returns(closes)
+    # The missing close spoils the returns on both sides of it
+    assert returns.shape == (1, 2)
+    np.testing.assert_allclose(returns[:, 0], np.log(1.1))
@@ -0,0 +1,191 @@
+# tests/test_tick_recorder.py
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_manager import DataManager
+from config import LEDGER_HOUSE_WALLET
+from main import trading_tick
+from order_status import FillReconciler
+from pretrade_risk import PreTradeRiskGate
+from risk_engine import StreamingRiskEngine
+from risk_manager import RiskManager
+from trade_ledger import TradeLedger
+from tick_recorder import (
+    ReplayCandleClient, ReplayClock, ReplayExchange, ReplaySentiment, TickRecorder, read_log, replay
+)
+
+PRODUCTS = ["BTC-USD", "ETH-USD"]
+START = pd.Timestamp("2024-01-01", tz="UTC")
+
+
+class LinearModel:
+    """Deterministic stand-in policy: allocation driven by RSI."""
+
+    def __init__(self, scale=1.0):
+        self.scale = scale
+
+    def predict(self, obs, deterministic=True):
+        rsi = obs[:, [3, 7]]
+        return np.clip(rsi / 100.0 * self.scale, 0, 1).astype(np.float32), None
+
+
+def _candles(n, seed):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    times = (START + pd.to_timedelta(np.arange(n), unit="h")).astype("int64") // 10**9
+    return [[float(t), c - 1, c + 1, c, c, 5.0] for t, c in zip(times, close)]
+
+
+def _record(path, n_ticks=6, catalogs=None, prepare=None):
+    """
+    Record `n_ticks` ticks; `catalogs` maps a tick index to product rows
+    loaded before it, `prepare(risk_manager, risk_gate)` runs before the first.
+    """
+    history = {pid: _candles(120, seed) for seed, pid in enumerate(PRODUCTS)}
+    source = ReplayCandleClient()
+    data_manager = DataManager(PRODUCTS, resolutions=[], client=source)
+    clock = ReplayClock()
+    exchange = ReplayExchange(PreTradeRiskGate(clock=clock))
+    exchange.balances = [{"currency": "USD", "balance": "10000"}, {"currency": "BTC", "balance": "2"}]
+    sentiment = ReplaySentiment()
+    sentiment.score = 0.9
+    # Same streaming risk model as the live loop (replay builds its own)
+    risk_manager = RiskManager(risk_engine=StreamingRiskEngine(len(PRODUCTS)))
+    recorder = TickRecorder(str(path), PRODUCTS, 3600, [])
+    recorder.attach(data_manager)
+    if prepare is not None:
+        prepare(risk_manager, exchange.risk_gate)
+
+    for i in range(n_ticks):
+        now = START + pd.Timedelta(hours=80 + i)
+        clock.now = now.timestamp()
+        # Bars up to `now` have arrived
+        source.apply({pid: [row for row in rows if row[0] <= now.timestamp()] for pid, rows in history.items()})
+        if i in (catalogs or {}):
+            exchange.catalog.load(catalogs[i])
+        recorder.begin(now)
+        delay = trading_tick(LinearModel(), PRODUCTS, sentiment, exchange, data_manager, risk_manager,
+                             now=now, recorder=recorder, notify=lambda *args: None)
+        recorder.commit(delay)
+    recorder.close()
+    return exchange
+
+
+def test_log_is_delta_encoded(tmp_path):
+    path = tmp_path / "ticks.log"
+    _record(path)
+    header, *ticks = list(read_log(path))
+    assert header["product_ids"] == PRODUCTS
+    assert len(ticks) == 6
+    # First tick carries the whole window, later ticks only the new bar
+    assert len(ticks[0]["candles"]["BTC-USD"]) > 50
+    assert all(len(t["candles"]["BTC-USD"]) == 1 for t in ticks[1:])
+    assert any(o["ok"] for t in ticks for o in t["orders"])
+
+
+def test_replay_reproduces_recorded_decisions(tmp_path):
+    path = tmp_path / "ticks.log"
+    _record(path)
+    assert replay(str(path))["mismatches"] == []
+    report = replay(str(path), model=LinearModel())
+    assert report["ticks"] == 6 and report["mismatches"] == []
+
+
+def test_replay_sizes_orders_with_the_recorded_catalog(tmp_path):
+    path = tmp_path / "ticks.log"
+    coarse = [{"product_id": pid, "base_increment": "0.1", "quote_increment": "10", "quote_min_size": "10"}
+              for pid in PRODUCTS]
+    # ETH stops taking market orders halfway through
+    halted = [coarse[0], dict(coarse[1], limit_only=True)]
+    _record(path, catalogs={0: coarse, 3: halted})
+    _header, *ticks = list(read_log(path))
+    # Written on the first tick and when the rules change, not every tick
+    assert [i for i, t in enumerate(ticks) if "catalog" in t] == [0, 3]
+    assert ticks[0]["catalog"][0]["quote_increment"] == "10"
+    orders = [o for t in ticks for o in t["orders"] if o["funds"] is not None]
+    assert orders and all(o["funds"] % 10 == 0 for o in orders)
+    assert not any(o["product_id"] == "ETH-USD" for t in ticks[3:] for o in t["orders"])
+    assert replay(str(path))["mismatches"] == []
+
+
+def test_replay_flags_changed_decisions(tmp_path):
+    path = tmp_path / "ticks.log"
+    _record(path)
+    report = replay(str(path), model=LinearModel(scale=0.2))
+    assert report["mismatches"]
+    assert "action" in report["mismatches"][0]["diffs"]
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    path = tmp_path / "ticks.log"
+    _record(path)
+    with open(path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00partial")
+    assert len(list(read_log(path))) == 7
+
+
+def test_replay_starts_each_tick_from_the_recorded_risk_state(tmp_path):
+    path = tmp_path / "ticks.log"
+
+    def after_a_drawdown(risk_manager, risk_gate):
+        # History the replay cannot rebuild from the log's candles
+        risk_manager.peak_net_worth = 20000.0
+        risk_gate.update_portfolio(20000.0)
+        risk_gate.update_portfolio(10000.0)
+
+    _record(path, prepare=after_a_drawdown)
+    _header, *ticks = list(read_log(path))
+    assert ticks[0]["risk_state"]["risk_gate"]["killed"]
+    assert all(o["side"] == "sell" for t in ticks for o in t["orders"] if o["ok"])
+    assert replay(str(path))["mismatches"] == []
+
+
+class SlowFillExchange(ReplayExchange):
+    """ReplayExchange whose orders only report FILLED once `release` is set."""
+
+    def __init__(self, risk_gate):
+        super().__init__(risk_gate)
+        self.release = threading.Event()
+
+    def get_order(self, order_id):
+        order = self.orders[int(order_id.split("-")[1]) - 1]
+        if not self.release.is_set():
+            return {"status": "OPEN", "filled_size": "0"}
+        size = order["size"] or order["funds"] / 100.0
+        return {"status": "FILLED", "filled_size": str(size), "average_filled_price": "100", "fee": "0.1"}
+
+
+def test_live_tick_records_fills_in_the_background_and_marks_equity(tmp_path):
+    source = ReplayCandleClient()
+    source.apply({pid: _candles(80, seed) for seed, pid in enumerate(PRODUCTS)})
+    data_manager = DataManager(PRODUCTS, resolutions=[], client=source)
+    clock = ReplayClock()
+    exchange = SlowFillExchange(PreTradeRiskGate(clock=clock))
+    exchange.balances = [{"currency": "USD", "balance": "10000"}]
+    sentiment = ReplaySentiment()
+    sentiment.score = 0.9
+    ledger = TradeLedger(str(tmp_path / "ledger.db"))
+    reconciler = FillReconciler(timeout=5, poll=0.01)
+    now = START + pd.Timedelta(hours=79)
+    clock.now = now.timestamp()
+
+    started = time.perf_counter()
+    trading_tick(LinearModel(), PRODUCTS, sentiment, exchange, data_manager, RiskManager(), now=now,
+                 notify=lambda *args: None, ledger=ledger, fill_reconciler=reconciler)
+    # The tick returned with its orders still open
+    assert time.perf_counter() - started < 2
+    assert exchange.orders and reconciler.pending == len(exchange.orders)
+
+    exchange.release.set()
+    assert reconciler.join(timeout=5)
+    ledger.flush()
+    fills = ledger.fills(LEDGER_HOUSE_WALLET)
+    assert sorted(f["order_id"] for f in fills) == [f"replay-{i + 1}" for i in range(len(exchange.orders))]
+    assert all(f["price"] == 100.0 and f["fee"] == 0.1 for f in fills)
+    [mark] = ledger.marks(LEDGER_HOUSE_WALLET)
+    assert mark["equity"] == 10000.0 and mark["time"] == now.timestamp()
+    assert set(mark["prices"]) == set(PRODUCTS)
+    ledger.close()
@@ -0,0 +1,157 @@
+# tests/test_trade_ledger.py
+import sqlite3
+import threading
+
+import pandas as pd
+import pytest
+
+from test_trader_runtime import FakeUser, make_runtime
+from trade_ledger import TradeLedger
+from trader import start_trader
+
+DAY = 86400
+T0 = 1_704_067_200  # 2024-01-01 00:00 UTC
+
+
+def test_fills_roll_up_into_realized_pnl_and_daily_totals(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    ledger = TradeLedger(path)
+    ledger.record_order("w", "BTC-USD", "buy", funds=100.0, order_id="o1", timestamp=T0)
+    ledger.record_fill("w", "BTC-USD", "buy", 1.0, 100.0, fee=0.5, order_id="o1", timestamp=T0)
+    ledger.record_fill("w", "BTC-USD", "buy", 1.0, 200.0, fee=0.5, timestamp=T0 + 60)
+    ledger.record_fill("w", "BTC-USD", "sell", 1.0, 250.0, fee=1.0, timestamp=T0 + DAY)
+    ledger.record_fill("w", "ETH-USD", "buy", 2.0, 10.0, timestamp=T0 + DAY)
+    ledger.record_fill("other", "BTC-USD", "buy", 5.0, 100.0, timestamp=T0)
+    assert ledger.flush()
+
+    sell = ledger.fills("w", "BTC-USD")[-1]
+    # Average cost (100 + 0.5 + 200 + 0.5) / 2 = 150.5, minus the sell fee
+    assert sell["realized_pnl"] == pytest.approx(250.0 - 150.5 - 1.0)
+
+    daily = ledger.daily("w")
+    assert [(d["day"], d["product_id"], d["trades"]) for d in daily] == [
+        ("2024-01-01", "BTC-USD", 2), ("2024-01-02", "BTC-USD", 1), ("2024-01-02", "ETH-USD", 1)
+    ]
+    assert daily[0]["fees"] == pytest.approx(1.0)
+    assert ledger.totals("w", since=T0 + DAY)["realized_pnl"] == pytest.approx(98.5)
+    assert ledger.totals("w")["volume"] == pytest.approx(570.0)
+    assert ledger.orders("w")[0]["status"] == "sent"
+    ledger.close()
+
+    # Cost basis survives a restart
+    reopened = TradeLedger(path)
+    assert reopened.positions("w") == [
+        {"product_id": "BTC-USD", "amount": 1.0, "cost": pytest.approx(150.5)},
+        {"product_id": "ETH-USD", "amount": 2.0, "cost": 20.0},
+    ]
+    reopened.record_fill("w", "BTC-USD", "sell", 1.0, 150.5, timestamp=T0 + 2 * DAY)
+    reopened.flush()
+    assert reopened.fills("w", start=T0 + 2 * DAY)[0]["realized_pnl"] == pytest.approx(0.0)
+    reopened.close()
+
+
+def test_range_scans_and_paging(tmp_path):
+    ledger = TradeLedger(str(tmp_path / "ledger.db"))
+    for i in range(100):
+        ledger.record_fill("w", ("BTC-USD", "ETH-USD")[i % 2], "buy", 1.0, 10.0, timestamp=T0 + i)
+    ledger.flush()
+
+    window = ledger.fills("w", "ETH-USD", start=T0 + 10, end=T0 + 20)
+    assert [f["time"] for f in window] == [T0 + 11, T0 + 13, T0 + 15, T0 + 17, T0 + 19]
+
+    first = ledger.fills("w", limit=30)
+    second = ledger.fills("w", limit=30, after_id=first[-1]["id"])
+    assert first[-1]["time"] < second[0]["time"] and len(second) == 30
+    ledger.close()
+
+
+def test_concurrent_writers_are_batched(tmp_path):
+    ledger = TradeLedger(str(tmp_path / "ledger.db"))
+
+    def write(worker):
+        for i in range(5000):
+            ledger.record_fill(f"w{worker}", "BTC-USD", "buy" if i % 2 == 0 else "sell", 0.01, 100.0 + i % 7,
+                               timestamp=T0 + i)
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert ledger.flush(timeout=60)
+
+    assert ledger.written == 20000
+    assert ledger.batches <= 20000 // 100
+    for w in range(4):
+        assert ledger.totals(f"w{w}")["trades"] == 5000
+    ledger.close()
+
+
+def test_runtime_records_orders_and_fills(tmp_path):
+    runtime, broker, _clients = make_runtime()
+    runtime.ledger = TradeLedger(str(tmp_path / "ledger.db"))
+    start_trader(FakeUser("w0", tier=1), {"strategy": "basic"}, broker=broker)
+    runtime.tick(end=pd.Timestamp("2024-01-01", tz="UTC"))
+    # Fills are read back in the background
+    runtime.fill_reconciler.join(timeout=5)
+    runtime.ledger.flush()
+
+    assert [(o["product_id"], o["side"], o["funds"], o["status"]) for o in runtime.ledger.orders("w0")] == [
+        ("BTC-USD", "buy", 250.0, "sent"), ("ETH-USD", "buy", 250.0, "sent")
+    ]
+    assert {p["product_id"]: p["amount"] for p in runtime.ledger.positions("w0")} == {"BTC-USD": 2.5, "ETH-USD": 25.0}
+    runtime.ledger.close()
+
+
+def test_runtime_records_exchange_fills_not_reference_prices(tmp_path):
+    runtime, broker, clients = make_runtime()
+    runtime.ledger = TradeLedger(str(tmp_path / "ledger.db"))
+    start_trader(FakeUser("w0", tier=1), {"strategy": "basic"}, broker=broker)
+    runtime.process_commands()
+    client = clients["w0"]
+    client.fill_prices["BTC-USD"] = 125.0
+    place = client.place_market_order
+
+    def place_or_reject(product_id, side, funds=None, size=None):
+        if product_id == "ETH-USD":
+            # Coinbase rejection: no "error" key
+            return {"success": False, "error_response": {"error": "INSUFFICIENT_FUND", "message": "Insufficient"}}
+        return place(product_id, side, funds, size)
+
+    client.place_market_order = place_or_reject
+    runtime.tick(end=pd.Timestamp("2024-01-01", tz="UTC"))
+    # Fills are read back in the background
+    runtime.fill_reconciler.join(timeout=5)
+    runtime.ledger.flush()
+
+    assert [(o["product_id"], o["status"], o["error"]) for o in runtime.ledger.orders("w0")] == [
+        ("BTC-USD", "sent", None), ("ETH-USD", "rejected", "Insufficient")
+    ]
+    # $250 filled at 125, not 2.5 BTC at the 100 close; nothing for the rejected order
+    assert [(f["product_id"], f["size"], f["price"]) for f in runtime.ledger.fills("w0")] == [
+        ("BTC-USD", 2.0, 125.0)
+    ]
+    runtime.ledger.close()
+
+
+def test_win_counts_are_rolled_up_and_backfilled(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    ledger = TradeLedger(path)
+    ledger.record_fill("w", "BTC-USD", "buy", 2.0, 100.0, timestamp=T0)
+    ledger.record_fill("w", "BTC-USD", "sell", 1.0, 150.0, timestamp=T0 + 60)
+    ledger.record_fill("w", "BTC-USD", "sell", 1.0, 50.0, timestamp=T0 + DAY)
+    ledger.flush()
+    assert {k: ledger.totals("w")[k] for k in ("closing_trades", "wins")} == {"closing_trades": 2, "wins": 1}
+    ledger.close()
+
+    # A ledger written before the columns existed gets them counted from its fills
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("ALTER TABLE daily DROP COLUMN closing_trades")
+        conn.execute("ALTER TABLE daily DROP COLUMN wins")
+    conn.close()
+    reopened = TradeLedger(path)
+    assert [(d["day"], d["closing_trades"], d["wins"]) for d in reopened.daily("w")] == [
+        ("2024-01-01", 1, 1), ("2024-01-02", 1, 0)
+    ]
+    reopened.close()
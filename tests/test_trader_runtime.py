@@ -0,0 +1,167 @@
+# tests/test_trader_runtime.py
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from broker import InMemoryBroker
+from risk_manager import RiskManager
+from trade_ledger import TradeLedger
+from trader import start_trader
+from trader_runtime import MultiTenantRuntime
+
+PRODUCTS = ["BTC-USD", "ETH-USD"]
+
+
+class FakeDataManager:
+    def __init__(self):
+        self.calls = 0
+
+    def build_multiasset_dataset(self, start, end):
+        self.calls += 1
+        row = {"time": end}
+        for pid, px in zip(PRODUCTS, (100.0, 10.0)):
+            row.update({f"{pid}_close": px, f"{pid}_ma_50": px, f"{pid}_ma_200": px, f"{pid}_rsi": 50.0})
+        return pd.DataFrame([row])
+
+    def feature_names(self):
+        return ("close", "ma_50", "ma_200", "rsi")
+
+
+class FakeModel:
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, obs, deterministic=True):
+        self.batches.append(obs.shape)
+        return np.full((obs.shape[0], len(PRODUCTS)), 0.5, dtype=np.float32), None
+
+
+class FakeClient:
+    """
+    Fills every market order in full at `fill_prices` (the FakeDataManager
+    closes by default); each get_order takes `latency` seconds.
+    """
+
+    def __init__(self, usd, fill_prices=None, latency=0.0):
+        self.usd = usd
+        self.orders = []
+        self.fill_prices = fill_prices or {"BTC-USD": 100.0, "ETH-USD": 10.0}
+        self.latency = latency
+
+    def get_account_balances(self):
+        return [{"currency": "USD", "balance": str(self.usd)}]
+
+    def place_market_order(self, product_id, side, funds=None, size=None):
+        self.orders.append((product_id, side, funds, size))
+        return {"success": True, "success_response": {"order_id": str(len(self.orders))}}
+
+    def get_order(self, order_id):
+        time.sleep(self.latency)
+        product_id, _side, funds, size = self.orders[int(order_id) - 1]
+        price = self.fill_prices[product_id]
+        return {"order_id": order_id, "status": "FILLED", "filled_size": funds / price if funds else size,
+                "average_filled_price": price}
+
+
+class FakeUser:
+    def __init__(self, wallet, tier):
+        self.wallet_public_key = wallet
+        self.tier = tier
+
+    def dict(self):
+        return {"wallet_public_key": self.wallet_public_key, "tier": self.tier, "exchanges": []}
+
+
+def make_runtime(latency=0.0, **kwargs):
+    broker = InMemoryBroker()
+    clients = {}
+
+    def client_factory(user):
+        clients[user["wallet_public_key"]] = FakeClient(1000.0, latency=latency)
+        return clients[user["wallet_public_key"]]
+
+    # Position cap above the FakeModel's 50% targets unless a test sets its own
+    kwargs.setdefault("risk_manager", RiskManager(max_position=0.5))
+    runtime = MultiTenantRuntime(FakeModel(), PRODUCTS, FakeDataManager(),
+                                 broker=broker, client_factory=client_factory, **kwargs)
+    return runtime, broker, clients
+
+
+def test_market_data_and_inference_shared_across_users():
+    runtime, broker, clients = make_runtime()
+    for i in range(5):
+        start_trader(FakeUser(f"w{i}", tier=1), {"strategy": "basic"}, broker=broker)
+
+    results = runtime.tick(end=pd.Timestamp("2024-01-01", tz="UTC"))
+
+    assert runtime.data_manager.calls == 1
+    assert runtime.model.batches == [(5, len(PRODUCTS) * 4 + 2)]
+    assert len(results) == 5
+    # 50% of $1000 per product, moved halfway => $250 buys
+    assert clients["w0"].orders == [("BTC-USD", "buy", 250.0, None), ("ETH-USD", "buy", 250.0, None)]
+
+
+def test_tier_strategy_limits():
+    runtime, broker, _ = make_runtime()
+    with pytest.raises(ValueError):
+        start_trader(FakeUser("w", tier=1), {"strategy": "arbitrage"}, broker=broker)
+    with pytest.raises(ValueError):
+        runtime.register(FakeUser("w", tier=1).dict(), {"strategy": "market_making"})
+    assert runtime.tick() == {}
+
+
+def test_wait_for_fill_polls_until_terminal():
+    from order_status import accepted_order_id, wait_for_fill
+
+    class Pending:
+        def __init__(self, statuses):
+            self.statuses = list(statuses)
+
+        def get_order(self, order_id):
+            status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+            return {"order_id": order_id, "status": status, "filled_size": 1.0, "average_filled_price": 10.0}
+
+    assert accepted_order_id({"success": False, "error_response": {"error": "UNKNOWN"}}) is None
+    assert accepted_order_id({"success": True, "success_response": {"order_id": "a"}}) == "a"
+    status = wait_for_fill(Pending(["PENDING", "OPEN", "FILLED"]), "a", timeout=1, poll=0.001)
+    assert status["status"] == "FILLED" and status["terminal"]
+    status = wait_for_fill(Pending(["OPEN"]), "a", timeout=0.01, poll=0.001)
+    assert status["status"] == "OPEN" and not status["terminal"]
+
+
+def test_targets_go_through_the_position_cap_and_drawdown_halt():
+    runtime, broker, clients = make_runtime(risk_manager=RiskManager(max_position=0.2, max_drawdown=0.3))
+    start_trader(FakeUser("w0", tier=1), {"strategy": "basic"}, broker=broker)
+    runtime.tick(end=pd.Timestamp("2024-01-01", tz="UTC"))
+    # 50% targets capped at 20%: $200 per product, moved halfway
+    assert clients["w0"].orders == [("BTC-USD", "buy", 100.0, None), ("ETH-USD", "buy", 100.0, None)]
+    assert runtime.peaks == {"w0": 1000.0}
+
+    # The peak survives between ticks: 40% below it, the tenant is halted
+    clients["w0"].usd = 600.0
+    clients["w0"].orders.clear()
+    runtime.tick(end=pd.Timestamp("2024-01-01 01:00", tz="UTC"))
+    assert clients["w0"].orders == [] and runtime.peaks == {"w0": 1000.0}
+
+
+def test_fills_are_read_in_the_background(tmp_path):
+    ledger = TradeLedger(str(tmp_path / "ledger.db"))
+    runtime, broker, clients = make_runtime(latency=0.5, ledger=ledger)
+    for i in range(4):
+        start_trader(FakeUser(f"w{i}", tier=1), {"strategy": "basic"}, broker=broker)
+
+    started = time.perf_counter()
+    runtime.tick(end=pd.Timestamp("2024-01-01", tz="UTC"))
+    # Eight orders at 0.5s per status read: the tick does not wait for any of them
+    assert time.perf_counter() - started < 0.5
+    assert sum(len(c.orders) for c in clients.values()) == 8
+
+    assert runtime.fill_reconciler.join(timeout=5)
+    # ... and they are polled concurrently, not one after another (4s)
+    assert time.perf_counter() - started < 2.0
+    ledger.flush()
+    fills = ledger.fills("w0")
+    assert [(f["product_id"], f["size"], f["order_id"]) for f in fills] == [("BTC-USD", 2.5, "1"), ("ETH-USD", 25.0, "2")]
+    ledger.close()
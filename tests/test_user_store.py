@@ -0,0 +1,133 @@
+# tests/test_user_store.py
+import sqlite3
+import threading
+
+import pytest
+from cryptography.fernet import Fernet
+
+from user_store import UserStore
+
+KEY = Fernet.generate_key()
+
+
+def _store(tmp_path, **kwargs):
+    return UserStore(db_path=str(tmp_path / "users.db"), encryption_key=KEY, cache_check_interval=0.0, **kwargs)
+
+
+def test_credentials_round_trip_and_are_encrypted_at_rest(tmp_path):
+    store = _store(tmp_path)
+    record = store.update_telegram_user(42, api_key="key-1", api_secret="secret-1", settings={"risk": 0.2})
+    assert record["api_key"] == "key-1" and record["api_secret"] == "secret-1"
+    assert record["settings"] == {"risk": 0.2} and record["exchanges"] == []
+
+    raw = sqlite3.connect(tmp_path / "users.db").execute("SELECT api_key, api_secret FROM users").fetchone()
+    assert b"key-1" not in raw[0] and b"secret-1" not in raw[1]
+    assert Fernet(KEY).decrypt(raw[0]) == b"key-1"
+    # A reopened store with the same key reads them back; another key cannot
+    assert _store(tmp_path).get_by_telegram_id(42)["api_secret"] == "secret-1"
+    with pytest.raises(Exception):
+        UserStore(db_path=str(tmp_path / "users.db"), encryption_key=Fernet.generate_key()).get_by_telegram_id(42)
+
+
+def test_wallet_lookups_and_exchanges(tmp_path):
+    store = _store(tmp_path)
+    assert store.get_by_wallet("W1") is None
+    store.update_telegram_user(1, wallet="W1", tier=2)
+    assert store.get_by_wallet("W1")["telegram_id"] == 1
+
+    store.add_exchange("W1", {"name": "coinbase", "api_key": "k"})
+    store.add_exchange("W1", {"name": "kraken", "api_key": "k2"})
+    assert [e["name"] for e in store.get_by_telegram_id(1)["exchanges"]] == ["coinbase", "kraken"]
+
+    # Moving the wallet drops the old lookup
+    store.update_telegram_user(1, wallet="W2")
+    assert store.get_by_wallet("W1") is None and store.get_by_wallet("W2")["tier"] == 2
+
+
+def test_a_wallet_belongs_to_one_user(tmp_path):
+    store = _store(tmp_path)
+    store.update_telegram_user(1, wallet="W1")
+    with pytest.raises(ValueError, match="already linked"):
+        store.update_telegram_user(2, wallet="W1")
+    assert store.get_by_telegram_id(2) is None and store.get_by_wallet("W1")["telegram_id"] == 1
+
+
+def test_commits_from_another_connection_invalidate_the_cache(tmp_path):
+    reader, writer = _store(tmp_path), _store(tmp_path)
+    writer.update_telegram_user(7, tier=1)
+    assert reader.get_by_telegram_id(7)["tier"] == 1
+    writer.update_telegram_user(7, tier=3)
+    assert reader.get_by_telegram_id(7)["tier"] == 3
+
+    # Within the check interval the cached record is served
+    reader.cache_check_interval = 3600
+    writer.update_telegram_user(7, tier=4)
+    assert reader.get_by_telegram_id(7)["tier"] == 3
+    reader.cache_check_interval = 0.0
+    assert reader.get_by_telegram_id(7)["tier"] == 4
+
+
+def test_a_read_overtaken_by_an_invalidation_is_not_cached(tmp_path):
+    store = _store(tmp_path)
+    store.update_telegram_user(7, tier=1)
+    store.invalidate()
+    decode = store._decode
+
+    def decode_then_write(row):
+        # Another thread commits between this read and its cache fill
+        store._decode = decode
+        store.update_telegram_user(7, tier=5)
+        return decode(row)
+
+    store._decode = decode_then_write
+    assert store.get_by_telegram_id(7)["tier"] == 1
+    assert store.get_by_telegram_id(7)["tier"] == 5
+
+
+def test_conflicts_name_the_constraint_they_hit(tmp_path):
+    store = _store(tmp_path)
+    store.update_telegram_user(1, wallet="W1")
+    store.update_wallet_user("W2", tier=2)
+    with pytest.raises(ValueError, match="Telegram user 1 is already linked"):
+        store.update_wallet_user("W2", telegram_id=1)
+    assert store.get_by_wallet("W2")["telegram_id"] is None
+
+
+def test_duplicate_wallets_are_reported_instead_of_failing_startup(tmp_path, capsys):
+    path = tmp_path / "users.db"
+    _store(tmp_path)
+    # An older database from before wallets were unique
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("DROP INDEX idx_users_wallet_unique")
+        conn.execute("INSERT INTO users (telegram_id, wallet, updated_at) VALUES (1, 'W1', 0), (2, 'W1', 0)")
+    conn.close()
+
+    store = _store(tmp_path)
+    assert store.duplicate_wallets() == {"W1": [1, 2]}
+    assert "W1" in capsys.readouterr().out
+    # Still one user per wallet for new links
+    with pytest.raises(ValueError, match="already linked"):
+        store.update_telegram_user(3, wallet="W1")
+
+    store.update_telegram_user(2, wallet="W2")
+    assert _store(tmp_path).duplicate_wallets() == {}
+    with pytest.raises(sqlite3.IntegrityError):
+        conn = sqlite3.connect(path)
+        conn.execute("INSERT INTO users (telegram_id, wallet, updated_at) VALUES (4, 'W2', 0)")
+
+
+def test_concurrent_exchange_appends_are_not_lost(tmp_path):
+    _store(tmp_path).update_wallet_user("W1", tier=1)
+    stores = [_store(tmp_path) for _ in range(4)]
+
+    def append(i, store):
+        for j in range(10):
+            store.add_exchange("W1", {"name": f"ex-{i}-{j}"})
+
+    threads = [threading.Thread(target=append, args=(i, store)) for i, store in enumerate(stores)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(_store(tmp_path).get_by_wallet("W1")["exchanges"]) == 40
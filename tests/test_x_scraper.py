@@ -0,0 +1,89 @@
+# tests/test_x_scraper.py
+import asyncio
+import queue
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from fake_x_api import FakeXApi
+from x_scraper import XStream
+
+
+async def _run_until(stream, condition, timeout=5.0):
+    task = asyncio.ensure_future(stream.run())
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            break
+        await asyncio.sleep(0.01)
+    stream.stop()
+    await asyncio.wait_for(task, timeout=2)
+
+
+def test_rules_are_synced_by_diff():
+    async def scenario():
+        api = FakeXApi(rules={"1": "bitcoin", "2": "dogecoin"})
+        base_url = await api.start()
+        stream = XStream("token", ["bitcoin", "ethereum"], queue.Queue(), base_url=base_url)
+        try:
+            await _run_until(stream, lambda: api.connections >= 1)
+        finally:
+            await api.close()
+        return api
+
+    api = asyncio.run(scenario())
+    assert api.rule_calls == [{"delete": {"ids": ["2"]}}, {"add": [{"value": "ethereum", "tag": "ethereum"}]}]
+    assert sorted(api.rules.values()) == ["bitcoin", "ethereum"]
+
+
+def test_reconnects_with_backoff_on_one_connection():
+    delays = []
+
+    class RecordingStream(XStream):
+        def backoff(self, attempt, rate_limited=False):
+            delay = super().backoff(attempt, rate_limited)
+            delays.append((attempt, rate_limited, delay))
+            return delay
+
+    async def scenario():
+        api = FakeXApi(scripts=[503, 503, 429, ["first", "second"], ["third"], "hold"])
+        base_url = await api.start()
+        tweets = queue.Queue()
+        stream = RecordingStream("token", ["bitcoin"], tweets, base_url=base_url,
+                                 backoff_initial=0.01, rate_limit_backoff=0.02, jitter=lambda: 1.0)
+        try:
+            await _run_until(stream, lambda: tweets.qsize() >= 3 and stream.connected)
+        finally:
+            await api.close()
+        return api, [tweets.get_nowait() for _ in range(tweets.qsize())]
+
+    api, received = asyncio.run(scenario())
+    assert received == ["first", "second", "third"]
+    assert api.max_open_connections == 1
+    # Exponential growth across consecutive failures, 429 uses its own base,
+    # and a successful connection restarts the sequence
+    assert delays[:3] == [(0, False, 0.01), (1, False, 0.02), (2, True, 0.08)]
+    assert delays[3][0] == 0
+
+
+def test_full_queue_drops_oldest_without_blocking():
+    async def scenario():
+        api = FakeXApi(scripts=[[f"t{i}" for i in range(20)], "hold"])
+        base_url = await api.start()
+        tweets = queue.Queue(maxsize=5)
+        stream = XStream("token", ["bitcoin"], tweets, base_url=base_url, backoff_initial=0.01)
+        try:
+            await _run_until(stream, lambda: api.connections >= 2)
+        finally:
+            await api.close()
+        return [tweets.get_nowait() for _ in range(tweets.qsize())]
+
+    assert asyncio.run(scenario()) == ["t15", "t16", "t17", "t18", "t19"]
+
+
+def test_backoff_is_capped_and_jittered():
+    stream = XStream("token", [], queue.Queue(), backoff_initial=1.0, backoff_max=320.0, jitter=lambda: 0.0)
+    assert stream.backoff(20) == 160.0
+    stream.jitter = lambda: 1.0
+    assert stream.backoff(20) == 320.0
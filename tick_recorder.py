@@ -0,0 +1,356 @@
+import bisect
+import json
+import struct
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from product_catalog import ProductCatalog
+from state_snapshot import capture_risk_state, restore_risk_state
+
+# Each record is a little-endian uint32 length followed by zlib-compressed
+# JSON. Records are only ever appended, so a crash can at worst leave one
+# truncated record at the end, which read_log ignores.
+HEADER = struct.Struct("<I")
+CANDLE_FIELDS = ["time", "low", "high", "open", "close", "volume"]
+
+
+def _jsonable(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (np.floating, np.integer)):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def read_log(path):
+    """Yield the records of a tick log in order."""
+    with open(path, "rb") as f:
+        while True:
+            head = f.read(HEADER.size)
+            if len(head) < HEADER.size:
+                return
+            (size,) = HEADER.unpack(head)
+            payload = f.read(size)
+            if len(payload) < size:
+                return
+            yield json.loads(zlib.decompress(payload))
+
+
+class TickRecorder:
+    """
+    Captures what one live-loop tick saw and decided: clock, sentiment score,
+    balances, new or changed candles, model observation and action, the
+    orders with their pre-trade verdicts, and the returned delay.
+
+    Candles are delta-encoded per product (only rows that are new or changed
+    since the previous tick are written), so a 5-minute loop over a 3-day
+    window costs a few rows per tick rather than the whole window. The
+    product catalog rows the tick sized orders with are written the same
+    way: on the first tick and whenever they change.
+    With path=None nothing is written; the last record stays in `last`.
+    """
+
+    def __init__(self, path=None, product_ids=(), granularity=3600, resolutions=()):
+        self.path = path
+        self.current = None
+        self.last = None
+        self._logged_candles = {}
+        self._logged_catalog = None
+        if path:
+            self._file = open(path, "ab")
+            self._write({
+                "type": "header",
+                "product_ids": list(product_ids),
+                "granularity": granularity,
+                "resolutions": list(resolutions),
+                "started": time.time(),
+            })
+
+    # ------------------------------------------------------------------
+    # Hooks used by main.trading_tick
+    def attach(self, data_manager):
+        """Record the candles `data_manager` fetches (wraps its fetch method)."""
+        fetch = data_manager.fetch_historical_data
+
+        def recording_fetch(product_id, start, end):
+            df = fetch(product_id, start, end)
+            if self.current is not None and not df.empty:
+                self._record_candles(product_id, df)
+            return df
+
+        data_manager.fetch_historical_data = recording_fetch
+        return data_manager
+
+    def begin(self, now):
+        self.current = {"type": "tick", "t": pd.Timestamp(now).timestamp(), "candles": {}}
+
+    def record(self, key, value):
+        if self.current is not None:
+            self.current[key] = _jsonable(value)
+
+    def record_risk_state(self, risk_manager, risk_gate):
+        """RiskManager and pre-trade gate state at the start of the tick (for replay)."""
+        if self.current is not None:
+            self.current["risk_state"] = _jsonable(capture_risk_state(risk_manager, risk_gate))
+
+    def record_catalog(self, catalog, product_ids):
+        """The catalog's rules for `product_ids` (product_catalog.Product dicts), if changed."""
+        if self.current is None:
+            return
+        rows = [dict(catalog.get(pid).to_dict(), product_id=pid) for pid in product_ids]
+        if rows != self._logged_catalog:
+            self._logged_catalog = rows
+            self.current["catalog"] = rows
+
+    def commit(self, delay, error=None):
+        record, self.current = self.current, None
+        if record is None:
+            return None
+        record["delay"] = delay
+        if error is not None:
+            record["error"] = error
+        self.last = record
+        if self.path:
+            self._write(record)
+        return record
+
+    def close(self):
+        if self.path:
+            self._file.close()
+
+    # ------------------------------------------------------------------
+    def _record_candles(self, product_id, df):
+        rows = np.column_stack([
+            df["time"].astype("int64").to_numpy() // 10**9,
+            *(df[c].to_numpy(dtype=np.float64) for c in CANDLE_FIELDS[1:]),
+        ]).tolist()
+        logged = self._logged_candles.setdefault(product_id, {})
+        changed = [row for row in rows if logged.get(row[0]) != row]
+        for row in changed:
+            logged[row[0]] = row
+        # Forget rows that fell out of the fetch window
+        oldest = rows[0][0]
+        for t in [t for t in logged if t < oldest]:
+            del logged[t]
+        if changed:
+            self.current["candles"].setdefault(product_id, []).extend(changed)
+
+    def _write(self, record):
+        payload = zlib.compress(json.dumps(record, separators=(",", ":")).encode())
+        self._file.write(HEADER.pack(len(payload)) + payload)
+        self._file.flush()
+
+
+class NullRecorder:
+    """Recorder that records nothing (the default for trading_tick)."""
+
+    def attach(self, data_manager):
+        return data_manager
+
+    def begin(self, now):
+        pass
+
+    def record(self, key, value):
+        pass
+
+    def record_risk_state(self, risk_manager, risk_gate):
+        pass
+
+    def record_catalog(self, catalog, product_ids):
+        pass
+
+    def commit(self, delay, error=None):
+        return None
+
+    def close(self):
+        pass
+
+
+NO_RECORDER = NullRecorder()
+
+
+# ----------------------------------------------------------------------
+# Replay stubs: stand-ins for the exchange, clock, sentiment and model that
+# serve the recorded inputs to the unchanged decision code.
+class ReplayCandleClient:
+    """Serves recorded candles to DataManager.fetch_historical_data."""
+
+    def __init__(self):
+        self.candles = {}
+        self.times = {}
+
+    def apply(self, deltas):
+        for product_id, rows in deltas.items():
+            store = self.candles.setdefault(product_id, {})
+            times = self.times.setdefault(product_id, [])
+            for row in rows:
+                if row[0] not in store:
+                    bisect.insort(times, row[0])
+                store[row[0]] = row
+
+    def get(self, path, params=None):
+        product_id = path.split("/products/")[1].split("/")[0]
+        store = self.candles.get(product_id, {})
+        times = self.times.get(product_id, [])
+        lo = bisect.bisect_left(times, params["start"])
+        hi = bisect.bisect_right(times, params["end"])
+        return {"candles": [store[t] for t in times[lo:hi]]}
+
+
+class ReplayClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ReplayExchange:
+    """
+    CoinbaseClient stand-in: recorded balances and product catalog, orders
+    are collected.
+    """
+
+    def __init__(self, risk_gate, catalog=None):
+        self.risk_gate = risk_gate
+        # Not loaded (default limits) until a tick's catalog rows are applied
+        self.catalog = catalog if catalog is not None else ProductCatalog()
+        self.order_books = ReplayDepth()
+        self.balances = []
+        self.orders = []
+
+    def get_account_balances(self):
+        return self.balances
+
+    def place_market_order(self, product_id, side, funds=None, size=None, prechecked=False, reservation=None):
+        self.orders.append({"product_id": product_id, "side": side, "funds": funds, "size": size})
+        return {"success": True, "success_response": {"order_id": f"replay-{len(self.orders)}"}}
+
+
+class ReplayDepth:
+    """OrderBooks stand-in serving the depth limits recorded for the tick."""
+
+    def __init__(self):
+        self.depth = {}
+
+    def max_fill(self, product_id, side, max_slippage=None):
+        limit = self.depth.get(f"{product_id}:{side}")
+        return tuple(limit) if limit is not None else None
+
+
+class ReplaySentiment:
+    def __init__(self):
+        self.score = 0.5
+
+    def get_market_sentiment(self):
+        return self.score
+
+
+class ReplayModel:
+    """Returns the recorded action (used when no model is given to replay)."""
+
+    def __init__(self):
+        self.action = None
+
+    def predict(self, obs, deterministic=True):
+        return np.asarray(self.action, dtype=np.float32), None
+
+
+def _differs(recorded, replayed, tolerance=1e-5):
+    if isinstance(recorded, list) and isinstance(replayed, list):
+        return len(recorded) != len(replayed) or any(
+            _differs(a, b, tolerance) for a, b in zip(recorded, replayed)
+        )
+    if isinstance(recorded, dict) and isinstance(replayed, dict):
+        return recorded.keys() != replayed.keys() or any(
+            _differs(recorded[k], replayed[k], tolerance) for k in recorded
+        )
+    if isinstance(recorded, float) or isinstance(replayed, float):
+        if recorded is None or replayed is None:
+            return recorded is not replayed
+        return abs(recorded - replayed) > tolerance * max(1.0, abs(recorded))
+    return recorded != replayed
+
+
+def replay(path, model=None, compare=("obs", "action", "orders", "delay")):
+    """
+    Re-run main.trading_tick over a tick log as fast as possible, with the
+    exchange, clock, sentiment and (unless `model` is given) the model
+    stubbed from the log. Returns a report with the number of ticks, wall
+    time per tick and every tick whose replayed outputs differ from the
+    recorded ones, so a performance change can be checked against real days
+    of traffic and the run doubles as a production-shaped profiling workload.
+    """
+    from main import trading_tick
+    from data_manager import DataManager
+    from pretrade_risk import PreTradeRiskGate
+    from risk_engine import StreamingRiskEngine
+    from risk_manager import RiskManager
+
+    records = read_log(path)
+    header = next(records, None)
+    if header is None or header.get("type") != "header":
+        raise ValueError(f"{path} is not a tick log")
+    product_ids = header["product_ids"]
+
+    candles = ReplayCandleClient()
+    data_manager = DataManager(product_ids, granularity=header["granularity"],
+                               resolutions=header["resolutions"], client=candles)
+    clock = ReplayClock()
+    exchange = ReplayExchange(PreTradeRiskGate(clock=clock))
+    sentiment = ReplaySentiment()
+    recorded_model = ReplayModel()
+    risk_manager = RiskManager(risk_engine=StreamingRiskEngine(len(product_ids)))
+    recorder = TickRecorder()
+
+    n_ticks = 0
+    mismatches = []
+    started = time.perf_counter()
+    for record in records:
+        clock.now = record["t"]
+        candles.apply(record["candles"])
+        exchange.balances = record.get("balances", [])
+        exchange.order_books.depth = record.get("depth", {})
+        if "catalog" in record:
+            exchange.catalog.load(record["catalog"])
+        if "risk_state" in record:
+            # Start from the live tick's drawdown peaks, kill switch, rate
+            # limit window and risk model, not from replay's own history
+            restore_risk_state(record["risk_state"], risk_manager, exchange.risk_gate)
+        sentiment.score = record.get("sentiment", 0.5)
+        recorded_model.action = record.get("action")
+
+        recorder.begin(pd.Timestamp(record["t"], unit="s", tz="UTC"))
+        try:
+            delay = trading_tick(
+                model or recorded_model, product_ids, sentiment, exchange, data_manager,
+                risk_manager, now=pd.Timestamp(record["t"], unit="s", tz="UTC"),
+                recorder=recorder, notify=lambda *args: None
+            )
+            replayed = recorder.commit(delay)
+        except Exception as e:
+            replayed = recorder.commit(60, error=str(e))
+
+        diffs = {
+            key: {"recorded": record.get(key), "replayed": replayed.get(key)}
+            for key in compare
+            if _differs(record.get(key), replayed.get(key))
+        }
+        if diffs:
+            mismatches.append({"t": record["t"], "diffs": diffs})
+        n_ticks += 1
+
+    elapsed = time.perf_counter() - started
+    return {
+        "ticks": n_ticks,
+        "seconds": elapsed,
+        "seconds_per_tick": elapsed / n_ticks if n_ticks else 0.0,
+        "mismatches": mismatches,
+    }
@@ -0,0 +1,490 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from config import LEDGER_DB_PATH, LEDGER_BATCH_SIZE, LEDGER_FLUSH_SECONDS
+from order_status import accepted_order_id, order_error
+
+_STOP = object()
+
+
+def day_of(timestamp):
+    """UTC calendar day (YYYY-MM-DD) of an epoch timestamp."""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class TradeLedger:
+    """
+    Append-only record of orders and fills in SQLite (WAL mode).
+
+    record_order() and record_fill() only put a tuple on an in-memory queue,
+    so the trading thread never waits on disk. One writer thread drains the
+    queue and writes up to LEDGER_BATCH_SIZE records per transaction. In
+    the same transaction it keeps two derived tables current:
+
+      - positions: amount and average cost per (wallet, product), used to
+        compute each sell's realized PnL as it is written
+      - daily: trades, volume, fees, realized PnL and closing (sell) trades
+        and wins per (wallet, product, UTC day)
+
+    Rollups such as monthly PnL therefore read a few `daily` rows rather
+    than scanning fills. Orders and fills are indexed by wallet, product
+    and time for range scans. record_mark() adds equity marks, from which
+    (with the fills) performance.PerformanceStore rebuilds its aggregates.
+    Order, fill and mark rows are never updated or deleted. record_balance()
+    keeps the current balances of house-mode sub-accounts
+    (rebalance_planner.InternalAccount) in the same write stream.
+    """
+
+    def __init__(self, db_path=LEDGER_DB_PATH, batch_size=LEDGER_BATCH_SIZE,
+                 flush_seconds=LEDGER_FLUSH_SECONDS):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.written = 0
+        self.batches = 0
+
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._positions = {}   # writer thread only: (wallet, product_id) -> [amount, cost]
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_schema()
+        self._writer = threading.Thread(target=self._run, name="trade-ledger", daemon=True)
+        self._writer.start()
+
+    # ------------------------------------------------------------------
+    # Connection / schema
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS orders (
+                    id INTEGER PRIMARY KEY,
+                    time REAL NOT NULL,
+                    wallet TEXT NOT NULL,
+                    product_id TEXT NOT NULL,
+                    side TEXT NOT NULL,
+                    funds REAL,
+                    size REAL,
+                    order_id TEXT,
+                    status TEXT NOT NULL,
+                    error TEXT
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fills (
+                    id INTEGER PRIMARY KEY,
+                    time REAL NOT NULL,
+                    wallet TEXT NOT NULL,
+                    product_id TEXT NOT NULL,
+                    side TEXT NOT NULL,
+                    size REAL NOT NULL,
+                    price REAL NOT NULL,
+                    fee REAL NOT NULL DEFAULT 0,
+                    realized_pnl REAL NOT NULL DEFAULT 0,
+                    order_id TEXT
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS marks (
+                    id INTEGER PRIMARY KEY,
+                    time REAL NOT NULL,
+                    wallet TEXT NOT NULL,
+                    equity REAL NOT NULL,
+                    cash REAL,
+                    prices TEXT
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_marks_wallet_time ON marks(wallet, time)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS positions (
+                    wallet TEXT NOT NULL,
+                    product_id TEXT NOT NULL,
+                    amount REAL NOT NULL,
+                    cost REAL NOT NULL,
+                    PRIMARY KEY (wallet, product_id)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS daily (
+                    wallet TEXT NOT NULL,
+                    product_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    trades INTEGER NOT NULL,
+                    volume REAL NOT NULL,
+                    fees REAL NOT NULL,
+                    realized_pnl REAL NOT NULL,
+                    closing_trades INTEGER NOT NULL DEFAULT 0,
+                    wins INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (wallet, day, product_id)
+                ) WITHOUT ROWID
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(daily)")}
+            if "wins" not in columns:
+                # Ledgers from before win counts were rolled up: count them once from the fills
+                conn.execute("ALTER TABLE daily ADD COLUMN closing_trades INTEGER NOT NULL DEFAULT 0")
+                conn.execute("ALTER TABLE daily ADD COLUMN wins INTEGER NOT NULL DEFAULT 0")
+                conn.execute(
+                    """
+                    UPDATE daily SET
+                        closing_trades = (SELECT COUNT(*) FROM fills f WHERE f.wallet = daily.wallet
+                            AND f.product_id = daily.product_id AND f.side = 'sell'
+                            AND date(f.time, 'unixepoch') = daily.day),
+                        wins = (SELECT COUNT(*) FROM fills f WHERE f.wallet = daily.wallet
+                            AND f.product_id = daily.product_id AND f.side = 'sell' AND f.realized_pnl > 0
+                            AND date(f.time, 'unixepoch') = daily.day)
+                    """
+                )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS balances (
+                    wallet TEXT NOT NULL,
+                    currency TEXT NOT NULL,
+                    amount REAL NOT NULL,
+                    PRIMARY KEY (wallet, currency)
+                ) WITHOUT ROWID
+                """
+            )
+            for table in ("orders", "fills"):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_wallet_time ON {table}(wallet, time)")
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table}_wallet_product_time ON {table}(wallet, product_id, time)"
+                )
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_product_time ON {table}(product_id, time)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fills_order_id ON fills(order_id)")
+
+    # ------------------------------------------------------------------
+    # Writes (any thread, never block)
+    def record_order(self, wallet, product_id, side, funds=None, size=None, order_id=None,
+                     status="sent", error=None, timestamp=None):
+        self._queue.put(("order", (timestamp or time.time(), wallet, product_id, side,
+                                   funds, size, order_id, status, error)))
+
+    def record_fill(self, wallet, product_id, side, size, price, fee=0.0, order_id=None, timestamp=None):
+        self._queue.put(("fill", (timestamp or time.time(), wallet, product_id, side,
+                                  float(size), float(price), float(fee), order_id)))
+
+    def record_mark(self, wallet, equity, cash=None, prices=None, timestamp=None):
+        """Account value (and the prices it was marked at) for the equity curve."""
+        self._queue.put(("mark", (timestamp or time.time(), wallet, float(equity),
+                                  None if cash is None else float(cash), json.dumps(prices or {}))))
+
+    def record_balance(self, wallet, currency, amount):
+        """Current balance of an internal sub-account (replaces the previous one)."""
+        self._queue.put(("balance", (wallet, currency, float(amount))))
+
+    def record_result(self, wallet, order, result, timestamp=None):
+        """
+        Record an order dict ({product_id, side, funds, size}) and the exchange
+        response; returns the order id, or None if the order was not accepted.
+        """
+        order_id = accepted_order_id(result)
+        error = order_error(result)
+        if order_id is not None:
+            status = "sent"
+        elif isinstance(result, dict) and "error" in result and not result.get("rejected"):
+            status = "error"       # failed locally (network, bad arguments)
+        else:
+            status = "rejected"    # pre-trade gate, product checks or the exchange's error_response
+        self.record_order(wallet, order["product_id"], order["side"], order.get("funds"), order.get("size"),
+                          order_id, status, error, timestamp)
+        return order_id
+
+    def flush(self, timeout=10):
+        """Block until everything queued so far is committed."""
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        self._queue.put((_STOP, None))
+        self._writer.join(timeout=10)
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size and batch[-1][0] not in ("flush", _STOP):
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(conn, batch)
+            except Exception as e:
+                # Cached positions may include the failed batch: reload from disk
+                self._positions.clear()
+                print(f"Trade ledger write failed ({len(batch)} records): {e}")
+            for kind, item in batch:
+                if kind == "flush":
+                    item.set()
+                elif kind is _STOP:
+                    conn.close()
+                    return
+
+    def _position(self, conn, key):
+        if key not in self._positions:
+            row = conn.execute("SELECT amount, cost FROM positions WHERE wallet = ? AND product_id = ?",
+                               key).fetchone()
+            self._positions[key] = [row["amount"], row["cost"]] if row is not None else [0.0, 0.0]
+        return self._positions[key]
+
+    def _write(self, conn, batch):
+        orders, fills, marks = [], [], []
+        balances = {}
+        daily = {}
+        touched = set()
+        for kind, item in batch:
+            if kind == "order":
+                orders.append(item)
+            elif kind == "mark":
+                marks.append(item)
+            elif kind == "balance":
+                balances[item[:2]] = item[2]
+            elif kind == "fill":
+                ts, wallet, pid, side, size, price, fee, order_id = item
+                key = (wallet, pid)
+                position = self._position(conn, key)
+                pnl = 0.0
+                if side == "buy":
+                    position[0] += size
+                    position[1] += size * price + fee
+                else:
+                    held = min(size, position[0])
+                    avg_cost = position[1] / position[0] if position[0] > 0 else price
+                    # Units sold beyond the recorded position have no known cost
+                    pnl = held * (price - avg_cost) - fee
+                    position[0] -= held
+                    position[1] -= held * avg_cost
+                touched.add(key)
+                fills.append((ts, wallet, pid, side, size, price, fee, pnl, order_id))
+                row = daily.setdefault((wallet, day_of(ts), pid), [0, 0.0, 0.0, 0.0, 0, 0])
+                row[0] += 1
+                row[1] += size * price
+                row[2] += fee
+                row[3] += pnl
+                if side != "buy":
+                    row[4] += 1
+                    row[5] += pnl > 0
+        if not orders and not fills and not marks and not balances:
+            return
+        with conn:
+            conn.executemany(
+                "INSERT INTO orders (time, wallet, product_id, side, funds, size, order_id, status, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", orders
+            )
+            conn.executemany(
+                "INSERT INTO fills (time, wallet, product_id, side, size, price, fee, realized_pnl, order_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", fills
+            )
+            conn.executemany(
+                "INSERT INTO marks (time, wallet, equity, cash, prices) VALUES (?, ?, ?, ?, ?)", marks
+            )
+            conn.executemany(
+                "INSERT INTO positions (wallet, product_id, amount, cost) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(wallet, product_id) DO UPDATE SET amount = excluded.amount, cost = excluded.cost",
+                [key + tuple(self._positions[key]) for key in touched]
+            )
+            conn.executemany(
+                "INSERT INTO daily (wallet, day, product_id, trades, volume, fees, realized_pnl, closing_trades, wins) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(wallet, day, product_id) DO UPDATE SET "
+                "trades = trades + excluded.trades, volume = volume + excluded.volume, "
+                "fees = fees + excluded.fees, realized_pnl = realized_pnl + excluded.realized_pnl, "
+                "closing_trades = closing_trades + excluded.closing_trades, wins = wins + excluded.wins",
+                [key + tuple(row) for key, row in daily.items()]
+            )
+            conn.executemany(
+                "INSERT INTO balances (wallet, currency, amount) VALUES (?, ?, ?) "
+                "ON CONFLICT(wallet, currency) DO UPDATE SET amount = excluded.amount",
+                [key + (amount,) for key, amount in balances.items()]
+            )
+        self.written += len(orders) + len(fills) + len(marks) + len(balances)
+        self.batches += 1
+
+    # ------------------------------------------------------------------
+    # Reads
+    def _range(self, table, wallet, product_id=None, start=None, end=None, limit=500, after_id=None):
+        clauses, params = ["wallet = ?"], [wallet]
+        if product_id is not None:
+            clauses.append("product_id = ?")
+            params.append(product_id)
+        if start is not None:
+            clauses.append("time >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("time < ?")
+            params.append(end)
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        rows = self._conn().execute(
+            f"SELECT * FROM {table} WHERE {' AND '.join(clauses)} ORDER BY time, id LIMIT ?", params + [limit]
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def orders(self, wallet, product_id=None, start=None, end=None, limit=500, after_id=None):
+        """A wallet's orders in time order, optionally for one product and [start, end) epoch seconds."""
+        return self._range("orders", wallet, product_id, start, end, limit, after_id)
+
+    def fills(self, wallet, product_id=None, start=None, end=None, limit=500, after_id=None):
+        """A wallet's fills in time order, with the realized PnL of each sell."""
+        return self._range("fills", wallet, product_id, start, end, limit, after_id)
+
+    def marks(self, wallet, start=None, end=None, limit=500, after_id=None):
+        """A wallet's equity marks in time order, prices decoded."""
+        rows = self._range("marks", wallet, None, start, end, limit, after_id)
+        for row in rows:
+            row["prices"] = json.loads(row["prices"] or "{}")
+        return rows
+
+    def order_fills(self, order_id):
+        """(size, fee) recorded so far for one exchange order id."""
+        row = self._conn().execute(
+            "SELECT COALESCE(SUM(size), 0), COALESCE(SUM(fee), 0) FROM fills WHERE order_id = ?", (order_id,)
+        ).fetchone()
+        return row[0], row[1]
+
+    def changes(self, wallet, after_fill_id=0, after_mark_id=0, limit=10000):
+        """
+        Fills and marks written after the given row ids, in write order:
+        (fills, marks). Lets a reader follow the ledger incrementally.
+        """
+        conn = self._conn()
+        fills = conn.execute("SELECT * FROM fills WHERE wallet = ? AND id > ? ORDER BY id LIMIT ?",
+                             (wallet, after_fill_id, limit)).fetchall()
+        marks = conn.execute("SELECT * FROM marks WHERE wallet = ? AND id > ? ORDER BY id LIMIT ?",
+                             (wallet, after_mark_id, limit)).fetchall()
+        marks = [dict(row) for row in marks]
+        for row in marks:
+            row["prices"] = json.loads(row["prices"] or "{}")
+        return [dict(row) for row in fills], marks
+
+    def daily(self, wallet, start_day=None, end_day=None, product_id=None):
+        """Per-day, per-product trades, volume, fees and realized PnL (days as YYYY-MM-DD, inclusive)."""
+        clauses, params = ["wallet = ?"], [wallet]
+        if start_day is not None:
+            clauses.append("day >= ?")
+            params.append(start_day)
+        if end_day is not None:
+            clauses.append("day <= ?")
+            params.append(end_day)
+        if product_id is not None:
+            clauses.append("product_id = ?")
+            params.append(product_id)
+        rows = self._conn().execute(
+            f"SELECT * FROM daily WHERE {' AND '.join(clauses)} ORDER BY day, product_id", params
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def totals(self, wallet, since=None, conn=None):
+        """
+        Trades, volume, fees, realized PnL, closing trades and wins since
+        `since` (epoch seconds, whole UTC days).
+        """
+        clauses, params = ["wallet = ?"], [wallet]
+        if since is not None:
+            clauses.append("day >= ?")
+            params.append(day_of(since))
+        row = (conn or self._conn()).execute(
+            "SELECT COALESCE(SUM(trades), 0) AS trades, COALESCE(SUM(volume), 0) AS volume, "
+            "COALESCE(SUM(fees), 0) AS fees, COALESCE(SUM(realized_pnl), 0) AS realized_pnl, "
+            "COALESCE(SUM(closing_trades), 0) AS closing_trades, COALESCE(SUM(wins), 0) AS wins "
+            f"FROM daily WHERE {' AND '.join(clauses)}", params
+        ).fetchone()
+        return dict(row)
+
+    def positions(self, wallet, conn=None):
+        rows = (conn or self._conn()).execute(
+            "SELECT product_id, amount, cost FROM positions WHERE wallet = ? AND amount > 0 ORDER BY product_id",
+            (wallet,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def rollup(self, wallet, marks=1000):
+        """
+        A wallet's state as of one consistent read: {"totals", "positions",
+        "last_fills" (the latest fill per product), "marks" (the last
+        `marks` equity marks, in time order), "fill_id", "mark_id"}, the ids
+        being the last fill and mark the rollups include.
+        Lets a reader start following changes() from there without
+        replaying the history.
+        """
+        conn = self._conn()
+        # One read transaction: the writer cannot commit between the queries
+        conn.execute("BEGIN")
+        try:
+            fill_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM fills WHERE wallet = ?", (wallet,)).fetchone()[0]
+            mark_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM marks WHERE wallet = ?", (wallet,)).fetchone()[0]
+            tail = conn.execute("SELECT * FROM marks WHERE wallet = ? ORDER BY time DESC, id DESC LIMIT ?",
+                                (wallet, marks)).fetchall()
+            last_fills = conn.execute(
+                "SELECT * FROM fills WHERE id IN (SELECT MAX(id) FROM fills WHERE wallet = ? GROUP BY product_id) "
+                "ORDER BY id", (wallet,)
+            ).fetchall()
+            rollup = {"totals": self.totals(wallet, conn=conn), "positions": self.positions(wallet, conn=conn),
+                      "last_fills": [dict(row) for row in last_fills], "fill_id": fill_id, "mark_id": mark_id}
+        finally:
+            conn.rollback()
+        rollup["marks"] = [dict(row) for row in reversed(tail)]
+        for row in rollup["marks"]:
+            row["prices"] = json.loads(row["prices"] or "{}")
+        return rollup
+
+    def balances(self, wallet):
+        """{currency: amount} of an internal sub-account ({} if it has none)."""
+        rows = self._conn().execute("SELECT currency, amount FROM balances WHERE wallet = ?", (wallet,)).fetchall()
+        return {row["currency"]: row["amount"] for row in rows}
+
+    def balance_totals(self):
+        """{currency: amount} summed over every internal sub-account."""
+        rows = self._conn().execute("SELECT currency, SUM(amount) AS amount FROM balances GROUP BY currency").fetchall()
+        return {row["currency"]: row["amount"] for row in rows}
+
+
+_default_ledger = None
+_default_ledger_lock = threading.Lock()
+
+
+def get_trade_ledger():
+    """Return the process-wide TradeLedger, creating it on first use."""
+    global _default_ledger
+    if _default_ledger is None:
+        with _default_ledger_lock:
+            if _default_ledger is None:
+                _default_ledger = TradeLedger()
+    return _default_ledger
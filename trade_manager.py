@@ -1,6 +1,10 @@
 import math
 from coinbase.rest import RESTClient
-from config import COINBASE_API_KEY, COINBASE_API_SECRET
+from config import COINBASE_API_KEY, COINBASE_API_SECRET, PRETRADE_PRICE_MAX_AGE_SECONDS
+from order_status import accepted_order_id
+from pretrade_risk import get_risk_gate
+from product_catalog import get_product_catalog
+import metrics
 
 class CoinbaseClient:
     """
@@ -8,17 +12,61 @@ class CoinbaseClient:
     but uses coinbase-advanced-py (RESTClient) underneath.
     """
 
-    def __init__(self):
-        self.client = RESTClient(
-            api_key=COINBASE_API_KEY,
-            api_secret=COINBASE_API_SECRET
-        )
+    def __init__(self, api_key=None, api_secret=None, risk_gate=None, order_books=None, catalog=None):
+        # Per-user credentials for multi-tenant trading; defaults to the house account
+        self.client = metrics.instrument(RESTClient(
+            api_key=api_key or COINBASE_API_KEY,
+            api_secret=api_secret or COINBASE_API_SECRET
+        ), "coinbase")
+        # Every order placed through this client is checked here first
+        self.risk_gate = risk_gate if risk_gate is not None else get_risk_gate()
+        # Optional order_book.OrderBooks kept current by the level2 websocket
+        self.order_books = order_books
+        # Increments/minimums/status per product: orders are quantized and
+        # validated against it before they are sent
+        self.catalog = catalog if catalog is not None else get_product_catalog()
+
+    def _prepare(self, product_id, side, funds=None, size=None, price=None, market=True):
+        """
+        Quantize an order to the product's increments: (funds, size, price,
+        error dict or None). No network call.
+        """
+        funds, size, price, reason = self.catalog.get(product_id).prepare(side, funds, size, price, market)
+        if reason:
+            return funds, size, price, {"error": f"Order check failed: {reason}", "rejected": True}
+        return funds, size, price, None
 
-    def place_market_order(self, product_id: str, side: str, funds=None, size=None):
+    def _pretrade_check(self, product_id, side, funds=None, size=None, price=None):
+        """
+        (error dict, None) if the pre-trade gate rejects the order, else
+        (None, reservation) to hand to _settle once the order is sent.
+        """
+        if not self.risk_gate.has_price(product_id, max_age=PRETRADE_PRICE_MAX_AGE_SECONDS):
+            # No reference price yet or a stale one (manual /buy, /sell outside
+            # the trading loop): re-read it so notional, position and band
+            # checks use the current market
+            px = self.get_current_price(product_id)
+            if not isinstance(px, dict):
+                self.risk_gate.update_price(product_id, px)
+        ok, reason, reservation = self.risk_gate.reserve(product_id, side, funds=funds, size=size, price=price)
+        if not ok:
+            return {"error": f"Pre-trade check failed: {reason}", "rejected": True}, None
+        return None, reservation
+
+    def _settle(self, resp, reservation):
+        """Give the gate back an order's rate and position usage if the exchange did not accept it."""
+        if accepted_order_id(resp) is None:
+            self.risk_gate.release(reservation)
+        return resp
+
+    def place_market_order(self, product_id: str, side: str, funds=None, size=None, prechecked=False,
+                           reservation=None):
         """
         Create a market order using coinbase-advanced-py.
         - `funds` = USD amount (quote_size) to buy/sell
         - `size` = base units (e.g., BTC) to buy/sell
+        - `prechecked` = order already passed risk_gate.reserve_batch(); its
+          `reservation` is released if the order fails or is rejected
         """
         side = side.lower()
         if side not in ("buy", "sell"):
@@ -27,6 +75,17 @@ class CoinbaseClient:
         if funds is None and size is None:
             return {"error": "Either 'funds' (USD) or 'size' (base units) must be provided."}
 
+        funds, size, _price, rejection = self._prepare(
+            product_id, side, funds=funds, size=size if funds is None else None
+        )
+        if rejection:
+            return rejection
+
+        if not prechecked:
+            rejection, reservation = self._pretrade_check(product_id, side, funds=funds, size=size)
+            if rejection:
+                return rejection
+
         client_order_id = ""
         try:
             if side == "buy":
@@ -55,39 +114,102 @@ class CoinbaseClient:
                         product_id=product_id,
                         base_size=str(size)
                     )
-            return resp.to_dict()
+            return self._settle(resp.to_dict(), reservation)
         except Exception as e:
-            return {"error": str(e)}
+            return self._settle({"error": str(e)}, reservation)
 
-    def place_limit_order(self, product_id: str, side: str, limit_price, size):
+    def place_limit_order(self, product_id: str, side: str, limit_price, size, post_only=False):
         """
-        Example bridging for a limit order. Buys/sells a certain 'base_size'
-        at `limit_price`.
+        Good-till-cancelled limit order for `size` base units at
+        `limit_price`. With `post_only` the exchange rejects the order
+        instead of letting it take liquidity.
         """
         side = side.lower()
         if side not in ("buy", "sell"):
             return {"error": "Invalid side. Must be 'buy' or 'sell'."}
 
+        _funds, size, limit_price, rejection = self._prepare(product_id, side, size=size, price=limit_price,
+                                                             market=False)
+        if rejection:
+            return rejection
+
+        rejection, reservation = self._pretrade_check(product_id, side, size=size, price=limit_price)
+        if rejection:
+            return rejection
+
         try:
             limit_price_str = str(limit_price)
             base_size_str = str(size)
             client_order_id = ""
 
             if side == "buy":
-                resp = self.client.limit_order_buy(
+                resp = self.client.limit_order_gtc_buy(
                     client_order_id=client_order_id,
                     product_id=product_id,
+                    base_size=base_size_str,
                     limit_price=limit_price_str,
-                    base_size=base_size_str
+                    post_only=post_only
                 )
             else:  # side == "sell"
-                resp = self.client.limit_order_sell(
+                resp = self.client.limit_order_gtc_sell(
                     client_order_id=client_order_id,
                     product_id=product_id,
+                    base_size=base_size_str,
                     limit_price=limit_price_str,
-                    base_size=base_size_str
+                    post_only=post_only
                 )
-            return resp.to_dict()
+            return self._settle(resp.to_dict(), reservation)
+        except Exception as e:
+            return self._settle({"error": str(e)}, reservation)
+
+    def place_ioc_order(self, product_id: str, side: str, limit_price, size):
+        """
+        Immediate-or-cancel limit order: fills what it can at `limit_price`
+        or better right away and cancels the rest. Never rests on the book.
+        """
+        side = side.lower()
+        if side not in ("buy", "sell"):
+            return {"error": "Invalid side. Must be 'buy' or 'sell'."}
+
+        _funds, size, limit_price, rejection = self._prepare(product_id, side, size=size, price=limit_price,
+                                                             market=False)
+        if rejection:
+            return rejection
+
+        rejection, reservation = self._pretrade_check(product_id, side, size=size, price=limit_price)
+        if rejection:
+            return rejection
+
+        try:
+            place = self.client.limit_order_ioc_buy if side == "buy" else self.client.limit_order_ioc_sell
+            resp = place(client_order_id="", product_id=product_id,
+                         base_size=str(size), limit_price=str(limit_price))
+            return self._settle(resp.to_dict(), reservation)
+        except Exception as e:
+            return self._settle({"error": str(e)}, reservation)
+
+    def get_order(self, order_id):
+        """
+        Status of one order: {order_id, status, filled_size, average_filled_price, fee}.
+        """
+        try:
+            order = self.client.get_order(order_id=order_id).order
+            return {
+                "order_id": order_id,
+                "status": order.status,
+                "filled_size": float(order.filled_size or 0),
+                "average_filled_price": float(order.average_filled_price or 0),
+                "fee": float(getattr(order, "total_fees", None) or 0),
+            }
+        except Exception as e:
+            return {"error": str(e)}
+
+    def cancel_orders(self, order_ids):
+        """
+        Cancel open orders by id (one request for the whole list).
+        """
+        try:
+            return self.client.cancel_orders(order_ids=list(order_ids)).to_dict()
         except Exception as e:
             return {"error": str(e)}
 
@@ -111,7 +233,12 @@ class CoinbaseClient:
     def get_current_price(self, product_id="BTC-USD"):
         """
         Approximate 'current price' by averaging the top bid and ask.
+        Uses the local L2 book when it is fresh, otherwise one REST call.
         """
+        if self.order_books is not None:
+            mid = self.order_books.mid(product_id)
+            if mid is not None:
+                return mid
         try:
             order_book = self.client.get_product_order_book(product_id=product_id, level=1)
             if not order_book.bids or not order_book.asks:
@@ -1,14 +1,35 @@
 # ai_trader/trader.py
-def start_trader(user, settings):
-    if user.tier < 3:
-        available_strategies = ['basic']
-    else:
-        available_strategies = ['basic', 'arbitrage', 'market_making', 'predictive']
+from broker import get_broker, RUNTIME_CHANNEL
+
+def available_strategies(tier):
+    if tier < 3:
+        return ['basic']
+    return ['basic', 'arbitrage', 'market_making', 'predictive']
+
+def start_trader(user, settings, broker=None):
     strategy = settings.get('strategy', 'basic')
-    if strategy not in available_strategies:
+    if strategy not in available_strategies(user.tier):
         raise ValueError("Strategy not available for your tier")
-    # Initialize and run strategy
+    # Hand the user to the shared multi-tenant runtime (trader_runtime.py)
+    # instead of running a private fetch/predict loop per user.
+    (broker or get_broker()).publish(RUNTIME_CHANNEL, {
+        "action": "register",
+        "user": user.dict(),
+        "settings": settings,
+    })
+
+def fund_house_account(wallet, amount, currency="USD", broker=None):
+    """
+    Ask the runtime to credit (or, negative, debit) a house-mode sub-account.
+    The runtime only applies it if the house account holds the funds.
+    """
+    (broker or get_broker()).publish(RUNTIME_CHANNEL, {
+        "action": "deposit",
+        "user_id": wallet,
+        "currency": currency,
+        "amount": float(amount),
+    })
     # ai_trader/trader.py
 def route_trade(signal, exchange_clients):
     best_exchange = max(exchange_clients.keys(), key=lambda e: get_price(e, signal['pair']))
-    exchange_clients[best_exchange].place_order(signal['pair'], signal['action'], signal['amount'])
\ No newline at end of file
+    exchange_clients[best_exchange].place_order(signal['pair'], signal['action'], signal['amount'])
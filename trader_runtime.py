@@ -0,0 +1,483 @@
+import time
+import functools
+import numpy as np
+import pandas as pd
+
+import metrics
+from config import RUNTIME_TICK_SECONDS, LEDGER_HOUSE_WALLET, MM_FILL_POLL_SECONDS
+from broker import get_broker, RUNTIME_CHANNEL
+from trader import available_strategies
+from observation import ObservationBuilder
+from performance import fill_event, mark_event, order_event
+from app.broadcaster import BrokerPublisher
+from rebalance_planner import (
+    InternalAccount, NettingPlan, clamp_flows, orders_from_flows, rebalance_diffs, step_flows
+)
+from product_catalog import get_product_catalog
+from risk_manager import RiskManager
+from order_status import FillReconciler, accepted_order_id, filled, order_error
+
+# Strategies driven by the shared RL policy
+POLICY_STRATEGIES = ("basic", "predictive")
+# Strategies that quote from order-book events between ticks
+EVENT_STRATEGIES = ("market_making",)
+
+MIN_ACTION = 0.01      # ignore target fractions below 1%
+
+
+class Tenant:
+    """A registered user and the exchange client trading their account."""
+
+    def __init__(self, user_id, tier, strategy, client, engine=None):
+        self.user_id = user_id
+        self.tier = tier
+        self.strategy = strategy
+        self.client = client
+        # Event-driven strategy instance (e.g. MarketMakingStrategy), if any
+        self.engine = engine
+
+
+def default_client_factory(user):
+    """Build a CoinbaseClient from the user's first Coinbase exchange config."""
+    from trade_manager import CoinbaseClient
+    from pretrade_risk import PreTradeRiskGate
+    for exchange in user.get("exchanges", []):
+        if exchange.get("exchange_name", "").lower() == "coinbase":
+            # Each account gets its own gate: positions and drawdown are per user
+            return CoinbaseClient(exchange["api_key"], exchange["api_secret"],
+                                  risk_gate=PreTradeRiskGate())
+    raise ValueError(f"User {user.get('wallet_public_key')} has no Coinbase exchange configured")
+
+
+def _balance_map(balances):
+    """{currency: amount} from a get_account_balances() list."""
+    return {b["currency"]: float(b["balance"]) for b in balances}
+
+
+def _shortfall(allocated, house_balances):
+    """{currency: amount} of `allocated` not covered by the house account's balances."""
+    house = _balance_map(house_balances)
+    short = {}
+    for currency, amount in allocated.items():
+        missing = amount - house.get(currency, 0.0)
+        if missing > 1e-9 * max(1.0, abs(amount)):
+            short[currency] = missing
+    return short
+
+
+class HouseAccounts:
+    """
+    client_factory for house mode: each user's InternalAccount, kept in
+    `ledger` and created empty the first time they register. The same
+    instance is returned on every later registration, so nothing queued for
+    the ledger is lost to a reload. Money only enters through deposit(),
+    which the house account's own balances must cover.
+    """
+
+    def __init__(self, ledger=None):
+        self.ledger = ledger
+        self.accounts = {}
+
+    def __call__(self, user):
+        return self.account(user["wallet_public_key"])
+
+    def account(self, wallet):
+        if wallet not in self.accounts:
+            self.accounts[wallet] = InternalAccount(wallet=wallet, ledger=self.ledger)
+        return self.accounts[wallet]
+
+    def allocated(self):
+        """{currency: amount} held by all sub-accounts, including ones not registered now."""
+        if self.ledger is None:
+            totals = {}
+            for account in self.accounts.values():
+                for currency, amount in account.balances.items():
+                    totals[currency] = totals.get(currency, 0.0) + amount
+            return totals
+        self.ledger.flush()
+        return self.ledger.balance_totals()
+
+    def deposit(self, wallet, amount, currency, house_balances):
+        """Credit a sub-account from the house funds not yet allocated (negative withdraws)."""
+        if amount > 0:
+            free = _balance_map(house_balances).get(currency, 0.0) - self.allocated().get(currency, 0.0)
+            if amount > free + 1e-9:
+                raise ValueError(f"House account has only {free:.8f} {currency} unallocated")
+        self.account(wallet).deposit(currency, amount)
+        return self.account(wallet).balances
+
+
+class MultiTenantRuntime:
+    """
+    Runs the trading policy for many users against one shared market snapshot.
+
+    Each tick fetches candles and computes indicators once per product, then
+    builds one observation per tenant (shared market features + that tenant's
+    portfolio), runs a single batched model.predict over all tenants and
+    rebalances each account. Market-data and inference cost scale with the
+    number of products; only the balance reads and orders are per tenant.
+    Targets go through the same RiskManager position cap and drawdown halt
+    as the single-account loop, with a running peak kept per tenant. Orders
+    are all sent first; their fills are read back by a FillReconciler in
+    the background, so fill polling never holds up the tick.
+
+    Market-making tenants are not run by the policy: their engine listens
+    to the shared `order_books` and quotes between ticks, and each tick
+    only re-syncs its inventory and open orders with the exchange.
+
+    With a `house_client` the tenants' clients are rebalance_planner
+    InternalAccounts inside one exchange account (see HouseAccounts):
+    opposing flows are netted per product and at most one order per product
+    is sent. Each tick first checks that the sub-accounts hold no more than
+    the house account, and skips trading if they do.
+    """
+
+    def __init__(self, model, product_ids, data_manager, broker=None,
+                 client_factory=default_client_factory, lookback="3 days",
+                 features=None, order_books=None, house_client=None, ledger=None, catalog=None,
+                 broadcaster=None, risk_manager=None, fill_reconciler=None):
+        self.model = model
+        self.product_ids = list(product_ids)
+        self.data_manager = data_manager
+        self.broker = broker or get_broker()
+        self.client_factory = client_factory
+        self.lookback = pd.Timedelta(lookback)
+        self.features = tuple(features or data_manager.feature_names())
+        self.observation_builder = ObservationBuilder(self.product_ids, self.features)
+        self.currencies = [pid.split("-")[0] for pid in self.product_ids]
+        self.order_books = order_books
+        self.house_client = house_client
+        # Optional trade_ledger.TradeLedger: every order and fill is recorded
+        self.ledger = ledger
+        # Product increments/minimums the planned orders are sized to
+        self.catalog = catalog or get_product_catalog()
+        # Orders and fills go to each tenant's websockets via the API's BrokerRelay
+        self.broadcaster = broadcaster or BrokerPublisher(self.broker)
+        self.risk_manager = risk_manager or RiskManager()
+        # user_id -> highest net worth seen, for the drawdown halt
+        self.peaks = {}
+        self.fill_reconciler = fill_reconciler or FillReconciler()
+        self.last_plan = None
+        self.last_house_orders = []
+        self.tenants = {}
+
+    # ------------------------------------------------------------------
+    # Tenant management
+    def register(self, user, settings):
+        """
+        Add (or replace) a tenant. `user` is a User.dict(); the strategy must be
+        allowed for the user's tier.
+        """
+        strategy = settings.get("strategy", "basic")
+        if strategy not in available_strategies(user["tier"]):
+            raise ValueError("Strategy not available for your tier")
+        if strategy not in POLICY_STRATEGIES + EVENT_STRATEGIES:
+            raise ValueError(f"Strategy '{strategy}' is not run by the shared policy runtime")
+        if strategy in EVENT_STRATEGIES and self.order_books is None:
+            raise ValueError(f"Strategy '{strategy}' needs live order books")
+        user_id = user["wallet_public_key"]
+        self.unregister(user_id)
+        client = self.client_factory(user)
+        engine = None
+        if strategy == "market_making":
+            from strategies.market_making import MarketMakingStrategy
+            # Fills of its quotes are read back on the book delivery thread
+            engine = MarketMakingStrategy(client, self.product_ids, fill_poll_interval=MM_FILL_POLL_SECONDS)
+            self.order_books.add_listener(engine.on_order_book)
+        self.tenants[user_id] = Tenant(user_id, user["tier"], strategy, client, engine)
+        return self.tenants[user_id]
+
+    def unregister(self, user_id):
+        tenant = self.tenants.pop(user_id, None)
+        if tenant is not None and tenant.engine is not None:
+            self.order_books.remove_listener(tenant.engine.on_order_book)
+            tenant.engine.cancel_all()
+
+    def process_commands(self):
+        """Apply register/unregister messages published by trader.start_trader."""
+        for msg in self.broker.drain(RUNTIME_CHANNEL):
+            try:
+                if msg.get("action") == "register":
+                    self.register(msg["user"], msg.get("settings", {}))
+                elif msg.get("action") == "unregister":
+                    self.unregister(msg["user_id"])
+                elif msg.get("action") == "deposit":
+                    self.deposit(msg["user_id"], msg["amount"], msg.get("currency", "USD"))
+            except Exception as e:
+                print(f"Runtime rejected command {msg.get('action')}: {e}")
+
+    def deposit(self, user_id, amount, currency="USD"):
+        """Fund (or, negative, debit) a house-mode sub-account; see HouseAccounts.deposit."""
+        if self.house_client is None or not isinstance(self.client_factory, HouseAccounts):
+            raise ValueError("Deposits are only taken in house mode")
+        balances = self.client_factory.deposit(user_id, amount, currency,
+                                               self.house_client.get_account_balances())
+        print(f"Sub-account {user_id} now holds {balances.get(currency, 0.0)} {currency}")
+        return balances
+
+    def reconcile(self):
+        """{currency: amount} the sub-accounts hold beyond the house account ({} when covered)."""
+        house = self.house_client.get_account_balances()
+        if isinstance(house, dict) or (house and "error" in house[0]):
+            raise RuntimeError(f"Could not read house balances: {house}")
+        if isinstance(self.client_factory, HouseAccounts):
+            allocated = self.client_factory.allocated()
+        else:
+            allocated = {}
+            for tenant in self.tenants.values():
+                for currency, amount in _balance_map(tenant.client.get_account_balances()).items():
+                    allocated[currency] = allocated.get(currency, 0.0) + amount
+        return _shortfall(allocated, house)
+
+    # ------------------------------------------------------------------
+    # Market snapshot (shared by every tenant)
+    def market_snapshot(self, end=None):
+        """
+        Fetch and featurize every product once. Returns (prices, features) with
+        prices shaped (n_products,) and features flattened in observation order,
+        or None if no data is available.
+        """
+        end = end or pd.Timestamp.utcnow()
+        df = self.data_manager.build_multiasset_dataset(end - self.lookback, end)
+        if df is None or df.empty:
+            return None
+        latest_row = df.iloc[-1]
+        prices = np.array(
+            [float(latest_row[f"{pid}_close"]) for pid in self.product_ids], dtype=np.float64
+        )
+        features = self.observation_builder.market_from_frame(df)
+        return prices, features
+
+    def _load_portfolios(self, tenants, prices):
+        """
+        Read balances for each tenant. Returns (ok_mask, usd, positions) where
+        positions is (n_tenants, n_products) in base units.
+        """
+        n = len(tenants)
+        ok = np.zeros(n, dtype=bool)
+        usd = np.zeros(n, dtype=np.float64)
+        positions = np.zeros((n, len(self.product_ids)), dtype=np.float64)
+        index = {c: j for j, c in enumerate(self.currencies)}
+        for i, tenant in enumerate(tenants):
+            balances = tenant.client.get_account_balances()
+            if isinstance(balances, dict) or (balances and "error" in balances[0]):
+                print(f"Skipping {tenant.user_id}: could not read balances")
+                continue
+            ok[i] = True
+            for b in balances:
+                amount = float(b["balance"])
+                if amount <= 0:
+                    continue
+                if b["currency"] == "USD":
+                    usd[i] += amount
+                elif b["currency"] in index:
+                    positions[i, index[b["currency"]]] = amount
+        return ok, usd, positions
+
+    # ------------------------------------------------------------------
+    # Tick
+    def tick(self, end=None):
+        """
+        Run one decision step for all tenants. Returns a dict of
+        user_id -> list of order results.
+        """
+        self.process_commands()
+        tenants = list(self.tenants.values())
+        if not tenants:
+            return {}
+        if self.house_client is not None:
+            short = self.reconcile()
+            if short:
+                # Never trade money the house account does not hold
+                metrics.ERRORS.inc(stage="house_reconcile")
+                print(f"Sub-accounts exceed the house balances by {short}; not trading this tick")
+                return {}
+
+        snapshot = self.market_snapshot(end)
+        if snapshot is None:
+            return {}
+        prices, features = snapshot
+
+        ok, usd, positions = self._load_portfolios(tenants, prices)
+        if not ok.any():
+            return {}
+        tenants = [t for t, flag in zip(tenants, ok) if flag]
+        usd, positions = usd[ok], positions[ok]
+
+        # Portfolio values, all tenants at once
+        coin_values = positions * prices
+        totals = usd + coin_values.sum(axis=1)
+
+        # Refresh each account's pre-trade gate before its orders go out
+        for i, tenant in enumerate(tenants):
+            gate = getattr(tenant.client, "risk_gate", None)
+            if gate is None:
+                continue
+            for j, pid in enumerate(self.product_ids):
+                gate.update_price(pid, prices[j])
+            gate.update_portfolio(totals[i], dict(zip(self.product_ids, positions[i])))
+
+        # Equity marks for every account this tick; fills are added as orders go out
+        timestamp = (end or pd.Timestamp.utcnow()).timestamp()
+        price_map = dict(zip(self.product_ids, prices.tolist()))
+        events = [mark_event(t.user_id, totals[i], usd[i], price_map, timestamp) for i, t in enumerate(tenants)]
+
+        results = {}
+        policy = np.array([t.engine is None for t in tenants])
+        for i in np.flatnonzero(~policy):
+            results[tenants[i].user_id] = self._sync_engine(tenants[i], positions[i])
+        if policy.any():
+            tenants = [t for t, flag in zip(tenants, policy) if flag]
+            usd, positions, totals = usd[policy], positions[policy], totals[policy]
+
+            # One observation row per tenant; the market part is shared
+            obs = self.observation_builder.build_batch(features, totals, usd)
+
+            actions, _states = self.model.predict(obs, deterministic=True)
+            actions = np.asarray(actions, dtype=np.float32).reshape(len(tenants), len(self.product_ids))
+            actions = np.where(np.abs(actions) < MIN_ACTION, 0, actions)
+
+            # Position cap and drawdown halt the policy was trained under, per tenant
+            peaks = np.array([self.peaks.get(t.user_id, totals[i]) for i, t in enumerate(tenants)])
+            actions = self.risk_manager.apply_risk_constraints_batch(actions, totals, peaks)
+            self.peaks.update(zip((t.user_id for t in tenants), peaks.tolist()))
+
+            diffs = rebalance_diffs(totals, actions, positions, prices)
+            if self.house_client is not None:
+                results.update(self._execute_netted(tenants, diffs, prices, totals, usd, positions, events))
+            else:
+                results.update(self._execute(tenants, diffs, prices, events))
+
+        for event in events:
+            if event["type"] == "fill":
+                self.broadcaster.publish_threadsafe("trades", event, event["wallet"])
+        if self.ledger is not None:
+            # The API's performance aggregates are rebuilt from these rows
+            for event in events:
+                if event["type"] == "fill":
+                    self.ledger.record_fill(event["wallet"], event["product_id"], event["side"], event["size"],
+                                            event["price"], event["fee"], timestamp=event["time"])
+                else:
+                    self.ledger.record_mark(event["wallet"], event["equity"], event["cash"], event["prices"],
+                                            timestamp=event["time"])
+        return results
+
+    def _sync_engine(self, tenant, positions):
+        """Reconcile an event-driven engine with the account's balances and open orders."""
+        open_orders = tenant.client.get_open_orders()
+        open_ids = None if isinstance(open_orders, dict) else {o["order_id"] for o in open_orders}
+        return tenant.engine.sync(dict(zip(self.product_ids, positions)), open_ids)
+
+    def _execute(self, tenants, diffs, prices, events):
+        """
+        Each tenant trades its own diffs on its own exchange account. What
+        each accepted order actually filled (get_order) is recorded and
+        published by the fill reconciler once the order is done.
+        """
+        results = {tenant.user_id: [] for tenant in tenants}
+        flows = step_flows(diffs, prices, minimums=self.catalog.minimums(self.product_ids))
+        for i, j, order in orders_from_flows(flows, prices, self.product_ids, self.catalog):
+            tenant = tenants[i]
+            try:
+                res = tenant.client.place_market_order(order["product_id"], order["side"],
+                                                       funds=order.get("funds"), size=order.get("size"))
+                results[tenant.user_id].append(res)
+                if self.ledger is not None:
+                    self.ledger.record_result(tenant.user_id, order, res)
+                self.broadcaster.publish_threadsafe("trades", order_event(tenant.user_id, order, res),
+                                                    tenant.user_id)
+                order_id = accepted_order_id(res)
+                if order_id is None:
+                    print(f"Order {order['side']} {order['product_id']} not accepted: {order_error(res)}")
+                    continue
+                self.fill_reconciler.submit(tenant.client, order_id,
+                                            functools.partial(self._record_fill, tenant.user_id, order, order_id))
+            except Exception as e:
+                print(f"Error rebalancing {order['product_id']} for {tenant.user_id}: {e}")
+        return results
+
+    def _record_fill(self, user_id, order, order_id, status):
+        """Fill reconciler callback: ledger row and websocket event for what an order filled."""
+        fill = filled(status, order_id)
+        if fill is None:
+            return
+        event = fill_event(user_id, order["product_id"], order["side"], *fill)
+        if self.ledger is not None:
+            self.ledger.record_fill(user_id, order["product_id"], order["side"], *fill,
+                                    order_id=order_id, timestamp=event["time"])
+        self.broadcaster.publish_threadsafe("trades", event, user_id)
+
+    def _execute_netted(self, tenants, diffs, prices, totals, usd, positions, events):
+        """
+        Omnibus mode: cross opposing flows internally, send one net order per
+        product from the house account, then allocate fills to tenants.
+        """
+        # Sub-accounts only trade what they hold
+        flows = clamp_flows(step_flows(diffs, prices, order_minimums=False), usd, positions, prices)
+        plan = NettingPlan(flows, prices, self.product_ids, self.catalog)
+        self.last_plan = plan
+
+        gate = getattr(self.house_client, "risk_gate", None)
+        if gate is not None:
+            for j, pid in enumerate(self.product_ids):
+                gate.update_price(pid, prices[j])
+            gate.update_portfolio(float(totals.sum()), dict(zip(self.product_ids, positions.sum(axis=0))))
+
+        house_results, accepted = [], []
+        for order in plan.orders:
+            try:
+                res = self.house_client.place_market_order(order["product_id"], order["side"],
+                                                           funds=order.get("funds"), size=order.get("size"))
+            except Exception as e:
+                res = {"error": str(e)}
+            house_results.append(res)
+            if self.ledger is not None:
+                self.ledger.record_result(LEDGER_HOUSE_WALLET, order, res)
+            order_id = accepted_order_id(res)
+            if order_id is None:
+                print(f"Order {order['side']} {order['product_id']} not accepted: {order_error(res)}")
+                continue
+            accepted.append((order, order_id))
+
+        # At most one house order per product: their fills are read concurrently,
+        # since the allocation below needs them
+        statuses = self.fill_reconciler.resolve([(self.house_client, order_id) for _order, order_id in accepted])
+        size = np.zeros(len(self.product_ids))
+        price = prices.astype(np.float64)
+        fee = np.zeros(len(self.product_ids))
+        for (order, order_id), status in zip(accepted, statuses):
+            fill = filled(status, order_id)
+            if fill is None:
+                continue
+            j = self.product_ids.index(order["product_id"])
+            size[j] = fill[0] if order["side"] == "buy" else -fill[0]
+            price[j], fee[j] = fill[1], fill[2]
+            event = fill_event(LEDGER_HOUSE_WALLET, order["product_id"], order["side"], *fill)
+            if self.ledger is not None:
+                self.ledger.record_fill(LEDGER_HOUSE_WALLET, order["product_id"], order["side"], *fill,
+                                        order_id=order_id, timestamp=event["time"])
+            self.broadcaster.publish_threadsafe("trades", event, LEDGER_HOUSE_WALLET)
+
+        # What the house paid (average price and fee) is passed on pro rata
+        base, fill_prices, fees = plan.allocate_fills(size, price, fee)
+        results = {}
+        for i, tenant in enumerate(tenants):
+            fills = []
+            for j in np.flatnonzero(base[i]):
+                amount = float(base[i, j])
+                tenant.client.apply_fill(self.product_ids[j], amount, float(fill_prices[i, j]), float(fees[i, j]))
+                fills.append({"product_id": self.product_ids[j], "side": "buy" if amount > 0 else "sell",
+                              "size": abs(amount), "price": float(fill_prices[i, j]), "fee": float(fees[i, j])})
+                events.append(fill_event(tenant.user_id, **fills[-1]))
+            results[tenant.user_id] = fills
+        self.last_house_orders = house_results
+        return results
+
+    def run_forever(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Error in trader runtime tick: {e}")
+            time.sleep(max(0.0, RUNTIME_TICK_SECONDS - (time.monotonic() - started)))
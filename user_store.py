@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from cryptography.fernet import Fernet
+
+from config import USER_DB_PATH, USER_STORE_KEY, USER_CACHE_CHECK_INTERVAL
+
+# Columns holding exchange credentials; these are Fernet-encrypted at rest.
+ENCRYPTED_FIELDS = ("api_key", "api_secret", "exchanges")
+USER_FIELDS = ("telegram_id", "wallet", "tier", "token_balance",
+               "api_key", "api_secret", "exchanges", "settings")
+
+
+class UserStore:
+    """
+    Shared user-config store (wallets, tiers, exchange credentials) backed by
+    SQLite in WAL mode, so several bot and API worker processes see the same data.
+
+    Reads go through an in-process cache. The cache is dropped whenever this
+    process writes, and whenever SQLite reports that another connection has
+    committed (PRAGMA data_version), checked at most every
+    USER_CACHE_CHECK_INTERVAL seconds. Every write reads and writes its row
+    inside one BEGIN IMMEDIATE transaction, so concurrent writers in other
+    processes cannot interleave between the two.
+
+    A wallet belongs to at most one user (unique index). A database that
+    already holds duplicate wallets still opens: the duplicates are
+    reported, and the rule is checked on writes until they are resolved
+    and the store is reopened.
+    """
+
+    def __init__(self, db_path=USER_DB_PATH, encryption_key=USER_STORE_KEY,
+                 cache_check_interval=USER_CACHE_CHECK_INTERVAL):
+        if not encryption_key:
+            raise ValueError("USER_STORE_KEY must be set to a Fernet key to store user credentials.")
+        self.db_path = db_path
+        self.cipher = Fernet(encryption_key)
+        self.cache_check_interval = cache_check_interval
+
+        self._local = threading.local()
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        # Bumped on every invalidation so a read that started before it is not cached
+        self._generation = 0
+        self._version_lock = threading.Lock()
+        self._last_version = None
+        self._last_check = 0.0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_schema()
+        # Dedicated connection used only to detect commits from other processes
+        self._version_conn = self._connect()
+        self._last_version = self._data_version()
+
+    # ------------------------------------------------------------------
+    # Connection / schema
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    telegram_id INTEGER,
+                    wallet TEXT,
+                    tier INTEGER NOT NULL DEFAULT 1,
+                    token_balance REAL NOT NULL DEFAULT 0,
+                    api_key BLOB,
+                    api_secret BLOB,
+                    exchanges BLOB,
+                    settings TEXT,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)")
+            duplicates = self.duplicate_wallets(conn)
+            self.wallet_unique = not duplicates
+            if duplicates:
+                # CREATE UNIQUE INDEX would fail and take startup down with it
+                print(f"User store {self.db_path} has wallets linked to several users, "
+                      f"not enforcing unique wallets until they are resolved: {duplicates}")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_users_wallet ON users(wallet)")
+            else:
+                # Replaces the non-unique wallet index of older databases
+                conn.execute("DROP INDEX IF EXISTS idx_users_wallet")
+                conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_wallet_unique ON users(wallet)")
+
+    def duplicate_wallets(self, conn=None):
+        """{wallet: [telegram_id, ...]} for every wallet stored on more than one row."""
+        rows = (conn or self._conn()).execute(
+            """
+            SELECT wallet, telegram_id FROM users WHERE wallet IN (
+                SELECT wallet FROM users WHERE wallet IS NOT NULL GROUP BY wallet HAVING COUNT(*) > 1
+            ) ORDER BY wallet, id
+            """
+        ).fetchall()
+        duplicates = {}
+        for row in rows:
+            duplicates.setdefault(row["wallet"], []).append(row["telegram_id"])
+        return duplicates
+
+    def _data_version(self):
+        return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Cache
+    def _check_external_writes(self):
+        """Drop the cache if another connection committed since the last check."""
+        now = time.monotonic()
+        if now - self._last_check < self.cache_check_interval:
+            return
+        with self._version_lock:
+            self._last_check = now
+            version = self._data_version()
+            if version != self._last_version:
+                self._last_version = version
+                self.invalidate()
+
+    def invalidate(self, key=None):
+        with self._cache_lock:
+            self._generation += 1
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    def _cached_lookup(self, key, column, value):
+        self._check_external_writes()
+        with self._cache_lock:
+            if key in self._cache:
+                return self._cache[key]
+            generation = self._generation
+        row = self._conn().execute(
+            f"SELECT * FROM users WHERE {column} = ? ORDER BY updated_at DESC LIMIT 1", (value,)
+        ).fetchone()
+        record = self._decode(row) if row is not None else None
+        with self._cache_lock:
+            # An invalidation during the read means the row may already be stale
+            if generation == self._generation:
+                self._cache[key] = record
+        return record
+
+    # ------------------------------------------------------------------
+    # Encoding
+    def _encrypt(self, value):
+        if value is None:
+            return None
+        return self.cipher.encrypt(value.encode())
+
+    def _decrypt(self, value):
+        if value is None:
+            return None
+        return self.cipher.decrypt(bytes(value)).decode()
+
+    def _decode(self, row):
+        exchanges = self._decrypt(row["exchanges"])
+        return {
+            "telegram_id": row["telegram_id"],
+            "wallet": row["wallet"],
+            "tier": row["tier"],
+            "token_balance": row["token_balance"],
+            "api_key": self._decrypt(row["api_key"]),
+            "api_secret": self._decrypt(row["api_secret"]),
+            "exchanges": json.loads(exchanges) if exchanges else [],
+            "settings": json.loads(row["settings"]) if row["settings"] else {},
+        }
+
+    def _encode_fields(self, fields):
+        unknown = set(fields) - set(USER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown user fields: {sorted(unknown)}")
+        encoded = {}
+        for name, value in fields.items():
+            if name == "exchanges":
+                value = self._encrypt(json.dumps(value or []))
+            elif name in ENCRYPTED_FIELDS:
+                value = self._encrypt(value)
+            elif name == "settings":
+                value = json.dumps(value or {})
+            encoded[name] = value
+        return encoded
+
+    # ------------------------------------------------------------------
+    # Public API
+    def get_by_telegram_id(self, telegram_id):
+        """Return the user record for a Telegram user id, or None."""
+        return self._cached_lookup(("telegram_id", telegram_id), "telegram_id", telegram_id)
+
+    def get_by_wallet(self, wallet):
+        """Return the user record for a wallet address, or None."""
+        return self._cached_lookup(("wallet", wallet), "wallet", wallet)
+
+    def update_telegram_user(self, telegram_id, **fields):
+        """
+        Create or update the record owned by a Telegram user. Raises ValueError
+        if `wallet` is already linked to another user.
+        """
+        return self._upsert("telegram_id", telegram_id, fields)
+
+    def update_wallet_user(self, wallet, **fields):
+        """Create or update the record keyed by a wallet address (API users)."""
+        return self._upsert("wallet", wallet, fields)
+
+    def add_exchange(self, wallet, exchange_config):
+        """Append an exchange config (dict) to a wallet user's exchanges."""
+        return self._upsert("wallet", wallet, {}, modify=lambda record: {
+            "exchanges": list(record.get("exchanges", [])) + [exchange_config]
+        })
+
+    def _upsert(self, key_column, key_value, fields, modify=None):
+        """
+        Write `fields` to the row for a key. `modify(record)` (the current
+        record, {} if there is none) returns more fields, computed inside
+        the same transaction as the write.
+        """
+        fields = dict(fields)
+        conn = self._conn()
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if modify is not None:
+                    row = conn.execute(
+                        f"SELECT * FROM users WHERE {key_column} = ? ORDER BY updated_at DESC LIMIT 1", (key_value,)
+                    ).fetchone()
+                    fields.update(modify(self._decode(row) if row is not None else {}))
+                fields.pop(key_column, None)
+                old_wallet = self._write(conn, key_column, key_value, self._encode_fields(fields))
+        except sqlite3.IntegrityError as e:
+            raise ValueError(self._conflict(e, dict(fields, **{key_column: key_value}))) from e
+
+        # Keys that may now resolve differently
+        self.invalidate((key_column, key_value))
+        for wallet in (old_wallet, fields.get("wallet")):
+            if wallet:
+                self.invalidate(("wallet", wallet))
+        if key_column == "wallet":
+            # Telegram lookups may share this row
+            self.invalidate()
+        return self.get_by_telegram_id(key_value) if key_column == "telegram_id" else self.get_by_wallet(key_value)
+
+    @staticmethod
+    def _conflict(error, fields):
+        """Message for an IntegrityError, by the constraint it names."""
+        message = str(error)
+        if "users.wallet" in message:
+            return f"Wallet {fields.get('wallet')} is already linked to another user"
+        if "users.telegram_id" in message:
+            return f"Telegram user {fields.get('telegram_id')} is already linked to another wallet"
+        return f"Could not save user: {message}"
+
+    def _write(self, conn, key_column, key_value, encoded):
+        """Insert or update the row for a key; returns the wallet it had before."""
+        row = conn.execute(
+            f"SELECT id, wallet FROM users WHERE {key_column} = ? ORDER BY updated_at DESC LIMIT 1",
+            (key_value,)
+        ).fetchone()
+        wallet = encoded.get("wallet")
+        if not self.wallet_unique and wallet is not None and conn.execute(
+                "SELECT 1 FROM users WHERE wallet = ? AND id != ?", (wallet, row["id"] if row else -1)
+        ).fetchone():
+            # What the unique index reports once the duplicates are resolved
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: users.wallet")
+        now = time.time()
+        if row is None:
+            columns = [key_column, "updated_at"] + list(encoded)
+            values = [key_value, now] + list(encoded.values())
+            placeholders = ", ".join("?" for _ in columns)
+            conn.execute(
+                f"INSERT INTO users ({', '.join(columns)}) VALUES ({placeholders})", values
+            )
+            return None
+        assignments = ", ".join(f"{name} = ?" for name in encoded)
+        assignments = f"{assignments}, updated_at = ?" if assignments else "updated_at = ?"
+        conn.execute(
+            f"UPDATE users SET {assignments} WHERE id = ?",
+            list(encoded.values()) + [now, row["id"]]
+        )
+        return row["wallet"]
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_user_store():
+    """Return the process-wide UserStore, creating it on first use."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = UserStore()
+    return _default_store
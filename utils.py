@@ -1,11 +1,15 @@
 import requests
 from config import BOT_TOKEN
+import metrics
 
 def send_telegram_message(chat_id, message):
     url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     payload = {"chat_id": chat_id, "text": message}
+    metrics.API_CALLS.inc(client="telegram", method="sendMessage")
     try:
-        r = requests.post(url, json=payload)
+        with metrics.API_SECONDS.time(client="telegram", method="sendMessage"):
+            r = requests.post(url, json=payload)
         r.raise_for_status()
     except Exception as e:
+        metrics.API_ERRORS.inc(client="telegram", method="sendMessage")
         print(f"Failed to send Telegram message: {e}")
@@ -1,82 +1,210 @@
-import tweepy
+import os
+import json
 import queue
+import random
+import asyncio
 import threading
-import time
-import os
+
+import aiohttp
 from dotenv import load_dotenv
 
+import metrics
+
 # Load environment variables from .env file
 load_dotenv()
 
-class TwitterStreamListener(tweepy.StreamingClient):
+X_API_BASE = "https://api.twitter.com"
+STREAM_PATH = "/2/tweets/search/stream"
+RULES_PATH = "/2/tweets/search/stream/rules"
+# X sends a keep-alive newline every ~20s; no bytes for longer means a stalled connection
+STALL_TIMEOUT = 30
+
+TWEETS = metrics.counter("x_stream_tweets_total", "Tweets received from the X filtered stream")
+TWEETS_DROPPED = metrics.counter("x_stream_dropped_total", "Tweets dropped because the ingestion queue was full")
+RECONNECTS = metrics.counter("x_stream_reconnects_total", "X stream reconnects by reason")
+
+
+class XStream:
     """
-    Uses Tweepy v4.x with the Twitter v2 API for streaming.
+    asyncio consumer of the X v2 filtered stream.
+
+    One XStream owns one HTTP session and at most one open stream
+    connection. When the connection fails or closes it waits with
+    exponential backoff plus jitter (a longer base for HTTP 429) and
+    reconnects in the same task, so failures never stack threads or
+    connections. Stream rules are synced by diff: only rules that changed
+    are deleted or added. Tweet texts go into `tweet_queue` with
+    put_nowait; when the queue is full the oldest tweet is dropped so the
+    network reader never blocks on the consumer.
     """
-    def __init__(self, bearer_token, tweet_queue):
-        super().__init__(bearer_token=bearer_token, wait_on_rate_limit=True)
+
+    def __init__(self, bearer_token, keywords, tweet_queue, base_url=X_API_BASE,
+                 backoff_initial=1.0, backoff_max=320.0, rate_limit_backoff=60.0,
+                 jitter=random.random):
+        self.bearer_token = bearer_token
+        self.keywords = list(dict.fromkeys(keywords))
         self.tweet_queue = tweet_queue
+        self.base_url = base_url.rstrip("/")
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.rate_limit_backoff = rate_limit_backoff
+        self.jitter = jitter
+
+        self.session = None
+        self.connected = False
+        self.connections = 0
+        self._consume_task = None
+        self._stop = None
+        self._loop = None
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Rules
+    async def sync_rules(self, keywords=None):
+        """Make the server's rules equal `keywords` with the fewest changes."""
+        if keywords is not None:
+            self.keywords = list(dict.fromkeys(keywords))
+        async with self.session.get(self.base_url + RULES_PATH) as resp:
+            resp.raise_for_status()
+            current = {r["value"]: r["id"] for r in (await resp.json()).get("data") or []}
+
+        stale = [rule_id for value, rule_id in current.items() if value not in self.keywords]
+        missing = [kw for kw in self.keywords if kw not in current]
+        if stale:
+            async with self.session.post(self.base_url + RULES_PATH, json={"delete": {"ids": stale}}) as resp:
+                resp.raise_for_status()
+        if missing:
+            payload = {"add": [{"value": kw, "tag": kw} for kw in missing]}
+            async with self.session.post(self.base_url + RULES_PATH, json=payload) as resp:
+                resp.raise_for_status()
+        return {"deleted": stale, "added": missing}
+
+    # ------------------------------------------------------------------
+    # Streaming
+    def backoff(self, attempt, rate_limited=False):
+        """Delay before reconnect attempt `attempt` (0-based): capped exponential, 50-100% jitter."""
+        base = self.rate_limit_backoff if rate_limited else self.backoff_initial
+        delay = min(self.backoff_max, base * 2 ** attempt)
+        return delay * (0.5 + 0.5 * self.jitter())
+
+    def _deliver(self, text):
+        TWEETS.inc()
+        while True:
+            try:
+                self.tweet_queue.put_nowait(text)
+                return
+            except (queue.Full, asyncio.QueueFull):
+                try:
+                    # Keep the newest tweets: drop the oldest queued one
+                    self.tweet_queue.get_nowait()
+                    TWEETS_DROPPED.inc()
+                except (queue.Empty, asyncio.QueueEmpty):
+                    pass
+
+    async def _consume(self):
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=STALL_TIMEOUT)
+        async with self.session.get(self.base_url + STREAM_PATH, timeout=timeout) as resp:
+            if resp.status == 429:
+                raise RateLimited()
+            resp.raise_for_status()
+            self.connected = True
+            self.connections += 1
+            try:
+                async for line in resp.content:
+                    line = line.strip()
+                    if not line:
+                        continue  # keep-alive
+                    payload = json.loads(line)
+                    text = (payload.get("data") or {}).get("text")
+                    if text:
+                        self._deliver(text)
+                    elif "errors" in payload:
+                        print(f"X stream error: {payload['errors']}")
+            finally:
+                self.connected = False
+
+    async def run(self):
+        """Sync rules, then stream until stop() is called."""
+        self._stop = asyncio.Event()
+        headers = {"Authorization": f"Bearer {self.bearer_token}"}
+        rules_synced = False
+        attempt = 0
+        async with aiohttp.ClientSession(headers=headers) as self.session:
+            while not self._stop.is_set():
+                rate_limited = False
+                connections = self.connections
+                try:
+                    if not rules_synced:
+                        await self.sync_rules()
+                        rules_synced = True
+                    self._consume_task = asyncio.ensure_future(self._consume())
+                    await self._consume_task
+                    # The server ended the stream cleanly: reconnect after a short pause
+                    reason, attempt = "closed", 0
+                except asyncio.CancelledError:
+                    if self._stop.is_set():
+                        break
+                    raise
+                except RateLimited:
+                    reason, rate_limited = "rate_limited", True
+                except Exception as e:
+                    print(f"X stream connection error: {e}")
+                    reason = "error"
+                finally:
+                    self._consume_task = None
+                if self._stop.is_set():
+                    break
+
+                if self.connections > connections:
+                    # This attempt did connect: start the backoff sequence over
+                    attempt = 0
+                RECONNECTS.inc(reason=reason)
+                delay = self.backoff(attempt, rate_limited)
+                if reason != "closed":
+                    attempt += 1
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    # ------------------------------------------------------------------
+    # Running from synchronous code
+    def start(self):
+        """Run the stream on its own event loop in one daemon thread."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self.run(),), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Close the connection and end run() (from any thread)."""
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._request_stop)
+            self._thread.join(timeout=5)
+        else:
+            self._request_stop()
+
+    def _request_stop(self):
+        if self._stop is not None:
+            self._stop.set()
+        if self._consume_task is not None:
+            self._consume_task.cancel()
+
+    def update_keywords(self, keywords):
+        """Change the tracked keywords on a running stream (rules diff, no reconnect)."""
+        future = asyncio.run_coroutine_threadsafe(self.sync_rules(keywords), self._loop)
+        return future.result(timeout=30)
+
+
+class RateLimited(Exception):
+    pass
 
-    def on_tweet(self, tweet):
-        """
-        Called when a new tweet arrives.
-        """
-        # Put the tweet text in the queue
-        self.tweet_queue.put(tweet.text)
-        print(f"New tweet: {tweet.text}")
-
-    def on_errors(self, errors):
-        """
-        Called when an error occurs.
-        """
-        print(f"Error: {errors}")
-        self.on_connection_error()
-
-    def on_connection_error(self):
-        """
-        Handle connection errors and attempt to reconnect.
-        """
-        print("Connection error. Reconnecting in 10s.")
-        time.sleep(10)
-        self.restart_stream()
-
-    def restart_stream(self):
-        """
-        Restart the stream after a connection error.
-        """
-        try:
-            self.disconnect()
-        except Exception as e:
-            print(f"Error disconnecting: {e}")
-        time.sleep(2)
-        self.filter_thread()
 
 def start_twitter_stream(keywords, tweet_queue):
     """
-    Launch the streaming client in a separate thread.
+    Start streaming tweets matching `keywords` into `tweet_queue` on a
+    background thread. Returns the XStream (call stop() to end it).
     """
     # Load Twitter API credentials from .env
     BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")
-
-    # Initialize the stream listener
-    stream = TwitterStreamListener(bearer_token=BEARER_TOKEN, tweet_queue=tweet_queue)
-
-    # Remove old rules if any
-    try:
-        old_rules = stream.get_rules()
-        if old_rules and old_rules.data:
-            rule_ids = [r.id for r in old_rules.data]
-            stream.delete_rules(rule_ids)
-    except tweepy.errors.TweepyException as e:
-        print(f"Error removing old rules: {e}")
-
-    # Add new rules for the keywords
-    try:
-        for kw in keywords:
-            stream.add_rules(tweepy.StreamRule(value=kw))
-    except tweepy.errors.TweepyException as e:
-        print(f"Error adding rules: {e}")
-
-    # Start filtering in a thread
-    t = threading.Thread(target=stream.filter, kwargs={'threaded': True})
-    t.start()
-    return stream
\ No newline at end of file
+    return XStream(BEARER_TOKEN, keywords, tweet_queue).start()